@@ -0,0 +1,83 @@
+"""
+Seeded synthetic load generator for capacity tests.
+
+Generates a fleet of ``--hosts`` hosts sampled every ``--interval`` seconds
+for ``--steps`` steps with the collector's record format, drawing values
+with vectorised NumPy from ``--seed``, and writes the objects concurrently
+either to S3 or to a local directory for offline runs. The same seed always
+produces the same objects.
+
+Usage:
+    python benchmarks/load_generator.py --hosts 100000 --steps 3 --output-dir /tmp/load
+    python benchmarks/load_generator.py --hosts 20000 --bucket my-test-bucket --compression gzip --concurrency 32
+    python benchmarks/load_generator.py --metrics cpu:normal:55:15:percent,network:lognormal:7:1:bytes
+"""
+
+import argparse
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from pipeline_common import compression, load_generator  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--output-dir', help='write objects under this local directory')
+    target.add_argument('--bucket', help='write objects to this S3 bucket')
+    parser.add_argument('--prefix', default=load_generator.DEFAULT_PREFIX, help='key prefix')
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--metrics', default=load_generator.DEFAULT_METRIC_SPECS,
+                        help='comma-separated name:distribution:a:b[:unit] specs')
+    parser.add_argument('--interval', type=int, default=load_generator.DEFAULT_INTERVAL,
+                        help='seconds between samples of one host')
+    parser.add_argument('--steps', type=int, default=1, help='sampling steps to generate')
+    parser.add_argument('--start', type=int, help='epoch second of the first step (default: now)')
+    parser.add_argument('--records-per-object', type=int, default=load_generator.DEFAULT_RECORDS_PER_OBJECT)
+    parser.add_argument('--shape', choices=load_generator.SHAPES, default='array')
+    parser.add_argument('--compression', choices=compression.CODECS, default=compression.NONE)
+    parser.add_argument('--concurrency', type=int, default=8, help='objects built and written in parallel')
+    parser.add_argument('--region', default='eu-west-1', help='region written with every record')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    generator = load_generator.LoadGenerator(
+        hosts=args.hosts,
+        metric_specs=args.metrics,
+        interval=args.interval,
+        start=args.start,
+        seed=args.seed,
+        region=args.region
+    )
+
+    if args.bucket:
+        from pipeline_common import aws_clients
+        client = aws_clients.get_client('s3', max_pool_connections=max(args.concurrency, 10))
+        sink = load_generator.S3ObjectSink(client, args.bucket)
+    else:
+        sink = load_generator.LocalObjectSink(args.output_dir)
+
+    stats = load_generator.run_load(
+        generator,
+        sink,
+        steps=args.steps,
+        records_per_object=args.records_per_object,
+        shape=args.shape,
+        codec=args.compression,
+        prefix=args.prefix,
+        concurrency=args.concurrency
+    )
+    print(json.dumps(dict(stats, hosts=args.hosts, steps=args.steps, seed=args.seed), indent=2))
+    return stats
+
+
+if __name__ == '__main__':
+    main()
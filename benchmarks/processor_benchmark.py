@@ -0,0 +1,295 @@
+"""
+Offline throughput benchmark for the S3 -> DynamoDB processors.
+
+Generates metric files of a configurable size and shape, uploads them to a
+moto-backed S3 bucket and runs the processor's ``lambda_handler`` against a
+moto-backed DynamoDB table. Reports metrics per second, p50/p99 handler
+time and peak RSS. Nothing leaves the machine, so results from two builds
+can be compared before deploying.
+
+The ``throttled`` profile wraps ``batch_write_item`` so a share of every
+request comes back in ``UnprocessedItems`` and some requests fail with
+``ProvisionedThroughputExceededException``, exercising the retry path
+(including its real backoff sleeps).
+
+Usage:
+    python benchmarks/processor_benchmark.py --processor data-collector --files 4 --records 5000
+    python benchmarks/processor_benchmark.py --profile throttled --throttle-rate 0.2
+    python benchmarks/processor_benchmark.py --shape ndjson --compression gzip --output results.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from pipeline_common import compression  # noqa: E402
+
+PROCESSORS = ('data-collector', 'log-processor')
+SHAPES = ('array', 'ndjson')
+PROFILES = ('baseline', 'throttled')
+
+BUCKET = 'benchmark-metrics'
+TABLE = 'InfraMetrics'
+REGION = 'eu-west-1'  # log-processor pins its clients to eu-west-1
+METRIC_TYPES = ('cpu', 'memory', 'disk', 'network')
+BASE_TIMESTAMP = 1738440000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processor', choices=PROCESSORS, default='data-collector')
+    parser.add_argument('--files', type=int, default=4, help='S3 objects per invocation')
+    parser.add_argument('--records', type=int, default=5000,
+                        help='records per file (metrics for data-collector, envelopes for log-processor)')
+    parser.add_argument('--hosts', type=int, default=100, help='distinct hosts in the generated data')
+    parser.add_argument('--shape', choices=SHAPES, default='array')
+    parser.add_argument('--compression', choices=compression.CODECS, default=compression.NONE)
+    parser.add_argument('--iterations', type=int, default=5, help='measured invocations')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured invocations run first')
+    parser.add_argument('--profile', choices=PROFILES, default='baseline')
+    parser.add_argument('--throttle-rate', type=float, default=0.2,
+                        help='share of items returned unprocessed in the throttled profile')
+    parser.add_argument('--stage-timing', action='store_true',
+                        help='enable STAGE_TIMING and report per-stage seconds (data-collector only)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='also write the results as JSON to this path')
+    return parser.parse_args(argv)
+
+
+def configure_environment(stage_timing=False):
+    """Point boto3 at fake credentials before any client is created."""
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    os.environ['AWS_SESSION_TOKEN'] = 'testing'
+    os.environ['AWS_DEFAULT_REGION'] = REGION
+    os.environ['AWS_REGION'] = REGION
+    os.environ['DYNAMODB_TABLE'] = TABLE
+    os.environ['STAGE_TIMING'] = 'true' if stage_timing else 'false'
+
+
+def load_processor(name):
+    """Import a processor's lambda_function.py under a unique module name."""
+    path = os.path.join(REPO_ROOT, name, 'lambda_function.py')
+    spec = importlib.util.spec_from_file_location(f"benchmark_{name.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_records(processor, count, hosts, file_index, rng):
+    """
+    Generate one file's worth of records.
+
+    data-collector files hold flat metrics; log-processor files hold one
+    ``{"metrics": {...}}`` envelope per host sample.
+    """
+    records = []
+    for i in range(count):
+        sample = file_index * count + i
+        host = f"host-{rng.randrange(hosts):05d}"
+        timestamp = BASE_TIMESTAMP + sample
+
+        if processor == 'log-processor':
+            records.append({
+                'timestamp': datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat(),
+                'region': REGION,
+                'instance_id': host,
+                'metrics': {metric_type: round(rng.uniform(0.0, 100.0), 2) for metric_type in METRIC_TYPES}
+            })
+        else:
+            metric_type = METRIC_TYPES[sample % len(METRIC_TYPES)]
+            records.append({
+                'metric_id': f"{metric_type}-{timestamp}-{host}",
+                'timestamp': timestamp,
+                'metric_type': metric_type,
+                'value': round(rng.uniform(0.0, 100.0), 2),
+                'unit': 'percent',
+                'hostname': host,
+                'region': REGION
+            })
+    return records
+
+
+def encode_file(records, shape, codec):
+    """Serialise records as a JSON array or NDJSON and compress them."""
+    if shape == 'ndjson':
+        payload = '\n'.join(json.dumps(record) for record in records)
+    else:
+        payload = json.dumps(records)
+    return compression.compress(payload, codec)
+
+
+def create_resources(s3, dynamodb):
+    s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+    dynamodb.create_table(
+        TableName=TABLE,
+        KeySchema=[
+            {'AttributeName': 'metric_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'metric_id', 'AttributeType': 'S'},
+            {'AttributeName': 'timestamp', 'AttributeType': 'N'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def upload_files(s3, args, rng):
+    """Upload the benchmark files and build the S3 event that references them."""
+    suffix = '.json' + compression.key_suffix(args.compression)
+    records = []
+    for index in range(args.files):
+        key = f"benchmark/file-{index:04d}{suffix}"
+        put_args = {
+            'Bucket': BUCKET,
+            'Key': key,
+            'Body': encode_file(
+                generate_records(args.processor, args.records, args.hosts, index, rng),
+                args.shape, args.compression
+            )
+        }
+        encoding = compression.content_encoding(args.compression)
+        if encoding:
+            put_args['ContentEncoding'] = encoding
+        s3.put_object(**put_args)
+        records.append({'s3': {'bucket': {'name': BUCKET}, 'object': {'key': key}}})
+    return {'Records': records}
+
+
+def inject_throttling(client, rate, rng):
+    """
+    Make a DynamoDB client behave like an under-provisioned table.
+
+    A ``rate`` share of each request's items is withheld and returned in
+    ``UnprocessedItems``, and ``rate / 4`` of requests fail outright.
+    """
+    from botocore.exceptions import ClientError
+
+    original = client.batch_write_item
+
+    def throttled_batch_write_item(RequestItems, **kwargs):
+        if rng.random() < rate / 4:
+            raise ClientError(
+                {'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Injected'}},
+                'BatchWriteItem'
+            )
+
+        accepted, unprocessed = {}, {}
+        for table, requests in RequestItems.items():
+            for request in requests:
+                target = unprocessed if rng.random() < rate else accepted
+                target.setdefault(table, []).append(request)
+
+        response = original(RequestItems=accepted, **kwargs) if accepted else {'UnprocessedItems': {}}
+        for table, requests in unprocessed.items():
+            response.setdefault('UnprocessedItems', {}).setdefault(table, []).extend(requests)
+        return response
+
+    client.batch_write_item = throttled_batch_write_item
+
+
+def metrics_written(processor, response):
+    """Extract the number of metrics written from a handler response."""
+    if processor == 'log-processor':
+        return json.loads(response['body']).get('metrics_processed', 0)
+    return response.get('data', {}).get('successful_writes', 0)
+
+
+def peak_rss_bytes():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def run(args):
+    configure_environment(args.stage_timing)
+
+    import boto3
+    from moto import mock_aws
+
+    rng = random.Random(args.seed)
+
+    with mock_aws():
+        s3 = boto3.client('s3', region_name=REGION)
+        dynamodb = boto3.client('dynamodb', region_name=REGION)
+        create_resources(s3, dynamodb)
+        event = upload_files(s3, args, rng)
+
+        processor = load_processor(args.processor)
+        if args.profile == 'throttled':
+            inject_throttling(processor.dynamodb_client, args.throttle_rate, rng)
+
+        durations = []
+        written = []
+        stages = {}
+        for iteration in range(args.warmup + args.iterations):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                response = processor.lambda_handler(event, None)
+                elapsed = time.perf_counter() - start
+
+            if iteration >= args.warmup:
+                durations.append(elapsed)
+                written.append(metrics_written(args.processor, response))
+                for name, stage in response.get('data', {}).get('stages', {}).items():
+                    stages[name] = stages.get(name, 0.0) + stage['seconds']
+
+    durations = np.array(durations)
+    metrics_per_invocation = args.records * args.files * (
+        len(METRIC_TYPES) if args.processor == 'log-processor' else 1)
+
+    results = {
+        'processor': args.processor,
+        'profile': args.profile,
+        'shape': args.shape,
+        'compression': args.compression,
+        'files': args.files,
+        'records_per_file': args.records,
+        'iterations': args.iterations,
+        'metrics_per_invocation': metrics_per_invocation,
+        'metrics_written': int(np.mean(written)) if written else 0,
+        'throughput_metrics_per_sec': metrics_per_invocation * len(durations) / float(durations.sum()),
+        'p50_seconds': float(np.percentile(durations, 50)),
+        'p99_seconds': float(np.percentile(durations, 99)),
+        'peak_rss_mb': peak_rss_bytes() / (1024 * 1024)
+    }
+    # Mean seconds per invocation spent in each stage
+    for name, seconds in sorted(stages.items()):
+        results[f'stage_{name}_seconds'] = seconds / len(durations)
+    return results
+
+
+def print_report(results):
+    width = max(len(key) for key in results)
+    for key, value in results.items():
+        if isinstance(value, float):
+            value = f"{value:,.3f}"
+        print(f"{key.ljust(width)}  {value}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
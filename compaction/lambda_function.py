@@ -0,0 +1,130 @@
+import json
+import os
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+from pipeline_common import aws_clients, compaction
+
+# Environment variables
+BUCKET = os.environ.get('COMPACTION_BUCKET', 'infra-monitoring-pipeline-data')
+LAYOUTS = [layout.strip() for layout in os.environ.get('COMPACTION_LAYOUTS', 'metrics,raw-metrics').split(',') if layout.strip()]
+OUTPUT_PREFIX = os.environ.get('COMPACTION_OUTPUT_PREFIX', compaction.DEFAULT_OUTPUT_PREFIX)
+GRANULARITY = os.environ.get('COMPACTION_GRANULARITY', 'day')  # day or hour
+MODE = os.environ.get('COMPACTION_MODE', 'skip')  # skip keeps originals, delete removes them after the grace period
+DELETE_GRACE_SECONDS = int(os.environ.get('COMPACTION_DELETE_GRACE_SECONDS', str(compaction.DEFAULT_DELETE_GRACE_SECONDS)))
+CODEC = os.environ.get('COMPACTION_CODEC', 'gzip')
+TARGET_RECORDS = int(os.environ.get('COMPACTION_TARGET_RECORDS', str(compaction.DEFAULT_TARGET_RECORDS)))
+CONCURRENCY = int(os.environ.get('COMPACTION_CONCURRENCY', str(compaction.DEFAULT_CONCURRENCY)))
+MIN_AGE_SECONDS = int(os.environ.get('COMPACTION_MIN_AGE_SECONDS', '3600'))  # wait after a partition closes
+# Earlier days whose compacted partitions each run revisits for deletes and late arrivals
+REVISIT_DAYS = int(os.environ.get('COMPACTION_REVISIT_DAYS', str(compaction.revisit_days(DELETE_GRACE_SECONDS))))
+
+# S3 client sized for the parallel source downloads
+s3_client = aws_clients.lazy('s3', max_pool_connections=max(CONCURRENCY, aws_clients.DEFAULT_MAX_POOL_CONNECTIONS))
+
+def lambda_handler(event, context):
+    """
+    Compacts closed partitions of the collector prefixes.
+
+    The event may override the configuration: ``date`` (YYYY-MM-DD, default
+    yesterday UTC), ``days`` (how many days back from ``date``), ``layouts``,
+    ``granularity``, ``mode`` and ``revisit_days``. Partitions that are still
+    open, or closed less than COMPACTION_MIN_AGE_SECONDS ago, are skipped.
+
+    The ``revisit_days`` days before the range are revisited too, but only
+    partitions that already have a manifest: originals past the delete grace
+    period are removed and late arrivals are appended.
+    """
+    event = event or {}
+    print(f"Received event: {json.dumps(event)}")
+
+    now = datetime.now(timezone.utc)
+    last_day = date.fromisoformat(event['date']) if event.get('date') else (now - timedelta(days=1)).date()
+    days = int(event.get('days', 1))
+    layouts = event.get('layouts', LAYOUTS)
+    granularity = event.get('granularity', GRANULARITY)
+    mode = event.get('mode', MODE)
+    revisit = int(event.get('revisit_days', REVISIT_DAYS))
+
+    results = []
+    errors = []
+    # Each day prefix is listed once per run, however many hourly partitions it has
+    listing = {}
+    for offset in range(days + revisit):
+        day = last_day - timedelta(days=offset)
+        revisiting = offset >= days
+        for partition in compaction.partitions(day, granularity):
+            if compaction.partition_end(partition) + timedelta(seconds=MIN_AGE_SECONDS) > now:
+                print(f"Skipping open partition {partition}")
+                continue
+            for layout in layouts:
+                try:
+                    stats = compaction.compact_partition(
+                        s3_client,
+                        event.get('bucket', BUCKET),
+                        layout,
+                        partition,
+                        prefix=OUTPUT_PREFIX,
+                        codec=CODEC,
+                        target_records=TARGET_RECORDS,
+                        mode=mode,
+                        delete_grace_seconds=DELETE_GRACE_SECONDS,
+                        concurrency=CONCURRENCY,
+                        now=now,
+                        require_manifest=revisiting,
+                        listing=listing
+                    )
+                    if stats['status'] != 'skipped':
+                        results.append(stats)
+                except Exception as e:
+                    error_msg = f"Failed to compact {layout}/{partition}: {str(e)}"
+                    print(f"ERROR: {error_msg}")
+                    errors.append(error_msg)
+
+    summary = {
+        'partitions': len(results),
+        'compacted': sum(1 for stats in results if stats['status'] == 'compacted'),
+        'conflicts': sum(1 for stats in results if stats['status'] == 'conflict'),
+        'sources': sum(stats['sources'] for stats in results),
+        'records': sum(stats['records'] for stats in results),
+        'outputs': sum(stats['outputs'] for stats in results),
+        'deleted': sum(stats['deleted'] for stats in results),
+        'errors': errors
+    }
+    print(f"Compaction summary: {json.dumps(summary)}")
+
+    return create_response(207 if errors else 200, summary)
+
+def create_response(status_code, body):
+    """Creates standardized Lambda response."""
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(body),
+        'headers': {
+            'Content-Type': 'application/json'
+        }
+    }
+
+# Backfills from a workstation, e.g.
+#   python lambda_function.py --date 2026-01-31 --days 30 --mode delete
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compact collector objects into large compressed files')
+    parser.add_argument('--date', help='last day to compact (YYYY-MM-DD, default yesterday)')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--bucket', default=BUCKET)
+    parser.add_argument('--layouts', default=','.join(LAYOUTS))
+    parser.add_argument('--granularity', choices=compaction.GRANULARITIES, default=GRANULARITY)
+    parser.add_argument('--mode', choices=compaction.MODES, default=MODE)
+    parser.add_argument('--revisit-days', type=int, default=REVISIT_DAYS)
+    args = parser.parse_args()
+
+    response = lambda_handler({
+        'date': args.date,
+        'days': args.days,
+        'bucket': args.bucket,
+        'layouts': [layout for layout in args.layouts.split(',') if layout],
+        'granularity': args.granularity,
+        'mode': args.mode,
+        'revisit_days': args.revisit_days
+    }, None)
+    print(json.dumps(json.loads(response['body']), indent=2))
@@ -1,29 +1,122 @@
 
 import json
-import boto3
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
-from botocore.exceptions import ClientError
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-cloudwatch = boto3.client('cloudwatch')
+from pipeline_common import aws_clients
+from pipeline_common.batch_events import item_identifier, unpack_message
+from pipeline_common.decoders import decode_records
+from pipeline_common.detection import AlertPublisher, DetectionEngine, EwmaDetector, S3StateStore, parse_rules
+from pipeline_common.dlq_writer import DeadLetterWriter
+from pipeline_common.dynamodb_writer import RetryBudget
+from pipeline_common.ingestion_ledger import BloomFilter, IngestionLedger
+from pipeline_common.instrumentation import Instrumentation
+from pipeline_common.object_processor import (
+    ObjectProcessor, StageConfig, merge_summary, new_processing_summary, validate_metrics
+)
+from pipeline_common.parquet_sink import ParquetSink
+from pipeline_common.rollups import parse_resolutions
+from pipeline_common.series_keys import create_encoder, parse_shard_map, validate_layout
+
+# AWS clients, created on first use and kept across warm invocations
+s3_client = aws_clients.lazy('s3')
+cloudwatch = aws_clients.lazy('cloudwatch')
+sqs_client = aws_clients.lazy('sqs')
+sns_client = aws_clients.lazy('sns')
 
 # Environment variables
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'InfraMetrics')
 REGION = os.environ.get('AWS_REGION', 'us-east-1')
 DLQ_URL = os.environ.get('DLQ_URL', '')  # Optional: SQS DLQ URL
+DLQ_SPILL_BUCKET = os.environ.get('DLQ_SPILL_BUCKET', '')  # Optional: S3 bucket for DLQ payloads over the SQS limit
+DLQ_SPILL_PREFIX = os.environ.get('DLQ_SPILL_PREFIX', 'dlq')
+RECORD_WORKERS = int(os.environ.get('RECORD_WORKERS', '1'))  # >1 processes S3 records concurrently
+WRITE_CONCURRENCY = int(os.environ.get('DYNAMODB_WRITE_CONCURRENCY', '4'))  # BatchWriteItem calls in flight
+RETRY_BUDGET = int(os.environ.get('DYNAMODB_RETRY_BUDGET', '100'))  # Retry requests per invocation
+PARQUET_BUCKET = os.environ.get('PARQUET_BUCKET', '')  # Optional: enables the Parquet sink for Athena
+PARQUET_PREFIX = os.environ.get('PARQUET_PREFIX', 'parquet/metrics')
+PARQUET_MAX_ROWS = int(os.environ.get('PARQUET_MAX_ROWS', '100000'))  # Rows per partition before a flush
+ROLLUP_TABLE = os.environ.get('ROLLUP_TABLE', '')  # Optional: enables incremental min/max/avg/count rollups
+ROLLUP_RESOLUTIONS = parse_resolutions(os.environ.get('ROLLUP_RESOLUTIONS', '1m,1h'))
+ROLLUP_TTL_DAYS = int(os.environ.get('ROLLUP_TTL_DAYS', '90'))
+CHUNK_TABLE = os.environ.get('CHUNK_TABLE', '')  # Optional: enables hourly Gorilla-compressed chunks per series
+CHUNK_TTL_DAYS = int(os.environ.get('CHUNK_TTL_DAYS', '30'))
+CHUNK_ONLY = os.environ.get('CHUNK_ONLY', 'false').lower() == 'true' and bool(CHUNK_TABLE)  # Skip per-point items
+CHUNK_COMPACT = os.environ.get('CHUNK_COMPACT', 'true').lower() == 'true'  # Fold segments of closed hours
+SKETCH_TABLE = os.environ.get('SKETCH_TABLE', '')  # Optional: enables mergeable quantile sketches (p50/p95/p99)
+SKETCH_RESOLUTIONS = parse_resolutions(os.environ.get('SKETCH_RESOLUTIONS', '1h'))
+SKETCH_ACCURACY = float(os.environ.get('SKETCH_ACCURACY', '0.01'))  # Relative error of returned quantiles
+SKETCH_TTL_DAYS = int(os.environ.get('SKETCH_TTL_DAYS', '90'))
+LATEST_TABLE = os.environ.get('LATEST_TABLE', '')  # Optional: enables latest-value items per host and metric type
+LEDGER_TABLE = os.environ.get('LEDGER_TABLE', '')  # Optional: enables the idempotent ingestion ledger
+LEDGER_TTL_DAYS = int(os.environ.get('LEDGER_TTL_DAYS', '7'))
+STAGE_TIMING = os.environ.get('STAGE_TIMING', 'false').lower() == 'true'  # Per-stage timings in the summary
+STAGE_TRACEMALLOC = os.environ.get('STAGE_TRACEMALLOC', 'false').lower() == 'true'  # Also tracemalloc peaks
+STAGE_METRICS = [name.strip() for name in os.environ.get('STAGE_METRICS', '').split(',') if name.strip()]  # Stages published to CloudWatch
+PREWARM_CLIENTS = aws_clients.parse_services(os.environ.get('PREWARM_CLIENTS', ''))  # Clients created during init
+KEY_LAYOUT = validate_layout(os.environ.get('KEY_LAYOUT', 'metric_id'))  # metric_id or series (host#metric_type#day)
+DETECTION_RULES = parse_rules(os.environ.get('DETECTION_RULES', ''))  # e.g. cpu_utilization>80,memory_usage>90:critical
+DETECTION_ZSCORE_METRICS = [name.strip() for name in os.environ.get('DETECTION_ZSCORE_METRICS', '').split(',') if name.strip()]  # EWMA z-score detection (* = all)
+DETECTION_ALPHA = float(os.environ.get('DETECTION_ALPHA', '0.1'))  # EWMA weight of each new point
+DETECTION_ZSCORE = float(os.environ.get('DETECTION_ZSCORE', '4.0'))  # |z| that counts as an anomaly
+DETECTION_WARMUP = int(os.environ.get('DETECTION_WARMUP', '30'))  # Points per series before it is scored
+ALERT_COOLDOWN_SECONDS = int(os.environ.get('ALERT_COOLDOWN_SECONDS', '300'))  # Per series and check
+ALERT_TOPIC_ARN = os.environ.get('ALERT_TOPIC_ARN', '')  # SNS topic for alerts (alerts are only counted when unset)
+DETECTION_STATE_BUCKET = os.environ.get('DETECTION_STATE_BUCKET', '')  # Optional: checkpoints detector state in S3
+DETECTION_STATE_KEY = os.environ.get('DETECTION_STATE_KEY', 'detection/state.json.gz')
+DETECTION_STATE_DAYS = int(os.environ.get('DETECTION_STATE_DAYS', '7'))  # Series idle longer are dropped from the state
+DETECTION_CHECKPOINT_SECONDS = int(os.environ.get('DETECTION_CHECKPOINT_SECONDS', '60'))  # Per container
+SERIES_SHARD_MAP = parse_shard_map(os.environ.get('SERIES_SHARDS', '1'), os.environ.get('SERIES_HOT_HOSTS', ''))  # Write shards per series day
+
+# Shared low-level DynamoDB client for parallel batch writes, with enough pooled
+# connections for every concurrent record and in-flight request
+dynamodb_client = aws_clients.lazy(
+    'dynamodb',
+    max_pool_connections=max(aws_clients.DEFAULT_MAX_POOL_CONNECTIONS, RECORD_WORKERS * WRITE_CONCURRENCY)
+)
 
-# Initialize DynamoDB table
-table = dynamodb.Table(DYNAMODB_TABLE)
+# Create the listed clients in the init phase (useful with provisioned concurrency)
+aws_clients.prewarm(PREWARM_CLIENTS)
 
 # Constants
 TTL_DAYS = 30
 MAX_RETRIES = 3
-BATCH_SIZE = 25  # DynamoDB batch write limit
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '1000'))  # Records held in memory at once
+
+# Retry budget shared by every write in the current invocation
+retry_budget = RetryBudget(RETRY_BUDGET)
+
+# Parquet sink for the current invocation (None when disabled)
+parquet_sink = None
+
+# Object versions this warm container has already seen, checked before the ledger table
+ingestion_bloom = BloomFilter() if LEDGER_TABLE else None
+
+# Ingestion ledger for the current invocation (None when disabled)
+ingestion_ledger = None
+
+# Dead-letter buffer for the current invocation (None when DLQ_URL is unset)
+dead_letters = None
+
+# Chunk hours this warm container has already compacted
+compacted_chunks = set()
+
+# Stage instrumentation for the current invocation (a no-op unless STAGE_TIMING is set)
+instrumentation = Instrumentation(enabled=False)
+
+# Detection rules and per-series detector state, kept across warm invocations
+detection_engine = DetectionEngine(
+    DETECTION_RULES,
+    detector=EwmaDetector(DETECTION_ZSCORE_METRICS, alpha=DETECTION_ALPHA, z_threshold=DETECTION_ZSCORE,
+                          warmup=DETECTION_WARMUP) if DETECTION_ZSCORE_METRICS else None,
+    cooldown_seconds=ALERT_COOLDOWN_SECONDS
+)
+detection_state = S3StateStore(
+    s3_client, DETECTION_STATE_BUCKET, DETECTION_STATE_KEY, min_interval=DETECTION_CHECKPOINT_SECONDS
+) if DETECTION_STATE_BUCKET else None
 
 
 def lambda_handler(event, context):
@@ -39,13 +132,9 @@ def lambda_handler(event, context):
     """
     print(f"Received event: {json.dumps(event)}")
     
-    processing_summary = {
-        'total_files': 0,
-        'total_metrics': 0,
-        'successful_writes': 0,
-        'failed_writes': 0,
-        'errors': []
-    }
+    start_invocation()
+    
+    processing_summary = new_processing_summary()
     
     try:
         # Parse S3 event records
@@ -56,13 +145,19 @@ def lambda_handler(event, context):
         processing_summary['total_files'] = len(records)
         
         # Process each S3 object
-        for record in records:
-            try:
-                process_s3_record(record, processing_summary)
-            except Exception as e:
-                error_msg = f"Failed to process record: {str(e)}"
-                print(f"ERROR: {error_msg}")
-                processing_summary['errors'].append(error_msg)
+        process_records(records, processing_summary)
+        
+        # Write whatever is still buffered for Athena
+        flush_parquet_sink(processing_summary)
+        
+        # Deliver the failures collected during the invocation in one go
+        flush_dead_letters(processing_summary)
+        
+        # Publish the invocation's alerts together and checkpoint the detectors
+        flush_alerts(processing_summary)
+        
+        if instrumentation.enabled:
+            processing_summary['stages'] = instrumentation.snapshot()
         
         # Publish CloudWatch metrics
         publish_processing_metrics(processing_summary)
@@ -83,182 +178,494 @@ def lambda_handler(event, context):
         # Send to DLQ if configured
         if DLQ_URL:
             send_to_dlq(event, error_msg)
+            flush_dead_letters(processing_summary)
         
         return create_response(500, error_msg, processing_summary)
+    
+    finally:
+        instrumentation.stop()
 
 
-def process_s3_record(record, summary):
+def batch_handler(event, context):
     """
-    Process a single S3 event record.
+    Lambda handler for batched SQS or Kinesis events.
+    
+    Each message carries S3 event notifications or an inline metric
+    payload. S3 objects are processed like lambda_handler records (on the
+    RECORD_WORKERS pool), and the inline metrics of every message are
+    validated and written together. Only messages with metrics that could
+    not be written are reported in batchItemFailures, so only they are
+    redelivered. Messages that can never succeed (unparseable payloads)
+    go to the DLQ instead when one is configured.
     
     Args:
-        record: S3 event record
-        summary: Processing summary dictionary to update
+        event: SQS or Kinesis batch event
+        context: Lambda context object
+        
+    Returns:
+        dict: Partial batch response ({'batchItemFailures': [...]})
     """
-    # Extract S3 object details
-    bucket_name = record['s3']['bucket']['name']
-    object_key = record['s3']['object']['key']
-    
-    print(f"Processing: s3://{bucket_name}/{object_key}")
+    messages = event.get('Records', [])
+    print(f"Received batch of {len(messages)} messages")
     
-    # Download and parse JSON from S3
-    metrics = download_and_parse_json(bucket_name, object_key)
+    start_invocation()
     
-    if not metrics:
-        raise ValueError(f"No valid metrics found in {object_key}")
+    processing_summary = new_processing_summary()
+    processing_summary['total_messages'] = len(messages)
+    failed_ids = set()
     
-    summary['total_metrics'] += len(metrics)
-    
-    # Validate metrics structure
-    validated_metrics = validate_metrics(metrics)
+    try:
+        batch = unpack_batch(messages, failed_ids, processing_summary)
+        processing_summary['total_files'] = len(batch['s3_records'])
+        
+        # S3 objects referenced by the batch, attributed back to their message.
+        # Their messages are redelivered on failure, so failed items skip the DLQ
+        record_summaries = process_records(batch['s3_records'], processing_summary, redelivered=True)
+        for message_id, record_summary in zip(batch['s3_owners'], record_summaries):
+            if record_summary['errors'] or record_summary['failed_writes']:
+                failed_ids.add(message_id)
+        
+        # Inline metrics from every message, written together
+        failed_ids.update(
+            process_inline_metrics(batch['metrics'], batch['metric_owners'], processing_summary)
+        )
+        
+        flush_parquet_sink(processing_summary)
+        flush_dead_letters(processing_summary)
+        flush_alerts(processing_summary)
+        
+        if instrumentation.enabled:
+            processing_summary['stages'] = instrumentation.snapshot()
+        
+        publish_processing_metrics(processing_summary)
+        
+    except Exception as e:
+        error_msg = f"Batch processing failed: {str(e)}"
+        print(f"CRITICAL ERROR: {error_msg}")
+        processing_summary['errors'].append(error_msg)
+        
+        # Nothing can be attributed safely, so the whole batch is redelivered
+        for message in messages:
+            try:
+                failed_ids.add(item_identifier(message))
+            except (KeyError, ValueError):
+                pass
     
-    # Write to DynamoDB with retry logic
-    success_count, failure_count = write_to_dynamodb_batch(validated_metrics)
+    finally:
+        instrumentation.stop()
     
-    summary['successful_writes'] += success_count
-    summary['failed_writes'] += failure_count
+    failures = []
+    for message in messages:
+        try:
+            message_id = item_identifier(message)
+        except (KeyError, ValueError):
+            continue
+        if message_id in failed_ids:
+            failures.append({'itemIdentifier': message_id})
     
-    print(f"Processed {len(metrics)} metrics: {success_count} succeeded, {failure_count} failed")
+    print(f"Batch summary: {json.dumps(processing_summary, default=str)}")
+    print(f"Reporting {len(failures)} of {len(messages)} messages as failed")
+    return {'batchItemFailures': failures}
+
+
+def start_invocation():
+    """
+    Reset the per-invocation state shared by the handlers.
+    """
+    global retry_budget, parquet_sink, ingestion_ledger, dead_letters, instrumentation
+    retry_budget = RetryBudget(RETRY_BUDGET)
+    parquet_sink = create_parquet_sink()
+    ingestion_ledger = create_ingestion_ledger()
+    dead_letters = create_dead_letter_writer()
+    instrumentation = Instrumentation(enabled=STAGE_TIMING, trace_memory=STAGE_TRACEMALLOC)
+    instrumentation.start()
+    sync_detection_state()
 
 
-def download_and_parse_json(bucket, key):
+def unpack_batch(messages, failed_ids, summary):
     """
-    Download JSON file from S3 and parse it.
+    Split a batch of SQS/Kinesis messages into S3 records and inline metrics.
+    
+    Every S3 record and inline metric is paired with the identifier of the
+    message it came from. Messages whose payload cannot be parsed are sent
+    to the DLQ when one is configured, and reported as failed otherwise.
     
     Args:
-        bucket: S3 bucket name
-        key: S3 object key
+        messages: Records of the batch event
+        failed_ids: Set of failed message identifiers to update
+        summary: Processing summary dictionary to update
         
     Returns:
-        list: Parsed metrics data
-        
-    Raises:
-        ClientError: If S3 download fails
-        json.JSONDecodeError: If JSON parsing fails
+        dict: s3_records, s3_owners, metrics and metric_owners lists
     """
-    try:
-        # Download object from S3
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        content = response['Body'].read().decode('utf-8')
-        
-        # Parse JSON
-        data = json.loads(content)
-        
-        # Handle both single object and array formats
-        if isinstance(data, dict):
-            return [data]
-        elif isinstance(data, list):
-            return data
-        else:
-            raise ValueError(f"Unexpected JSON structure: {type(data)}")
-            
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'NoSuchKey':
-            print(f"ERROR: S3 object not found: {key}")
-        elif error_code == 'AccessDenied':
-            print(f"ERROR: Access denied to S3 object: {key}")
-        raise
+    batch = {'s3_records': [], 's3_owners': [], 'metrics': [], 'metric_owners': []}
+    
+    for message in messages:
+        try:
+            message_id = item_identifier(message)
+        except (KeyError, ValueError) as e:
+            error_msg = f"Skipping malformed batch message: {str(e)}"
+            print(f"ERROR: {error_msg}")
+            summary['errors'].append(error_msg)
+            continue
         
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Invalid JSON in {key}: {str(e)}")
-        raise
+        try:
+            with instrumentation.span('download_parse'):
+                s3_records, inline = unpack_message(message)
+                decoder, metrics = decode_records(inline)
+                metrics = list(metrics)
+        except Exception as e:
+            error_msg = f"Failed to parse message {message_id}: {str(e)}"
+            print(f"ERROR: {error_msg}")
+            summary['errors'].append(error_msg)
+            if DLQ_URL:
+                send_to_dlq(message, error_msg)
+            else:
+                failed_ids.add(message_id)
+            continue
+        
+        batch['s3_records'].extend(s3_records)
+        batch['s3_owners'].extend([message_id] * len(s3_records))
+        
+        if decoder is not None:
+            summary['decoders'][decoder] = summary['decoders'].get(decoder, 0) + 1
+            batch['metrics'].extend(metrics)
+            batch['metric_owners'].extend([message_id] * len(metrics))
+    
+    return batch
 
 
-def validate_metrics(metrics):
+def process_inline_metrics(metrics, owners, summary):
     """
-    Validate metrics structure and filter out invalid entries.
+    Validate and write the inline metrics of a batch together.
+    
+    Metrics go through the same stages as S3 objects (Parquet sink,
+    rollups, latest values). Items DynamoDB never accepted are mapped back
+    to the messages that carried them.
     
     Args:
-        metrics: List of metric dictionaries
+        metrics: Decoded metric records from every message
+        owners: Message identifier of each metric
+        summary: Processing summary dictionary to update
         
     Returns:
-        list: Validated metrics
+        set: Identifiers of messages with metrics that failed to write
     """
-    validated = []
-    required_fields = ['metric_id', 'timestamp', 'metric_type', 'value', 'hostname']
+    # Failed messages are redelivered, so failed items skip the DLQ
+    return create_object_processor(redelivered=True).process_inline_metrics(metrics, owners, summary)
+
+
+def process_records(records, summary, redelivered=False):
+    """
+    Process S3 event records serially or on a bounded worker pool.
     
-    for metric in metrics:
-        # Check required fields
-        if not all(field in metric for field in required_fields):
-            print(f"WARNING: Skipping invalid metric (missing fields): {metric}")
-            continue
+    With RECORD_WORKERS > 1 each record is processed in its own thread
+    against a private summary. Results are merged on the calling thread in
+    event order, so the shared summary is never mutated concurrently.
+    
+    Args:
+        records: S3 event records
+        summary: Processing summary dictionary to update
+        redelivered: True when failed records are redelivered by the event
+            source, so their failed items are not sent to the DLQ
         
-        # Validate data types
-        try:
-            metric['timestamp'] = int(metric['timestamp'])
-            metric['value'] = float(metric['value'])
-        except (ValueError, TypeError) as e:
-            print(f"WARNING: Skipping metric with invalid data types: {metric}")
-            continue
+    Returns:
+        list: Per-record summaries, in event order
+    """
+    workers = min(RECORD_WORKERS, len(records))
+    record_summaries = []
+    
+    if workers <= 1:
+        for record in records:
+            record_summaries.append(process_record_isolated(record, redelivered))
+            merge_summary(summary, record_summaries[-1])
+        return record_summaries
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for record_summary in executor.map(process_record_isolated, records, [redelivered] * len(records)):
+            record_summaries.append(record_summary)
+            merge_summary(summary, record_summary)
+    return record_summaries
+
+
+def process_record_isolated(record, redelivered=False):
+    """
+    Process one S3 event record against its own summary.
+    
+    Exceptions are captured and attributed to the record's S3 location
+    instead of propagating, so one bad object does not affect the others.
+    
+    Args:
+        record: S3 event record
+        redelivered: True when the record is redelivered on failure
         
-        validated.append(metric)
+    Returns:
+        dict: Summary for this record only
+    """
+    record_summary = new_processing_summary()
     
-    return validated
+    try:
+        process_s3_record(record, record_summary, redelivered)
+    except Exception as e:
+        error_msg = f"Failed to process {describe_record(record)}: {str(e)}"
+        print(f"ERROR: {error_msg}")
+        record_summary['errors'].append(error_msg)
+    
+    # total_files is counted once from the event, not per record
+    del record_summary['total_files']
+    return record_summary
 
 
-def write_to_dynamodb_batch(metrics):
+def describe_record(record):
     """
-    Write metrics to DynamoDB using batch operations with retry logic.
+    Describe an S3 event record for log and error messages.
     
     Args:
-        metrics: List of validated metrics
+        record: S3 event record
         
     Returns:
-        tuple: (success_count, failure_count)
+        str: s3://bucket/key, or a placeholder for malformed records
+    """
+    try:
+        return f"s3://{record['s3']['bucket']['name']}/{record['s3']['object']['key']}"
+    except (KeyError, TypeError):
+        return 'record'
+
+
+def process_s3_record(record, summary, redelivered=False):
     """
-    success_count = 0
-    failure_count = 0
+    Process a single S3 event record.
     
-    # Process in batches of 25 (DynamoDB limit)
-    for i in range(0, len(metrics), BATCH_SIZE):
-        batch = metrics[i:i + BATCH_SIZE]
+    Args:
+        record: S3 event record
+        summary: Processing summary dictionary to update
+        redelivered: True when the record is redelivered on failure; failed
+            items are then left to the retry instead of the DLQ
+    """
+    create_object_processor(redelivered).process_s3_record(record, summary)
+
+
+def create_object_processor(redelivered=False):
+    """
+    Create the shared per-object stage runner for the current invocation.
+    
+    Configuration is read when called, so every record sees the
+    invocation's retry budget, sink, ledger and dead-letter buffer.
+    
+    Args:
+        redelivered: True when failed objects are redelivered by the event
+            source, so their failed items are not sent to the DLQ
         
-        # Retry logic for batch write
-        for attempt in range(MAX_RETRIES):
-            try:
-                with table.batch_writer() as batch_writer:
-                    for metric in batch:
-                        item = prepare_dynamodb_item(metric)
-                        batch_writer.put_item(Item=item)
-                
-                success_count += len(batch)
-                break  # Success - exit retry loop
-                
-            except ClientError as e:
-                error_code = e.response['Error']['Code']
-                
-                if error_code == 'ProvisionedThroughputExceededException':
-                    # Throttling - retry with exponential backoff
-                    if attempt < MAX_RETRIES - 1:
-                        wait_time = (2 ** attempt) * 0.5  # 0.5s, 1s, 2s
-                        print(f"DynamoDB throttled, retrying in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"ERROR: DynamoDB throttling persists after {MAX_RETRIES} attempts")
-                        failure_count += len(batch)
-                        
-                        # Send failed batch to DLQ
-                        if DLQ_URL:
-                            send_batch_to_dlq(batch)
-                else:
-                    # Non-retryable error
-                    print(f"ERROR: DynamoDB write failed: {error_code}")
-                    failure_count += len(batch)
-                    break
-                    
-            except Exception as e:
-                print(f"ERROR: Unexpected error writing to DynamoDB: {str(e)}")
-                failure_count += len(batch)
-                break
-    
-    return success_count, failure_count
+    Returns:
+        ObjectProcessor: Stage runner for S3 records and inline metrics
+    """
+    return ObjectProcessor(
+        dynamodb_client,
+        s3_client,
+        DYNAMODB_TABLE,
+        create_item_encoder,
+        REGION,
+        stages=StageConfig(
+            rollup_table=ROLLUP_TABLE,
+            rollup_resolutions=ROLLUP_RESOLUTIONS,
+            rollup_ttl_days=ROLLUP_TTL_DAYS,
+            chunk_table=CHUNK_TABLE,
+            chunk_ttl_days=CHUNK_TTL_DAYS,
+            chunk_only=CHUNK_ONLY,
+            chunk_compact=CHUNK_COMPACT,
+            sketch_table=SKETCH_TABLE,
+            sketch_resolutions=SKETCH_RESOLUTIONS,
+            sketch_accuracy=SKETCH_ACCURACY,
+            sketch_ttl_days=SKETCH_TTL_DAYS,
+            latest_table=LATEST_TABLE
+        ),
+        batch_size=STREAM_BATCH_SIZE,
+        write_concurrency=WRITE_CONCURRENCY,
+        max_retries=MAX_RETRIES,
+        retry_budget=retry_budget,
+        parquet_sink=parquet_sink,
+        ledger=ingestion_ledger,
+        dead_letters=dead_letters,
+        instrumentation=instrumentation,
+        detection=detection_engine,
+        compacted_chunks=compacted_chunks,
+        redelivered=redelivered
+    )
+
+
+def create_item_encoder():
+    """
+    Create the item encoder for the table's key layout.
+    
+    With KEY_LAYOUT=series, items also carry the ``series`` partition key
+    (``host#metric_type#day``, sharded for the hosts in SERIES_HOT_HOSTS).
+    
+    Returns:
+        ItemEncoder or SeriesItemEncoder
+    """
+    return create_encoder(KEY_LAYOUT, REGION, ttl_days=TTL_DAYS, shard_map=SERIES_SHARD_MAP)
+
+
+def create_ingestion_ledger():
+    """
+    Create the ingestion ledger for one invocation when LEDGER_TABLE is set.
+    
+    The ledger shares the warm container's Bloom filter and the
+    invocation's retry budget.
+    
+    Returns:
+        IngestionLedger or None: Ledger, or None when the stage is disabled
+    """
+    if not LEDGER_TABLE:
+        return None
+    return IngestionLedger(
+        dynamodb_client,
+        LEDGER_TABLE,
+        bloom=ingestion_bloom,
+        ttl_days=LEDGER_TTL_DAYS,
+        retry_budget=retry_budget
+    )
+
+
+def create_dead_letter_writer():
+    """
+    Create the dead-letter buffer for one invocation when DLQ_URL is set.
+    
+    Returns:
+        DeadLetterWriter or None: Writer, or None when no DLQ is configured
+    """
+    if not DLQ_URL:
+        return None
+    return DeadLetterWriter(
+        sqs_client,
+        DLQ_URL,
+        s3_client=s3_client,
+        spill_bucket=DLQ_SPILL_BUCKET or None,
+        spill_prefix=DLQ_SPILL_PREFIX
+    )
+
+
+def create_parquet_sink():
+    """
+    Create the Parquet sink for one invocation when PARQUET_BUCKET is set.
+    
+    A sink that cannot be created (e.g. pyarrow is not packaged) disables
+    the stage for the invocation instead of failing ingestion, since
+    DynamoDB remains the system of record.
+    
+    Returns:
+        ParquetSink or None: Sink, or None when the stage is disabled
+    """
+    if not PARQUET_BUCKET:
+        return None
+    try:
+        return ParquetSink(s3_client, PARQUET_BUCKET, prefix=PARQUET_PREFIX, max_rows=PARQUET_MAX_ROWS)
+    except Exception as e:
+        print(f"ERROR: Parquet sink disabled: {str(e)}")
+        return None
+
+
+def flush_parquet_sink(summary):
+    """
+    Flush buffered Parquet partitions at the end of an invocation.
+    
+    Failures are recorded in the summary instead of failing the invocation,
+    since DynamoDB remains the system of record.
+    
+    Args:
+        summary: Processing summary dictionary to update
+    """
+    if parquet_sink is None:
+        return
+    
+    try:
+        with instrumentation.span('parquet_flush'):
+            summary['parquet_files'] += len(parquet_sink.flush())
+    except Exception as e:
+        error_msg = f"Failed to flush Parquet sink: {str(e)}"
+        print(f"ERROR: {error_msg}")
+        summary['errors'].append(error_msg)
+
+
+def flush_dead_letters(summary):
+    """
+    Send the failures buffered during the invocation to the DLQ.
+    
+    Args:
+        summary: Processing summary dictionary to update
+    """
+    if dead_letters is None:
+        return
+    
+    result = dead_letters.flush()
+    summary['dlq_messages'] += result.messages
+    summary['dlq_spilled'] += result.spilled
+    if result.dropped:
+        summary['errors'].append(f"Failed to deliver {result.dropped} DLQ messages")
+
+
+def sync_detection_state():
+    """
+    Merge detector state checkpointed by other containers into this one.
+    
+    Only a HeadObject is made while the checkpoint is unchanged. Failures
+    are logged; detection continues from the in-memory state.
+    """
+    if detection_state is None or not detection_engine.enabled:
+        return
+    
+    try:
+        detection_state.sync(detection_engine)
+    except Exception as e:
+        print(f"ERROR: Failed to load detection state: {str(e)}")
+
+
+def flush_alerts(summary):
+    """
+    Publish the invocation's alerts and checkpoint the detector state
+    (at most once every DETECTION_CHECKPOINT_SECONDS per container).
+    
+    Alerts are packed into as few SNS messages as possible, most severe
+    first. Failures are recorded in the summary instead of failing the
+    invocation.
+    
+    Args:
+        summary: Processing summary dictionary to update
+    """
+    if not detection_engine.enabled:
+        return
+    
+    alerts = detection_engine.drain()
+    if alerts and ALERT_TOPIC_ARN:
+        with instrumentation.span('alerts'):
+            messages, failed = AlertPublisher(sns_client, ALERT_TOPIC_ARN).publish(alerts)
+        summary['alerts_published'] += len(alerts) - failed
+        if failed:
+            summary['errors'].append(f"Failed to publish {failed} alerts")
+        print(f"Published {len(alerts) - failed} alerts in {messages} messages")
+    
+    # Idle series and cooldowns are dropped whether or not the state is checkpointed
+    detection_engine.expire(int(time.time()) - DETECTION_STATE_DAYS * 86400)
+    
+    if detection_state is None:
+        return
+    
+    try:
+        with instrumentation.span('detection_state'):
+            detection_state.checkpoint(detection_engine)
+    except Exception as e:
+        error_msg = f"Failed to checkpoint detection state: {str(e)}"
+        print(f"ERROR: {error_msg}")
+        summary['errors'].append(error_msg)
 
 
 def prepare_dynamodb_item(metric):
     """
     Prepare metric for DynamoDB insertion.
     
+    Resource-style equivalent of ItemEncoder.encode, which the write path
+    uses to skip the Decimal conversion and TypeSerializer pass.
+    
     Args:
         metric: Metric dictionary
         
@@ -292,38 +699,64 @@ def publish_processing_metrics(summary):
     """
     Publish custom CloudWatch metrics for monitoring.
     
+    Stages listed in STAGE_METRICS also get a StageDuration datum (and a
+    StagePeakMemory datum when tracemalloc is on), dimensioned by Stage.
+    
     Args:
         summary: Processing summary dictionary
     """
     try:
+        metric_data = [
+            {
+                'MetricName': 'MetricsProcessed',
+                'Value': summary['total_metrics'],
+                'Unit': 'Count',
+                'Timestamp': datetime.utcnow()
+            },
+            {
+                'MetricName': 'SuccessfulWrites',
+                'Value': summary['successful_writes'],
+                'Unit': 'Count',
+                'Timestamp': datetime.utcnow()
+            },
+            {
+                'MetricName': 'FailedWrites',
+                'Value': summary['failed_writes'],
+                'Unit': 'Count',
+                'Timestamp': datetime.utcnow()
+            },
+            {
+                'MetricName': 'FilesProcessed',
+                'Value': summary['total_files'],
+                'Unit': 'Count',
+                'Timestamp': datetime.utcnow()
+            }
+        ]
+        
+        for name in STAGE_METRICS:
+            stage = summary.get('stages', {}).get(name)
+            if stage is None:
+                continue
+            dimensions = [{'Name': 'Stage', 'Value': name}]
+            metric_data.append({
+                'MetricName': 'StageDuration',
+                'Value': stage['seconds'] * 1000,
+                'Unit': 'Milliseconds',
+                'Dimensions': dimensions,
+                'Timestamp': datetime.utcnow()
+            })
+            if 'peak_kb' in stage:
+                metric_data.append({
+                    'MetricName': 'StagePeakMemory',
+                    'Value': stage['peak_kb'],
+                    'Unit': 'Kilobytes',
+                    'Dimensions': dimensions,
+                    'Timestamp': datetime.utcnow()
+                })
+        
         cloudwatch.put_metric_data(
             Namespace='InfraMonitoring/Pipeline',
-            MetricData=[
-                {
-                    'MetricName': 'MetricsProcessed',
-                    'Value': summary['total_metrics'],
-                    'Unit': 'Count',
-                    'Timestamp': datetime.utcnow()
-                },
-                {
-                    'MetricName': 'SuccessfulWrites',
-                    'Value': summary['successful_writes'],
-                    'Unit': 'Count',
-                    'Timestamp': datetime.utcnow()
-                },
-                {
-                    'MetricName': 'FailedWrites',
-                    'Value': summary['failed_writes'],
-                    'Unit': 'Count',
-                    'Timestamp': datetime.utcnow()
-                },
-                {
-                    'MetricName': 'FilesProcessed',
-                    'Value': summary['total_files'],
-                    'Unit': 'Count',
-                    'Timestamp': datetime.utcnow()
-                }
-            ]
+            MetricData=metric_data
         )
         print("Published CloudWatch metrics successfully")
     except Exception as e:
@@ -332,52 +765,19 @@ def publish_processing_metrics(summary):
 
 def send_to_dlq(event, error_message):
     """
-    Send failed event to Dead Letter Queue (SQS).
+    Queue a failed event for the Dead Letter Queue (SQS).
+    
+    The event is delivered when the invocation's dead letters are flushed.
     
     Args:
         event: Original Lambda event
         error_message: Error description
     """
-    if not DLQ_URL:
-        return
-    
-    try:
-        sqs = boto3.client('sqs')
-        sqs.send_message(
-            QueueUrl=DLQ_URL,
-            MessageBody=json.dumps({
-                'event': event,
-                'error': error_message,
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        )
-        print(f"Sent failed event to DLQ: {DLQ_URL}")
-    except Exception as e:
-        print(f"ERROR: Failed to send to DLQ: {str(e)}")
-
-
-def send_batch_to_dlq(batch):
-    """
-    Send failed batch of metrics to DLQ.
-    
-    Args:
-        batch: List of metrics that failed to write
-    """
-    if not DLQ_URL:
+    if dead_letters is None:
         return
     
-    try:
-        sqs = boto3.client('sqs')
-        sqs.send_message(
-            QueueUrl=DLQ_URL,
-            MessageBody=json.dumps({
-                'failed_metrics': batch,
-                'timestamp': datetime.utcnow().isoformat()
-            })
-        )
-        print(f"Sent {len(batch)} failed metrics to DLQ")
-    except Exception as e:
-        print(f"ERROR: Failed to send batch to DLQ: {str(e)}")
+    dead_letters.add_event(event, error_message)
+    print(f"Queued failed event for DLQ: {DLQ_URL}")
 
 
 def create_response(status_code, message, data=None):
@@ -1,10 +1,27 @@
 
 import unittest
+import io
 import json
 import os
+import sys
 from unittest.mock import patch, MagicMock, call
 from decimal import Decimal
+
+# Make the shared pipeline_common package importable when running locally
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
 import lambda_function
+from pipeline_common.dynamodb_writer import WriteResult
+
+
+def write_result(succeeded, failed=0):
+    """WriteResult as returned by ObjectProcessor.write"""
+    result = WriteResult()
+    result.succeeded = succeeded
+    result.failed = failed
+    return result
+
 
 class TestLogProcessor(unittest.TestCase):
     """Unit tests for log-processor Lambda function"""
@@ -79,67 +96,160 @@ class TestLogProcessor(unittest.TestCase):
         self.assertIn('ttl', item)
         self.assertGreater(item['ttl'], 1738675200)
     
+    def test_item_encoder_matches_prepare_dynamodb_item(self):
+        """Test the wire-format encoder produces the same item as the resource path"""
+        from pipeline_common.dynamodb_writer import serialize_item
+        from pipeline_common.item_encoder import ItemEncoder
+        
+        tagged = dict(self.sample_metric, tags={'team': 'infra', 'tier': 1})
+        untagged = {k: v for k, v in self.sample_metric.items() if k not in ('unit', 'environment')}
+        encoder = ItemEncoder(lambda_function.REGION, ttl_days=lambda_function.TTL_DAYS)
+        
+        for metric in (tagged, untagged):
+            expected = serialize_item(lambda_function.prepare_dynamodb_item(metric))
+            actual = encoder.encode(metric)
+            self.assertLessEqual(abs(int(actual.pop('ttl')['N']) - int(expected.pop('ttl')['N'])), 1)
+            self.assertEqual(actual, expected)
+    
+    @patch('lambda_function.KEY_LAYOUT', 'series')
+    def test_create_item_encoder_series_layout(self):
+        """Test KEY_LAYOUT=series adds the host#metric_type#day partition key"""
+        encoder = lambda_function.create_item_encoder()
+        item = encoder.encode(self.sample_metric)
+        
+        self.assertEqual(item['series'], {'S': 'server-001#cpu_utilization#2025-02-04'})
+        self.assertEqual(item['metric_id'], {'S': 'test-123'})
+        self.assertEqual(encoder.key_attributes, ('series', 'timestamp'))
+    
+    @patch('pipeline_common.object_processor.ObjectProcessor.write')
     @patch('lambda_function.s3_client')
-    def test_download_and_parse_json_success(self, mock_s3):
-        """Test successful JSON download and parsing"""
-        mock_response = {
-            'Body': MagicMock(read=lambda: json.dumps([self.sample_metric]).encode('utf-8'))
-        }
-        mock_s3.get_object.return_value = mock_response
+    @patch('lambda_function.STREAM_BATCH_SIZE', 2)
+    def test_process_s3_record_streams_in_slices(self, mock_s3, mock_write):
+        """Test large files are validated and written in bounded slices"""
+        body = json.dumps([self.sample_metric] * 5).encode('utf-8')
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(body)}
+        mock_write.side_effect = lambda batch: write_result(len(batch))
+        summary = lambda_function.new_processing_summary()
         
-        metrics = lambda_function.download_and_parse_json('test-bucket', 'test.json')
+        lambda_function.process_s3_record(self.sample_s3_event['Records'][0], summary)
         
-        self.assertEqual(len(metrics), 1)
-        self.assertEqual(metrics[0]['metric_id'], 'test-123')
-        mock_s3.get_object.assert_called_once_with(Bucket='test-bucket', Key='test.json')
+        self.assertEqual([len(c.args[0]) for c in mock_write.call_args_list], [2, 2, 1])
+        self.assertEqual(summary['total_metrics'], 5)
+        self.assertEqual(summary['successful_writes'], 5)
     
+    @patch('pipeline_common.object_processor.ObjectProcessor.write')
     @patch('lambda_function.s3_client')
-    def test_download_and_parse_json_invalid_json(self, mock_s3):
-        """Test handling of invalid JSON"""
-        mock_response = {
-            'Body': MagicMock(read=lambda: b'invalid json{')
+    def test_process_s3_record_decodes_envelopes(self, mock_s3, mock_write):
+        """Test metric envelopes are expanded by the shared decoders"""
+        envelope = {
+            'timestamp': '2025-02-04T13:00:00Z',
+            'region': 'eu-west-1',
+            'instance_id': 'i-0123456789',
+            'metrics': {'cpu': 45.2, 'memory': 62.8}
         }
-        mock_s3.get_object.return_value = mock_response
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(envelope).encode('utf-8'))}
+        mock_write.side_effect = lambda batch: write_result(len(batch))
+        summary = lambda_function.new_processing_summary()
+        
+        lambda_function.process_s3_record(self.sample_s3_event['Records'][0], summary)
         
-        with self.assertRaises(json.JSONDecodeError):
-            lambda_function.download_and_parse_json('test-bucket', 'test.json')
+        written = mock_write.call_args[0][0]
+        self.assertEqual([m['metric_type'] for m in written], ['cpu', 'memory'])
+        self.assertEqual(written[0]['hostname'], 'i-0123456789')
+        self.assertEqual(summary['decoders'], {'envelope': 1})
+        self.assertEqual(summary['successful_writes'], 2)
     
-    @patch('lambda_function.table')
-    def test_write_to_dynamodb_batch_success(self, mock_table):
-        """Test successful batch write to DynamoDB"""
-        metrics = [self.sample_metric] * 3
-        mock_batch_writer = MagicMock()
-        mock_table.batch_writer.return_value.__enter__.return_value = mock_batch_writer
+    @patch('lambda_function.CHUNK_ONLY', True)
+    @patch('lambda_function.CHUNK_TABLE', 'InfraMetricsChunks')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_process_s3_record_chunk_only(self, mock_s3, mock_client):
+        """Test CHUNK_ONLY appends points to hourly chunks instead of per-point items"""
+        metrics = [dict(self.sample_metric, metric_id=f'test-{i}', timestamp=1738675200 + i * 60) for i in range(5)]
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(metrics).encode('utf-8'))}
+        mock_client.query.return_value = {'Items': []}
+        summary = lambda_function.new_processing_summary()
         
-        success, failure = lambda_function.write_to_dynamodb_batch(metrics)
+        lambda_function.process_s3_record(self.sample_s3_event['Records'][0], summary)
         
-        self.assertEqual(success, 3)
-        self.assertEqual(failure, 0)
-        self.assertEqual(mock_batch_writer.put_item.call_count, 3)
+        mock_client.batch_write_item.assert_not_called()
+        mock_client.get_item.assert_not_called()
+        mock_client.put_item.assert_called_once()
+        item = mock_client.put_item.call_args.kwargs['Item']
+        self.assertEqual(item['series'], {'S': 'server-001#cpu_utilization'})
+        self.assertTrue(item['chunk']['S'].startswith('1738674000#'))
+        self.assertEqual(item['count'], {'N': '5'})
+        self.assertEqual(summary['chunk_updates'], 1)
+        self.assertEqual(summary['successful_writes'], 5)
+        # The previous hour of the series was checked for pending segments once
+        mock_client.query.assert_called_once()
+        self.assertEqual(summary['chunk_compactions'], 0)
     
-    @patch('lambda_function.table')
-    @patch('lambda_function.time.sleep')
-    def test_write_to_dynamodb_batch_throttling(self, mock_sleep, mock_table):
-        """Test retry logic on DynamoDB throttling"""
-        from botocore.exceptions import ClientError
+    @patch('lambda_function.SKETCH_TABLE', 'InfraMetricsSketches')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_process_s3_record_sketches(self, mock_s3, mock_client):
+        """Test each file's points are merged into one quantile sketch per host window"""
+        from pipeline_common.sketches import DDSketch, fleet_shard
         
-        metrics = [self.sample_metric]
+        metrics = [dict(self.sample_metric, metric_id=f'test-{i}', timestamp=1738675200 + i * 60, value=float(i))
+                   for i in range(1, 11)]
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(metrics).encode('utf-8'))}
+        mock_client.batch_write_item.return_value = {'UnprocessedItems': {}}
+        mock_client.get_item.return_value = {}
+        summary = lambda_function.new_processing_summary()
+        
+        lambda_function.process_s3_record(self.sample_s3_event['Records'][0], summary)
+        
+        item = mock_client.put_item.call_args.kwargs['Item']
+        self.assertEqual(item['series'], {'S': 'server-001#cpu_utilization#1h'})
+        self.assertEqual(item['fleet_series'], {'S': f"cpu_utilization#1h#{fleet_shard('server-001')}"})
+        sketch = DDSketch.from_bytes(item['sketch']['B'])
+        self.assertEqual(sketch.count, 10)
+        self.assertAlmostEqual(sketch.quantile(0.5), 5.0, delta=0.05)
+        self.assertEqual(summary['sketch_updates'], 1)
+    
+    @patch('lambda_function.ALERT_TOPIC_ARN', 'arn:aws:sns:us-east-1:123456789012:InfraMonitoring-Alarms')
+    @patch('lambda_function.sns_client')
+    @patch('pipeline_common.object_processor.ObjectProcessor.write', side_effect=lambda batch: write_result(len(batch)))
+    @patch('lambda_function.s3_client')
+    def test_process_s3_record_detection(self, mock_s3, mock_write, mock_sns):
+        """Test rule breaches are detected in-stream and published in one batch"""
+        from pipeline_common.detection import DetectionEngine, parse_rules
         
-        # Simulate throttling on first attempt, success on second
-        mock_batch_writer = MagicMock()
-        mock_batch_writer.put_item.side_effect = [
-            ClientError(
-                {'Error': {'Code': 'ProvisionedThroughputExceededException'}},
-                'BatchWriteItem'
-            ),
-            None  # Success on retry
-        ]
-        mock_table.batch_writer.return_value.__enter__.return_value = mock_batch_writer
+        values = [85.0, 50.0, 95.0]
+        metrics = [dict(self.sample_metric, metric_id=f'test-{i}', timestamp=1738675200 + i * 600, value=value)
+                   for i, value in enumerate(values)]
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(metrics).encode('utf-8'))}
+        mock_sns.publish_batch.return_value = {'Successful': [{'Id': '0'}]}
+        summary = lambda_function.new_processing_summary()
         
-        success, failure = lambda_function.write_to_dynamodb_batch(metrics)
+        with patch('lambda_function.detection_engine', DetectionEngine(parse_rules('cpu_utilization>80'))):
+            lambda_function.process_s3_record(self.sample_s3_event['Records'][0], summary)
+            lambda_function.flush_alerts(summary)
         
-        # Should retry and eventually succeed
-        mock_sleep.assert_called()  # Verify backoff was used
+        self.assertEqual(summary['alerts'], 2)
+        self.assertEqual(summary['alerts_published'], 2)
+        mock_sns.publish_batch.assert_called_once()
+        entries = mock_sns.publish_batch.call_args.kwargs['PublishBatchRequestEntries']
+        alerts = json.loads(entries[0]['Message'])['alerts']
+        self.assertEqual([alert['value'] for alert in alerts], [85.0, 95.0])
+    
+    @patch('lambda_function.ALERT_TOPIC_ARN', '')
+    @patch('lambda_function.detection_state', None)
+    def test_flush_alerts_expires_state_without_checkpoint(self):
+        """Test idle series are dropped even when the state is not checkpointed"""
+        from pipeline_common.detection import DetectionEngine, EwmaDetector
+    
+        engine = DetectionEngine(detector=EwmaDetector())
+        engine.evaluate([self.sample_metric])
+        summary = lambda_function.new_processing_summary()
+    
+        with patch('lambda_function.detection_engine', engine):
+            lambda_function.flush_alerts(summary)
+    
+        self.assertEqual(engine.series, {})
+        self.assertEqual(summary['errors'], [])
     
     @patch('lambda_function.cloudwatch')
     def test_publish_processing_metrics(self, mock_cloudwatch):
@@ -172,6 +282,361 @@ class TestLogProcessor(unittest.TestCase):
         mock_process.assert_called_once()
         mock_publish.assert_called_once()
     
+    @patch('lambda_function.RECORD_WORKERS', 4)
+    @patch('lambda_function.process_s3_record')
+    @patch('lambda_function.publish_processing_metrics')
+    def test_lambda_handler_concurrent_records(self, mock_publish, mock_process):
+        """Test records are processed on a worker pool and summaries merged"""
+        keys = [f'metrics/file-{i}.json' for i in range(6)]
+        event = {'Records': [
+            {'s3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': key}}}
+            for key in keys
+        ]}
+        
+        def fake_process(record, summary, redelivered):
+            if record['s3']['object']['key'] == keys[2]:
+                raise ValueError('corrupt object')
+            summary['total_metrics'] += 10
+            summary['successful_writes'] += 9
+            summary['failed_writes'] += 1
+        
+        mock_process.side_effect = fake_process
+        
+        response = lambda_function.lambda_handler(event, None)
+        data = response['data']
+        
+        self.assertEqual(response['statusCode'], 207)
+        self.assertEqual(data['total_files'], 6)
+        self.assertEqual(data['total_metrics'], 50)
+        self.assertEqual(data['successful_writes'], 45)
+        self.assertEqual(data['failed_writes'], 5)
+        self.assertEqual(len(data['errors']), 1)
+        self.assertIn(f's3://test-bucket/{keys[2]}', data['errors'][0])
+    
+    @patch('lambda_function.PARQUET_BUCKET', 'analytics-bucket')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_parquet_sink(self, mock_s3, mock_dynamodb, mock_publish):
+        """Test validated metrics are flushed to Parquet at the end of the invocation"""
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest('pyarrow not installed')
+        
+        mock_s3.get_object.return_value = {
+            'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))
+        }
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        
+        response = lambda_function.lambda_handler(self.sample_s3_event, None)
+        
+        self.assertEqual(response['data']['parquet_files'], 1)
+        key = mock_s3.put_object.call_args[1]['Key']
+        self.assertTrue(key.startswith('parquet/metrics/dt=2025-02-04/hour=13/metric_type=cpu_utilization/'))
+    
+    @patch('lambda_function.PARQUET_BUCKET', 'analytics-bucket')
+    @patch('lambda_function.ParquetSink', side_effect=RuntimeError('pyarrow is not installed'))
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_parquet_sink_unavailable(self, mock_s3, mock_dynamodb, mock_publish, mock_sink):
+        """Test a sink that cannot be created is disabled instead of failing ingestion"""
+        mock_s3.get_object.return_value = {
+            'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))
+        }
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+    
+        response = lambda_function.lambda_handler(self.sample_s3_event, None)
+    
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data']['successful_writes'], 1)
+        self.assertEqual(response['data']['parquet_files'], 0)
+        mock_s3.put_object.assert_not_called()
+    
+    @patch('lambda_function.ROLLUP_TABLE', 'InfraMetricsRollups')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_rollups(self, mock_s3, mock_dynamodb, mock_publish):
+        """Test each file's metrics are committed as one update per rollup window"""
+        metrics = [dict(self.sample_metric, metric_id=f'test-{i}', value=float(i)) for i in range(3)]
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(metrics).encode('utf-8'))}
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        mock_dynamodb.update_item.return_value = {'Attributes': {}}
+        
+        response = lambda_function.lambda_handler(self.sample_s3_event, None)
+        
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['data']['rollup_updates'], 2)
+        series = sorted(c[1]['Key']['series']['S'] for c in mock_dynamodb.update_item.call_args_list)
+        self.assertEqual(series, ['server-001#cpu_utilization#1h', 'server-001#cpu_utilization#1m'])
+        counts = {c[1]['ExpressionAttributeValues'][':count']['N'] for c in mock_dynamodb.update_item.call_args_list}
+        self.assertEqual(counts, {'3'})
+    
+    @patch('lambda_function.ROLLUP_TABLE', 'InfraMetricsRollups')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_rolls_up_written_points_of_partial_object(self, mock_s3, mock_dynamodb, mock_sleep,
+                                                                      mock_publish):
+        """Test a partially written object is not retried, so its written points are rolled up"""
+        metrics = [dict(self.sample_metric, metric_id=f'test-{i}', value=float(i)) for i in range(3)]
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(metrics).encode('utf-8'))}
+        mock_dynamodb.batch_write_item.side_effect = lambda RequestItems: {'UnprocessedItems': {
+            'InfraMetrics': [request for request in RequestItems['InfraMetrics']
+                             if request['PutRequest']['Item']['metric_id']['S'] == 'test-1']}}
+        mock_dynamodb.update_item.return_value = {'Attributes': {}}
+        
+        response = lambda_function.lambda_handler(self.sample_s3_event, None)
+        
+        self.assertEqual(response['statusCode'], 207)
+        self.assertEqual(response['data']['rollup_updates'], 2)
+        values = {(c[1]['ExpressionAttributeValues'][':count']['N'], c[1]['ExpressionAttributeValues'][':sum']['N'])
+                  for c in mock_dynamodb.update_item.call_args_list}
+        self.assertEqual(values, {('2', '2.0')})
+    
+    @patch('lambda_function.LATEST_TABLE', 'InfraMetricsLatest')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_latest_values(self, mock_s3, mock_dynamodb, mock_publish):
+        """Test only the newest point of each series is written, conditionally"""
+        metrics = [dict(self.sample_metric, metric_id=f'test-{i}', timestamp=1738677600 + i) for i in range(3)]
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps(metrics).encode('utf-8'))}
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        
+        response = lambda_function.lambda_handler(self.sample_s3_event, None)
+        
+        self.assertEqual(response['data']['latest_updates'], 1)
+        kwargs = mock_dynamodb.update_item.call_args[1]
+        self.assertEqual(kwargs['TableName'], 'InfraMetricsLatest')
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':ts'], {'N': '1738677602'})
+        self.assertIn('#ts < :ts', kwargs['ConditionExpression'])
+    
+    @patch('lambda_function.LEDGER_TABLE', 'InfraMetricsLedger')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_skips_duplicate_deliveries(self, mock_s3, mock_dynamodb, mock_publish):
+        """Test a redelivered object version is skipped before download"""
+        from pipeline_common.ingestion_ledger import BloomFilter
+        
+        event = json.loads(json.dumps(self.sample_s3_event))
+        event['Records'][0]['s3']['object']['eTag'] = 'abc123'
+        mock_s3.get_object.side_effect = lambda **kwargs: {
+            'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))
+        }
+        mock_dynamodb.get_item.side_effect = lambda **kwargs: (
+            {'Item': mock_dynamodb.put_item.call_args[1]['Item']} if mock_dynamodb.put_item.called else {}
+        )
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        
+        with patch('lambda_function.ingestion_bloom', BloomFilter(capacity=100)):
+            first = lambda_function.lambda_handler(event, None)
+            second = lambda_function.lambda_handler(event, None)
+        
+        self.assertEqual(first['data']['duplicate_files'], 0)
+        self.assertEqual(first['data']['successful_writes'], 1)
+        self.assertEqual(second['data']['duplicate_files'], 1)
+        self.assertEqual(second['data']['total_metrics'], 0)
+        self.assertEqual(mock_s3.get_object.call_count, 1)
+        # The warm-container filter hit is confirmed with an eventually consistent read
+        reads = [c[1]['ConsistentRead'] for c in mock_dynamodb.get_item.call_args_list]
+        self.assertEqual(reads, [True, False])
+        put = mock_dynamodb.put_item.call_args[1]
+        self.assertEqual(put['Item']['object_id'], {'S': 's3://test-bucket/metrics/test.json#abc123'})
+        self.assertEqual(put['ConditionExpression'], 'attribute_not_exists(committed_at)')
+    
+    @patch('lambda_function.LEDGER_TABLE', 'InfraMetricsLedger')
+    @patch('lambda_function.ROLLUP_TABLE', 'InfraMetricsRollups')
+    @patch('lambda_function.ingestion_bloom', None)
+    @patch('pipeline_common.object_processor.ObjectProcessor.write')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_process_s3_record_ledger_partial_failure(self, mock_s3, mock_dynamodb, mock_write):
+        """Test redelivered objects with failed writes are neither committed to the ledger nor rolled up"""
+        record = json.loads(json.dumps(self.sample_s3_event['Records'][0]))
+        record['s3']['object']['versionId'] = 'v1'
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))}
+        mock_dynamodb.get_item.return_value = {}
+        mock_write.return_value = write_result(0, failed=1)
+        summary = lambda_function.new_processing_summary()
+        
+        with patch('lambda_function.ingestion_ledger', lambda_function.create_ingestion_ledger()):
+            lambda_function.process_s3_record(record, summary, redelivered=True)
+        
+        mock_dynamodb.get_item.assert_called_once()
+        mock_dynamodb.put_item.assert_not_called()
+        # The retry of the whole object adds the counts once
+        mock_dynamodb.update_item.assert_not_called()
+        self.assertEqual(summary['rollup_updates'], 0)
+    
+    @patch('lambda_function.LEDGER_TABLE', 'InfraMetricsLedger')
+    @patch('lambda_function.ROLLUP_TABLE', 'InfraMetricsRollups')
+    @patch('lambda_function.ingestion_bloom', None)
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_process_s3_record_retries_pending_rollups_only(self, mock_s3, mock_dynamodb):
+        """Test a failed rollup window keeps the object out of the ledger and is the only one retried"""
+        from botocore.exceptions import ClientError
+        
+        record = json.loads(json.dumps(self.sample_s3_event['Records'][0]))
+        record['s3']['object']['versionId'] = 'v1'
+        mock_s3.get_object.side_effect = lambda **kwargs: {
+            'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))
+        }
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        mock_dynamodb.get_item.return_value = {}
+        
+        def fail_minute_window(**kwargs):
+            if kwargs['Key']['series']['S'].endswith('#1m'):
+                raise ClientError({'Error': {'Code': 'ValidationException'}}, 'UpdateItem')
+            return {'Attributes': {}}
+        
+        mock_dynamodb.update_item.side_effect = fail_minute_window
+        with patch('lambda_function.ingestion_ledger', lambda_function.create_ingestion_ledger()):
+            lambda_function.process_s3_record(record, lambda_function.new_processing_summary())
+        
+        progress = mock_dynamodb.put_item.call_args[1]['Item']
+        self.assertNotIn('committed_at', progress)
+        self.assertEqual(progress['stages']['M']['rollups'],
+                         {'SS': ['["server-001", "cpu_utilization", "1m", 1738675200]']})
+        
+        mock_dynamodb.get_item.return_value = {'Item': progress}
+        mock_dynamodb.update_item.reset_mock(side_effect=True)
+        mock_dynamodb.update_item.return_value = {'Attributes': {}}
+        with patch('lambda_function.ingestion_ledger', lambda_function.create_ingestion_ledger()):
+            lambda_function.process_s3_record(record, lambda_function.new_processing_summary())
+        
+        mock_dynamodb.update_item.assert_called_once()
+        self.assertEqual(mock_dynamodb.update_item.call_args[1]['Key']['series']['S'], 'server-001#cpu_utilization#1m')
+        self.assertIn('committed_at', mock_dynamodb.put_item.call_args[1]['Item'])
+    
+    @patch('lambda_function.STAGE_TIMING', True)
+    @patch('lambda_function.STAGE_METRICS', ['write', 'missing'])
+    @patch('lambda_function.cloudwatch')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_lambda_handler_stage_timings(self, mock_s3, mock_dynamodb, mock_cloudwatch):
+        """Test stage timings land in the summary and configured stages are published"""
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))}
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        
+        response = lambda_function.lambda_handler(self.sample_s3_event, None)
+        
+        stages = response['data']['stages']
+        self.assertEqual(set(stages), {'download_parse', 'validate', 'write'})
+        self.assertEqual(stages['validate']['count'], 1)
+        metric_data = mock_cloudwatch.put_metric_data.call_args[1]['MetricData']
+        self.assertEqual(len(metric_data), 5)
+        self.assertEqual(metric_data[-1]['MetricName'], 'StageDuration')
+        self.assertEqual(metric_data[-1]['Dimensions'], [{'Name': 'Stage', 'Value': 'write'}])
+    
+    @patch('lambda_function.DLQ_URL', 'https://sqs.example/dlq')
+    @patch('lambda_function.sqs_client')
+    def test_dlq_batches_failures_per_invocation(self, mock_sqs):
+        """Test DLQ failures are buffered and sent with one SendMessageBatch"""
+        mock_sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+            'Successful': [{'Id': entry['Id']} for entry in Entries]
+        }
+        summary = lambda_function.new_processing_summary()
+        
+        with patch('lambda_function.dead_letters', lambda_function.create_dead_letter_writer()):
+            lambda_function.send_to_dlq({'Records': []}, 'boom')
+            lambda_function.dead_letters.add_items([{'metric_id': 'test-1'}])
+            lambda_function.dead_letters.add_items([{'metric_id': 'test-2'}])
+            mock_sqs.send_message_batch.assert_not_called()
+            
+            lambda_function.flush_dead_letters(summary)
+        
+        mock_sqs.send_message_batch.assert_called_once()
+        entries = mock_sqs.send_message_batch.call_args[1]['Entries']
+        bodies = [json.loads(entry['MessageBody']) for entry in entries]
+        self.assertEqual(bodies[0]['failed_metrics'], [{'metric_id': 'test-1'}, {'metric_id': 'test-2'}])
+        self.assertEqual(bodies[1]['error'], 'boom')
+        self.assertEqual(summary['dlq_messages'], 2)
+    
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    def test_batch_handler_reports_failed_messages(self, mock_s3, mock_dynamodb, mock_publish):
+        """Test only messages whose work failed are returned for redelivery"""
+        from botocore.exceptions import ClientError
+        mock_s3.get_object.side_effect = ClientError({'Error': {'Code': 'NoSuchKey', 'Message': ''}}, 'GetObject')
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+        event = {'Records': [
+            {'eventSource': 'aws:sqs', 'messageId': 'inline-1',
+             'body': json.dumps([self.sample_metric, dict(self.sample_metric, metric_id='test-456')])},
+            {'eventSource': 'aws:sqs', 'messageId': 's3-1', 'body': json.dumps(self.sample_s3_event)},
+            {'eventSource': 'aws:sqs', 'messageId': 'inline-2', 'body': json.dumps(self.sample_metric)}
+        ]}
+        
+        response = lambda_function.batch_handler(event, None)
+        
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': 's3-1'}]})
+        # Inline metrics from both messages were written together
+        mock_dynamodb.batch_write_item.assert_called_once()
+        summary = mock_publish.call_args[0][0]
+        self.assertEqual(summary['successful_writes'], 3)
+    
+    @patch('lambda_function.ROLLUP_TABLE', 'InfraMetricsRollups')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.dynamodb_client')
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_batch_handler_attributes_write_failures(self, mock_sleep, mock_dynamodb, mock_publish):
+        """Test unprocessed items are mapped back to the Kinesis record that carried them"""
+        import base64
+        
+        def reject_second_host(RequestItems):
+            requests = RequestItems['InfraMetrics']
+            rejected = [r for r in requests if r['PutRequest']['Item']['hostname']['S'] == 'server-002']
+            return {'UnprocessedItems': {'InfraMetrics': rejected} if rejected else {}}
+        
+        mock_dynamodb.batch_write_item.side_effect = reject_second_host
+        mock_dynamodb.update_item.return_value = {'Attributes': {}}
+        records = []
+        for sequence, host in (('1001', 'server-001'), ('1002', 'server-002')):
+            data = json.dumps(dict(self.sample_metric, metric_id=f'cpu-{host}', hostname=host)).encode('utf-8')
+            records.append({'eventSource': 'aws:kinesis',
+                            'kinesis': {'sequenceNumber': sequence, 'data': base64.b64encode(data).decode('ascii')}})
+        
+        response = lambda_function.batch_handler({'Records': records}, None)
+        
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': '1002'}]})
+        # The redelivered record is rolled up when it is written
+        series = {c[1]['Key']['series']['S'].split('#')[0] for c in mock_dynamodb.update_item.call_args_list}
+        self.assertEqual(series, {'server-001'})
+    
+    @patch('lambda_function.DLQ_URL', 'https://sqs.us-east-1.amazonaws.com/123456789012/dlq')
+    @patch('lambda_function.publish_processing_metrics')
+    @patch('lambda_function.sqs_client')
+    @patch('lambda_function.dynamodb_client')
+    @patch('lambda_function.s3_client')
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_batch_handler_s3_failures_skip_dlq(self, mock_sleep, mock_s3, mock_dynamodb, mock_sqs, mock_publish):
+        """Test items of a redelivered S3 message are not also sent to the DLQ"""
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(json.dumps([self.sample_metric]).encode('utf-8'))}
+        mock_dynamodb.batch_write_item.side_effect = lambda RequestItems: {'UnprocessedItems': RequestItems}
+        event = {'Records': [{'eventSource': 'aws:sqs', 'messageId': 's3-1', 'body': json.dumps(self.sample_s3_event)}]}
+        
+        response = lambda_function.batch_handler(event, None)
+        
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': 's3-1'}]})
+        mock_sqs.send_message_batch.assert_not_called()
+        mock_sqs.send_message.assert_not_called()
+    
+    @patch('lambda_function.DLQ_URL', '')
+    @patch('lambda_function.publish_processing_metrics')
+    def test_batch_handler_unparseable_message(self, mock_publish):
+        """Test a message that cannot be parsed is reported when there is no DLQ"""
+        event = {'Records': [{'eventSource': 'aws:sqs', 'messageId': 'bad-1', 'body': 'not json{'}]}
+        
+        response = lambda_function.batch_handler(event, None)
+        
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': 'bad-1'}]})
+    
     def test_lambda_handler_no_records(self):
         """Test Lambda handler with empty event"""
         empty_event = {'Records': []}
@@ -1,18 +1,23 @@
 
 import json
-import boto3
 import random
 from datetime import datetime
 from decimal import Decimal
 import os
 
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-cloudwatch = boto3.client('cloudwatch')
+from pipeline_common import aws_clients, compression
+from pipeline_common.cloudwatch_emitter import MetricsEmitter, validate_mode
+
+# AWS clients, created on first use and kept across warm invocations
+s3_client = aws_clients.lazy('s3')
+dynamodb = aws_clients.lazy('dynamodb', resource=True)
+cloudwatch = aws_clients.lazy('cloudwatch')
 
 BUCKET_NAME = 'infra-monitoring-pipeline-data'
 TABLE_NAME = 'InfraMetrics'
 REGION = 'eu-west-1'
+COMPRESSION = compression.validate_codec(os.environ.get('METRICS_COMPRESSION', 'none'))  # none, gzip or zstd
+CLOUDWATCH_MODE = validate_mode(os.environ.get('CLOUDWATCH_MODE', 'api'))  # api, emf or none
 
 def lambda_handler(event, context):
     timestamp = int(datetime.now().timestamp())
@@ -63,7 +68,7 @@ def lambda_handler(event, context):
     
     try:
         date_path = datetime.now().strftime('%Y/%m/%d')
-        s3_key = f"raw-metrics/{date_path}/metrics-{timestamp}.json"
+        s3_key = f"raw-metrics/{date_path}/metrics-{timestamp}.json{compression.key_suffix(COMPRESSION)}"
         
         json_lines_list = []
         for metric in metrics:
@@ -72,12 +77,16 @@ def lambda_handler(event, context):
         newline = chr(10)
         json_lines = newline.join(json_lines_list)
         
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=json_lines,
-            ContentType='application/json'
-        )
+        put_args = {
+            'Bucket': BUCKET_NAME,
+            'Key': s3_key,
+            'Body': compression.compress(json_lines, COMPRESSION),
+            'ContentType': 'application/json'
+        }
+        if COMPRESSION != compression.NONE:
+            put_args['ContentEncoding'] = compression.content_encoding(COMPRESSION)
+        
+        s3_client.put_object(**put_args)
         
         print(f"Successfully wrote {len(metrics)} metrics to S3: {s3_key}")
         
@@ -108,24 +117,18 @@ def lambda_handler(event, context):
         raise
     
     try:
+        emitter = MetricsEmitter('InfraMonitoring', mode=CLOUDWATCH_MODE, client=cloudwatch)
         for metric in metrics:
-            cloudwatch.put_metric_data(
-                Namespace='InfraMonitoring',
-                MetricData=[
-                    {
-                        'MetricName': metric['metric_type'],
-                        'Value': float(metric['value']),
-                        'Unit': 'Percent' if metric['metric_type'] != 'network_traffic' else 'Megabits/Second',
-                        'Timestamp': datetime.now(),
-                        'Dimensions': [
-                            {'Name': 'Region', 'Value': REGION},
-                            {'Name': 'InstanceID', 'Value': metric['instance_id']}
-                        ]
-                    }
-                ]
+            emitter.add(
+                metric['metric_type'],
+                float(metric['value']),
+                unit='Percent' if metric['metric_type'] != 'network_traffic' else 'Megabits/Second',
+                dimensions={'Region': REGION, 'InstanceID': metric['instance_id']},
+                timestamp=timestamp
             )
+        emitter.flush()
         
-        print(f"Successfully published {len(metrics)} metrics to CloudWatch")
+        print(f"Successfully published {len(metrics)} metrics to CloudWatch ({CLOUDWATCH_MODE} mode)")
         
     except Exception as e:
         print(f"Error publishing to CloudWatch: {str(e)}")
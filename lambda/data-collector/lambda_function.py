@@ -1,14 +1,20 @@
 import json
-import boto3
+import os
 import random
 import time
 from datetime import datetime
 
-# Initialize AWS clients
-s3_client = boto3.client('s3')
+from pipeline_common import aws_clients, compression
+from pipeline_common.cloudwatch_emitter import MetricsEmitter, validate_mode
+
+# AWS clients, created on first use and kept across warm invocations
+s3_client = aws_clients.lazy('s3')
+cloudwatch = aws_clients.lazy('cloudwatch')
 
 # Configuration
 S3_BUCKET = 'infra-monitoring-pipeline-data'
+COMPRESSION = compression.validate_codec(os.environ.get('METRICS_COMPRESSION', 'none'))  # none, gzip or zstd
+CLOUDWATCH_MODE = validate_mode(os.environ.get('CLOUDWATCH_MODE', 'none'))  # api, emf or none
 METRIC_TYPES = ['cpu', 'memory', 'disk', 'network']
 HOST_IDS = ['host-001', 'host-002', 'host-003', 'host-004', 'host-005']
 REGION = 'eu-west-1'
@@ -39,8 +45,16 @@ def generate_metric(metric_type, host_id, timestamp):
         'ttl': ttl
     }
 
-def generate_metrics_batch():
-    """Generate a batch of metrics for all hosts and metric types."""
+def generate_metrics_batch(generator=None, step=0):
+    """
+    Generate a batch of metrics for all hosts and metric types.
+
+    With a LoadGenerator the batch covers its whole synthetic fleet and is
+    drawn with vectorised NumPy from its seed, instead of the demo hosts.
+    """
+    if generator is not None:
+        return generator.batch(step)
+
     timestamp = int(time.time())
     metrics = []
 
@@ -51,24 +65,101 @@ def generate_metrics_batch():
 
     return metrics
 
-def upload_to_s3(metrics, timestamp):
-    """Upload metrics to S3 as JSON file."""
+def upload_to_s3(metrics, timestamp, codec=None):
+    """
+    Upload metrics to S3 as JSON file.
+
+    With a compression codec configured the payload is written compactly,
+    compressed, and tagged with ContentEncoding and a key suffix
+    (e.g. metrics-1738440000.json.gz) so processors can detect it.
+    """
+    codec = COMPRESSION if codec is None else compression.validate_codec(codec)
     date_str = datetime.fromtimestamp(timestamp).strftime('%Y/%m/%d')
-    filename = f"metrics/{date_str}/metrics-{timestamp}.json"
-    json_data = json.dumps(metrics, indent=2)
-
-    s3_client.put_object(
-        Bucket=S3_BUCKET,
-        Key=filename,
-        Body=json_data,
-        ContentType='application/json'
-    )
+    filename = f"metrics/{date_str}/metrics-{timestamp}.json{compression.key_suffix(codec)}"
+
+    put_args = {
+        'Bucket': S3_BUCKET,
+        'Key': filename,
+        'ContentType': 'application/json'
+    }
+
+    if codec == compression.NONE:
+        put_args['Body'] = json.dumps(metrics, indent=2)
+    else:
+        put_args['Body'] = compression.compress(json.dumps(metrics, separators=(',', ':')), codec)
+        put_args['ContentEncoding'] = compression.content_encoding(codec)
+
+    s3_client.put_object(**put_args)
 
     return filename
 
+def publish_fleet_metrics(metrics, mode=None):
+    """
+    Publish fleet-wide statistics for the batch to CloudWatch.
+
+    Only the Region dimension is kept, so the points of every host fold
+    into one StatisticValues datum (or EMF entry) per metric type and the
+    cost no longer grows with the number of hosts.
+
+    Returns the number of PutMetricData requests or EMF documents written.
+    """
+    emitter = MetricsEmitter('InfraMonitoring/Collector', mode=mode or CLOUDWATCH_MODE, client=cloudwatch)
+    for metric in metrics:
+        emitter.add(
+            metric['metric_type'],
+            metric['value'],
+            dimensions={'Region': metric['region']},
+            timestamp=metric['timestamp']
+        )
+    return emitter.flush()
+
+def run_load_test(config):
+    """
+    Load-generator mode: write a seeded synthetic fleet to S3 concurrently.
+
+    ``config`` comes from the invoking event's ``load`` key, e.g.
+    ``{"hosts": 100000, "steps": 5, "metrics": "cpu:normal:55:15:percent,memory",
+    "interval": 60, "seed": 7, "records_per_object": 10000, "concurrency": 16}``.
+    Returns the run statistics.
+    """
+    # NumPy is only needed (and packaged) for load tests
+    from pipeline_common import load_generator
+
+    generator = load_generator.LoadGenerator(
+        hosts=int(config.get('hosts', 1000)),
+        metric_specs=config.get('metrics', load_generator.DEFAULT_METRIC_SPECS),
+        interval=int(config.get('interval', load_generator.DEFAULT_INTERVAL)),
+        start=config.get('start'),
+        seed=int(config.get('seed', 42)),
+        region=REGION
+    )
+    concurrency = int(config.get('concurrency', 8))
+    client = aws_clients.get_client('s3', max_pool_connections=max(concurrency, aws_clients.DEFAULT_MAX_POOL_CONNECTIONS))
+    sink = load_generator.S3ObjectSink(client, config.get('bucket', S3_BUCKET))
+
+    return load_generator.run_load(
+        generator,
+        sink,
+        steps=int(config.get('steps', 1)),
+        records_per_object=int(config.get('records_per_object', load_generator.DEFAULT_RECORDS_PER_OBJECT)),
+        shape=config.get('shape', 'array'),
+        codec=config.get('compression', COMPRESSION),
+        prefix=config.get('prefix', load_generator.DEFAULT_PREFIX),
+        concurrency=concurrency
+    )
+
 def lambda_handler(event, context):
     """Main Lambda handler function."""
     try:
+        if isinstance(event, dict) and event.get('load'):
+            print(f"Load-generator mode: {json.dumps(event['load'])}")
+            stats = run_load_test(event['load'])
+            print(f"Load test complete: {json.dumps(stats)}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps(dict(stats, message='Load test objects generated and uploaded successfully'))
+            }
+
         print("Generating metrics batch...")
         metrics = generate_metrics_batch()
         print(f"Generated {len(metrics)} metrics")
@@ -77,6 +168,9 @@ def lambda_handler(event, context):
         s3_key = upload_to_s3(metrics, timestamp)
         print(f"Uploaded metrics to S3: {s3_key}")
 
+        if CLOUDWATCH_MODE != 'none':
+            publish_fleet_metrics(metrics)
+
         return {
             'statusCode': 200,
             'body': json.dumps({
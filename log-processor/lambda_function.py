@@ -1,25 +1,61 @@
 import json
-import boto3
 import os
 from datetime import datetime
-from decimal import Decimal
-from botocore.exceptions import ClientError
-import time
 
-# Initialize AWS clients with explicit region
-s3_client = boto3.client('s3', region_name='eu-west-1')
-dynamodb = boto3.resource('dynamodb', region_name='eu-west-1')
-cloudwatch = boto3.client('cloudwatch', region_name='eu-west-1')
+from pipeline_common import aws_clients
+from pipeline_common.decoders import DEFAULT_ENVIRONMENT
+from pipeline_common.dynamodb_writer import RetryBudget
+from pipeline_common.ingestion_ledger import BloomFilter, IngestionLedger
+from pipeline_common.object_processor import ObjectProcessor, StageConfig, new_processing_summary
+from pipeline_common.parquet_sink import ParquetSink
+from pipeline_common.rollups import parse_resolutions
+from pipeline_common.series_keys import create_encoder, parse_shard_map, validate_layout
 
 # Environment variables
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE', 'InfraMetrics')
 REGION = os.environ.get('REGION', 'eu-west-1')
+WRITE_CONCURRENCY = int(os.environ.get('DYNAMODB_WRITE_CONCURRENCY', '4'))
+RETRY_BUDGET = int(os.environ.get('DYNAMODB_RETRY_BUDGET', '100'))
+PARQUET_BUCKET = os.environ.get('PARQUET_BUCKET', '')
+PARQUET_PREFIX = os.environ.get('PARQUET_PREFIX', 'parquet/metrics')
+PARQUET_MAX_ROWS = int(os.environ.get('PARQUET_MAX_ROWS', '100000'))
+ROLLUP_TABLE = os.environ.get('ROLLUP_TABLE', '')
+ROLLUP_RESOLUTIONS = parse_resolutions(os.environ.get('ROLLUP_RESOLUTIONS', '1m,1h'))
+ROLLUP_TTL_DAYS = int(os.environ.get('ROLLUP_TTL_DAYS', '90'))
+CHUNK_TABLE = os.environ.get('CHUNK_TABLE', '')
+CHUNK_TTL_DAYS = int(os.environ.get('CHUNK_TTL_DAYS', '30'))
+CHUNK_ONLY = os.environ.get('CHUNK_ONLY', 'false').lower() == 'true'
+CHUNK_COMPACT = os.environ.get('CHUNK_COMPACT', 'true').lower() == 'true'
+SKETCH_TABLE = os.environ.get('SKETCH_TABLE', '')
+SKETCH_RESOLUTIONS = parse_resolutions(os.environ.get('SKETCH_RESOLUTIONS', '1h'))
+SKETCH_ACCURACY = float(os.environ.get('SKETCH_ACCURACY', '0.01'))
+SKETCH_TTL_DAYS = int(os.environ.get('SKETCH_TTL_DAYS', '90'))
+LATEST_TABLE = os.environ.get('LATEST_TABLE', '')
+LEDGER_TABLE = os.environ.get('LEDGER_TABLE', '')
+LEDGER_TTL_DAYS = int(os.environ.get('LEDGER_TTL_DAYS', '7'))
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '1000'))
+PREWARM_CLIENTS = aws_clients.parse_services(os.environ.get('PREWARM_CLIENTS', ''))
+KEY_LAYOUT = validate_layout(os.environ.get('KEY_LAYOUT', 'metric_id'))
+SERIES_SHARD_MAP = parse_shard_map(os.environ.get('SERIES_SHARDS', '1'), os.environ.get('SERIES_HOT_HOSTS', ''))
+
+# AWS clients with explicit region, created on first use and reused while warm
+s3_client = aws_clients.lazy('s3', region_name='eu-west-1')
+dynamodb_client = aws_clients.lazy('dynamodb', region_name='eu-west-1')
+cloudwatch = aws_clients.lazy('cloudwatch', region_name='eu-west-1')
+
+# Create the listed clients in the init phase (useful with provisioned concurrency)
+aws_clients.prewarm(PREWARM_CLIENTS)
 
 # Constants
 MAX_RETRIES = 3
-BATCH_SIZE = 25
 TTL_DAYS = 30
 
+# Object versions this warm container has already seen, checked before the ledger table
+ingestion_bloom = BloomFilter() if LEDGER_TABLE else None
+
+# Chunk hours this warm container has already compacted
+compacted_chunks = set()
+
 def lambda_handler(event, context):
     """
     Main handler for S3 event notifications.
@@ -27,176 +63,108 @@ def lambda_handler(event, context):
     """
     print(f"Received event: {json.dumps(event)}")
 
-    metrics_processed = 0
-    metrics_failed = 0
+    processor = create_object_processor()
+    summary = new_processing_summary()
     files_processed = 0
+    record_errors = 0
 
     try:
         for record in event.get('Records', []):
+            # Files hold metric envelopes or flat records; either shape is
+            # decoded to flat metrics as the body streams in
             try:
-                bucket = record['s3']['bucket']['name']
-                key = record['s3']['object']['key']
-
-                print(f"Processing file: s3://{bucket}/{key}")
-
-                metrics_data = download_and_parse_json(bucket, key)
-
-                if metrics_data:
-                    valid_metrics = validate_metrics(metrics_data)
-
-                    if valid_metrics:
-                        success_count, fail_count = write_to_dynamodb_batch(valid_metrics)
-                        metrics_processed += success_count
-                        metrics_failed += fail_count
-                        files_processed += 1
-                    else:
-                        print(f"No valid metrics found in {key}")
-                        metrics_failed += 1
+                valid_before = summary['total_metrics'] - summary['invalid_metrics']
+                duplicates_before = summary['duplicate_files']
+                processor.process_s3_record(record, summary)
+                # As before, a file without one valid metric counts as one failure
+                # rather than a processed file, and invalid records are not counted
+                if (summary['total_metrics'] - summary['invalid_metrics'] > valid_before
+                        or summary['duplicate_files'] > duplicates_before):
+                    files_processed += 1
                 else:
-                    print(f"Failed to parse JSON from {key}")
-                    metrics_failed += 1
-
+                    print(f"No valid metrics found in {record['s3']['object']['key']}")
+                    record_errors += 1
             except Exception as e:
                 print(f"Error processing record: {str(e)}")
-                metrics_failed += 1
+                record_errors += 1
+
+        if processor.parquet_sink is not None:
+            try:
+                summary['parquet_files'] += len(processor.parquet_sink.flush())
+            except Exception as e:
+                print(f"Error flushing Parquet sink: {str(e)}")
 
-        publish_processing_metrics(metrics_processed, metrics_failed, files_processed)
+        metrics_failed = summary['failed_writes'] + record_errors
+        publish_processing_metrics(summary['successful_writes'], metrics_failed, files_processed)
 
         return create_response(200, {
-            'metrics_processed': metrics_processed,
+            'metrics_processed': summary['successful_writes'],
+            'metrics_retried': summary['retried_writes'],
             'metrics_failed': metrics_failed,
-            'files_processed': files_processed
+            'files_processed': files_processed,
+            'parquet_files': summary['parquet_files']
         })
 
     except Exception as e:
         print(f"Lambda execution error: {str(e)}")
-        publish_processing_metrics(metrics_processed, metrics_failed, files_processed)
+        metrics_failed = summary['failed_writes'] + record_errors
+        publish_processing_metrics(summary['successful_writes'], metrics_failed, files_processed)
         return create_response(500, {'error': str(e)})
 
-def download_and_parse_json(bucket, key):
-    """Downloads JSON file from S3 and parses it."""
-    try:
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        content = response['Body'].read().decode('utf-8')
-        data = json.loads(content)
-        return data
-
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'NoSuchKey':
-            print(f"File not found: {key}")
-        elif error_code == 'AccessDenied':
-            print(f"Access denied to file: {key}")
-        else:
-            print(f"S3 error: {error_code}")
-        return None
-
-    except json.JSONDecodeError as e:
-        print(f"Invalid JSON in file {key}: {str(e)}")
-        return None
-
-    except Exception as e:
-        print(f"Unexpected error downloading {key}: {str(e)}")
-        return None
-
-def validate_metrics(data):
-    """Validates metrics data structure."""
-    if not isinstance(data, dict):
-        print("Data is not a dictionary")
-        return []
-
-    metrics = data.get('metrics', {})
-    if not isinstance(metrics, dict):
-        print("Metrics field is not a dictionary")
-        return []
-
-    required_fields = ['timestamp', 'region', 'instance_id']
-    for field in required_fields:
-        if field not in data:
-            print(f"Missing required field: {field}")
-            return []
-
-    valid_metrics = []
-    for metric_name, metric_value in metrics.items():
-        if isinstance(metric_value, (int, float)):
-            metric_item = {
-                'metric_name': metric_name,
-                'value': metric_value,
-                'timestamp': data['timestamp'],
-                'region': data.get('region', 'unknown'),
-                'instance_id': data.get('instance_id', 'unknown'),
-                'environment': data.get('environment', 'production')
-            }
-            valid_metrics.append(metric_item)
-
-    return valid_metrics
-
-def prepare_dynamodb_item(metric):
-    """Prepares a metric for DynamoDB insertion."""
-    timestamp_str = metric['timestamp']
-    if isinstance(timestamp_str, str):
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        timestamp_unix = int(dt.timestamp())
-    else:
-        timestamp_unix = int(timestamp_str)
-
-    ttl = int(time.time()) + (TTL_DAYS * 24 * 60 * 60)
-
-    item = {
-        'metric_id': f"{metric['metric_name']}#{metric['instance_id']}#{timestamp_unix}",
-        'timestamp': timestamp_unix,
-        'metric_type': metric['metric_name'],
-        'value': Decimal(str(metric['value'])),
-        'hostname': metric['instance_id'],
-        'region': metric['region'],
-        'environment': metric['environment'],
-        'ttl': ttl
-    }
-
-    return item
-
-def write_to_dynamodb_batch(metrics):
-    """Writes metrics to DynamoDB using batch operations."""
-    table = dynamodb.Table(TABLE_NAME)
-    success_count = 0
-    failure_count = 0
-
-    for i in range(0, len(metrics), BATCH_SIZE):
-        batch = metrics[i:i + BATCH_SIZE]
-
-        for attempt in range(MAX_RETRIES):
-            try:
-                with table.batch_writer() as batch_writer:
-                    for metric in batch:
-                        item = prepare_dynamodb_item(metric)
-                        batch_writer.put_item(Item=item)
-
-                success_count += len(batch)
-                print(f"Successfully wrote batch of {len(batch)} items")
-                break
-
-            except ClientError as e:
-                error_code = e.response['Error']['Code']
-
-                if error_code == 'ProvisionedThroughputExceededException':
-                    if attempt < MAX_RETRIES - 1:
-                        wait_time = (2 ** attempt) * 0.5
-                        print(f"Throttled. Retrying in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"Failed after {MAX_RETRIES} retries")
-                        failure_count += len(batch)
-                else:
-                    print(f"DynamoDB error: {error_code}")
-                    failure_count += len(batch)
-                    break
-
-            except Exception as e:
-                print(f"Unexpected error writing batch: {str(e)}")
-                failure_count += len(batch)
-                break
+def create_object_processor():
+    """
+    Creates the shared per-object stage runner for one invocation.
 
-    return success_count, failure_count
+    Each invocation gets its own retry budget, Parquet sink and ledger; the
+    stages run exactly as in data-collector.
+    """
+    retry_budget = RetryBudget(RETRY_BUDGET)
+    parquet_sink = None
+    if PARQUET_BUCKET:
+        # A missing pyarrow disables the sink rather than failing ingestion
+        try:
+            parquet_sink = ParquetSink(s3_client, PARQUET_BUCKET, prefix=PARQUET_PREFIX,
+                                       max_rows=PARQUET_MAX_ROWS)
+        except Exception as e:
+            print(f"Parquet sink disabled: {str(e)}")
+    ledger = None
+    if LEDGER_TABLE:
+        ledger = IngestionLedger(dynamodb_client, LEDGER_TABLE, bloom=ingestion_bloom,
+                                 ttl_days=LEDGER_TTL_DAYS, retry_budget=retry_budget)
+
+    return ObjectProcessor(
+        dynamodb_client,
+        s3_client,
+        TABLE_NAME,
+        create_item_encoder,
+        REGION,
+        stages=StageConfig(
+            rollup_table=ROLLUP_TABLE,
+            rollup_resolutions=ROLLUP_RESOLUTIONS,
+            rollup_ttl_days=ROLLUP_TTL_DAYS,
+            chunk_table=CHUNK_TABLE,
+            chunk_ttl_days=CHUNK_TTL_DAYS,
+            chunk_only=CHUNK_ONLY,
+            chunk_compact=CHUNK_COMPACT,
+            sketch_table=SKETCH_TABLE,
+            sketch_resolutions=SKETCH_RESOLUTIONS,
+            sketch_accuracy=SKETCH_ACCURACY,
+            sketch_ttl_days=SKETCH_TTL_DAYS,
+            latest_table=LATEST_TABLE
+        ),
+        batch_size=STREAM_BATCH_SIZE,
+        write_concurrency=WRITE_CONCURRENCY,
+        max_retries=MAX_RETRIES,
+        retry_budget=retry_budget,
+        parquet_sink=parquet_sink,
+        ledger=ledger,
+        compacted_chunks=compacted_chunks
+    )
+
+def create_item_encoder():
+    """Creates the item encoder for the table's key layout."""
+    return create_encoder(KEY_LAYOUT, REGION, environment=DEFAULT_ENVIRONMENT, ttl_days=TTL_DAYS,
+                          shard_map=SERIES_SHARD_MAP)
 
 def publish_processing_metrics(processed, failed, files):
     """Publishes custom CloudWatch metrics for monitoring."""
@@ -0,0 +1,73 @@
+"""
+Copy InfraMetrics into a table keyed by host#metric_type#day and timestamp.
+
+Scans the source table with ``--segments`` parallel workers and writes
+every item, with its ``series`` key added, to the target table. Progress is
+saved to ``--checkpoint`` after every page; rerun the same command to
+resume an interrupted migration.
+
+Usage:
+    python migration/migrate_series_layout.py --source InfraMetrics --target InfraMetricsSeries --create-table
+    python migration/migrate_series_layout.py --source InfraMetrics --target InfraMetricsSeries \
+        --segments 16 --hot-hosts db-01=8,db-02=4 --checkpoint /tmp/series-migration.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from pipeline_common import aws_clients, series_keys, series_migration  # noqa: E402
+from pipeline_common.dynamodb_writer import RetryBudget  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--source', default='InfraMetrics', help='table keyed by metric_id')
+    parser.add_argument('--target', required=True, help='table keyed by series and timestamp')
+    parser.add_argument('--create-table', action='store_true', help='create the target table first')
+    parser.add_argument('--segments', type=int, default=series_migration.DEFAULT_SEGMENTS,
+                        help='parallel scan segments (keep the same value when resuming)')
+    parser.add_argument('--page-size', type=int, default=series_migration.DEFAULT_PAGE_SIZE)
+    parser.add_argument('--write-concurrency', type=int, default=4,
+                        help='BatchWriteItem requests in flight per segment')
+    parser.add_argument('--shards', default='1', help='write shards per series day (SERIES_SHARDS)')
+    parser.add_argument('--hot-hosts', default='', help='hostname=shards overrides (SERIES_HOT_HOSTS)')
+    parser.add_argument('--checkpoint', default='series-migration.json', help='progress file used to resume')
+    parser.add_argument('--retry-budget', type=int, default=10000, help='throttling retries for the whole run')
+    parser.add_argument('--region', help='AWS region (default: from the environment)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    options = {'max_pool_connections': max(aws_clients.DEFAULT_MAX_POOL_CONNECTIONS,
+                                           args.segments * (args.write_concurrency + 1))}
+    if args.region:
+        options['region_name'] = args.region
+    client = aws_clients.get_client('dynamodb', **options)
+
+    if args.create_table:
+        series_migration.create_series_table(client, args.target)
+        print(f"Created {args.target}")
+
+    stats = series_migration.migrate_to_series(
+        client,
+        args.source,
+        args.target,
+        shard_map=series_keys.parse_shard_map(args.shards, args.hot_hosts),
+        total_segments=args.segments,
+        checkpoint_path=args.checkpoint,
+        page_size=args.page_size,
+        write_concurrency=args.write_concurrency,
+        retry_budget=RetryBudget(args.retry_budget)
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
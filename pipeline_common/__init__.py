@@ -0,0 +1,6 @@
+"""
+Shared helpers for the infra-monitoring pipeline Lambda functions.
+
+Each Lambda is deployed as a zip of its own directory, so this package is
+copied next to ``lambda_function.py`` when the deployment package is built.
+"""
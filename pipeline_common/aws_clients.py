@@ -0,0 +1,225 @@
+"""
+Lazily created, pooled AWS clients shared across warm invocations.
+
+Handler modules used to create every client at import time, paying for
+service-model loading and endpoint resolution on each cold start even for
+clients a given path never touches. A ``ClientRegistry`` creates each
+client on first use instead and keeps it for the lifetime of the container,
+so warm invocations reuse both the client and its pooled HTTPS connections.
+
+Module globals hold ``LazyClient`` proxies:
+
+    s3_client = aws_clients.lazy('s3')
+
+The proxy resolves the real client on first attribute access, and tests can
+still replace the module global with a mock.
+
+Every client is built with a tuned ``max_pool_connections`` and TCP
+keep-alive. ``prewarm`` resolves selected clients during the Lambda init
+phase, which provisioned concurrency runs before any request arrives.
+"""
+
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_MAX_POOL_CONNECTIONS = int(os.environ.get('CLIENT_MAX_POOL_CONNECTIONS', '25'))
+DEFAULT_CONNECT_TIMEOUT = 5  # seconds
+
+
+def parse_services(value):
+    """
+    Parse a comma-separated service list such as ``"s3,dynamodb"``.
+
+    Args:
+        value: Comma-separated service names
+
+    Returns:
+        list: Service names
+    """
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class LazyClient:
+    """
+    Proxy that creates a registry client on first attribute access.
+
+    Args:
+        registry: ClientRegistry that owns the client
+        service: AWS service name
+        resource: Build a boto3 resource instead of a low-level client
+        options: Extra arguments for the registry (region_name, max_pool_connections)
+    """
+
+    def __init__(self, registry, service, resource=False, **options):
+        self._registry = registry
+        self._service = service
+        self._resource = resource
+        self._options = options
+        self._target = None
+
+    @property
+    def service(self):
+        return self._service
+
+    def resolve(self):
+        """Create (or fetch) the underlying client."""
+        if self._target is None:
+            factory = self._registry.resource if self._resource else self._registry.client
+            self._target = factory(self._service, **self._options)
+        return self._target
+
+    @property
+    def resolved(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the proxy itself. Private
+        # and protocol probes (mock.patch looks up __code__ and _is_coroutine,
+        # copy looks up __deepcopy__) must not create the client.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+
+class ClientRegistry:
+    """
+    Per-container cache of boto3 clients and resources.
+
+    Args:
+        max_pool_connections: Default HTTP connection pool size per client
+        tcp_keepalive: Enable TCP keep-alive on pooled connections
+        connect_timeout: Connection timeout in seconds
+        session: Optional boto3 Session (one is created on first use)
+    """
+
+    def __init__(self, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS, tcp_keepalive=True,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, session=None):
+        self.max_pool_connections = max_pool_connections
+        self.tcp_keepalive = tcp_keepalive
+        self.connect_timeout = connect_timeout
+        self._session = session
+        self._clients = {}
+        self._proxies = []
+        # boto3 sessions are not thread-safe; records processed in parallel
+        # may request the same client at the same time
+        self._lock = threading.RLock()
+
+    def _config(self, max_pool_connections):
+        return Config(
+            max_pool_connections=max_pool_connections or self.max_pool_connections,
+            tcp_keepalive=self.tcp_keepalive,
+            connect_timeout=self.connect_timeout
+        )
+
+    def _get(self, kind, service, region_name, max_pool_connections):
+        key = (kind, service, region_name, max_pool_connections)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if self._session is None:
+                    self._session = boto3.session.Session()
+                factory = self._session.resource if kind == 'resource' else self._session.client
+                client = factory(service, region_name=region_name, config=self._config(max_pool_connections))
+                self._clients[key] = client
+            return client
+
+    def client(self, service, region_name=None, max_pool_connections=None):
+        """
+        Get the shared low-level client for a service.
+
+        Args:
+            service: AWS service name
+            region_name: Optional region (defaults to the session region)
+            max_pool_connections: Optional pool size for this client
+
+        Returns:
+            botocore client
+        """
+        return self._get('client', service, region_name, max_pool_connections)
+
+    def resource(self, service, region_name=None, max_pool_connections=None):
+        """
+        Get the shared boto3 resource for a service.
+
+        Args:
+            service: AWS service name
+            region_name: Optional region (defaults to the session region)
+            max_pool_connections: Optional pool size for this resource
+
+        Returns:
+            boto3 ServiceResource
+        """
+        return self._get('resource', service, region_name, max_pool_connections)
+
+    def lazy(self, service, resource=False, **options):
+        """
+        Get a proxy that creates the client the first time it is used.
+
+        Args:
+            service: AWS service name
+            resource: Build a boto3 resource instead of a low-level client
+            **options: region_name and/or max_pool_connections
+
+        Returns:
+            LazyClient
+        """
+        proxy = LazyClient(self, service, resource=resource, **options)
+        with self._lock:
+            self._proxies.append(proxy)
+        return proxy
+
+    def prewarm(self, services):
+        """
+        Resolve the lazy clients of the given services now.
+
+        Meant to run at import time, i.e. in the Lambda init phase. Failures
+        are logged and left for the first real use to surface.
+
+        Args:
+            services: Service names (e.g. ``['s3', 'dynamodb']``)
+
+        Returns:
+            list: Services whose clients were created
+        """
+        wanted = set(services)
+        warmed = []
+        for proxy in list(self._proxies):
+            if proxy.service not in wanted:
+                continue
+            try:
+                proxy.resolve()
+                warmed.append(proxy.service)
+            except Exception as e:
+                print(f"WARNING: Failed to prewarm {proxy.service} client: {str(e)}")
+        return warmed
+
+    def clear(self):
+        """Drop every cached client (lazy proxies keep theirs)."""
+        with self._lock:
+            self._clients.clear()
+
+
+# Registry shared by every module in the container
+registry = ClientRegistry()
+
+
+def lazy(service, resource=False, **options):
+    """Get a lazy client from the shared registry."""
+    return registry.lazy(service, resource=resource, **options)
+
+
+def get_client(service, region_name=None, max_pool_connections=None):
+    """Get a client from the shared registry."""
+    return registry.client(service, region_name=region_name, max_pool_connections=max_pool_connections)
+
+
+def prewarm(services):
+    """Resolve lazy clients of the shared registry during the init phase."""
+    return registry.prewarm(services)
@@ -0,0 +1,143 @@
+"""
+Unpacking of batched SQS and Kinesis events.
+
+With an SQS queue or Kinesis stream in front of the processor, one
+invocation receives up to thousands of messages. Each message carries one
+of:
+
+* an S3 event notification (``{"Records": [{"s3": ...}]}``), delivered to
+  SQS directly, wrapped in an SNS notification, or as an EventBridge
+  ``Object Created`` event;
+* an inline metric payload: flat records or metric envelopes, as a JSON
+  array, a single object or NDJSON, optionally gzip/zstd compressed.
+
+``unpack_message`` turns a message into S3 records and inline JSON records.
+The processor handles the whole batch together and reports failed messages
+by ``item_identifier`` in a ``batchItemFailures`` response, so only those
+are redelivered (``ReportBatchItemFailures`` must be enabled on the event
+source mapping).
+"""
+
+import base64
+import io
+import json
+
+from pipeline_common.compression import open_stream
+from pipeline_common.json_stream import iter_json_records
+
+SQS = 'aws:sqs'
+KINESIS = 'aws:kinesis'
+
+S3_TEST_EVENT = 's3:TestEvent'
+
+
+def event_source(message):
+    """
+    Identify the service a batch message came from.
+
+    Args:
+        message: One entry of the event's ``Records``
+
+    Returns:
+        str: SQS or KINESIS
+
+    Raises:
+        ValueError: For any other event source
+    """
+    source = message.get('eventSource')
+    if source not in (SQS, KINESIS):
+        raise ValueError(f"Unsupported event source: {source}")
+    return source
+
+
+def item_identifier(message):
+    """
+    Return the identifier Lambda expects in ``batchItemFailures``.
+
+    Args:
+        message: SQS or Kinesis record
+
+    Returns:
+        str: SQS message ID or Kinesis sequence number
+    """
+    if event_source(message) == KINESIS:
+        return message['kinesis']['sequenceNumber']
+    return message['messageId']
+
+
+def message_payload(message):
+    """
+    Extract the raw payload of a message.
+
+    Args:
+        message: SQS or Kinesis record
+
+    Returns:
+        bytes: Message body (Kinesis data is base64-decoded)
+    """
+    if event_source(message) == KINESIS:
+        return base64.b64decode(message['kinesis']['data'])
+    return message['body'].encode('utf-8')
+
+
+def unpack_message(message):
+    """
+    Split a message into S3 records and inline JSON records.
+
+    Args:
+        message: SQS or Kinesis record
+
+    Returns:
+        tuple: (list of S3 event records, list of inline JSON records)
+
+    Raises:
+        json.JSONDecodeError: If the payload is not valid JSON
+        ValueError: For unsupported event sources
+    """
+    stream = open_stream(io.BytesIO(message_payload(message)))
+    records = list(iter_json_records(stream))
+
+    s3_records = []
+    inline = []
+    for record in records:
+        record = _unwrap_sns(record)
+        notification = _s3_records(record)
+        if notification is not None:
+            s3_records.extend(notification)
+        elif isinstance(record, dict) and record.get('Event') == S3_TEST_EVENT:
+            continue
+        else:
+            inline.append(record)
+    return s3_records, inline
+
+
+def _unwrap_sns(record):
+    """Return the inner message of an SNS notification delivered through SQS."""
+    if isinstance(record, dict) and record.get('Type') == 'Notification' and isinstance(record.get('Message'), str):
+        try:
+            return json.loads(record['Message'])
+        except ValueError:
+            return record
+    return record
+
+
+def _s3_records(record):
+    """Return the S3 records of a notification, or None for anything else."""
+    if not isinstance(record, dict):
+        return None
+
+    records = record.get('Records')
+    if isinstance(records, list) and records and all(isinstance(r, dict) and 's3' in r for r in records):
+        return records
+
+    # EventBridge delivers one object per event in a different shape
+    if record.get('source') == 'aws.s3' and record.get('detail-type') == 'Object Created':
+        detail = record['detail']
+        s3_object = {'key': detail['object']['key']}
+        if detail['object'].get('etag'):
+            s3_object['eTag'] = detail['object']['etag']
+        if detail['object'].get('version-id'):
+            s3_object['versionId'] = detail['object']['version-id']
+        return [{'s3': {'bucket': {'name': detail['bucket']['name']}, 'object': s3_object}}]
+
+    return None
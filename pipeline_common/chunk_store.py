@@ -0,0 +1,365 @@
+"""
+Hourly compressed chunks per (hostname, metric_type).
+
+A raw ``InfraMetrics`` item is ~200 bytes and one write unit per point, with
+``region``, ``environment`` and ``ttl`` repeated every time. The chunk store
+packs the points of one series and hour into Gorilla blocks
+(``pipeline_common.gorilla``):
+
+    series (S, HASH):  ``{hostname}#{metric_type}``
+    chunk (S, RANGE):  ``{chunk_start:010d}`` for a merged chunk,
+                       ``{chunk_start:010d}#{segment_id}`` for a segment
+    data (B):          Encoded block
+    chunk_start, count, first_ts, last_ts, unit, hostname, metric_type, ttl
+    written_at (segments); version and folded ``segments`` ids (merged chunks)
+
+Writes are append-only: ``commit`` puts one *segment* per series and hour
+with the points of the file or batch, without reading anything first. The
+segment id is a hash of the block, so replaying a file rewrites the same
+item. Readers merge a chunk and the segments it has not folded by timestamp (a later
+write of a timestamp wins), and ``compact_chunks`` lazily folds the
+segments of closed hours into the merged chunk and deletes them.
+
+Cost per commit is one PutItem per (series, hour) it touches, 1 WCU for
+blocks up to ~1 KB (several hundred points), independent of how large the
+hour already is. The saving over per-point items therefore scales with the
+points per series in one commit: a collector object with one sample per
+series costs the same 1 WCU per point as ``InfraMetrics``, a batch carrying
+ten samples per series costs a tenth. Compaction costs one Query, one
+PutItem and one delete per segment, once per series and closed hour.
+"""
+
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from pipeline_common import gorilla
+from pipeline_common.dynamodb_writer import call_with_retry
+from pipeline_common.item_encoder import ttl_timestamp
+from pipeline_common.metric_query import QueryResult
+
+CHUNK_SECONDS = 3600
+DEFAULT_TTL_DAYS = 30
+DELETE_BATCH = 25  # BatchWriteItem limit
+
+
+def series_key(hostname, metric_type):
+    """Partition key of a chunked series."""
+    return f"{hostname}#{metric_type}"
+
+
+def chunk_start(timestamp):
+    """Start of the hour a timestamp falls in."""
+    return int(timestamp) // CHUNK_SECONDS * CHUNK_SECONDS
+
+
+def chunk_key(start, segment_id=None):
+    """Sort key of a merged chunk, or of one of its segments."""
+    key = f"{int(start):010d}"
+    return f"{key}#{segment_id}" if segment_id else key
+
+
+class ChunkCommitResult:
+    """
+    Outcome of a ChunkAccumulator commit.
+
+    Attributes:
+        committed: Segments written
+        written: (hostname, metric_type, chunk_start) of written segments
+        points: Points in written segments
+        failed: (hostname, metric_type, chunk_start) of segments not written
+        failed_points: Points in failed segments
+    """
+
+    def __init__(self):
+        self.committed = 0
+        self.written = []
+        self.points = 0
+        self.failed = []
+        self.failed_points = 0
+
+    def __repr__(self):
+        return (f"ChunkCommitResult(committed={self.committed}, points={self.points}, "
+                f"failed={len(self.failed)}, failed_points={self.failed_points})")
+
+
+class ChunkAccumulator:
+    """
+    Points of one file or invocation, grouped per (hostname, metric_type, hour).
+    """
+
+    def __init__(self):
+        self.chunks = {}
+        self.units = {}
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def fold(self, metrics):
+        """
+        Add validated metrics (int ``timestamp``, float ``value``).
+
+        Args:
+            metrics: Validated metrics
+        """
+        chunks = self.chunks
+        for metric in metrics:
+            timestamp = metric['timestamp']
+            key = (metric['hostname'], metric['metric_type'], chunk_start(timestamp))
+            points = chunks.get(key)
+            if points is None:
+                points = chunks[key] = {}
+                self.units[key] = metric.get('unit', 'unknown')
+            points[timestamp] = metric['value']
+
+    def commit(self, client, table_name, concurrency=4, ttl_days=DEFAULT_TTL_DAYS, retry_budget=None):
+        """
+        Append one segment per chunk to the table, then reset.
+
+        Args:
+            client: Low-level boto3 DynamoDB client
+            table_name: Chunk table name
+            concurrency: Segments written at once
+            ttl_days: Retention for chunk items
+            retry_budget: Optional RetryBudget shared with the invocation
+
+        Returns:
+            ChunkCommitResult
+        """
+        chunks, self.chunks = self.chunks, {}
+        units, self.units = self.units, {}
+        result = ChunkCommitResult()
+        if not chunks:
+            return result
+
+        ttl = {'N': str(ttl_timestamp(ttl_days))}
+        written_at = {'N': str(time.time_ns())}
+
+        def commit_one(entry):
+            key, points = entry
+            return _put_segment(client, table_name, key, points, units[key], ttl, written_at, retry_budget)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            outcomes = list(executor.map(commit_one, chunks.items()))
+
+        for (key, points), written in zip(chunks.items(), outcomes):
+            if written:
+                result.committed += 1
+                result.written.append(key)
+                result.points += len(points)
+            else:
+                result.failed.append(key)
+                result.failed_points += len(points)
+        return result
+
+
+def _block_attributes(hostname, metric_type, start, points, unit, ttl):
+    """Attributes shared by segments and merged chunks."""
+    timestamps = sorted(points)
+    data = gorilla.encode_block(timestamps, [points[ts] for ts in timestamps])
+    return data, {
+        'series': {'S': series_key(hostname, metric_type)},
+        'data': {'B': data},
+        'chunk_start': {'N': str(start)},
+        'count': {'N': str(len(timestamps))},
+        'first_ts': {'N': str(timestamps[0])},
+        'last_ts': {'N': str(timestamps[-1])},
+        'hostname': {'S': str(hostname)},
+        'metric_type': {'S': str(metric_type)},
+        'unit': {'S': str(unit)},
+        'ttl': ttl
+    }
+
+
+def _put_segment(client, table_name, key, points, unit, ttl, written_at, retry_budget):
+    """
+    Write one segment without reading the chunk.
+
+    Returns:
+        bool: True when the segment was written
+    """
+    hostname, metric_type, start = key
+    data, item = _block_attributes(hostname, metric_type, start, points, unit, ttl)
+    # Identical points give an identical block, so a replayed file rewrites the same segment
+    item['chunk'] = {'S': chunk_key(start, hashlib.sha1(data).hexdigest()[:16])}
+    item['written_at'] = written_at
+    try:
+        call_with_retry(client.put_item, retry_budget=retry_budget, TableName=table_name, Item=item)
+        return True
+    except ClientError as e:
+        print(f"ERROR: Chunk segment write failed for {hostname}/{metric_type}/{start}: "
+              f"{e.response['Error']['Code']}")
+        return False
+
+
+def _query_items(client, table_name, hostname, metric_type, first_start, last_start, retry_budget):
+    """Query the chunks and segments of the hours starting in [first_start, last_start]."""
+    request = {
+        'TableName': table_name,
+        'KeyConditionExpression': 'series = :series AND chunk BETWEEN :first AND :last',
+        'ExpressionAttributeValues': {
+            ':series': {'S': series_key(hostname, metric_type)},
+            ':first': {'S': chunk_key(first_start)},
+            ':last': {'S': chunk_key(last_start) + '~'}  # '~' sorts after every segment suffix
+        }
+    }
+    items = []
+    pages = 0
+    while True:
+        response = call_with_retry(client.query, retry_budget=retry_budget, **request)
+        pages += 1
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items, pages
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _merge_hours(items):
+    """
+    Merge queried items per hour.
+
+    The merged chunk comes first, then the segments it has not folded yet,
+    oldest first, so a later write of a timestamp wins.
+
+    Returns:
+        dict: chunk_start -> (points dict, merged chunk item or None, all
+            segment items, segments not folded yet, ids of folded segments)
+    """
+    hours = {}
+    for item in items:
+        start = int(item['chunk_start']['N'])
+        entry = hours.setdefault(start, [None, []])
+        if '#' in item['chunk']['S']:
+            entry[1].append(item)
+        else:
+            entry[0] = item
+
+    merged = {}
+    for start, (chunk, segments) in hours.items():
+        points = {}
+        folded = set()
+        if chunk is not None:
+            points.update(zip(*gorilla.decode_block(chunk['data']['B'])))
+            folded = set(chunk.get('segments', {}).get('SS', []))
+        segments.sort(key=lambda segment: int(segment['written_at']['N']))
+        pending = []
+        for segment in segments:
+            if segment['chunk']['S'].split('#', 1)[1] not in folded:
+                points.update(zip(*gorilla.decode_block(segment['data']['B'])))
+                pending.append(segment)
+        merged[start] = (points, chunk, segments, pending, folded)
+    return merged
+
+
+def read_chunks(client, table_name, hostname, metric_type, start, end, retry_budget=None):
+    """
+    Read one series in ``[start, end)`` from the chunk table.
+
+    Merged chunks and pending segments are combined by timestamp.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Chunk table name
+        hostname: Host name
+        metric_type: Metric type
+        start: First epoch second (inclusive)
+        end: Last epoch second (exclusive)
+        retry_budget: Optional RetryBudget for throttled pages
+
+    Returns:
+        QueryResult: Points ordered by timestamp
+    """
+    started = time.perf_counter()
+    items, pages = _query_items(client, table_name, hostname, metric_type, chunk_start(start),
+                                chunk_start(int(end) - 1), retry_budget)
+
+    points = {}
+    for merged in _merge_hours(items).values():
+        points.update(merged[0])
+
+    timestamps = np.array(sorted(points), dtype=np.int64)
+    values = np.array([points[ts] for ts in timestamps.tolist()], dtype=np.float64)
+    mask = (timestamps >= int(start)) & (timestamps < int(end))
+    timestamps, values = timestamps[mask], values[mask]
+
+    return QueryResult(metric_type, timestamps, values, np.full(len(timestamps), hostname, dtype=object),
+                       pages=pages, scanned=len(items), seconds=round(time.perf_counter() - started, 3))
+
+
+def compact_chunks(client, table_name, hostname, metric_type, start, end, ttl_days=DEFAULT_TTL_DAYS,
+                   retry_budget=None, now=None):
+    """
+    Fold the segments of closed hours in ``[start, end)`` into their merged chunks.
+
+    Each hour with segments is rewritten as one item, conditional on the
+    ``version`` that was read, and its segments are deleted afterwards.
+    An hour another compaction rewrote first is skipped; segments written
+    during the compaction stay and are folded next time.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Chunk table name
+        hostname: Host name
+        metric_type: Metric type
+        start: First epoch second (inclusive)
+        end: Last epoch second (exclusive)
+        ttl_days: Retention for merged chunks
+        retry_budget: Optional RetryBudget for throttled calls
+        now: Optional current epoch second; hours that have not ended are left alone
+
+    Returns:
+        dict: hours compacted, segments deleted and conflicts
+    """
+    now = int(time.time()) if now is None else int(now)
+    last_closed = min(chunk_start(int(end) - 1), chunk_start(now) - CHUNK_SECONDS)
+    stats = {'hours': 0, 'segments': 0, 'conflicts': 0}
+    if last_closed < chunk_start(start):
+        return stats
+
+    items, _ = _query_items(client, table_name, hostname, metric_type, chunk_start(start), last_closed,
+                            retry_budget)
+    ttl = {'N': str(ttl_timestamp(ttl_days))}
+
+    for hour, (points, chunk, segments, pending, folded) in sorted(_merge_hours(items).items()):
+        if not segments:
+            continue
+        version = int(chunk['version']['N']) if chunk is not None else 0
+        unit = segments[-1]['unit']['S']
+        _, item = _block_attributes(hostname, metric_type, hour, points, unit, ttl)
+        item['chunk'] = {'S': chunk_key(hour)}
+        item['version'] = {'N': str(version + 1)}
+        # Readers skip segments listed here, so segments left behind by a failed delete are not reapplied
+        item['segments'] = {'SS': sorted(folded | {segment['chunk']['S'].split('#', 1)[1] for segment in pending})}
+
+        condition = {'ConditionExpression': 'attribute_not_exists(series)'}
+        if chunk is not None:
+            condition = {
+                'ConditionExpression': '#version = :version',
+                'ExpressionAttributeNames': {'#version': 'version'},
+                'ExpressionAttributeValues': {':version': {'N': str(version)}}
+            }
+        try:
+            call_with_retry(client.put_item, retry_budget=retry_budget, TableName=table_name, Item=item,
+                            **condition)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            stats['conflicts'] += 1
+            continue
+
+        keys = [{'series': segment['series'], 'chunk': segment['chunk']} for segment in segments]
+        for offset in range(0, len(keys), DELETE_BATCH):
+            pending = [{'DeleteRequest': {'Key': key}} for key in keys[offset:offset + DELETE_BATCH]]
+            # Segments left behind are already folded and are deleted next time
+            for attempt in range(3):
+                response = call_with_retry(client.batch_write_item, retry_budget=retry_budget,
+                                           RequestItems={table_name: pending})
+                pending = response.get('UnprocessedItems', {}).get(table_name, [])
+                if not pending:
+                    break
+        stats['hours'] += 1
+        stats['segments'] += len(segments)
+    return stats
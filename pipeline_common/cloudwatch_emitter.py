@@ -0,0 +1,203 @@
+"""
+Buffered CloudWatch metric publishing.
+
+Collectors used to call ``put_metric_data`` once per datapoint, so the
+number of API round-trips grew with the number of hosts. ``MetricsEmitter``
+buffers datapoints for the invocation and, on ``flush``:
+
+* ``api`` mode: sends them in ``PutMetricData`` requests of up to 1000
+  datums. Points sharing a metric name, unit, dimensions and minute are
+  folded into one ``StatisticValues`` datum (SampleCount/Sum/Min/Max), so
+  dropping a per-host dimension aggregates a whole fleet into one datum.
+* ``emf`` mode: prints Embedded Metric Format documents to the function's
+  log stream, where CloudWatch extracts the metrics without any API call.
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+
+API = 'api'
+EMF = 'emf'
+NONE = 'none'
+MODES = (API, EMF, NONE)
+
+MAX_DATUMS_PER_REQUEST = 1000  # PutMetricData limit
+MAX_EMF_METRICS = 100  # Metrics per EMF document
+MAX_EMF_VALUES = 100  # Values per metric in one EMF document
+
+
+def validate_mode(mode):
+    """
+    Normalise and check a publishing mode from configuration.
+
+    Args:
+        mode: ``api``, ``emf`` or ``none`` (case-insensitive)
+
+    Returns:
+        str: One of MODES
+
+    Raises:
+        ValueError: If the mode is not supported
+    """
+    mode = (mode or NONE).strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"Unsupported CloudWatch mode: {mode} (expected one of {', '.join(MODES)})")
+    return mode
+
+
+class MetricsEmitter:
+    """
+    Buffer datapoints and publish them in as few calls as possible.
+
+    Args:
+        namespace: CloudWatch namespace
+        mode: ``api``, ``emf`` or ``none`` (drop everything)
+        client: boto3 CloudWatch client, required in ``api`` mode
+        emit: Callable receiving each EMF document as a string
+    """
+
+    def __init__(self, namespace, mode=API, client=None, emit=print):
+        self.namespace = namespace
+        self.mode = validate_mode(mode)
+        if self.mode == API and client is None:
+            raise ValueError("A CloudWatch client is required in api mode")
+        self.client = client
+        self.emit = emit
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def add(self, name, value, unit='None', dimensions=None, timestamp=None):
+        """
+        Buffer one datapoint.
+
+        Args:
+            name: Metric name
+            value: Numeric value
+            unit: CloudWatch unit (e.g. ``Percent``)
+            dimensions: Optional dict of dimension name to value
+            timestamp: Epoch seconds (defaults to now)
+        """
+        if self.mode == NONE:
+            return
+
+        if timestamp is None:
+            timestamp = time.time()
+        minute = int(timestamp) - int(timestamp) % 60
+        dims = tuple(sorted((dimensions or {}).items()))
+        value = float(value)
+
+        key = (name, unit, dims, minute)
+        point = self._points.get(key)
+        if point is None:
+            # Only EMF documents carry the raw values; api mode sends statistics
+            self._points[key] = [1, value, value, value, [value] if self.mode == EMF else None]
+        else:
+            point[0] += 1
+            point[1] += value
+            point[2] = min(point[2], value)
+            point[3] = max(point[3], value)
+            if point[4] is not None:
+                point[4].append(value)
+
+    def flush(self):
+        """
+        Publish and clear the buffered datapoints.
+
+        Returns:
+            int: PutMetricData requests made or EMF documents written
+
+        Raises:
+            ClientError: If a PutMetricData request fails (api mode)
+        """
+        points, self._points = self._points, {}
+        if not points:
+            return 0
+        if self.mode == EMF:
+            return self._flush_emf(points)
+        return self._flush_api(points)
+
+    def _flush_api(self, points):
+        datums = [_datum(key, point) for key, point in points.items()]
+        for start in range(0, len(datums), MAX_DATUMS_PER_REQUEST):
+            self.client.put_metric_data(
+                Namespace=self.namespace,
+                MetricData=datums[start:start + MAX_DATUMS_PER_REQUEST]
+            )
+        return -(-len(datums) // MAX_DATUMS_PER_REQUEST)
+
+    def _flush_emf(self, points):
+        # One document per dimension set and minute, holding many metrics. A
+        # name seen with a second unit goes to another document, since each
+        # metric's values are stored under its name
+        groups = {}
+        for (name, unit, dims, minute), point in points.items():
+            slots = groups.setdefault((dims, minute), [])
+            slot = next((slot for slot in slots if name not in slot), None)
+            if slot is None:
+                slot = {}
+                slots.append(slot)
+            slot[name] = (unit, point[4])
+
+        documents = 0
+        for (dims, minute), slots in groups.items():
+            for slot in slots:
+                documents += self._emit_emf(dims, minute, [(name, unit, values) for name, (unit, values) in slot.items()])
+        return documents
+
+    def _emit_emf(self, dims, minute, metrics):
+        """Write the documents of metrics with distinct names, splitting long value arrays."""
+        documents = 0
+        offset = 0
+        while True:
+            chunk = [(name, unit, values[offset:offset + MAX_EMF_VALUES])
+                     for name, unit, values in metrics if len(values) > offset]
+            if not chunk:
+                break
+            for start in range(0, len(chunk), MAX_EMF_METRICS):
+                self.emit(json.dumps(self._emf_document(dims, minute, chunk[start:start + MAX_EMF_METRICS])))
+                documents += 1
+            offset += MAX_EMF_VALUES
+        return documents
+
+    def _emf_document(self, dims, minute, metrics):
+        document = {
+            '_aws': {
+                'Timestamp': minute * 1000,
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [[name for name, _ in dims]],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit, _ in metrics]
+                }]
+            }
+        }
+        # EMF dimension values must be strings
+        document.update((name, str(value)) for name, value in dims)
+        for name, _, values in metrics:
+            document[name] = values[0] if len(values) == 1 else values
+        return document
+
+
+def _datum(key, point):
+    """Build one PutMetricData datum, folding repeated points into StatisticValues."""
+    name, unit, dims, minute = key
+    count, total, minimum, maximum, _ = point
+
+    datum = {
+        'MetricName': name,
+        'Unit': unit,
+        'Timestamp': datetime.fromtimestamp(minute, tz=timezone.utc),
+        'Dimensions': [{'Name': dim, 'Value': str(value)} for dim, value in dims]
+    }
+    if count == 1:
+        datum['Value'] = total
+    else:
+        datum['StatisticValues'] = {
+            'SampleCount': float(count),
+            'Sum': total,
+            'Minimum': minimum,
+            'Maximum': maximum
+        }
+    return datum
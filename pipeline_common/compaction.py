@@ -0,0 +1,401 @@
+"""
+Small-file compaction for the collectors' S3 prefixes.
+
+The collectors write one small object per run:
+
+    metrics/YYYY/MM/DD/metrics-{ts}.json[.gz|.zst]      (JSON array)
+    raw-metrics/YYYY/MM/DD/metrics-{ts}.json[.gz|.zst]  (NDJSON)
+
+so every Athena scan and every replay pays per-object overhead many
+thousands of times a month. ``compact_partition`` merges a closed day (or
+hour) of them into a few large NDJSON objects, compressed with gzip or
+zstd:
+
+    compacted/{layout}/YYYY/MM/DD[/HH]/part-{run}-{n}.json.gz
+    compacted/manifests/{layout}/YYYY/MM/DD[/HH]/manifest.json
+
+Compacted objects live outside the source prefixes, so they do not trigger
+the processors' S3 notifications again.
+
+The manifest is the commit point. It lists the compacted outputs and every
+source object (key and ETag) they replace, and it is written with an S3
+conditional put (``If-None-Match`` on create, ``If-Match`` on update). A
+partition therefore switches from its originals to its compacted objects in
+one atomic PUT, and two concurrent runs cannot both commit. Readers call
+``resolve_partition``, which returns the committed outputs plus any
+originals the manifest does not cover (late arrivals). They see every
+record exactly once, before, during and after compaction.
+
+Athena cannot call ``resolve_partition``, so manifests are single-line
+JSON under their own prefix, where an Athena table can read them (Athena
+skips ``_``-prefixed files). A view joins that table on ``"$path"`` to
+read committed outputs plus uncovered originals (see the Phase 9 Athena
+doc). Uncommitted or discarded outputs never appear in a manifest, so
+Athena ignores them too.
+
+Originals are kept (``skip``) or removed (``delete``). Deletion only
+happens once the manifest is older than a grace period, so readers that
+resolved the partition just before the commit can finish reading the
+originals. A scheduled run commits its partitions well inside that period,
+so each run also revisits the compacted partitions of the days before
+(``revisit_days``): their originals are deleted once the grace period has
+passed and late arrivals are appended to their manifests.
+"""
+
+import json
+import math
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+from pipeline_common import compression
+from pipeline_common.json_stream import iter_json_records
+
+LAYOUTS = ('metrics', 'raw-metrics')
+GRANULARITIES = ('day', 'hour')
+MODES = ('skip', 'delete')
+
+DEFAULT_OUTPUT_PREFIX = 'compacted'
+DEFAULT_TARGET_RECORDS = 500000  # records per compacted object
+DEFAULT_DELETE_GRACE_SECONDS = 3600
+DEFAULT_CONCURRENCY = 16  # source objects downloaded in parallel
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+_DELETE_BATCH = 1000  # DeleteObjects limit
+
+_SOURCE_KEY = re.compile(
+    r'^(?P<layout>metrics|raw-metrics)/(?P<day>\d{4}/\d{2}/\d{2})/metrics-(?P<ts>\d+)\.json(?:\.gz|\.zst)?$'
+)
+
+
+class ManifestConflict(Exception):
+    """Another run committed the partition's manifest first."""
+
+
+def validate_layout(layout):
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unsupported layout: {layout} (expected one of {', '.join(LAYOUTS)})")
+    return layout
+
+
+def partitions(day, granularity='day'):
+    """
+    List the partitions of a day.
+
+    Args:
+        day: date
+        granularity: 'day' or 'hour'
+
+    Returns:
+        list: Partition paths such as ``2026/01/31`` or ``2026/01/31/13``
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity} (expected one of {', '.join(GRANULARITIES)})")
+    base = day.strftime('%Y/%m/%d')
+    if granularity == 'day':
+        return [base]
+    return [f"{base}/{hour:02d}" for hour in range(24)]
+
+
+def partition_end(partition):
+    """Return the UTC datetime at which a partition stops receiving data."""
+    parts = [int(part) for part in partition.split('/')]
+    start = datetime(parts[0], parts[1], parts[2], parts[3] if len(parts) > 3 else 0, tzinfo=timezone.utc)
+    return start + (timedelta(hours=1) if len(parts) > 3 else timedelta(days=1))
+
+
+def revisit_days(delete_grace_seconds=DEFAULT_DELETE_GRACE_SECONDS):
+    """
+    Days before a run's range whose compacted partitions it revisits.
+
+    Covers the grace period plus one day, so a partition committed by one
+    scheduled daily run has its originals deleted, and its late arrivals
+    compacted, by the next.
+    """
+    return math.ceil(max(delete_grace_seconds, 0) / 86400) + 1
+
+
+def output_prefix(layout, partition, prefix=DEFAULT_OUTPUT_PREFIX):
+    return f"{prefix.strip('/')}/{layout}/{partition}/"
+
+
+def manifest_key(layout, partition, prefix=DEFAULT_OUTPUT_PREFIX):
+    """Key of a partition's manifest, outside the compacted data prefix Athena reads."""
+    return f"{prefix.strip('/')}/manifests/{layout}/{partition}/{MANIFEST_NAME}"
+
+
+def list_sources(s3_client, bucket, layout, partition, listing=None):
+    """
+    List the collector objects of a partition.
+
+    Objects are listed a whole day at a time and grouped by hour, so with
+    hourly partitions a shared ``listing`` cache turns 24 LISTs of the day
+    prefix into one.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        layout: 'metrics' or 'raw-metrics'
+        partition: Partition path (day, or day/hour)
+        listing: Optional dict reused across calls of one run to cache each
+            day's listing; objects written after it was taken are picked up
+            by a later run
+
+    Returns:
+        list: {'key', 'etag', 'size', 'timestamp'} dicts, oldest first
+    """
+    day = partition[:10]
+    hour = int(partition[11:13]) if len(partition) > 10 else None
+
+    cache_key = (bucket, layout, day)
+    hours = listing.get(cache_key) if listing is not None else None
+    if hours is None:
+        hours = _list_day(s3_client, bucket, layout, day)
+        if listing is not None:
+            listing[cache_key] = hours
+
+    if hour is not None:
+        sources = list(hours.get(hour, []))
+    else:
+        sources = [source for by_hour in hours.values() for source in by_hour]
+    sources.sort(key=lambda source: (source['timestamp'], source['key']))
+    return sources
+
+
+def _list_day(s3_client, bucket, layout, day):
+    """List a day's collector objects once, grouped by UTC hour."""
+    hours = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{layout}/{day}/"):
+        for entry in page.get('Contents', []):
+            match = _SOURCE_KEY.match(entry['Key'])
+            if match is None:
+                continue
+            timestamp = int(match.group('ts'))
+            hours.setdefault(datetime.fromtimestamp(timestamp, tz=timezone.utc).hour, []).append({
+                'key': entry['Key'],
+                'etag': entry['ETag'].strip('"'),
+                'size': entry['Size'],
+                'timestamp': timestamp
+            })
+    return hours
+
+
+def read_manifest(s3_client, bucket, layout, partition, prefix=DEFAULT_OUTPUT_PREFIX):
+    """
+    Fetch a partition's manifest.
+
+    Returns:
+        tuple: (manifest dict or None, ETag or None)
+    """
+    key = manifest_key(layout, partition, prefix)
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None, None
+        raise
+    with response['Body'] as body:
+        return json.loads(body.read()), response['ETag']
+
+
+def resolve_partition(s3_client, bucket, layout, partition, prefix=DEFAULT_OUTPUT_PREFIX, listing=None):
+    """
+    List the objects a reader should read for a partition.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        layout: 'metrics' or 'raw-metrics'
+        partition: Partition path
+        listing: Optional listing cache shared across calls (see ``list_sources``)
+
+    Returns:
+        list: Object keys; compacted outputs first, then originals the
+            manifest does not cover
+    """
+    manifest, _ = read_manifest(s3_client, bucket, layout, partition, prefix)
+    covered = set()
+    keys = []
+    if manifest is not None:
+        covered = {source['key'] for source in manifest['sources']}
+        keys = [output['key'] for output in manifest['outputs']]
+    keys.extend(source['key'] for source in list_sources(s3_client, bucket, layout, partition, listing)
+                if source['key'] not in covered)
+    return keys
+
+
+def _read_records(s3_client, bucket, key):
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    body = response['Body']
+    try:
+        return list(iter_json_records(compression.open_stream(body, response.get('ContentEncoding'), key)))
+    finally:
+        body.close()
+
+
+def _write_output(s3_client, bucket, key, records, codec):
+    payload = '\n'.join(json.dumps(record, separators=(',', ':')) for record in records)
+    body = compression.compress(payload, codec) if codec != compression.NONE else payload.encode('utf-8')
+    put_args = {'Bucket': bucket, 'Key': key, 'Body': body, 'ContentType': 'application/x-ndjson'}
+    encoding = compression.content_encoding(codec)
+    if encoding:
+        put_args['ContentEncoding'] = encoding
+    s3_client.put_object(**put_args)
+    return {'key': key, 'records': len(records), 'bytes': len(body)}
+
+
+def _put_manifest(s3_client, bucket, key, manifest, etag):
+    conditions = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            # One line, so Athena's JSON SerDe reads it as one row
+            Body=json.dumps(manifest, separators=(',', ':')).encode('utf-8'),
+            ContentType='application/json',
+            **conditions
+        )
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        # If-Match on a manifest deleted since it was read fails with NoSuchKey
+        if code in ('PreconditionFailed', 'ConditionalRequestConflict', '412') or (etag and code == 'NoSuchKey'):
+            raise ManifestConflict(key) from e
+        raise
+
+
+def _delete_keys(s3_client, bucket, keys):
+    deleted = 0
+    for start in range(0, len(keys), _DELETE_BATCH):
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[start:start + _DELETE_BATCH]], 'Quiet': True}
+        )
+        errors = response.get('Errors', [])
+        for error in errors:
+            print(f"ERROR: Failed to delete s3://{bucket}/{error['Key']}: {error.get('Code')}")
+        deleted += min(_DELETE_BATCH, len(keys) - start) - len(errors)
+    return deleted
+
+
+def compact_partition(s3_client, bucket, layout, partition, prefix=DEFAULT_OUTPUT_PREFIX,
+                      codec=compression.GZIP, target_records=DEFAULT_TARGET_RECORDS, mode='skip',
+                      delete_grace_seconds=DEFAULT_DELETE_GRACE_SECONDS, concurrency=DEFAULT_CONCURRENCY,
+                      now=None, require_manifest=False, listing=None):
+    """
+    Compact one partition and, in delete mode, retire originals past the grace period.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        layout: 'metrics' or 'raw-metrics'
+        partition: Partition path (``YYYY/MM/DD`` or ``YYYY/MM/DD/HH``)
+        prefix: Prefix for compacted objects and manifests
+        codec: Compression codec of the compacted objects
+        target_records: Records per compacted object
+        mode: 'skip' keeps originals, 'delete' removes them after the grace period
+        delete_grace_seconds: Minimum manifest age before originals are deleted
+        concurrency: Source objects downloaded in parallel
+        now: Optional current datetime (UTC)
+        require_manifest: Leave the partition alone unless it was compacted
+            before (status ``skipped``), as when revisiting earlier days
+        listing: Optional listing cache shared by the partitions of one run
+            (see ``list_sources``)
+
+    Returns:
+        dict: Partition statistics (sources, records, outputs, deleted, status)
+    """
+    validate_layout(layout)
+    codec = compression.validate_codec(codec)
+    if mode not in MODES:
+        raise ValueError(f"Unsupported mode: {mode} (expected one of {', '.join(MODES)})")
+    now = now or datetime.now(timezone.utc)
+
+    stats = {'layout': layout, 'partition': partition, 'sources': 0, 'records': 0,
+             'outputs': 0, 'bytes': 0, 'deleted': 0, 'status': 'unchanged'}
+
+    manifest, etag = read_manifest(s3_client, bucket, layout, partition, prefix)
+    if manifest is None and require_manifest:
+        stats['status'] = 'skipped'
+        return stats
+    covered = {source['key'] for source in manifest['sources']} if manifest else set()
+    present = list_sources(s3_client, bucket, layout, partition, listing)
+    pending = [source for source in present if source['key'] not in covered]
+
+    if pending:
+        base = output_prefix(layout, partition, prefix)
+        run_id = uuid.uuid4().hex[:12]
+        outputs = []
+        buffer = []
+
+        # Originals are tiny, so request latency dominates: fetch in parallel
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            fetched = executor.map(lambda source: _read_records(s3_client, bucket, source['key']), pending)
+            for records in fetched:
+                buffer.extend(records)
+                while len(buffer) >= target_records:
+                    key = f"{base}part-{run_id}-{len(outputs):05d}.json{compression.key_suffix(codec)}"
+                    outputs.append(_write_output(s3_client, bucket, key, buffer[:target_records], codec))
+                    del buffer[:target_records]
+        if buffer:
+            key = f"{base}part-{run_id}-{len(outputs):05d}.json{compression.key_suffix(codec)}"
+            outputs.append(_write_output(s3_client, bucket, key, buffer, codec))
+
+        committed_at = now.isoformat()
+        new_sources = [{'key': s['key'], 'etag': s['etag'], 'size': s['size'], 'committed_at': committed_at}
+                       for s in pending]
+        updated = {
+            'version': MANIFEST_VERSION,
+            'layout': layout,
+            'partition': partition,
+            'codec': codec,
+            'outputs': (manifest['outputs'] if manifest else []) + outputs,
+            'sources': (manifest['sources'] if manifest else []) + new_sources,
+            'committed_at': committed_at
+        }
+
+        try:
+            _put_manifest(s3_client, bucket, manifest_key(layout, partition, prefix), updated, etag)
+        except ManifestConflict:
+            # Another run won; our outputs were never visible to readers
+            print(f"WARNING: Manifest for {layout}/{partition} changed concurrently; discarding this run")
+            _delete_keys(s3_client, bucket, [output['key'] for output in outputs])
+            stats['status'] = 'conflict'
+            return stats
+
+        manifest = updated
+        stats.update(
+            sources=len(pending),
+            records=sum(output['records'] for output in outputs),
+            outputs=len(outputs),
+            bytes=sum(output['bytes'] for output in outputs),
+            status='compacted'
+        )
+        print(f"Compacted {len(pending)} objects of {layout}/{partition} into {len(outputs)} "
+              f"({stats['records']} records)")
+
+    if mode == 'delete' and manifest is not None:
+        stats['deleted'] = _delete_expired_sources(s3_client, bucket, manifest, present, delete_grace_seconds, now)
+
+    return stats
+
+
+def _delete_expired_sources(s3_client, bucket, manifest, present, grace_seconds, now):
+    """Delete originals whose compaction was committed at least grace_seconds ago."""
+    cutoff = now - timedelta(seconds=grace_seconds)
+    # Only objects that still exist with the compacted ETag; an overwritten
+    # original holds data the outputs do not contain
+    current = {source['key']: source['etag'] for source in present}
+    expired = [source['key'] for source in manifest['sources']
+               if current.get(source['key']) == source['etag']
+               and datetime.fromisoformat(source['committed_at']) <= cutoff]
+    if not expired:
+        return 0
+
+    deleted = _delete_keys(s3_client, bucket, expired)
+    print(f"Deleted {deleted} compacted originals of {manifest['layout']}/{manifest['partition']}")
+    return deleted
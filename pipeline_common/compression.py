@@ -0,0 +1,191 @@
+"""
+Compression codecs for metric objects exchanged through S3.
+
+Collectors compress their output with the configured codec and record it in
+both the object's ``ContentEncoding`` and its key suffix. Processors call
+``open_stream`` on the ``get_object`` body to get a file-like object that
+decompresses incrementally, so compressed objects still stream through the
+JSON parser with bounded memory.
+
+zstd uses the standard library ``compression.zstd`` module on Python 3.14+
+and falls back to the ``zstandard`` package on older runtimes.
+"""
+
+import gzip
+
+try:
+    from compression import zstd as _stdlib_zstd
+except ImportError:
+    _stdlib_zstd = None
+
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+NONE = 'none'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+CODECS = (NONE, GZIP, ZSTD)
+
+KEY_SUFFIXES = {NONE: '', GZIP: '.gz', ZSTD: '.zst'}
+CONTENT_ENCODINGS = {GZIP: 'gzip', ZSTD: 'zstd'}
+
+_MAGIC = {
+    GZIP: b'\x1f\x8b',
+    ZSTD: b'\x28\xb5\x2f\xfd',
+}
+
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+
+
+def validate_codec(codec):
+    """
+    Normalise and check a codec name from configuration.
+
+    Args:
+        codec: Codec name, case-insensitive; empty means no compression
+
+    Returns:
+        str: One of CODECS
+
+    Raises:
+        ValueError: If the codec is not supported
+    """
+    codec = (codec or NONE).strip().lower()
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported compression codec: {codec} (expected one of {', '.join(CODECS)})")
+    return codec
+
+
+def compress(data, codec, level=None):
+    """
+    Compress a payload with the given codec.
+
+    Args:
+        data: Bytes or str (encoded as UTF-8)
+        codec: One of CODECS
+        level: Optional compression level (codec default when omitted)
+
+    Returns:
+        bytes: Compressed payload (unchanged for ``none``)
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    codec = validate_codec(codec)
+    if codec == NONE:
+        return data
+
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+
+    if codec == GZIP:
+        # mtime=0 keeps output deterministic for identical payloads
+        return gzip.compress(data, compresslevel=level, mtime=0)
+
+    if _stdlib_zstd is not None:
+        return _stdlib_zstd.compress(data, level=level)
+    return _require_zstandard().ZstdCompressor(level=level).compress(data)
+
+
+def content_encoding(codec):
+    """Return the ContentEncoding header for a codec, or None when uncompressed."""
+    return CONTENT_ENCODINGS.get(validate_codec(codec))
+
+
+def key_suffix(codec):
+    """Return the S3 key suffix for a codec (e.g. ``.gz``)."""
+    return KEY_SUFFIXES[validate_codec(codec)]
+
+
+def detect_codec(content_encoding=None, key='', prefix=b''):
+    """
+    Work out which codec an object was written with.
+
+    The ContentEncoding header wins, then the key suffix, then the magic
+    bytes at the start of the payload.
+
+    Args:
+        content_encoding: ContentEncoding from the get_object response
+        key: S3 object key
+        prefix: First bytes of the object body
+
+    Returns:
+        str: One of CODECS
+    """
+    encoding = (content_encoding or '').strip().lower()
+    for codec, header in CONTENT_ENCODINGS.items():
+        if encoding == header:
+            return codec
+
+    for codec, suffix in KEY_SUFFIXES.items():
+        if suffix and key.endswith(suffix):
+            return codec
+
+    for codec, magic in _MAGIC.items():
+        if prefix.startswith(magic):
+            return codec
+
+    return NONE
+
+
+def open_stream(body, content_encoding=None, key=''):
+    """
+    Wrap an S3 body in an incrementally decompressing reader.
+
+    Args:
+        body: Readable binary stream (e.g. botocore StreamingBody)
+        content_encoding: ContentEncoding from the get_object response
+        key: S3 object key, used for suffix detection
+
+    Returns:
+        File-like object whose ``read(size)`` yields decompressed bytes
+    """
+    prefix = body.read(4)
+    stream = _PrefixedStream(prefix, body)
+    codec = detect_codec(content_encoding, key, prefix)
+
+    if codec == GZIP:
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if codec == ZSTD:
+        if _stdlib_zstd is not None:
+            return _stdlib_zstd.ZstdFile(stream, mode='rb')
+        return _require_zstandard().ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    return stream
+
+
+def _require_zstandard():
+    if _zstandard is None:
+        raise RuntimeError("zstd support requires Python 3.14+ or the 'zstandard' package")
+    return _zstandard
+
+
+class _PrefixedStream:
+    """Replay bytes already read for codec sniffing ahead of the remaining stream."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._stream.read(size) if size is not None and size >= 0 else self._stream.read()
+
+        if size is None or size < 0:
+            data = self._prefix + self._stream.read()
+            self._prefix = b''
+            return data
+
+        data = self._prefix[:size]
+        self._prefix = self._prefix[size:]
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._stream.close()
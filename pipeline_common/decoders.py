@@ -0,0 +1,122 @@
+"""
+Schema decoders that turn any supported payload into flat metric records.
+
+Two payload shapes reach the processors:
+
+* flat records, as written by the collectors:
+  ``{"metric_id": ..., "timestamp": 1738440000, "metric_type": "cpu", ...}``
+* metric envelopes, one per instance sample:
+  ``{"timestamp": "2026-01-31T12:00:00Z", "region": ..., "instance_id": ...,
+  "metrics": {"cpu": 45.2, "memory": 62.8}}``
+
+The streaming JSON parser only materialises the first record before the
+shape is sniffed, so dispatch costs a few hundred bytes of lookahead.
+Decoders are tried in registration order; the first whose ``sniff`` accepts
+the first record decodes the whole object. New shapes are added with
+``register_decoder``.
+
+Decoders do not drop malformed input silently: anything they cannot map is
+passed through unchanged so that batch validation rejects and counts it.
+"""
+
+import itertools
+
+from pipeline_common.item_encoder import parse_timestamp
+
+FLAT = 'flat'
+ENVELOPE = 'envelope'
+
+ENVELOPE_FIELDS = ('timestamp', 'region', 'instance_id')
+DEFAULT_ENVIRONMENT = 'production'
+
+_decoders = []
+
+
+def register_decoder(name, sniff, decode):
+    """
+    Register a payload decoder.
+
+    Args:
+        name: Decoder name reported in logs and summaries
+        sniff: Callable(first_record) -> bool
+        decode: Callable(records) -> iterable of flat metric records
+    """
+    _decoders[:] = [entry for entry in _decoders if entry[0] != name]
+    _decoders.append((name, sniff, decode))
+
+
+def decoder_names():
+    """Return the registered decoder names in dispatch order."""
+    return [name for name, _, _ in _decoders]
+
+
+def decode_records(records):
+    """
+    Sniff the payload shape from the first record and decode every record.
+
+    Args:
+        records: Iterable of parsed JSON records (e.g. from iter_json_records)
+
+    Returns:
+        tuple: (decoder_name, iterator of flat metric records); the name is
+            None for an empty payload
+    """
+    iterator = iter(records)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return None, iter(())
+
+    for name, sniff, decode in _decoders:
+        if sniff(first):
+            return name, iter(decode(itertools.chain([first], iterator)))
+
+    # Nothing matched: hand the records to validation as-is
+    return FLAT, itertools.chain([first], iterator)
+
+
+def _is_envelope(record):
+    return isinstance(record, dict) and isinstance(record.get('metrics'), dict)
+
+
+def _is_flat(record):
+    return isinstance(record, dict) and 'metric_type' in record
+
+
+def _decode_flat(records):
+    return records
+
+
+def _decode_envelopes(records):
+    """Expand each envelope into one flat record per numeric metric."""
+    for envelope in records:
+        if not _is_envelope(envelope) or any(field not in envelope for field in ENVELOPE_FIELDS):
+            yield envelope
+            continue
+
+        try:
+            timestamp = parse_timestamp(envelope['timestamp'])
+        except (TypeError, ValueError):
+            yield envelope
+            continue
+
+        instance_id = envelope['instance_id']
+        region = envelope['region']
+        environment = envelope.get('environment', DEFAULT_ENVIRONMENT)
+
+        for metric_name, value in envelope['metrics'].items():
+            if not isinstance(value, (int, float)):
+                continue
+            yield {
+                'metric_id': f"{metric_name}#{instance_id}#{timestamp}",
+                'timestamp': timestamp,
+                'metric_type': metric_name,
+                'value': value,
+                'hostname': instance_id,
+                'region': region,
+                'environment': environment
+            }
+
+
+register_decoder(ENVELOPE, _is_envelope, _decode_envelopes)
+register_decoder(FLAT, _is_flat, _decode_flat)
@@ -0,0 +1,513 @@
+"""
+Threshold and anomaly detection at ingest time.
+
+The CloudWatch alarms in ``docs/phase8-cloudwatch-alarms.md`` evaluate
+over whole periods, so a breach surfaces minutes after the data lands.
+``DetectionEngine`` runs inside the processor right after validation:
+
+* **Static rules** such as ``cpu_utilization>80:warning`` are compiled once
+  into per-metric-type lists of (comparison, threshold), so each point
+  costs one dict lookup plus its comparisons. ``*`` matches every type.
+* **EWMA z-score detectors** keep an exponentially weighted mean and
+  variance per (hostname, metric_type) series. Each point is scored
+  against the state before it is folded in, and flagged once the series
+  has seen ``warmup`` points and ``|z| >= z_threshold``. Points older than
+  the series' last timestamp still go through the rules but do not touch
+  the detector.
+
+State is four numbers per series (mean, variance, count, last timestamp)
+plus the last alert time of each (series, check) for the cooldown. It
+lives in the warm container and is checkpointed as one gzip JSON object in
+S3. The checkpoint is written with a conditional put on the ETag that was
+loaded; on a conflict with another container, both states are merged (the
+newer entry of each series wins) and the write is retried. Each container
+checkpoints at most once every ``min_interval`` seconds, so a busy fleet
+does not race on the object after every invocation.
+
+Alerts are collected for the whole invocation and published by
+``AlertPublisher`` in as few SNS messages as the size limit allows, using
+``PublishBatch``.
+"""
+
+import json
+import math
+import operator
+import re
+import threading
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+from pipeline_common import compression
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+SEVERITIES = ('info', 'warning', 'critical')
+
+DEFAULT_ALPHA = 0.1
+DEFAULT_Z_THRESHOLD = 4.0
+DEFAULT_WARMUP = 30
+DEFAULT_COOLDOWN_SECONDS = 300
+DEFAULT_STATE_KEY = 'detection/state.json.gz'
+
+MAX_MESSAGE_BYTES = 256 * 1024  # SNS limit per message and per PublishBatch request
+MAX_BATCH_ENTRIES = 10
+MAX_CHECKPOINT_ATTEMPTS = 3
+DEFAULT_CHECKPOINT_SECONDS = 60  # per container
+
+_ENVELOPE_BYTES = 256
+_RULE = re.compile(r'^(?P<metric>[^<>=:\s]+)\s*(?P<op>>=|<=|>|<)\s*(?P<threshold>[-+0-9.eE]+)'
+                   r'(?::(?P<severity>\w+))?$')
+
+# Positions in a series state entry
+_MEAN, _VAR, _COUNT, _LAST_TS = range(4)
+
+
+class Rule:
+    """
+    Static threshold on one metric type.
+
+    Args:
+        metric_type: Metric type, or ``*`` for every type
+        op: One of OPERATORS
+        threshold: Threshold value
+        severity: One of SEVERITIES
+    """
+
+    def __init__(self, metric_type, op, threshold, severity='warning'):
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Unsupported severity: {severity} (expected one of {', '.join(SEVERITIES)})")
+        self.metric_type = metric_type
+        self.op = op
+        self.threshold = float(threshold)
+        self.severity = severity
+        self.name = f"{metric_type}{op}{self.threshold:g}"
+        self.compare = OPERATORS[op]
+
+    def __repr__(self):
+        return f"Rule({self.name}:{self.severity})"
+
+
+def parse_rules(value):
+    """
+    Parse comma-separated ``metric_type<op>threshold[:severity]`` rules.
+
+    Args:
+        value: e.g. ``"cpu_utilization>80,memory_usage>=90:critical"``
+
+    Returns:
+        list: Rule objects
+
+    Raises:
+        ValueError: If a rule is malformed
+    """
+    rules = []
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = _RULE.match(entry)
+        if match is None:
+            raise ValueError(f"Invalid rule: {entry} (expected metric_type<op>threshold[:severity])")
+        rules.append(Rule(match.group('metric'), match.group('op'), match.group('threshold'),
+                          match.group('severity') or 'warning'))
+    return rules
+
+
+class EwmaDetector:
+    """
+    Exponentially weighted mean/variance z-score detector.
+
+    Args:
+        metric_types: Metric types to score (None or ``*`` = all)
+        alpha: Weight of each new point
+        z_threshold: Absolute z-score that counts as an anomaly
+        warmup: Points a series needs before it is scored
+        severity: Severity of anomaly alerts
+    """
+
+    name = 'ewma'
+
+    def __init__(self, metric_types=None, alpha=DEFAULT_ALPHA, z_threshold=DEFAULT_Z_THRESHOLD,
+                 warmup=DEFAULT_WARMUP, severity='warning'):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        types = set(metric_types or ())
+        self.metric_types = None if not types or '*' in types else types
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.severity = severity
+
+    def applies_to(self, metric_type):
+        return self.metric_types is None or metric_type in self.metric_types
+
+    def update(self, entry, value):
+        """
+        Score a value against a series entry, then fold it in.
+
+        Args:
+            entry: Mutable [mean, var, count, last_ts] list
+            value: New value
+
+        Returns:
+            float or None: z-score of the value, or None during warm-up
+        """
+        count = entry[_COUNT]
+        if count == 0:
+            entry[_MEAN] = value
+            entry[_VAR] = 0.0
+            entry[_COUNT] = 1
+            return None
+
+        mean = entry[_MEAN]
+        variance = entry[_VAR]
+        diff = value - mean
+        if variance > 0:
+            z = diff / math.sqrt(variance)
+        else:
+            z = 0.0 if diff == 0 else math.copysign(math.inf, diff)
+
+        increment = self.alpha * diff
+        entry[_MEAN] = mean + increment
+        entry[_VAR] = (1 - self.alpha) * (variance + diff * increment)
+        entry[_COUNT] = count + 1
+        return z if count >= self.warmup else None
+
+
+class DetectionEngine:
+    """
+    Rules, detectors and their per-series state for one warm container.
+
+    Thread-safe: records processed in parallel evaluate against the same
+    state.
+
+    Args:
+        rules: Rule list
+        detector: Optional EwmaDetector
+        cooldown_seconds: Minimum time between alerts of one (series, check)
+    """
+
+    def __init__(self, rules=(), detector=None, cooldown_seconds=DEFAULT_COOLDOWN_SECONDS):
+        self.detector = detector
+        self.cooldown_seconds = cooldown_seconds
+        # Rules compiled per metric type; wildcard rules are appended to every list
+        self.wildcard_rules = [rule for rule in rules if rule.metric_type == '*']
+        self.rules = {}
+        for rule in rules:
+            if rule.metric_type != '*':
+                self.rules.setdefault(rule.metric_type, []).append(rule)
+        for type_rules in self.rules.values():
+            type_rules.extend(self.wildcard_rules)
+
+        self.series = {}
+        self.cooldowns = {}
+        self.etag = None
+        self.dirty = False
+        self._alerts = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.rules or self.wildcard_rules or self.detector)
+
+    def evaluate(self, metrics):
+        """
+        Check validated metrics and queue the resulting alerts.
+
+        Args:
+            metrics: Validated metrics (int ``timestamp``, float ``value``)
+
+        Returns:
+            int: Alerts raised by this call (after cooldown)
+        """
+        rules = self.rules
+        wildcard_rules = self.wildcard_rules
+        detector = self.detector
+        raised = []
+
+        with self._lock:
+            for metric in sorted(metrics, key=operator.itemgetter('timestamp')):
+                metric_type = metric['metric_type']
+                value = metric['value']
+                timestamp = metric['timestamp']
+
+                for rule in rules.get(metric_type, wildcard_rules):
+                    if rule.compare(value, rule.threshold):
+                        self._raise(raised, metric, rule.name, rule.severity, threshold=rule.threshold)
+
+                if detector is None or not detector.applies_to(metric_type):
+                    continue
+                key = f"{metric['hostname']}#{metric_type}"
+                entry = self.series.get(key)
+                if entry is None:
+                    entry = self.series[key] = [0.0, 0.0, 0, timestamp]
+                elif timestamp <= entry[_LAST_TS]:
+                    continue  # late or replayed point
+                mean = entry[_MEAN]
+                z = detector.update(entry, value)
+                entry[_LAST_TS] = timestamp
+                self.dirty = True
+                if z is not None and abs(z) >= detector.z_threshold:
+                    self._raise(raised, metric, detector.name, detector.severity,
+                                zscore=round(z, 2) if math.isfinite(z) else str(z), mean=round(mean, 4))
+
+            self._alerts.extend(raised)
+        return len(raised)
+
+    def _raise(self, raised, metric, check, severity, **details):
+        """Queue an alert unless the same check fired for the series within the cooldown."""
+        timestamp = metric['timestamp']
+        cooldown_key = f"{metric['hostname']}#{metric['metric_type']}#{check}"
+        last = self.cooldowns.get(cooldown_key)
+        if last is not None and 0 <= timestamp - last < self.cooldown_seconds:
+            return
+        self.cooldowns[cooldown_key] = timestamp
+        self.dirty = True
+        alert = {
+            'check': check,
+            'severity': severity,
+            'hostname': metric['hostname'],
+            'metric_type': metric['metric_type'],
+            'timestamp': timestamp,
+            'value': metric['value']
+        }
+        alert.update(details)
+        raised.append(alert)
+
+    def drain(self):
+        """Return and clear the queued alerts."""
+        with self._lock:
+            alerts, self._alerts = self._alerts, []
+        return alerts
+
+    def state(self):
+        """Compact, JSON-serialisable copy of the detector state."""
+        with self._lock:
+            return {'version': 1, 'series': {key: list(entry) for key, entry in self.series.items()},
+                    'cooldowns': dict(self.cooldowns)}
+
+    def merge_state(self, state):
+        """
+        Merge a checkpoint into the in-memory state; the newer entry of each series wins.
+
+        Args:
+            state: Dict produced by ``state()``
+        """
+        with self._lock:
+            for key, entry in state.get('series', {}).items():
+                current = self.series.get(key)
+                if current is None or entry[_LAST_TS] > current[_LAST_TS]:
+                    self.series[key] = list(entry)
+            for key, last in state.get('cooldowns', {}).items():
+                if key not in self.cooldowns or last > self.cooldowns[key]:
+                    self.cooldowns[key] = last
+
+    def expire(self, before):
+        """Drop series and cooldowns not updated since ``before`` (epoch seconds)."""
+        with self._lock:
+            self.series = {key: entry for key, entry in self.series.items() if entry[_LAST_TS] >= before}
+            self.cooldowns = {key: last for key, last in self.cooldowns.items() if last >= before}
+
+
+class S3StateStore:
+    """
+    Checkpoint of a DetectionEngine in one S3 object.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        key: Object key
+        min_interval: Minimum seconds between checkpoints written by this
+            container; changes made in between are written by the next one
+    """
+
+    def __init__(self, s3_client, bucket, key=DEFAULT_STATE_KEY, min_interval=DEFAULT_CHECKPOINT_SECONDS):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.min_interval = min_interval
+        self._last_checkpoint = None
+
+    def _load(self):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None, None
+            raise
+        body = response['Body']
+        try:
+            state = json.load(compression.open_stream(body, response.get('ContentEncoding'), self.key))
+        finally:
+            body.close()
+        return state, response['ETag']
+
+    def sync(self, engine):
+        """
+        Merge the stored checkpoint into the engine if another container changed it.
+
+        One HeadObject per call while the checkpoint is unchanged.
+        """
+        try:
+            etag = self.s3_client.head_object(Bucket=self.bucket, Key=self.key)['ETag']
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404', 'NotFound'):
+                return
+            raise
+        if etag == engine.etag:
+            return
+        state, etag = self._load()
+        if state is not None:
+            engine.merge_state(state)
+        engine.etag = etag
+
+    def checkpoint(self, engine, force=False):
+        """
+        Write the engine's state if it changed since the last checkpoint.
+
+        Args:
+            engine: DetectionEngine to checkpoint
+            force: Write even if ``min_interval`` has not passed yet
+
+        Returns:
+            bool: True when a checkpoint was written
+        """
+        if not engine.dirty:
+            return False
+        now = time.monotonic()
+        if (not force and self._last_checkpoint is not None
+                and now - self._last_checkpoint < self.min_interval):
+            return False
+        # Also throttles the retries of a checkpoint that kept conflicting
+        self._last_checkpoint = now
+        for _ in range(MAX_CHECKPOINT_ATTEMPTS):
+            body = compression.compress(json.dumps(engine.state(), separators=(',', ':')), compression.GZIP)
+            conditions = {'IfMatch': engine.etag} if engine.etag else {'IfNoneMatch': '*'}
+            try:
+                response = self.s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    Body=body,
+                    ContentType='application/json',
+                    ContentEncoding=compression.content_encoding(compression.GZIP),
+                    **conditions
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict',
+                                                       '412', 'NoSuchKey'):
+                    raise
+                # Another container checkpointed first: merge its state and retry
+                state, etag = self._load()
+                if state is not None:
+                    engine.merge_state(state)
+                engine.etag = etag
+                continue
+            engine.etag = response['ETag']
+            engine.dirty = False
+            return True
+        raise RuntimeError(f"Detection checkpoint s3://{self.bucket}/{self.key} kept changing")
+
+
+class AlertPublisher:
+    """
+    Publish alerts to an SNS topic in as few messages as possible.
+
+    Args:
+        sns_client: boto3 SNS client
+        topic_arn: Topic ARN
+        source: Name used in message subjects
+        max_message_bytes: Size limit per message and per batch request
+    """
+
+    def __init__(self, sns_client, topic_arn, source='InfraMonitoring', max_message_bytes=MAX_MESSAGE_BYTES):
+        self.sns_client = sns_client
+        self.topic_arn = topic_arn
+        self.source = source
+        self.max_message_bytes = max_message_bytes
+
+    def publish(self, alerts):
+        """
+        Publish alerts, most severe first.
+
+        Returns:
+            tuple: (messages published, alerts that could not be published)
+        """
+        if not alerts:
+            return 0, 0
+        rank = {severity: index for index, severity in enumerate(reversed(SEVERITIES))}
+        alerts = sorted(alerts, key=lambda alert: (rank.get(alert['severity'], len(rank)), alert['timestamp']))
+        messages = self._pack(alerts)
+
+        published = failed = 0
+        batch = []
+        batch_bytes = 0
+        for message in messages:
+            size = len(message[0].encode('utf-8'))
+            if batch and (len(batch) == MAX_BATCH_ENTRIES or batch_bytes + size > self.max_message_bytes):
+                sent, lost = self._publish_batch(batch)
+                published += sent
+                failed += lost
+                batch = []
+                batch_bytes = 0
+            batch.append(message)
+            batch_bytes += size
+        if batch:
+            sent, lost = self._publish_batch(batch)
+            published += sent
+            failed += lost
+        return published, failed
+
+    def _pack(self, alerts):
+        """Group alerts into (body, subject, alert count, severity) messages under the size limit."""
+        generated_at = datetime.utcnow().isoformat()
+        limit = self.max_message_bytes - _ENVELOPE_BYTES
+        messages = []
+        chunk = []
+        size = 0
+        for alert in alerts:
+            encoded = json.dumps(alert)
+            if chunk and size + len(encoded) + 1 > limit:
+                messages.append(self._message(chunk, generated_at))
+                chunk = []
+                size = 0
+            chunk.append(encoded)
+            size += len(encoded) + 1
+        if chunk:
+            messages.append(self._message(chunk, generated_at))
+        return messages
+
+    def _message(self, chunk, generated_at):
+        worst = json.loads(chunk[0])
+        subject = (f"{self.source}: {len(chunk)} alert{'s' if len(chunk) != 1 else ''} "
+                   f"({worst['severity']}: {worst['hostname']} {worst['check']})")[:100]
+        body = '{"alerts": [' + ','.join(chunk) + f'], "count": {len(chunk)}, "generated_at": "{generated_at}"}}'
+        return body, subject, len(chunk), worst['severity']
+
+    def _publish_batch(self, batch):
+        entries = {str(index): message for index, message in enumerate(batch)}
+        try:
+            response = self.sns_client.publish_batch(
+                TopicArn=self.topic_arn,
+                PublishBatchRequestEntries=[
+                    {
+                        'Id': entry_id,
+                        'Message': message[0],
+                        'Subject': message[1],
+                        'MessageAttributes': {'severity': {'DataType': 'String', 'StringValue': message[3]}}
+                    }
+                    for entry_id, message in entries.items()
+                ]
+            )
+        except Exception as e:
+            print(f"ERROR: Failed to publish alerts: {str(e)}")
+            return 0, sum(message[2] for message in batch)
+
+        published = len(response.get('Successful', []))
+        lost = 0
+        for failure in response.get('Failed', []):
+            print(f"ERROR: Alert message rejected: {failure.get('Code')} {failure.get('Message', '')}")
+            lost += entries[failure['Id']][2]
+        return published, lost
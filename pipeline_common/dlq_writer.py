@@ -0,0 +1,258 @@
+"""
+Batched dead-letter writer with S3 spill-over.
+
+Failed writes used to reach the DLQ as one ``SendMessage`` per 25-item
+batch, so a throttling storm turned into thousands of SQS calls, and any
+message over the SQS size limit was rejected. ``DeadLetterWriter``
+accumulates failures for the whole invocation and flushes them at the end:
+
+* Failed metrics are packed into as few messages as the size limit allows
+  (``{"failed_metrics": [<metric record>, ...], "timestamp": ...}``, the
+  records as the processor received and validated them). Failed events
+  become one message each (``{"event": ..., "error": ...}``).
+* Messages go out in ``SendMessageBatch`` requests of up to 10 entries
+  whose combined size stays under the limit. Entries SQS reports as failed
+  on its side are retried once.
+* When a spill bucket is configured and the payload does not fit in one
+  message, the whole payload is written to S3 as one gzip object. A single
+  pointer message is sent instead:
+  ``{"payload_s3": {"bucket": ..., "key": ...}, "failed_metric_count": <n>,
+  "event_count": <n>, "timestamp": ...}``. The object holds
+  ``{"failed_metrics": [...], "events": [...], "timestamp": ...}``.
+
+A storm therefore costs one ``PutObject`` and one ``SendMessage`` however
+many items failed. Without a spill bucket, anything that still does not fit
+is dropped with an error log and counted, rather than failing silently.
+"""
+
+import json
+import threading
+import uuid
+from datetime import datetime
+
+from pipeline_common import compression
+
+MAX_MESSAGE_BYTES = 256 * 1024  # SQS limit per message and per SendMessageBatch request
+MAX_BATCH_ENTRIES = 10
+DEFAULT_SPILL_PREFIX = 'dlq'
+
+# Room for the message envelope around the packed items
+_ENVELOPE_BYTES = 128
+
+
+class DeadLetterResult:
+    """
+    Outcome of a DeadLetterWriter flush.
+
+    Attributes:
+        messages: SQS messages accepted
+        requests: SendMessage/SendMessageBatch calls made
+        spilled: Payload objects written to S3
+        items: Failed items delivered (inline or spilled)
+        events: Failed events delivered (inline or spilled)
+        dropped: Messages that could not be delivered
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.requests = 0
+        self.spilled = 0
+        self.items = 0
+        self.events = 0
+        self.dropped = 0
+
+    def __repr__(self):
+        return (f"DeadLetterResult(messages={self.messages}, requests={self.requests}, "
+                f"spilled={self.spilled}, items={self.items}, events={self.events}, "
+                f"dropped={self.dropped})")
+
+
+class DeadLetterWriter:
+    """
+    Per-invocation buffer of failures for an SQS dead-letter queue.
+
+    Safe to share between threads: records processed in parallel add to the
+    same buffer.
+
+    Args:
+        sqs_client: boto3 SQS client
+        queue_url: Dead-letter queue URL
+        s3_client: Optional boto3 S3 client for spill-over
+        spill_bucket: Bucket for payloads too large for one message (optional)
+        spill_prefix: Key prefix for spilled payloads
+        max_message_bytes: Size limit per message and per batch request
+    """
+
+    def __init__(self, sqs_client, queue_url, s3_client=None, spill_bucket=None,
+                 spill_prefix=DEFAULT_SPILL_PREFIX, max_message_bytes=MAX_MESSAGE_BYTES):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.s3_client = s3_client
+        self.spill_bucket = spill_bucket
+        self.spill_prefix = spill_prefix.strip('/')
+        self.max_message_bytes = max_message_bytes
+        self._items = []
+        self._events = []
+        self._lock = threading.Lock()
+
+    def add_items(self, items):
+        """
+        Queue metrics that failed to write.
+
+        Args:
+            items: JSON-serialisable metric records that were never written
+        """
+        # Serialise now so flush only joins strings
+        encoded = [json.dumps(item) for item in items]
+        with self._lock:
+            self._items.extend(encoded)
+
+    def add_event(self, event, error_message):
+        """
+        Queue a Lambda event that failed as a whole.
+
+        Args:
+            event: Original Lambda event
+            error_message: Error description
+        """
+        with self._lock:
+            self._events.append({'event': event, 'error': error_message})
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items) + len(self._events)
+
+    def flush(self):
+        """
+        Deliver everything queued so far and clear the buffer.
+
+        Returns:
+            DeadLetterResult
+        """
+        with self._lock:
+            items, self._items = self._items, []
+            events, self._events = self._events, []
+
+        result = DeadLetterResult()
+        if not items and not events:
+            return result
+
+        timestamp = datetime.utcnow().isoformat()
+        messages = self._pack_items(items, timestamp)
+        for event in events:
+            body = json.dumps(dict(event, timestamp=timestamp))
+            messages.append((body, 0, 1))
+
+        if self.spill_bucket and self.s3_client is not None and (
+                len(messages) > 1 or len(messages[0][0]) > self.max_message_bytes):
+            self._spill(items, events, timestamp, result)
+        else:
+            self._send(messages, result)
+
+        print(f"DLQ flush: {result}")
+        return result
+
+    def _pack_items(self, items, timestamp):
+        """Group serialised items into message bodies under the size limit."""
+        suffix = f'], "timestamp": "{timestamp}"}}'
+        limit = self.max_message_bytes - _ENVELOPE_BYTES
+        messages = []
+        chunk = []
+        size = 0
+        for encoded in items:
+            if chunk and size + len(encoded) + 1 > limit:
+                messages.append(('{"failed_metrics": [' + ','.join(chunk) + suffix, len(chunk), 0))
+                chunk = []
+                size = 0
+            chunk.append(encoded)
+            size += len(encoded) + 1
+        if chunk:
+            messages.append(('{"failed_metrics": [' + ','.join(chunk) + suffix, len(chunk), 0))
+        return messages
+
+    def _send(self, messages, result):
+        """Send messages in SendMessageBatch requests within the entry and size limits."""
+        batch = []
+        batch_bytes = 0
+        for message in messages:
+            body_bytes = len(message[0].encode('utf-8'))
+            if body_bytes > self.max_message_bytes:
+                print(f"ERROR: Dropping DLQ message of {body_bytes} bytes "
+                      f"({message[1]} items, {message[2]} events): over the SQS size limit")
+                result.dropped += 1
+                continue
+            if batch and (len(batch) == MAX_BATCH_ENTRIES or batch_bytes + body_bytes > self.max_message_bytes):
+                self._send_batch(batch, result)
+                batch = []
+                batch_bytes = 0
+            batch.append(message)
+            batch_bytes += body_bytes
+        if batch:
+            self._send_batch(batch, result)
+
+    def _send_batch(self, batch, result):
+        entries = {str(index): message for index, message in enumerate(batch)}
+        pending = list(entries)
+
+        # One retry for entries that failed on the SQS side; anything else
+        # is dropped rather than adding load during an incident
+        for attempt in range(2):
+            try:
+                result.requests += 1
+                response = self.sqs_client.send_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{'Id': entry_id, 'MessageBody': entries[entry_id][0]} for entry_id in pending]
+                )
+            except Exception as e:
+                print(f"ERROR: Failed to send DLQ batch: {str(e)}")
+                result.dropped += len(pending)
+                return
+
+            for success in response.get('Successful', []):
+                _, item_count, event_count = entries[success['Id']]
+                result.messages += 1
+                result.items += item_count
+                result.events += event_count
+
+            failed = response.get('Failed', [])
+            retry = [f['Id'] for f in failed if not f.get('SenderFault')] if attempt == 0 else []
+            for failure in failed:
+                if failure['Id'] not in retry:
+                    print(f"ERROR: DLQ message rejected: {failure.get('Code')} {failure.get('Message', '')}")
+                    result.dropped += 1
+            if not retry:
+                return
+            pending = retry
+
+    def _spill(self, items, events, timestamp, result):
+        """Write the whole payload to S3 and send one pointer message."""
+        key = (f"{self.spill_prefix}/{datetime.utcnow():%Y/%m/%d}/{uuid.uuid4()}.json"
+               f"{compression.key_suffix(compression.GZIP)}")
+        payload = ('{"failed_metrics": [' + ','.join(items) + '], "events": '
+                   + json.dumps(events) + f', "timestamp": "{timestamp}"}}')
+
+        try:
+            result.requests += 1
+            self.s3_client.put_object(
+                Bucket=self.spill_bucket,
+                Key=key,
+                Body=compression.compress(payload, compression.GZIP),
+                ContentEncoding=compression.content_encoding(compression.GZIP),
+                ContentType='application/json'
+            )
+        except Exception as e:
+            print(f"ERROR: Failed to spill DLQ payload to s3://{self.spill_bucket}/{key}: {str(e)}")
+            # Fall back to inline messages so the failures are not lost
+            messages = self._pack_items(items, timestamp)
+            messages.extend((json.dumps(dict(event, timestamp=timestamp)), 0, 1) for event in events)
+            self._send(messages, result)
+            return
+
+        result.spilled += 1
+        pointer = json.dumps({
+            'payload_s3': {'bucket': self.spill_bucket, 'key': key},
+            'failed_metric_count': len(items),
+            'event_count': len(events),
+            'timestamp': timestamp
+        })
+        self._send_batch([(pointer, len(items), len(events))], result)
@@ -0,0 +1,320 @@
+"""
+Pipelined DynamoDB BatchWriteItem engine.
+
+``table.batch_writer()`` sends one BatchWriteItem request at a time, so write
+throughput is bound by round-trip latency rather than table capacity. The
+writer here slices items into 25-item requests and keeps up to
+``concurrency`` of them in flight on a shared low-level client, building the
+next slice while earlier ones are still on the wire.
+
+Retries are item-level: only the entries DynamoDB returns in
+``UnprocessedItems`` are resubmitted, after a full-jitter exponential backoff,
+and every resubmission draws from a ``RetryBudget`` shared by the whole
+invocation so a throttling storm cannot multiply the write load.
+
+Items must already be in low-level ``AttributeValue`` form (e.g.
+``{'metric_id': {'S': 'cpu-1'}, 'value': {'N': '42.5'}}``); use
+``serialize_item`` to convert resource-style dicts.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+BATCH_SIZE = 25  # DynamoDB BatchWriteItem limit
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.1  # seconds
+BACKOFF_CAP = 5.0  # seconds
+DEFAULT_RETRY_BUDGET = 100  # retry requests per invocation
+
+RETRYABLE_ERRORS = (
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+)
+
+_serializer = TypeSerializer()
+
+
+def serialize_item(item):
+    """
+    Convert a resource-style item into low-level AttributeValue form.
+
+    Args:
+        item: Dictionary of Python values (Decimal for numbers)
+
+    Returns:
+        dict: Item ready for the low-level client
+    """
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+
+def full_jitter_backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Compute a full-jitter exponential backoff delay.
+
+    Args:
+        attempt: Zero-based retry number
+        base: Delay ceiling for the first retry, in seconds
+        cap: Maximum delay ceiling, in seconds
+
+    Returns:
+        float: Seconds to sleep, uniform in [0, min(cap, base * 2**attempt)]
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryBudget:
+    """
+    Thread-safe pool of retry requests shared by one invocation.
+
+    Args:
+        limit: Total retry requests allowed
+    """
+
+    def __init__(self, limit=DEFAULT_RETRY_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one retry from the budget.
+
+        Returns:
+            bool: False once the budget is exhausted
+        """
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    @property
+    def remaining(self):
+        return max(0, self.limit - self.used)
+
+
+def call_with_retry(operation, retry_budget=None, max_retries=MAX_RETRIES, **kwargs):
+    """
+    Call a single-item DynamoDB operation, retrying throttling errors.
+
+    Args:
+        operation: Bound client method (e.g. ``client.update_item``)
+        retry_budget: Optional RetryBudget shared with the invocation
+        max_retries: Maximum retries after the first attempt
+        **kwargs: Request parameters
+
+    Returns:
+        dict: Operation response
+
+    Raises:
+        ClientError: Non-retryable errors, or the last error once retries
+            or the budget are exhausted
+    """
+    attempt = 0
+    while True:
+        try:
+            return operation(**kwargs)
+        except ClientError as e:
+            if (e.response['Error']['Code'] not in RETRYABLE_ERRORS or attempt >= max_retries
+                    or (retry_budget is not None and not retry_budget.acquire())):
+                raise
+        time.sleep(full_jitter_backoff(attempt))
+        attempt += 1
+
+
+class WriteResult:
+    """
+    Per-item outcome of a ParallelBatchWriter.write call.
+
+    ``succeeded`` and ``failed`` partition the input items; ``retried``
+    counts the items that needed at least one resubmission, whichever way
+    they ended up.
+    """
+
+    def __init__(self):
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.failed_items = []
+
+    def record(self, outcome):
+        self.succeeded += outcome.succeeded
+        self.failed += outcome.failed
+        self.retried += outcome.retried
+        self.failed_items.extend(outcome.failed_items)
+
+    def __repr__(self):
+        return (f"WriteResult(succeeded={self.succeeded}, failed={self.failed}, "
+                f"retried={self.retried})")
+
+
+class ParallelBatchWriter:
+    """
+    Write items to one DynamoDB table with several BatchWriteItem calls in flight.
+
+    Args:
+        client: Low-level boto3 DynamoDB client (thread-safe, shared by workers)
+        table_name: Target table name
+        concurrency: Maximum BatchWriteItem requests in flight at once
+        max_retries: Retries per request after the first attempt, for
+            throttling and unprocessed items (as in ``call_with_retry``)
+        retry_budget: Optional RetryBudget shared across writers in one
+            invocation; unlimited (bounded only by max_retries) when omitted
+        key_attributes: Optional primary key attribute names; items sharing a
+            key within one request are collapsed (last write wins), since
+            DynamoDB rejects requests that contain duplicate keys, and a
+            request repeating a key of an earlier one still in flight waits
+            for it, so the last write wins across requests too
+    """
+
+    def __init__(self, client, table_name, concurrency=DEFAULT_CONCURRENCY,
+                 max_retries=MAX_RETRIES, retry_budget=None, key_attributes=None):
+        self.client = client
+        self.table_name = table_name
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.key_attributes = tuple(key_attributes or ())
+
+    def write(self, items):
+        """
+        Write items, keeping up to ``concurrency`` requests in flight.
+
+        Args:
+            items: Iterable of AttributeValue items; consumed lazily so item
+                preparation overlaps with in-flight requests
+
+        Returns:
+            WriteResult: Succeeded, retried and failed item counts plus the
+            items that could not be written
+        """
+        result = WriteResult()
+        # Request that last carried each key, to keep repeated keys in order
+        sent = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for chunk in self._chunks(items):
+                keys = [self._key(item) for item in chunk[0]] if self.key_attributes else ()
+                earlier = {sent[key] for key in keys if key in sent and not sent[key].done()}
+                if earlier:
+                    wait(earlier)
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, result)
+                future = executor.submit(self._write_chunk, chunk)
+                pending.add(future)
+                for key in keys:
+                    sent[key] = future
+
+            self._collect(pending, result)
+
+        return result
+
+    def _chunks(self, items):
+        """Group items into BatchWriteItem-sized slices."""
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == BATCH_SIZE:
+                yield self._dedupe(chunk)
+                chunk = []
+        if chunk:
+            yield self._dedupe(chunk)
+
+    def _dedupe(self, chunk):
+        """
+        Collapse items with the same primary key, keeping the last one.
+
+        Returns:
+            tuple: (items, collapsed) where collapsed maps the primary key of
+                each surviving item to the number of items it replaced
+        """
+        if not self.key_attributes:
+            return chunk, {}
+
+        unique = {}
+        collapsed = {}
+        for item in chunk:
+            key = self._key(item)
+            if key in unique:
+                collapsed[key] = collapsed.get(key, 0) + 1
+            unique[key] = item
+        return list(unique.values()), collapsed
+
+    def _key(self, item):
+        return tuple(tuple(item[name].items()) for name in self.key_attributes)
+
+    @staticmethod
+    def _collect(futures, result):
+        for future in futures:
+            result.record(future.result())
+
+    def _can_retry(self, attempt):
+        """Check the per-request attempt limit, then the invocation budget."""
+        if attempt >= self.max_retries:
+            return False
+        return self.retry_budget is None or self.retry_budget.acquire()
+
+    def _write_chunk(self, chunk):
+        """
+        Send one BatchWriteItem request, resubmitting only unprocessed items.
+
+        Returns:
+            WriteResult: Outcome for this request's items
+        """
+        items, collapsed = chunk
+        outcome = WriteResult()
+        requests = [{'PutRequest': {'Item': item}} for item in items]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.batch_write_item(
+                    RequestItems={self.table_name: requests}
+                )
+            except ClientError as e:
+                # A rejected request writes nothing, so every item is pending
+                error_code = e.response['Error']['Code']
+                if error_code not in RETRYABLE_ERRORS:
+                    print(f"ERROR: DynamoDB write failed: {error_code}")
+                    break
+                unprocessed = requests
+            except Exception as e:
+                print(f"ERROR: Unexpected error writing to DynamoDB: {str(e)}")
+                break
+            else:
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                outcome.succeeded += len(requests) - len(unprocessed)
+                requests = unprocessed
+
+                if not requests:
+                    # Collapsed duplicates share the outcome of their surviving item
+                    outcome.succeeded += sum(collapsed.values())
+                    return outcome
+
+            if not self._can_retry(attempt):
+                print(f"ERROR: {len(requests)} items not written after {attempt + 1} attempts")
+                break
+
+            # Pending items only shrink, so the first retry covers every
+            # item that is ever retried for this request
+            if attempt == 0:
+                outcome.retried = len(requests)
+
+            wait_time = full_jitter_backoff(attempt)
+            print(f"{len(requests)} items unprocessed, retrying in {wait_time:.2f}s...")
+            time.sleep(wait_time)
+
+        outcome.failed_items = [r['PutRequest']['Item'] for r in requests]
+        failed_collapsed = sum(collapsed.get(self._key(item), 0) for item in outcome.failed_items) if collapsed else 0
+        outcome.succeeded += sum(collapsed.values()) - failed_collapsed
+        outcome.failed = len(outcome.failed_items) + failed_collapsed
+        return outcome
@@ -0,0 +1,230 @@
+"""
+Gorilla-style compression of (timestamp, value) series.
+
+Timestamps are stored as delta-of-deltas and values as the XOR of each
+float with the previous one (Pelkonen et al., "Gorilla: A Fast, Scalable,
+In-Memory Time Series Database", VLDB 2015). A steady 60-second series
+with slowly changing values costs a few bits per point instead of a
+~200-byte DynamoDB item.
+
+Block layout (big-endian bit stream):
+
+    version (8) | count (32) | first timestamp (64, signed) | first value (64, IEEE 754)
+
+then, for each further point, the timestamp delta-of-delta D (two's
+complement):
+
+    '0'                    D == 0
+    '10'   + 7 bits        -64 <= D <= 63
+    '110'  + 9 bits        -256 <= D <= 255
+    '1110' + 12 bits       -2048 <= D <= 2047
+    '1111' + 64 bits       anything else
+
+followed by the value XOR X with the previous value:
+
+    '0'                    X == 0
+    '10' + meaningful bits X fits the previous leading/trailing zero window
+    '11' + 5 bits leading zeros + 6 bits length (0 = 64) + meaningful bits
+
+Timestamps are integer epoch seconds in ascending order. The first delta
+is encoded as a delta-of-delta against 0.
+"""
+
+import struct
+
+VERSION = 1
+
+# (prefix, prefix bits, value bits) for each delta-of-delta range
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+_DOD_FALLBACK = (0b1111, 4, 64)
+
+
+def _float_bits(value):
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack('>d', struct.pack('>Q', bits))[0]
+
+
+class BitWriter:
+    """Append-only big-endian bit buffer."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        """Append the low ``bits`` bits of ``value``."""
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self._buffer.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def to_bytes(self):
+        """Return the buffer, padding the last byte with zero bits."""
+        if self._bits:
+            return bytes(self._buffer) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self._buffer)
+
+
+class BitReader:
+    """Sequential big-endian bit reader."""
+
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, bits):
+        """Read ``bits`` bits as an unsigned int."""
+        start = self._position
+        end = start + bits
+        if end > len(self._data) * 8:
+            raise ValueError("Unexpected end of block")
+        first_byte = start >> 3
+        last_byte = (end + 7) >> 3
+        chunk = int.from_bytes(self._data[first_byte:last_byte], 'big')
+        self._position = end
+        return (chunk >> ((last_byte << 3) - end)) & ((1 << bits) - 1)
+
+    def read_bit(self):
+        return self.read(1)
+
+
+def _signed(value, bits):
+    """Interpret the low ``bits`` of ``value`` as two's complement."""
+    if value >= 1 << (bits - 1):
+        return value - (1 << bits)
+    return value
+
+
+def encode_block(timestamps, values):
+    """
+    Compress a series.
+
+    Args:
+        timestamps: Ascending integer epoch seconds
+        values: Float values, one per timestamp
+
+    Returns:
+        bytes: Encoded block
+
+    Raises:
+        ValueError: If the lengths differ, the series is empty or timestamps
+            are not strictly ascending
+    """
+    if len(timestamps) != len(values):
+        raise ValueError("timestamps and values must have the same length")
+    if not timestamps:
+        raise ValueError("Cannot encode an empty series")
+
+    writer = BitWriter()
+    writer.write(VERSION, 8)
+    writer.write(len(timestamps), 32)
+    writer.write(int(timestamps[0]), 64)
+    previous_bits = _float_bits(float(values[0]))
+    writer.write(previous_bits, 64)
+
+    previous_ts = int(timestamps[0])
+    previous_delta = 0
+    leading = trailing = -1  # no window yet
+
+    for index in range(1, len(timestamps)):
+        ts = int(timestamps[index])
+        delta = ts - previous_ts
+        if delta <= 0:
+            raise ValueError(f"Timestamps must be strictly ascending: {previous_ts} then {ts}")
+        dod = delta - previous_delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+                if -(1 << (value_bits - 1)) <= dod < 1 << (value_bits - 1):
+                    break
+            else:
+                prefix, prefix_bits, value_bits = _DOD_FALLBACK
+            writer.write(prefix, prefix_bits)
+            writer.write(dod, value_bits)
+        previous_ts = ts
+        previous_delta = delta
+
+        bits = _float_bits(float(values[index]))
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+
+        lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if leading >= 0 and lead >= leading and trail >= trailing:
+            writer.write(0b10, 2)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            length = 64 - lead - trail
+            writer.write(0b11, 2)
+            writer.write(lead, 5)
+            writer.write(length & 0x3F, 6)
+            writer.write(xor >> trail, length)
+            leading, trailing = lead, trail
+
+    return writer.to_bytes()
+
+
+def decode_block(data):
+    """
+    Decompress a block written by ``encode_block``.
+
+    Args:
+        data: Encoded block
+
+    Returns:
+        tuple: (list of int timestamps, list of float values)
+
+    Raises:
+        ValueError: If the block is truncated or has an unknown version
+    """
+    reader = BitReader(bytes(data))
+    version = reader.read(8)
+    if version != VERSION:
+        raise ValueError(f"Unsupported block version: {version}")
+    count = reader.read(32)
+
+    previous_ts = _signed(reader.read(64), 64)
+    previous_bits = reader.read(64)
+    timestamps = [previous_ts]
+    values = [_bits_float(previous_bits)]
+
+    previous_delta = 0
+    leading = trailing = 0
+    for _ in range(count - 1):
+        if reader.read_bit() == 0:
+            dod = 0
+        else:
+            # One more '1' per bucket: '10', '110', '1110', then '1111'
+            value_bits = _DOD_FALLBACK[2]
+            for _, _, bucket_bits in _DOD_BUCKETS:
+                if reader.read_bit() == 0:
+                    value_bits = bucket_bits
+                    break
+            dod = _signed(reader.read(value_bits), value_bits)
+        previous_delta += dod
+        previous_ts += previous_delta
+        timestamps.append(previous_ts)
+
+        if reader.read_bit() == 1:
+            if reader.read_bit() == 1:
+                leading = reader.read(5)
+                length = reader.read(6) or 64
+                trailing = 64 - leading - length
+            previous_bits ^= reader.read(64 - leading - trailing) << trailing
+        values.append(_bits_float(previous_bits))
+
+    return timestamps, values
@@ -0,0 +1,103 @@
+"""
+Ingestion core shared by the processors.
+
+Both Lambda functions run the same path for every S3 object:
+
+    stream_records -> decoders.decode_records -> json_stream.iter_batches
+                   -> filter_valid -> write_metrics
+
+``stream_records`` downloads and decompresses the object incrementally and
+parses arrays, single objects and NDJSON; ``decode_records`` sniffs the
+payload shape and maps it to flat metric records; ``filter_valid`` checks
+and coerces each slice column-wise; ``write_metrics`` encodes straight to
+AttributeValue items and writes them with the pipelined, budgeted
+BatchWriteItem engine. ``object_processor`` runs the optional stages
+around this path; each processor only adds its handlers and response
+format.
+"""
+
+from pipeline_common.batch_validation import validate_batch
+from pipeline_common.compression import open_stream
+from pipeline_common.dynamodb_writer import ParallelBatchWriter
+from pipeline_common.json_stream import iter_json_records
+
+
+def stream_records(s3_client, bucket, key):
+    """
+    Download an S3 object and yield its JSON records as they stream in.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: S3 bucket name
+        key: S3 object key
+
+    Yields:
+        Parsed JSON records
+
+    Raises:
+        ClientError: If the download fails
+        json.JSONDecodeError: If the payload is not valid JSON
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    body = response['Body']
+    try:
+        stream = open_stream(body, response.get('ContentEncoding'), key)
+        yield from iter_json_records(stream)
+    finally:
+        body.close()
+
+
+def filter_valid(metrics):
+    """
+    Validate a slice of flat records and keep the valid ones.
+
+    Valid records are updated in place with their coerced int timestamp and
+    float value.
+
+    Args:
+        metrics: List of flat metric records
+
+    Returns:
+        tuple: (validated list, BatchValidation for the slice)
+    """
+    result = validate_batch(metrics)
+
+    timestamps = result.timestamps.tolist()
+    values = result.values.tolist()
+
+    validated = []
+    for index in result.mask.nonzero()[0].tolist():
+        metric = metrics[index]
+        metric['timestamp'] = timestamps[index]
+        metric['value'] = values[index]
+        validated.append(metric)
+
+    return validated, result
+
+
+def write_metrics(client, table_name, metrics, encoder, concurrency=4, max_retries=3, retry_budget=None):
+    """
+    Encode validated metrics and write them with parallel BatchWriteItem calls.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Target table
+        metrics: Validated metrics
+        encoder: ItemEncoder (or SeriesItemEncoder) with the processor's defaults;
+            its ``key_attributes`` name the table's primary key
+        concurrency: BatchWriteItem requests kept in flight
+        max_retries: Retries per item
+        retry_budget: Optional RetryBudget shared with the invocation
+
+    Returns:
+        WriteResult: Per-item outcome, including the items that failed
+    """
+    writer = ParallelBatchWriter(
+        client,
+        table_name,
+        concurrency=concurrency,
+        max_retries=max_retries,
+        retry_budget=retry_budget,
+        key_attributes=encoder.key_attributes
+    )
+    return writer.write(encoder.encode_all(metrics))
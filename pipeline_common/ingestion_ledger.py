@@ -0,0 +1,265 @@
+"""
+Idempotent ingestion ledger for S3 objects.
+
+S3 notifications are delivered at least once and failed invocations are
+retried, so the same object can reach the processor several times. The
+ledger records every object version that was fully written:
+
+    object_id (S, HASH): ``s3://{bucket}/{key}#{version_id or etag}``
+
+The processor checks the ledger before downloading an object and commits
+the record only after every write and derived stage succeeded, so a
+partially failed object is retried in full. Commits are conditional puts
+(``attribute_not_exists(committed_at)``), making the durable record the
+single source of truth when two invocations race.
+
+Derived stages that add to stored values (rollups, sketches) must not be
+applied twice when a partially failed object is retried. When an attempt
+ends incomplete, ``record_progress`` stores which of those stages finished
+and which of their keys are still pending:
+
+    stages (M): ``{stage: NULL}`` when done, ``{stage: SS}`` of pending keys
+
+The retry reads it with ``progress`` and applies only what is pending. The
+record of a completed object replaces the progress record.
+
+A Bloom filter kept in the warm container remembers object versions this
+container has already seen. A hit is only a hint: it is confirmed with an
+eventually consistent read (half the cost of the strongly consistent one),
+so a false positive can never drop a new object. The filter is cleared
+once it holds ``capacity`` entries, keeping its false-positive rate at the
+configured target (one in a million by default) in long-lived containers.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.dynamodb_writer import call_with_retry
+from pipeline_common.item_encoder import ttl_timestamp
+
+DEFAULT_CAPACITY = 100000  # object versions remembered per container
+DEFAULT_ERROR_RATE = 1e-6
+DEFAULT_TTL_DAYS = 7
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter for strings, safe to share between threads.
+
+    The filter starts over once it holds ``capacity`` entries, so its
+    false-positive rate never exceeds ``error_rate``.
+
+    Args:
+        capacity: Expected number of entries
+        error_rate: Target false-positive rate at capacity
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.capacity = capacity
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, value):
+        # Double hashing over two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        """Record a value, starting over when the filter is full."""
+        positions = self._positions(value)
+        with self._lock:
+            if self.count >= self.capacity:
+                self._bits = bytearray(len(self._bits))
+                self.count = 0
+            bits = self._bits
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def __len__(self):
+        return self.count
+
+
+def object_id(record):
+    """
+    Build the ledger key of an S3 event record.
+
+    Args:
+        record: S3 event record
+
+    Returns:
+        str or None: Ledger key, or None when the record carries neither a
+            version ID nor an ETag (the object version cannot be identified)
+    """
+    s3_object = record['s3']['object']
+    version = s3_object.get('versionId') or s3_object.get('eTag')
+    if not version:
+        return None
+    return f"s3://{record['s3']['bucket']['name']}/{s3_object['key']}#{version}"
+
+
+class IngestionLedger:
+    """
+    Durable record of fully processed S3 object versions.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Ledger table name
+        bloom: Optional BloomFilter that outlives the invocation
+        ttl_days: How long ledger records are kept
+        retry_budget: Optional RetryBudget shared with the invocation
+    """
+
+    def __init__(self, client, table_name, bloom=None, ttl_days=DEFAULT_TTL_DAYS, retry_budget=None):
+        self.client = client
+        self.table_name = table_name
+        self.bloom = bloom
+        self.ttl_days = ttl_days
+        self.retry_budget = retry_budget
+        self._progress = {}
+
+    def is_processed(self, ledger_id):
+        """
+        Check whether an object version was already fully processed.
+
+        Args:
+            ledger_id: Key from ``object_id``
+
+        Returns:
+            bool: True for a duplicate delivery
+        """
+        if self.bloom is not None and ledger_id in self.bloom:
+            # Likely seen before: a cheaper read confirms it, and a miss
+            # (false positive or replication lag) falls through
+            item = self._read(ledger_id, consistent=False)
+            if item is not None and 'stages' not in item:
+                return True
+
+        item = self._read(ledger_id, consistent=True)
+        if item is None:
+            return False
+        if 'stages' in item:
+            # An earlier attempt ended incomplete
+            self._progress[ledger_id] = _decode_stages(item['stages']['M'])
+            return False
+
+        if self.bloom is not None:
+            self.bloom.add(ledger_id)
+        return True
+
+    def _read(self, ledger_id, consistent):
+        """Read the ledger record of an object version, or None."""
+        response = call_with_retry(
+            self.client.get_item,
+            retry_budget=self.retry_budget,
+            TableName=self.table_name,
+            Key={'object_id': {'S': ledger_id}},
+            ProjectionExpression='object_id, committed_at, stages',
+            ConsistentRead=consistent
+        )
+        return response.get('Item')
+
+    def commit(self, ledger_id, metrics=0):
+        """
+        Record an object version after all of its writes succeeded.
+
+        Args:
+            ledger_id: Key from ``object_id``
+            metrics: Number of metrics written, kept for auditing
+
+        Returns:
+            bool: False if another invocation committed it first
+        """
+        try:
+            call_with_retry(
+                self.client.put_item,
+                retry_budget=self.retry_budget,
+                TableName=self.table_name,
+                Item={
+                    'object_id': {'S': ledger_id},
+                    'metrics': {'N': str(metrics)},
+                    'committed_at': {'N': str(int(time.time()))},
+                    'ttl': {'N': str(ttl_timestamp(self.ttl_days))}
+                },
+                ConditionExpression='attribute_not_exists(committed_at)'
+            )
+            committed = True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            committed = False
+
+        if self.bloom is not None:
+            self.bloom.add(ledger_id)
+        return committed
+
+    def progress(self, ledger_id):
+        """
+        Stage progress left by an incomplete earlier attempt.
+
+        Only known after ``is_processed`` returned False for the object.
+
+        Args:
+            ledger_id: Key from ``object_id``
+
+        Returns:
+            dict: stage -> frozenset of pending keys (empty when the stage is
+                done); stages that never ran are absent
+        """
+        return self._progress.get(ledger_id, {})
+
+    def record_progress(self, ledger_id, stages):
+        """
+        Record the stage progress of an attempt that did not complete.
+
+        Args:
+            ledger_id: Key from ``object_id``
+            stages: stage -> iterable of pending keys (tuples), empty when done
+
+        Returns:
+            bool: False if the object was committed in the meantime
+        """
+        encoded = {}
+        for stage, pending in stages.items():
+            pending = sorted({json.dumps(list(key)) for key in pending})
+            encoded[stage] = {'SS': pending} if pending else {'NULL': True}
+        try:
+            call_with_retry(
+                self.client.put_item,
+                retry_budget=self.retry_budget,
+                TableName=self.table_name,
+                Item={
+                    'object_id': {'S': ledger_id},
+                    'stages': {'M': encoded},
+                    'ttl': {'N': str(ttl_timestamp(self.ttl_days))}
+                },
+                ConditionExpression='attribute_not_exists(committed_at)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+        self._progress[ledger_id] = _decode_stages(encoded)
+        return True
+
+
+def _decode_stages(stages):
+    """Decode the ``stages`` map of a progress record."""
+    return {
+        stage: frozenset(tuple(json.loads(key)) for key in value.get('SS', []))
+        for stage, value in stages.items()
+    }
@@ -0,0 +1,134 @@
+"""
+Per-stage timing and memory instrumentation.
+
+Stages are wrapped in ``span`` context managers (or ``iterate`` for
+streaming generators, where the time is spent inside ``next``). Each
+stage accumulates its call count and wall time, and, when memory tracing
+is on, the largest ``tracemalloc`` peak seen while it ran.
+
+A disabled instance hands back one shared no-op context manager and the
+unwrapped iterable, so leaving instrumentation off costs a method call per
+stage and nothing per record.
+
+Memory peaks are process-wide: with several records processed in
+parallel, a stage's peak includes allocations made by other threads.
+"""
+
+import contextlib
+import threading
+import time
+import tracemalloc
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Instrumentation:
+    """
+    Stage statistics for one invocation, safe to share between threads.
+
+    Args:
+        enabled: Collect timings; when False every call is a no-op
+        trace_memory: Also record tracemalloc peaks per stage
+    """
+
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def start(self):
+        """Start tracemalloc if memory tracing is on and nothing else started it."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """Stop tracemalloc if this instance started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def span(self, name):
+        """
+        Time a block of code as one call of a stage.
+
+        Args:
+            name: Stage name
+
+        Returns:
+            Context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name)
+
+    @contextlib.contextmanager
+    def _span(self, name):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if tracing else None
+            self.record(name, elapsed, peak)
+
+    def iterate(self, name, iterable):
+        """
+        Attribute the time spent producing each item of an iterable to a stage.
+
+        Args:
+            name: Stage name
+            iterable: Iterable to wrap (e.g. a streaming parser)
+
+        Returns:
+            Iterable yielding the same items
+        """
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iterable)
+
+    def _iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.span(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record(self, name, seconds, peak_bytes=None):
+        """
+        Add one measured call to a stage.
+
+        Args:
+            name: Stage name
+            seconds: Wall time of the call
+            peak_bytes: Optional tracemalloc peak during the call
+        """
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'count': 0, 'seconds': 0.0}
+            stage['count'] += 1
+            stage['seconds'] += seconds
+            if peak_bytes is not None:
+                stage['peak_kb'] = max(stage.get('peak_kb', 0), peak_bytes // 1024)
+
+    def snapshot(self):
+        """
+        Copy the accumulated statistics.
+
+        Returns:
+            dict: Stage name -> {'count', 'seconds'[, 'peak_kb']}
+        """
+        with self._lock:
+            return {
+                name: dict(stage, seconds=round(stage['seconds'], 6))
+                for name, stage in self.stages.items()
+            }
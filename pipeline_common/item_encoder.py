@@ -0,0 +1,143 @@
+"""
+Direct encoding of validated metrics into DynamoDB wire-format items.
+
+The original write path built a resource-style dict per metric (calling
+``time.time()`` and ``Decimal(str(value))`` each time) and then let boto3's
+``TypeSerializer`` walk every dict again. ``ItemEncoder`` computes the
+per-file constants once and emits low-level ``AttributeValue`` dicts
+directly, which the low-level client sends without further conversion.
+"""
+
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from boto3.dynamodb.types import TypeSerializer
+
+SECONDS_PER_DAY = 24 * 60 * 60
+DEFAULT_TTL_DAYS = 30
+
+_serializer = TypeSerializer()
+
+
+def ttl_timestamp(ttl_days=DEFAULT_TTL_DAYS, now=None):
+    """
+    Compute the epoch second at which an item written now should expire.
+
+    Args:
+        ttl_days: Retention period in days
+        now: Optional current epoch time (defaults to time.time())
+
+    Returns:
+        int: Expiry timestamp for the DynamoDB ``ttl`` attribute
+    """
+    if now is None:
+        now = time.time()
+    return int(now) + ttl_days * SECONDS_PER_DAY
+
+
+def number_value(value):
+    """
+    Encode an int or float as a DynamoDB number attribute.
+
+    ``repr`` of a float is its shortest round-trip form, matching the digits
+    of the previous ``Decimal(str(value))`` conversion.
+    """
+    return {'N': repr(value)}
+
+
+@lru_cache(maxsize=1024)
+def _parse_iso_timestamp(value):
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+
+
+def parse_timestamp(value):
+    """
+    Convert an ISO-8601 string or epoch number to epoch seconds.
+
+    ISO strings are memoised: every metric in a collector envelope shares
+    one timestamp, so ``datetime.fromisoformat`` runs once per file.
+
+    Args:
+        value: ISO-8601 string (``Z`` suffix allowed) or number
+
+    Returns:
+        int: Epoch seconds
+    """
+    if isinstance(value, str):
+        return _parse_iso_timestamp(value)
+    return int(value)
+
+
+class ItemEncoder:
+    """
+    Encode validated metrics for the ``InfraMetrics`` table.
+
+    Args:
+        region: Default region for metrics that do not carry one
+        environment: Default environment for metrics that do not carry one
+        ttl_days: Retention period used for the ``ttl`` attribute
+        now: Optional epoch time the TTL is computed from
+    """
+
+    # Primary key of the items, used to collapse duplicates within a request
+    key_attributes = ('metric_id', 'timestamp')
+
+    def __init__(self, region, environment='unknown', ttl_days=DEFAULT_TTL_DAYS, now=None):
+        self.region = region
+        self.environment = environment
+        self.ttl = {'N': str(ttl_timestamp(ttl_days, now))}
+        self._region_attr = {'S': region}
+        self._environment_attr = {'S': environment}
+        self._unknown_unit = {'S': 'unknown'}
+
+    def encode(self, metric):
+        """
+        Encode one validated metric.
+
+        Produces the same item as ``serialize_item(prepare_dynamodb_item(metric))``
+        in the data-collector processor. ``timestamp`` and ``value`` must
+        already be coerced to int and float.
+
+        Args:
+            metric: Validated metric dictionary
+
+        Returns:
+            dict: Item in AttributeValue form
+        """
+        get = metric.get
+        unit = get('unit')
+        region = get('region')
+        environment = get('environment')
+
+        item = {
+            'metric_id': {'S': str(metric['metric_id'])},
+            'timestamp': {'N': str(metric['timestamp'])},
+            'metric_type': {'S': str(metric['metric_type'])},
+            'value': number_value(metric['value']),
+            'unit': self._unknown_unit if unit is None else {'S': str(unit)},
+            'hostname': {'S': str(metric['hostname'])},
+            'region': self._region_attr if region is None else {'S': str(region)},
+            'environment': (self._environment_attr if environment is None
+                            else {'S': str(environment)}),
+            'ttl': self.ttl
+        }
+
+        # Tags are free-form, so they go through the generic serializer
+        if 'tags' in metric:
+            item['tags'] = _serializer.serialize(metric['tags'])
+
+        return item
+
+    def encode_all(self, metrics):
+        """
+        Lazily encode a sequence of validated metrics.
+
+        Args:
+            metrics: Iterable of validated metric dictionaries
+
+        Returns:
+            generator: Items in AttributeValue form
+        """
+        encode = self.encode
+        return (encode(metric) for metric in metrics)
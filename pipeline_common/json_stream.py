@@ -0,0 +1,213 @@
+"""
+Incremental JSON parsing for metric objects stored in S3.
+
+The processors used to call ``response['Body'].read()`` followed by
+``json.loads`` which keeps the raw bytes, the decoded text and every parsed
+record alive at the same time. The helpers here read the body in fixed-size
+chunks and yield one record at a time, so peak memory is bounded by the size
+of a single record plus one chunk.
+
+Supported layouts:
+    - JSON array of objects:      ``[{...}, {...}]``
+    - Single JSON object:         ``{...}``
+    - NDJSON / concatenated JSON: ``{...}\\n{...}\\n``
+"""
+
+import codecs
+import json
+
+# 64 KiB keeps the number of reads low without holding much in memory
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Upper bound on a single record so malformed input cannot buffer the whole file
+MAX_RECORD_CHARS = 8 * 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _ChunkedText:
+    """
+    Text buffer fed from a binary stream through an incremental UTF-8 decoder.
+
+    Consumed text is dropped from the front of the buffer once it makes up
+    more than half of it, so the buffer never grows past one record plus one
+    chunk.
+    """
+
+    def __init__(self, stream, chunk_size, max_record_chars):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_record_chars = max_record_chars
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.first_chunk = True
+
+    def fill(self):
+        """
+        Read the next chunk from the stream into the buffer.
+
+        Returns:
+            bool: False once the stream is exhausted
+        """
+        if self.eof:
+            return False
+
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.decoder.decode(b'', final=True)
+            return False
+
+        if self.first_chunk:
+            self.first_chunk = False
+            if chunk.startswith(codecs.BOM_UTF8):
+                chunk = chunk[len(codecs.BOM_UTF8):]
+
+        if self.pos > len(self.buffer) // 2:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+        self.buffer += self.decoder.decode(chunk)
+        return True
+
+    def skip_whitespace(self):
+        """
+        Advance past whitespace, reading more data as needed.
+
+        Returns:
+            str: Next significant character, or '' at end of stream
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def decode_value(self, decoder):
+        """
+        Decode the next JSON value starting at the current position.
+
+        A value that ends exactly at the end of the buffer may be truncated
+        (e.g. ``12`` of ``1234``), so more data is read before accepting it.
+
+        Raises:
+            json.JSONDecodeError: If the stream holds invalid JSON
+        """
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if len(self.buffer) - self.pos > self.max_record_chars:
+                    raise self.error(
+                        f'Record exceeds {self.max_record_chars} characters'
+                    )
+                if self.fill():
+                    continue
+                raise
+
+            if end == len(self.buffer) and self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+    def error(self, message):
+        """Build a JSONDecodeError pointing at the current buffer position."""
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+
+def iter_json_records(stream, chunk_size=DEFAULT_CHUNK_SIZE, max_record_chars=MAX_RECORD_CHARS):
+    """
+    Yield JSON objects from a binary stream without loading it fully.
+
+    Args:
+        stream: File-like object with a ``read(size)`` method (e.g. the
+            botocore ``StreamingBody`` returned by ``get_object``)
+        chunk_size: Number of bytes to read per call
+        max_record_chars: Largest single record accepted before failing
+
+    Yields:
+        dict: One parsed record at a time
+
+    Raises:
+        json.JSONDecodeError: If the stream holds invalid JSON
+        ValueError: If a top-level value is not an object
+    """
+    text = _ChunkedText(stream, chunk_size, max_record_chars)
+    decoder = json.JSONDecoder()
+
+    first = text.skip_whitespace()
+    if not first:
+        return
+
+    if first == '[':
+        text.pos += 1
+        yield from _iter_array(text, decoder)
+    else:
+        yield from _iter_concatenated(text, decoder)
+
+
+def _iter_array(text, decoder):
+    """Yield the elements of a top-level JSON array."""
+    if text.skip_whitespace() == ']':
+        text.pos += 1
+        _expect_end(text)
+        return
+
+    while True:
+        if not text.skip_whitespace():
+            raise text.error('Unterminated JSON array')
+
+        value = text.decode_value(decoder)
+        if not isinstance(value, dict):
+            raise ValueError(f"Unexpected JSON structure: {type(value)}")
+        yield value
+
+        separator = text.skip_whitespace()
+        text.pos += 1
+        if separator == ',':
+            continue
+        if separator == ']':
+            _expect_end(text)
+            return
+        raise text.error("Expecting ',' delimiter")
+
+
+def _iter_concatenated(text, decoder):
+    """Yield a single object or a sequence of NDJSON objects."""
+    while text.skip_whitespace():
+        value = text.decode_value(decoder)
+        if not isinstance(value, dict):
+            raise ValueError(f"Unexpected JSON structure: {type(value)}")
+        yield value
+
+
+def _expect_end(text):
+    """Ensure nothing but whitespace follows the closing bracket."""
+    if text.skip_whitespace():
+        raise text.error('Extra data')
+
+
+def iter_batches(records, batch_size):
+    """
+    Group an iterator of records into lists of at most ``batch_size``.
+
+    Args:
+        records: Iterable of records
+        batch_size: Maximum number of records per list
+
+    Yields:
+        list: Consecutive slices of the input
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,159 @@
+"""
+Latest-value items per (hostname, metric_type) for current-state lookups.
+
+``metric_id`` embeds the timestamp, so reading the current value of a host
+from ``InfraMetrics`` means querying ``metric_type-timestamp-index`` and
+filtering. Instead, the processor keeps one small item per series holding
+the newest point it has seen:
+
+    hostname (S, HASH), metric_type (S, RANGE),
+    timestamp, value, unit, metric_id
+
+Each file is reduced to its newest point per series in memory, then written
+with a conditional ``UpdateItem`` (``attribute_not_exists(#ts) OR #ts < :ts``)
+so an older or replayed file can never overwrite a newer value.
+``batch_get_latest`` reads thousands of series with BatchGetItem.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.dynamodb_writer import MAX_RETRIES, call_with_retry, full_jitter_backoff
+from pipeline_common.item_encoder import number_value
+
+BATCH_GET_SIZE = 100  # DynamoDB BatchGetItem limit
+
+
+class LatestValueTracker:
+    """
+    Newest point per (hostname, metric_type) seen in one file or invocation.
+    """
+
+    def __init__(self):
+        self.latest = {}
+
+    def __len__(self):
+        return len(self.latest)
+
+    def fold(self, metrics):
+        """
+        Keep the newest validated metric of each series.
+
+        Args:
+            metrics: Validated metrics (int ``timestamp``, float ``value``)
+        """
+        latest = self.latest
+        for metric in metrics:
+            key = (metric['hostname'], metric['metric_type'])
+            current = latest.get(key)
+            if current is None or metric['timestamp'] > current['timestamp']:
+                latest[key] = metric
+
+    def commit(self, client, table_name, concurrency=4, retry_budget=None):
+        """
+        Conditionally write every tracked series, then reset.
+
+        Args:
+            client: Low-level boto3 DynamoDB client
+            table_name: Latest-value table name
+            concurrency: UpdateItem calls in flight at once
+            retry_budget: Optional RetryBudget shared with the invocation
+
+        Returns:
+            tuple: (updated_count, stale_count, failed_count)
+        """
+        latest, self.latest = self.latest, {}
+        if not latest:
+            return 0, 0, 0
+
+        def commit_one(metric):
+            return _write_latest(client, table_name, metric, retry_budget)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            outcomes = list(executor.map(commit_one, latest.values()))
+
+        return outcomes.count('updated'), outcomes.count('stale'), outcomes.count('failed')
+
+
+def _write_latest(client, table_name, metric, retry_budget):
+    """
+    Store one metric unless the item already holds a newer timestamp.
+
+    Returns:
+        str: ``'updated'``, ``'stale'`` or ``'failed'``
+    """
+    try:
+        call_with_retry(
+            client.update_item,
+            retry_budget=retry_budget,
+            TableName=table_name,
+            Key={
+                'hostname': {'S': str(metric['hostname'])},
+                'metric_type': {'S': str(metric['metric_type'])}
+            },
+            UpdateExpression='SET #ts = :ts, #value = :value, #unit = :unit, metric_id = :metric_id',
+            ConditionExpression='attribute_not_exists(#ts) OR #ts < :ts',
+            ExpressionAttributeNames={'#ts': 'timestamp', '#value': 'value', '#unit': 'unit'},
+            ExpressionAttributeValues={
+                ':ts': {'N': str(metric['timestamp'])},
+                ':value': number_value(metric['value']),
+                ':unit': {'S': str(metric.get('unit', 'unknown'))},
+                ':metric_id': {'S': str(metric['metric_id'])}
+            }
+        )
+        return 'updated'
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        if error_code == 'ConditionalCheckFailedException':
+            # The stored value is as new or newer
+            return 'stale'
+        print(f"ERROR: Latest-value update failed for {metric['hostname']}/{metric['metric_type']}: {error_code}")
+        return 'failed'
+
+
+def batch_get_latest(client, table_name, series, max_retries=MAX_RETRIES):
+    """
+    Read the latest value of many series with BatchGetItem.
+
+    Keys are requested 100 at a time and ``UnprocessedKeys`` are
+    resubmitted with full-jitter backoff.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Latest-value table name
+        series: Iterable of (hostname, metric_type) pairs
+        max_retries: Retries for keys DynamoDB leaves unprocessed
+
+    Returns:
+        dict: (hostname, metric_type) -> dict with timestamp, value, unit
+            and metric_id; series without an item are omitted
+    """
+    keys = [
+        {'hostname': {'S': hostname}, 'metric_type': {'S': metric_type}}
+        for hostname, metric_type in dict.fromkeys(series)
+    ]
+
+    results = {}
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        pending = keys[start:start + BATCH_GET_SIZE]
+        attempt = 0
+        while pending:
+            response = client.batch_get_item(RequestItems={table_name: {'Keys': pending}})
+            for item in response.get('Responses', {}).get(table_name, []):
+                results[(item['hostname']['S'], item['metric_type']['S'])] = {
+                    'timestamp': int(item['timestamp']['N']),
+                    'value': float(item['value']['N']),
+                    'unit': item.get('unit', {}).get('S', 'unknown'),
+                    'metric_id': item.get('metric_id', {}).get('S')
+                }
+
+            pending = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+            if pending:
+                if attempt >= max_retries:
+                    raise RuntimeError(f"{len(pending)} latest-value keys left unprocessed after retries")
+                time.sleep(full_jitter_backoff(attempt))
+                attempt += 1
+
+    return results
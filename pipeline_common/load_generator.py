@@ -0,0 +1,377 @@
+"""
+Seeded, vectorised synthetic metric load for capacity tests.
+
+The collector's ``generate_metrics_batch`` draws 20 values with
+``random.uniform`` in a Python loop, which is fine for a 5-host demo but
+cannot produce a realistic fleet. ``LoadGenerator`` produces the same
+record format for any number of hosts (100k+), metric types, sampling
+intervals and value distributions:
+
+* All values of one sampling step come from a single NumPy draw per metric
+  type, from a generator seeded with ``(seed, step)``. Every step is
+  reproducible on its own, whatever the order or concurrency of the writes.
+  The draw is kept for the last few steps, so the objects cut from one
+  step share it instead of redrawing the fleet per object.
+* Each step is cut into objects of ``records_per_object`` records,
+  serialised as a JSON array or NDJSON, compressed with the configured
+  codec and written concurrently to S3 (``S3ObjectSink``) or to a local
+  directory for offline runs (``LocalObjectSink``).
+
+Metric types are configured as ``name:distribution:a:b[:unit]`` specs, e.g.
+``cpu:normal:55:15:percent`` or ``network:lognormal:7:1:bytes``:
+
+* ``uniform``: a=low, b=high
+* ``normal``: a=mean, b=standard deviation
+* ``lognormal``: a=mean, b=sigma of the underlying normal
+* ``exponential``: a=scale, b unused
+
+Values are rounded to two decimals; ``percent`` metrics are clipped to
+0-100.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from pipeline_common import compression
+
+DISTRIBUTIONS = ('uniform', 'normal', 'lognormal', 'exponential')
+SHAPES = ('array', 'ndjson')
+
+DEFAULT_METRIC_SPECS = 'cpu:uniform:10:95:percent,memory:uniform:20:90:percent,' \
+                       'disk:uniform:30:85:percent,network:uniform:100:10000:bytes'
+DEFAULT_INTERVAL = 60  # seconds between samples of one host
+DEFAULT_RECORDS_PER_OBJECT = 10000
+DEFAULT_PREFIX = 'load-test'
+DEFAULT_TTL_DAYS = 30
+STEP_CACHE_SIZE = 4  # steps whose values are kept while their objects are built
+
+
+class MetricSpec:
+    """
+    Value distribution of one metric type.
+
+    Args:
+        name: Metric type
+        distribution: One of DISTRIBUTIONS
+        a: First distribution parameter
+        b: Second distribution parameter
+        unit: Unit written with every record
+    """
+
+    def __init__(self, name, distribution='uniform', a=0.0, b=100.0, unit='percent'):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unsupported distribution: {distribution} (expected one of {', '.join(DISTRIBUTIONS)})")
+        self.name = name
+        self.distribution = distribution
+        self.a = float(a)
+        self.b = float(b)
+        self.unit = unit
+
+    def sample(self, rng, size):
+        """Draw ``size`` values as a float64 array."""
+        if self.distribution == 'uniform':
+            values = rng.uniform(self.a, self.b, size)
+        elif self.distribution == 'normal':
+            values = rng.normal(self.a, self.b, size)
+        elif self.distribution == 'lognormal':
+            values = rng.lognormal(self.a, self.b, size)
+        else:
+            values = rng.exponential(self.a, size)
+
+        if self.unit == 'percent':
+            np.clip(values, 0.0, 100.0, out=values)
+        return np.round(values, 2)
+
+    def __repr__(self):
+        return f"MetricSpec({self.name}:{self.distribution}:{self.a:g}:{self.b:g}:{self.unit})"
+
+
+def parse_metric_specs(value):
+    """
+    Parse comma-separated ``name:distribution:a:b[:unit]`` specs.
+
+    A bare name uses a uniform 0-100 percent distribution.
+
+    Args:
+        value: Spec string, e.g. ``"cpu:normal:55:15,memory"``
+
+    Returns:
+        list: MetricSpec objects
+
+    Raises:
+        ValueError: If a spec is malformed
+    """
+    specs = []
+    for entry in (value or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split(':')
+        if len(parts) not in (1, 4, 5):
+            raise ValueError(f"Invalid metric spec: {entry} (expected name[:distribution:a:b[:unit]])")
+        if len(parts) == 1:
+            specs.append(MetricSpec(parts[0]))
+        else:
+            specs.append(MetricSpec(parts[0], parts[1], parts[2], parts[3], *parts[4:]))
+    if not specs:
+        raise ValueError("At least one metric type is required")
+    return specs
+
+
+class LoadGenerator:
+    """
+    Deterministic synthetic fleet.
+
+    Args:
+        hosts: Number of hosts
+        metric_specs: MetricSpec list or spec string
+        interval: Seconds between samples of one host
+        start: Epoch second of the first sample (defaults to now, aligned to the interval)
+        seed: Seed for every value drawn
+        region: Region written with every record
+        host_prefix: Host ID prefix
+        ttl_days: Retention used for the ``ttl`` attribute
+    """
+
+    def __init__(self, hosts=1000, metric_specs=DEFAULT_METRIC_SPECS, interval=DEFAULT_INTERVAL,
+                 start=None, seed=42, region='eu-west-1', host_prefix='host-', ttl_days=DEFAULT_TTL_DAYS):
+        if hosts < 1:
+            raise ValueError("hosts must be at least 1")
+        if interval < 1:
+            raise ValueError("interval must be at least 1 second")
+
+        self.specs = parse_metric_specs(metric_specs) if isinstance(metric_specs, str) else list(metric_specs)
+        self.hosts = hosts
+        self.interval = interval
+        self.start = start if start is not None else int(time.time()) // interval * interval
+        self.seed = seed
+        self.region = region
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+
+        width = max(3, len(str(hosts)))
+        self.host_ids = [f"{host_prefix}{i + 1:0{width}d}" for i in range(hosts)]
+
+        self._step_cache = OrderedDict()
+        self._step_lock = threading.Lock()
+
+    @property
+    def records_per_step(self):
+        return self.hosts * len(self.specs)
+
+    def timestamp(self, step):
+        """Epoch second of a sampling step."""
+        return self.start + step * self.interval
+
+    def values(self, step):
+        """
+        Draw every value of one step.
+
+        Args:
+            step: Sampling step (0-based)
+
+        Returns:
+            numpy.ndarray: float64 array of shape (len(specs), hosts)
+        """
+        rng = np.random.default_rng([self.seed, step])
+        return np.stack([spec.sample(rng, self.hosts) for spec in self.specs])
+
+    def step_values(self, step):
+        """
+        Values of one step, flattened metric type by metric type, drawn once.
+
+        The last STEP_CACHE_SIZE steps are kept, so concurrent workers
+        building objects of the same step share one draw.
+
+        Args:
+            step: Sampling step (0-based)
+
+        Returns:
+            numpy.ndarray: Read-only float64 array of ``records_per_step`` values
+        """
+        with self._step_lock:
+            values = self._step_cache.get(step)
+            if values is None:
+                values = self.values(step).ravel()
+                values.setflags(write=False)
+                self._step_cache[step] = values
+                if len(self._step_cache) > STEP_CACHE_SIZE:
+                    self._step_cache.popitem(last=False)
+            else:
+                self._step_cache.move_to_end(step)
+            return values
+
+    def batch(self, step, offset=0, limit=None):
+        """
+        Build the records of one step, metric type by metric type.
+
+        Records have the collector's format (``host_id``) plus ``hostname``
+        and ``unit`` so the processors accept them.
+
+        Args:
+            step: Sampling step
+            offset: First record of the step to build
+            limit: Maximum number of records (defaults to the rest of the step)
+
+        Returns:
+            list: Metric records
+        """
+        timestamp = self.timestamp(step)
+        ttl = timestamp + self.ttl_seconds
+        end = self.records_per_step if limit is None else min(self.records_per_step, offset + limit)
+        values = self.step_values(step)[offset:end].tolist()
+
+        records = []
+        for index, value in zip(range(offset, end), values):
+            spec = self.specs[index // self.hosts]
+            host_id = self.host_ids[index % self.hosts]
+            records.append({
+                'metric_id': f"{spec.name}-{timestamp}-{host_id}",
+                'timestamp': timestamp,
+                'metric_type': spec.name,
+                'value': value,
+                'unit': spec.unit,
+                'host_id': host_id,
+                'hostname': host_id,
+                'region': self.region,
+                'ttl': ttl
+            })
+        return records
+
+    def objects(self, steps, records_per_object=DEFAULT_RECORDS_PER_OBJECT):
+        """
+        Plan the objects of a run without generating any data.
+
+        Args:
+            steps: Number of sampling steps
+            records_per_object: Records per object
+
+        Yields:
+            tuple: (step, part, offset, limit)
+        """
+        for step in range(steps):
+            for part, offset in enumerate(range(0, self.records_per_step, records_per_object)):
+                yield step, part, offset, records_per_object
+
+
+def encode_object(records, shape='array', codec=compression.NONE):
+    """
+    Serialise records compactly and compress them.
+
+    Args:
+        records: Metric records
+        shape: 'array' or 'ndjson'
+        codec: Compression codec
+
+    Returns:
+        bytes: Object body
+    """
+    if shape == 'ndjson':
+        payload = '\n'.join(json.dumps(record, separators=(',', ':')) for record in records)
+    else:
+        payload = json.dumps(records, separators=(',', ':'))
+    return compression.compress(payload, codec) if codec != compression.NONE else payload.encode('utf-8')
+
+
+def object_key(prefix, timestamp, part, codec=compression.NONE):
+    """Key of one generated object, partitioned by day like the collector's uploads."""
+    date_str = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y/%m/%d')
+    return f"{prefix.strip('/')}/{date_str}/metrics-{timestamp}-{part:05d}.json{compression.key_suffix(codec)}"
+
+
+class S3ObjectSink:
+    """
+    Write generated objects to S3.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Target bucket
+    """
+
+    def __init__(self, s3_client, bucket):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def write(self, key, body, codec):
+        put_args = {'Bucket': self.bucket, 'Key': key, 'Body': body, 'ContentType': 'application/json'}
+        encoding = compression.content_encoding(codec)
+        if encoding:
+            put_args['ContentEncoding'] = encoding
+        self.s3_client.put_object(**put_args)
+        return f"s3://{self.bucket}/{key}"
+
+
+class LocalObjectSink:
+    """
+    Write generated objects under a local directory for offline runs.
+
+    Args:
+        directory: Root directory; keys become relative paths
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def write(self, key, body, codec):
+        path = os.path.join(self.directory, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        return path
+
+
+def run_load(generator, sink, steps=1, records_per_object=DEFAULT_RECORDS_PER_OBJECT, shape='array',
+             codec=compression.NONE, prefix=DEFAULT_PREFIX, concurrency=8):
+    """
+    Generate ``steps`` samples of the fleet and write them as objects.
+
+    Objects are built and written on a thread pool; each worker generates
+    only its own slice, so memory stays bounded by
+    ``concurrency * records_per_object`` records.
+
+    Args:
+        generator: LoadGenerator
+        sink: S3ObjectSink or LocalObjectSink
+        steps: Sampling steps to generate
+        records_per_object: Records per object
+        shape: 'array' or 'ndjson'
+        codec: Compression codec
+        prefix: Key prefix
+        concurrency: Objects built and written in parallel
+
+    Returns:
+        dict: objects, records, bytes, seconds and records_per_sec
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unsupported shape: {shape} (expected one of {', '.join(SHAPES)})")
+    codec = compression.validate_codec(codec)
+
+    def write_object(plan):
+        step, part, offset, limit = plan
+        records = generator.batch(step, offset, limit)
+        body = encode_object(records, shape, codec)
+        sink.write(object_key(prefix, generator.timestamp(step), part, codec), body, codec)
+        return len(records), len(body)
+
+    started = time.perf_counter()
+    objects = records = size = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for record_count, body_size in executor.map(write_object, generator.objects(steps, records_per_object)):
+            objects += 1
+            records += record_count
+            size += body_size
+    seconds = time.perf_counter() - started
+
+    return {
+        'objects': objects,
+        'records': records,
+        'bytes': size,
+        'seconds': round(seconds, 3),
+        'records_per_sec': round(records / seconds, 1) if seconds else 0.0
+    }
@@ -0,0 +1,207 @@
+"""
+Parallel time-range reads from ``InfraMetrics``.
+
+Reading a day of one metric type for the whole fleet through the
+resource API means one paginated ``Query`` walked serially and every item
+turned into a dict of ``Decimal`` values. ``query_metrics`` instead:
+
+* splits ``[start, end)`` into contiguous sub-ranges and queries
+  ``metric_type-timestamp-index`` for each of them on a thread pool, so
+  many 1 MB pages are in flight at once;
+* projects only ``timestamp``, ``value`` and ``hostname`` and keeps the
+  low-level client's wire strings, which NumPy converts to ``int64`` /
+  ``float64`` arrays in one pass per column.
+
+The result is ordered by timestamp, because each sub-range is returned in
+index order and the sub-ranges are concatenated in order.
+
+A host filter is sent as a ``FilterExpression`` (up to 100 hosts) or
+applied after reading; either way DynamoDB still reads, and bills, every
+item of the metric type in the range.
+
+NumPy is required; pandas is only imported by ``QueryResult.to_dataframe``.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pipeline_common.dynamodb_writer import call_with_retry
+
+INDEX_NAME = 'metric_type-timestamp-index'
+DEFAULT_SEGMENTS = 16  # sub-ranges queried in parallel
+MAX_FILTER_HOSTS = 100  # operands allowed in an IN condition
+
+
+class QueryResult:
+    """
+    Columnar result of a time-range query.
+
+    Attributes:
+        metric_type: Metric type queried
+        timestamps: int64 array of epoch seconds, ascending
+        values: float64 array of values
+        hostnames: object array of host names
+        pages: Query pages read
+        scanned: Items DynamoDB read before filtering
+        seconds: Wall-clock duration of the query
+    """
+
+    def __init__(self, metric_type, timestamps, values, hostnames, pages=0, scanned=0, seconds=0.0):
+        self.metric_type = metric_type
+        self.timestamps = timestamps
+        self.values = values
+        self.hostnames = hostnames
+        self.pages = pages
+        self.scanned = scanned
+        self.seconds = seconds
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return (f"QueryResult(metric_type={self.metric_type!r}, points={len(self)}, "
+                f"pages={self.pages}, scanned={self.scanned}, seconds={self.seconds})")
+
+    def for_host(self, hostname):
+        """
+        Select one host's points.
+
+        Returns:
+            tuple: (timestamps, values) arrays
+        """
+        mask = self.hostnames == hostname
+        return self.timestamps[mask], self.values[mask]
+
+    def to_dataframe(self):
+        """
+        Convert to a pandas DataFrame with ``timestamp`` (UTC datetimes),
+        ``hostname`` and ``value`` columns.
+
+        Raises:
+            RuntimeError: If pandas is not installed
+        """
+        try:
+            import pandas
+        except ImportError as e:
+            raise RuntimeError("QueryResult.to_dataframe requires the 'pandas' package") from e
+        return pandas.DataFrame({
+            'timestamp': pandas.to_datetime(self.timestamps, unit='s', utc=True),
+            'hostname': self.hostnames,
+            'value': self.values
+        })
+
+
+def split_range(start, end, segments=DEFAULT_SEGMENTS):
+    """
+    Split ``[start, end)`` into contiguous integer sub-ranges.
+
+    Args:
+        start: First epoch second (inclusive)
+        end: Last epoch second (exclusive)
+        segments: Number of sub-ranges wanted
+
+    Returns:
+        list: (first, last) pairs, both inclusive, in ascending order;
+            fewer than ``segments`` when the range is shorter
+    """
+    start, end = int(start), int(end)
+    if end <= start:
+        return []
+    segments = max(1, min(segments, end - start))
+    bounds = [start + (end - start) * i // segments for i in range(segments + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(segments)]
+
+
+def _query_segment(client, table_name, index_name, metric_type, first, last, hosts, retry_budget):
+    """Read one sub-range, following LastEvaluatedKey."""
+    request = {
+        'TableName': table_name,
+        'IndexName': index_name,
+        'KeyConditionExpression': 'metric_type = :metric_type AND #ts BETWEEN :first AND :last',
+        'ProjectionExpression': '#ts, #value, hostname',
+        'ExpressionAttributeNames': {'#ts': 'timestamp', '#value': 'value'},
+        'ExpressionAttributeValues': {
+            ':metric_type': {'S': metric_type},
+            ':first': {'N': str(first)},
+            ':last': {'N': str(last)}
+        }
+    }
+    if hosts is not None and len(hosts) <= MAX_FILTER_HOSTS:
+        placeholders = [f':host{i}' for i in range(len(hosts))]
+        request['FilterExpression'] = f"hostname IN ({', '.join(placeholders)})"
+        request['ExpressionAttributeValues'].update(
+            {placeholder: {'S': host} for placeholder, host in zip(placeholders, hosts)})
+
+    timestamps = []
+    values = []
+    hostnames = []
+    pages = scanned = 0
+    while True:
+        response = call_with_retry(client.query, retry_budget=retry_budget, **request)
+        pages += 1
+        scanned += response.get('ScannedCount', 0)
+        for item in response.get('Items', []):
+            timestamps.append(item['timestamp']['N'])
+            values.append(item['value']['N'])
+            hostnames.append(item['hostname']['S'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return timestamps, values, hostnames, pages, scanned
+
+
+def query_metrics(client, table_name, metric_type, start, end, hosts=None, segments=DEFAULT_SEGMENTS,
+                  concurrency=None, index_name=INDEX_NAME, retry_budget=None):
+    """
+    Read every point of one metric type in ``[start, end)``.
+
+    Args:
+        client: Low-level boto3 DynamoDB client (size its connection pool
+            to at least ``concurrency``)
+        table_name: Table name, e.g. ``InfraMetrics``
+        metric_type: Metric type to read
+        start: First epoch second (inclusive)
+        end: Last epoch second (exclusive)
+        hosts: Optional iterable of host names to keep; an empty one
+            matches nothing and reads nothing
+        segments: Sub-ranges the time range is split into
+        concurrency: Sub-ranges queried at once (defaults to ``segments``)
+        index_name: GSI keyed by metric_type and timestamp
+        retry_budget: Optional RetryBudget for throttled pages
+
+    Returns:
+        QueryResult
+    """
+    started = time.perf_counter()
+    host_list = sorted(set(hosts)) if hosts is not None else None
+    # No host can match an empty filter, so there is nothing to read
+    ranges = split_range(start, end, segments) if host_list != [] else []
+
+    def read(bounds):
+        return _query_segment(client, table_name, index_name, metric_type, bounds[0], bounds[1],
+                              host_list, retry_budget)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency or len(ranges) or 1)) as executor:
+        parts = list(executor.map(read, ranges))
+
+    # Columns stay as wire strings until here: one vectorised conversion each
+    timestamps = np.array([ts for part in parts for ts in part[0]], dtype=np.str_).astype(np.int64)
+    values = np.array([value for part in parts for value in part[1]], dtype=np.str_).astype(np.float64)
+    hostnames = np.array([host for part in parts for host in part[2]], dtype=object)
+
+    if host_list is not None and len(host_list) > MAX_FILTER_HOSTS:
+        mask = np.isin(hostnames, host_list)
+        timestamps, values, hostnames = timestamps[mask], values[mask], hostnames[mask]
+
+    return QueryResult(
+        metric_type,
+        timestamps,
+        values,
+        hostnames,
+        pages=sum(part[3] for part in parts),
+        scanned=sum(part[4] for part in parts),
+        seconds=round(time.perf_counter() - started, 3)
+    )
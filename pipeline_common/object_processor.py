@@ -0,0 +1,766 @@
+"""
+Per-object stage orchestration shared by the processors.
+
+``pipeline_common.ingestion`` holds the download, validate and write path.
+This module runs it together with the optional stages, for one S3 object
+or for the inline metrics of a batch:
+
+    ledger check -> stream_records -> decode_records -> iter_batches
+      -> filter_valid -> detection -> write_metrics
+      -> fold into rollups, latest values, chunks and sketches
+    -> commit chunks and latest values
+    -> commit rollups and sketches, add the written rows to the Parquet sink
+    -> ledger commit, or a progress record when anything failed
+
+Chunk segments and latest values are idempotent, so a retried object simply
+rewrites them. Rollups, sketches and Parquet rows add to what is stored: an
+object or message the event source redelivers only adds them once it is
+fully written, any other object adds the points that were written, and the
+ledger's progress record keeps a retry from adding them twice.
+
+Each processor builds an ObjectProcessor from its own configuration and its
+per-invocation state (retry budget, Parquet sink, ledger, dead letters,
+instrumentation). Handlers, response formats and CloudWatch metrics stay in
+the processors.
+"""
+
+import json
+
+from botocore.exceptions import ClientError
+
+from pipeline_common import chunk_store, rollups as rollup_store, sketches as sketch_store
+from pipeline_common.chunk_store import CHUNK_SECONDS, ChunkAccumulator, chunk_start, compact_chunks
+from pipeline_common.decoders import decode_records
+from pipeline_common.dynamodb_writer import MAX_RETRIES, WriteResult
+from pipeline_common.ingestion import filter_valid, stream_records, write_metrics
+from pipeline_common.ingestion_ledger import object_id
+from pipeline_common.instrumentation import Instrumentation
+from pipeline_common.json_stream import iter_batches
+from pipeline_common.latest_values import LatestValueTracker
+from pipeline_common.rollups import RollupAccumulator
+from pipeline_common.sketches import SketchAccumulator
+
+DEFAULT_BATCH_SIZE = 1000  # records held in memory at once
+COMPACTED_CHUNKS_LIMIT = 100000  # chunk hours remembered per container
+
+
+class StageConfig:
+    """
+    Tables and options of the optional stages.
+
+    An empty table name disables its stage.
+
+    Args:
+        rollup_table: Table for incremental min/max/sum/count rollups
+        rollup_resolutions: Rollup resolutions to maintain
+        rollup_ttl_days: Retention for rollup windows
+        chunk_table: Table for hourly Gorilla-compressed chunks
+        chunk_ttl_days: Retention for chunk items
+        chunk_only: Write only the chunks, not one item per point
+        chunk_compact: Fold a series' segments once it writes into the next hour
+        sketch_table: Table for mergeable quantile sketches
+        sketch_resolutions: Sketch resolutions to maintain
+        sketch_accuracy: Relative error of returned quantiles
+        sketch_ttl_days: Retention for sketch windows
+        latest_table: Table for latest-value items per host and metric type
+    """
+
+    def __init__(self, rollup_table='', rollup_resolutions=rollup_store.DEFAULT_RESOLUTIONS,
+                 rollup_ttl_days=rollup_store.DEFAULT_TTL_DAYS, chunk_table='',
+                 chunk_ttl_days=chunk_store.DEFAULT_TTL_DAYS, chunk_only=False, chunk_compact=True,
+                 sketch_table='', sketch_resolutions=sketch_store.DEFAULT_RESOLUTIONS,
+                 sketch_accuracy=sketch_store.DEFAULT_ACCURACY, sketch_ttl_days=sketch_store.DEFAULT_TTL_DAYS,
+                 latest_table=''):
+        self.rollup_table = rollup_table
+        self.rollup_resolutions = rollup_resolutions
+        self.rollup_ttl_days = rollup_ttl_days
+        self.chunk_table = chunk_table
+        self.chunk_ttl_days = chunk_ttl_days
+        self.chunk_only = chunk_only and bool(chunk_table)
+        self.chunk_compact = chunk_compact
+        self.sketch_table = sketch_table
+        self.sketch_resolutions = sketch_resolutions
+        self.sketch_accuracy = sketch_accuracy
+        self.sketch_ttl_days = sketch_ttl_days
+        self.latest_table = latest_table
+
+
+def new_processing_summary():
+    """
+    Create an empty processing summary.
+
+    Returns:
+        dict: Summary counters and error list
+    """
+    return {
+        'total_files': 0,
+        'total_metrics': 0,
+        'invalid_metrics': 0,
+        'successful_writes': 0,
+        'retried_writes': 0,
+        'failed_writes': 0,
+        'parquet_files': 0,
+        'rollup_updates': 0,
+        'rollup_failures': 0,
+        'chunk_updates': 0,
+        'chunk_failures': 0,
+        'chunk_compactions': 0,
+        'sketch_updates': 0,
+        'sketch_failures': 0,
+        'latest_updates': 0,
+        'latest_stale': 0,
+        'duplicate_files': 0,
+        'dlq_messages': 0,
+        'dlq_spilled': 0,
+        'alerts': 0,
+        'alerts_published': 0,
+        'decoders': {},
+        'errors': []
+    }
+
+
+def merge_summary(target, source):
+    """
+    Fold a per-record summary into the invocation summary.
+
+    Numeric counters are added, lists are extended and nested dicts are
+    merged recursively.
+
+    Args:
+        target: Summary dictionary to update
+        source: Summary dictionary to merge in
+    """
+    for key, value in source.items():
+        if isinstance(value, dict):
+            merge_summary(target.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            target.setdefault(key, []).extend(value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def download_records(s3_client, bucket, key):
+    """
+    Download an S3 object and yield its records as they stream in.
+
+    JSON arrays, single objects and NDJSON are accepted, plain or
+    compressed with gzip/zstd. Download and parse errors are logged and
+    re-raised while iterating.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: S3 bucket name
+        key: S3 object key
+
+    Yields:
+        dict: Parsed records
+
+    Raises:
+        ClientError: If the download fails
+        json.JSONDecodeError: If the payload is not valid JSON
+    """
+    try:
+        yield from stream_records(s3_client, bucket, key)
+
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        if error_code == 'NoSuchKey':
+            print(f"ERROR: S3 object not found: {key}")
+        elif error_code == 'AccessDenied':
+            print(f"ERROR: Access denied to S3 object: {key}")
+        raise
+
+    except json.JSONDecodeError as e:
+        print(f"ERROR: Invalid JSON in {key}: {str(e)}")
+        raise
+
+
+def validate_metrics(metrics):
+    """
+    Validate a slice of metrics and keep the valid ones.
+
+    The slice is checked column-wise and timestamp/value are coerced with
+    one NumPy conversion each. Rejected records are summarised in a single
+    warning per slice.
+
+    Args:
+        metrics: List of metric dictionaries
+
+    Returns:
+        list: Validated metrics
+    """
+    validated, result = filter_valid(metrics)
+
+    if result.failures:
+        reasons = ', '.join(f"{reason}={count}" for reason, count in sorted(result.failures.items()))
+        print(f"WARNING: Skipping {result.invalid_count} of {len(metrics)} invalid metrics ({reasons})")
+
+    return validated
+
+
+def metric_key(metric):
+    """Raw table key of a validated metric, as strings."""
+    return str(metric['metric_id']), str(metric['timestamp'])
+
+
+def item_key(item):
+    """Raw table key of an encoded item (AttributeValue form), as strings."""
+    return item['metric_id']['S'], item['timestamp']['N']
+
+
+def failed_metrics(metrics, failed_items):
+    """
+    Map items that were never written back to the metrics they were encoded from.
+
+    Items with the same key collapse into one request, so the last metric
+    with a failed key is returned, as it is the one that was sent.
+
+    Args:
+        metrics: Validated metrics of one write
+        failed_items: WriteResult.failed_items of that write
+
+    Returns:
+        list: Validated metric dictionaries, one per failed item
+    """
+    by_key = {metric_key(metric): metric for metric in metrics}
+    return [by_key[item_key(item)] for item in failed_items]
+
+
+class ObjectProcessor:
+    """
+    Runs every stage for S3 objects or inline metrics of one invocation.
+
+    Args:
+        dynamodb_client: Low-level boto3 DynamoDB client
+        s3_client: boto3 S3 client
+        table_name: Raw metrics table
+        encoder_factory: Callable returning the item encoder for the raw table
+        region: Default region of Parquet rows
+        stages: StageConfig of the optional stages
+        batch_size: Records validated and written at once
+        write_concurrency: DynamoDB requests in flight
+        max_retries: Retries per item or request
+        retry_budget: Optional RetryBudget shared with the invocation
+        parquet_sink: Optional ParquetSink of the invocation
+        ledger: Optional IngestionLedger of the invocation
+        dead_letters: Optional DeadLetterWriter of the invocation
+        instrumentation: Optional Instrumentation of the invocation
+        detection: Optional DetectionEngine that outlives the invocation
+        compacted_chunks: Set of chunk hours the container already compacted
+        redelivered: True when failed objects are redelivered by the event
+            source, so their failed items are not sent to the DLQ and a
+            partially written object merges no rollups or sketches
+    """
+
+    def __init__(self, dynamodb_client, s3_client, table_name, encoder_factory, region, stages=None,
+                 batch_size=DEFAULT_BATCH_SIZE, write_concurrency=4, max_retries=MAX_RETRIES, retry_budget=None,
+                 parquet_sink=None, ledger=None, dead_letters=None, instrumentation=None, detection=None,
+                 compacted_chunks=None, redelivered=False):
+        self.dynamodb_client = dynamodb_client
+        self.s3_client = s3_client
+        self.table_name = table_name
+        self.encoder_factory = encoder_factory
+        self.region = region
+        self.stages = stages or StageConfig()
+        self.batch_size = batch_size
+        self.write_concurrency = write_concurrency
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.parquet_sink = parquet_sink
+        self.ledger = ledger
+        self.dead_letters = dead_letters
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
+        self.detection = detection
+        self.compacted_chunks = compacted_chunks if compacted_chunks is not None else set()
+        self.redelivered = redelivered
+
+    def process_s3_record(self, record, summary):
+        """
+        Run every stage for one S3 event record.
+
+        Args:
+            record: S3 event record
+            summary: Processing summary dictionary to update
+
+        Raises:
+            ValueError: If the object holds no metrics
+        """
+        instrumentation = self.instrumentation
+        bucket_name = record['s3']['bucket']['name']
+        object_key = record['s3']['object']['key']
+
+        # Skip object versions that were already fully processed
+        ledger_id = object_id(record) if self.ledger is not None else None
+        if ledger_id:
+            with instrumentation.span('ledger'):
+                duplicate = self.ledger.is_processed(ledger_id)
+            if duplicate:
+                print(f"Skipping duplicate delivery: s3://{bucket_name}/{object_key}")
+                summary['duplicate_files'] += 1
+                return
+
+        print(f"Processing: s3://{bucket_name}/{object_key}")
+
+        # Records stream from S3 in bounded slices, so memory use depends on
+        # the slice size rather than the object size
+        metrics_count = 0
+        success_count = 0
+        retried_count = 0
+        failure_count = 0
+
+        # Aggregates for the whole object, committed once after the last slice
+        rollups = self.create_rollups()
+        latest = self.create_latest_values()
+        chunks = self.create_chunks()
+        sketches = self.create_sketches()
+        parquet_rows = [] if self.parquet_sink is not None else None
+
+        # Download, decompression and parsing are interleaved, so they are timed
+        # together as the time spent producing each slice. The payload shape
+        # (flat records or metric envelopes) is sniffed from the first record.
+        with instrumentation.span('download_parse'):
+            decoder, records = decode_records(download_records(self.s3_client, bucket_name, object_key))
+        if decoder is not None:
+            summary['decoders'][decoder] = summary['decoders'].get(decoder, 0) + 1
+
+        slices = instrumentation.iterate('download_parse', iter_batches(records, self.batch_size))
+
+        for metrics in slices:
+            metrics_count += len(metrics)
+            summary['total_metrics'] += len(metrics)
+
+            with instrumentation.span('validate'):
+                validated_metrics = validate_metrics(metrics)
+            summary['invalid_metrics'] += len(metrics) - len(validated_metrics)
+
+            # Check rules and detectors before anything is written
+            self.detect(validated_metrics, summary)
+
+            result = self.write(validated_metrics)
+            # Redelivered objects are retried as a whole, so their failed items skip the DLQ
+            # The DLQ carries the metrics as they were received, so they can be replayed as input
+            if result.failed_items and self.dead_letters is not None and not self.redelivered:
+                self.dead_letters.add_items(failed_metrics(validated_metrics, result.failed_items))
+                print(f"Queued {len(result.failed_items)} failed metrics for DLQ")
+
+            for accumulator in (latest, chunks):
+                if accumulator is not None:
+                    accumulator.fold(validated_metrics)
+
+            # Rollups, sketches and Parquet rows only take the points that were
+            # written; failed ones reach them when they are redelivered or
+            # replayed from the DLQ
+            written = validated_metrics
+            if result.failed_items:
+                failed_keys = {item_key(item) for item in result.failed_items}
+                written = [metric for metric in validated_metrics if metric_key(metric) not in failed_keys]
+            for accumulator in (rollups, sketches):
+                if accumulator is not None:
+                    accumulator.fold(written)
+            if parquet_rows is not None:
+                parquet_rows.extend(written)
+
+            success_count += result.succeeded
+            retried_count += result.retried
+            failure_count += result.failed
+            summary['successful_writes'] += result.succeeded
+            summary['retried_writes'] += result.retried
+            summary['failed_writes'] += result.failed
+
+        if metrics_count == 0:
+            raise ValueError(f"No valid metrics found in {object_key}")
+
+        # Segments and latest values are idempotent and simply rewritten on a retry.
+        # With chunk_only a failed chunk leaves the object out of the ledger, so it is retried
+        chunk_result = self.commit_chunks(chunks, summary)
+        stage_failures = len(chunk_result.failed) if chunk_result is not None else 0
+        if self.stages.chunk_only and chunk_result is not None:
+            success_count += chunk_result.points
+            failure_count += chunk_result.failed_points
+        stage_failures += self.commit_latest_values(latest, summary)
+
+        # Rollups, sketches and Parquet rows add to what is stored, so an earlier
+        # incomplete attempt's progress limits them to what it left pending
+        progress = self.ledger.progress(ledger_id) if ledger_id else {}
+        for stage, accumulator in (('rollups', rollups), ('sketches', sketches)):
+            if accumulator is not None and stage in progress:
+                accumulator.retain(progress[stage])
+        if 'parquet' in progress:
+            parquet_rows = None
+
+        pending = {}
+        # A redelivered object that was partially written is retried in full and
+        # would add its points again, so it only adds rollups, sketches and
+        # Parquet rows on the attempt that writes everything. Any other object
+        # adds its written points now; with chunk_only those include the points
+        # of a segment that failed to append, which nothing writes again.
+        merge = failure_count == 0 or not self.redelivered
+        for stage, accumulator, commit in (('rollups', rollups, self.commit_rollups),
+                                           ('sketches', sketches, self.commit_sketches)):
+            if accumulator is not None and merge:
+                pending[stage] = commit(accumulator, summary)
+            elif accumulator is not None and len(accumulator):
+                print(f"Skipping {stage} of partially written object s3://{bucket_name}/{object_key}")
+        if parquet_rows and merge:
+            if self.add_to_parquet_sink(parquet_rows, summary):
+                pending['parquet'] = []
+            else:
+                stage_failures += 1
+
+        # Only objects with every write and stage done are recorded, so anything
+        # else is retried; the retry skips the merge stages already applied
+        if ledger_id:
+            complete = failure_count == 0 and stage_failures == 0 and not any(pending.values())
+            with instrumentation.span('ledger'):
+                if complete:
+                    self.ledger.commit(ledger_id, metrics=metrics_count)
+                elif pending or progress:
+                    self.ledger.record_progress(ledger_id, dict(progress, **pending))
+
+        print(f"Processed {metrics_count} metrics: {success_count} succeeded, "
+              f"{retried_count} retried, {failure_count} failed")
+
+    def process_inline_metrics(self, metrics, owners, summary):
+        """
+        Run every stage for the inline metrics of a batch.
+
+        Items that were never written are mapped back to the messages that
+        carried them; those messages are redelivered, so the items skip the
+        DLQ and their points are left out of the rollups.
+
+        Args:
+            metrics: Decoded metric records from every message
+            owners: Message identifier of each metric
+            summary: Processing summary dictionary to update
+
+        Returns:
+            set: Identifiers of messages with metrics that failed to write
+        """
+        failed_ids = set()
+        if not metrics:
+            return failed_ids
+
+        rollups = self.create_rollups()
+        latest = self.create_latest_values()
+        chunks = self.create_chunks()
+        sketches = self.create_sketches()
+        chunk_owners = {}
+        accepted = []  # validated slices and their owners, merged once failed messages are known
+
+        for start in range(0, len(metrics), self.batch_size):
+            batch = metrics[start:start + self.batch_size]
+            owner_by_record = {id(metric): owner for metric, owner in zip(batch, owners[start:start + self.batch_size])}
+            summary['total_metrics'] += len(batch)
+
+            with self.instrumentation.span('validate'):
+                validated_metrics = validate_metrics(batch)
+            summary['invalid_metrics'] += len(batch) - len(validated_metrics)
+
+            self.detect(validated_metrics, summary)
+
+            if rollups is not None or sketches is not None or self.parquet_sink is not None:
+                accepted.append((validated_metrics, [owner_by_record[id(metric)] for metric in validated_metrics]))
+
+            for accumulator in (latest, chunks):
+                if accumulator is not None:
+                    accumulator.fold(validated_metrics)
+
+            # Chunks are the only copy: remember which messages fed each chunk
+            if self.stages.chunk_only:
+                for metric in validated_metrics:
+                    chunk_key = (metric['hostname'], metric['metric_type'], chunk_start(metric['timestamp']))
+                    chunk_owners.setdefault(chunk_key, set()).add(owner_by_record[id(metric)])
+                continue
+
+            result = self.write(validated_metrics)
+
+            summary['successful_writes'] += result.succeeded
+            summary['retried_writes'] += result.retried
+            summary['failed_writes'] += result.failed
+
+            for metric in failed_metrics(validated_metrics, result.failed_items):
+                failed_ids.add(owner_by_record[id(metric)])
+
+        # Appending is idempotent, so messages behind a failed chunk are simply redelivered
+        chunk_result = self.commit_chunks(chunks, summary)
+        if self.stages.chunk_only and chunk_result is not None:
+            for chunk_key in chunk_result.failed:
+                failed_ids.update(chunk_owners[chunk_key])
+
+        # Failed messages are redelivered and added then, so rollups, sketches
+        # and Parquet rows only take the others
+        for validated_metrics, metric_owners in accepted:
+            written = [metric for metric, owner in zip(validated_metrics, metric_owners) if owner not in failed_ids]
+            for accumulator in (rollups, sketches):
+                if accumulator is not None:
+                    accumulator.fold(written)
+            self.add_to_parquet_sink(written, summary)
+        self.commit_rollups(rollups, summary)
+        self.commit_sketches(sketches, summary)
+        self.commit_latest_values(latest, summary)
+
+        return failed_ids
+
+    def detect(self, metrics, summary):
+        """
+        Check validated metrics against the detection rules and detectors.
+
+        Alerts are queued on the engine; the processor publishes them.
+
+        Args:
+            metrics: Validated metrics
+            summary: Processing summary dictionary to update
+        """
+        if self.detection is None or not self.detection.enabled or not metrics:
+            return
+
+        with self.instrumentation.span('detect'):
+            summary['alerts'] += self.detection.evaluate(metrics)
+
+    def add_to_parquet_sink(self, metrics, summary):
+        """
+        Buffer written metrics in the Parquet sink when it is enabled.
+
+        Args:
+            metrics: Validated metrics whose writes succeeded
+            summary: Processing summary dictionary to update
+
+        Returns:
+            bool: False if a partition that filled up failed to upload
+        """
+        if self.parquet_sink is None:
+            return True
+
+        try:
+            with self.instrumentation.span('parquet'):
+                summary['parquet_files'] += len(self.parquet_sink.add(metrics, self.region))
+        except Exception as e:
+            error_msg = f"Failed to write Parquet partition: {str(e)}"
+            print(f"ERROR: {error_msg}")
+            summary['errors'].append(error_msg)
+            return False
+        return True
+
+    def write(self, metrics):
+        """
+        Write validated metrics to the raw table with parallel BatchWriteItem calls.
+
+        Only the items DynamoDB reports as unprocessed are retried, with
+        jittered backoff, until the invocation's retry budget runs out. With
+        ``chunk_only`` nothing is written: the points only go to the chunks.
+
+        Args:
+            metrics: Validated metrics
+
+        Returns:
+            WriteResult: Per-item outcome, including the items that failed
+        """
+        if self.stages.chunk_only:
+            return WriteResult()
+
+        with self.instrumentation.span('write'):
+            return write_metrics(
+                self.dynamodb_client,
+                self.table_name,
+                metrics,
+                self.encoder_factory(),
+                concurrency=self.write_concurrency,
+                max_retries=self.max_retries,
+                retry_budget=self.retry_budget
+            )
+
+    def create_rollups(self):
+        """Rollup accumulator for one object, or None when the stage is disabled."""
+        if not self.stages.rollup_table:
+            return None
+        return RollupAccumulator(self.stages.rollup_resolutions)
+
+    def create_latest_values(self):
+        """Latest-value tracker for one object, or None when the stage is disabled."""
+        return LatestValueTracker() if self.stages.latest_table else None
+
+    def create_chunks(self):
+        """Chunk accumulator for one object, or None when the stage is disabled."""
+        return ChunkAccumulator() if self.stages.chunk_table else None
+
+    def create_sketches(self):
+        """Sketch accumulator for one object, or None when the stage is disabled."""
+        if not self.stages.sketch_table:
+            return None
+        return SketchAccumulator(self.stages.sketch_resolutions, relative_accuracy=self.stages.sketch_accuracy)
+
+    def commit_chunks(self, chunks, summary):
+        """
+        Append an object's points to their hourly compressed chunks.
+
+        With ``chunk_only`` the chunks are the only copy of the points, so
+        their points count as successful or failed writes.
+
+        Args:
+            chunks: ChunkAccumulator, or None when the stage is disabled
+            summary: Processing summary dictionary to update
+
+        Returns:
+            ChunkCommitResult or None: Outcome, or None when there was nothing to append
+        """
+        if chunks is None or not len(chunks):
+            return None
+
+        with self.instrumentation.span('chunks'):
+            result = chunks.commit(
+                self.dynamodb_client,
+                self.stages.chunk_table,
+                concurrency=self.write_concurrency,
+                ttl_days=self.stages.chunk_ttl_days,
+                retry_budget=self.retry_budget
+            )
+        summary['chunk_updates'] += result.committed
+        summary['chunk_failures'] += len(result.failed)
+        if self.stages.chunk_only:
+            summary['successful_writes'] += result.points
+            summary['failed_writes'] += result.failed_points
+        if result.failed:
+            summary['errors'].append(f"Failed to append {len(result.failed)} chunk segments")
+        if self.stages.chunk_compact:
+            self.compact_previous_chunks(result.written, summary)
+        return result
+
+    def compact_previous_chunks(self, written, summary):
+        """
+        Fold the segments of the hour before each written chunk into its merged chunk.
+
+        A series writing into a new hour has usually closed the previous one, so
+        each series and hour is compacted once per warm container: one Query,
+        plus a PutItem and the segment deletes when segments are pending.
+        Failures are only reported; the segments stay readable and are folded
+        the next time.
+
+        Args:
+            written: (hostname, metric_type, chunk_start) of the segments just written
+            summary: Processing summary dictionary to update
+        """
+        if len(self.compacted_chunks) > COMPACTED_CHUNKS_LIMIT:
+            self.compacted_chunks.clear()
+
+        with self.instrumentation.span('chunk_compaction'):
+            for hostname, metric_type, start in written:
+                key = (hostname, metric_type, start - CHUNK_SECONDS)
+                if key in self.compacted_chunks:
+                    continue
+                try:
+                    stats = compact_chunks(
+                        self.dynamodb_client,
+                        self.stages.chunk_table,
+                        hostname,
+                        metric_type,
+                        key[2],
+                        start,
+                        ttl_days=self.stages.chunk_ttl_days,
+                        retry_budget=self.retry_budget
+                    )
+                except ClientError as e:
+                    summary['errors'].append(f"Chunk compaction failed for {hostname}/{metric_type}: "
+                                             f"{e.response['Error']['Code']}")
+                    continue
+                self.compacted_chunks.add(key)
+                summary['chunk_compactions'] += stats['hours']
+
+    def commit_rollups(self, rollups, summary):
+        """
+        Merge an object's aggregates into the rollup table.
+
+        Each (host, metric_type, window) aggregate is one atomic UpdateItem, so
+        late data and concurrent invocations merge into the same windows.
+        Updates add counts and sums, so callers only commit the aggregates of
+        fully written objects or messages. Failures are recorded in the
+        summary; the raw metrics are already written and remain the system of
+        record.
+
+        Args:
+            rollups: RollupAccumulator, or None when the stage is disabled
+            summary: Processing summary dictionary to update
+
+        Returns:
+            list: Keys of the windows that were not updated
+        """
+        if rollups is None or not len(rollups):
+            return []
+
+        with self.instrumentation.span('rollups'):
+            committed, failed = rollups.commit(
+                self.dynamodb_client,
+                self.stages.rollup_table,
+                concurrency=self.write_concurrency,
+                ttl_days=self.stages.rollup_ttl_days,
+                retry_budget=self.retry_budget
+            )
+        summary['rollup_updates'] += committed
+        summary['rollup_failures'] += len(failed)
+        if failed:
+            summary['errors'].append(f"Failed to update {len(failed)} rollup windows")
+        return failed
+
+    def commit_sketches(self, sketches, summary):
+        """
+        Merge an object's quantile sketches into their stored windows.
+
+        Each window is read, merged and written back conditionally on its
+        version, so concurrent invocations never drop each other's points.
+        Merging is not idempotent, so callers only commit the sketches of
+        fully written objects or messages, like rollups. Failures are
+        recorded in the summary; the raw metrics remain the system of
+        record.
+
+        Args:
+            sketches: SketchAccumulator, or None when the stage is disabled
+            summary: Processing summary dictionary to update
+
+        Returns:
+            list: Keys of the windows that were not merged
+        """
+        if sketches is None or not len(sketches):
+            return []
+
+        with self.instrumentation.span('sketches'):
+            committed, failed = sketches.commit(
+                self.dynamodb_client,
+                self.stages.sketch_table,
+                concurrency=self.write_concurrency,
+                ttl_days=self.stages.sketch_ttl_days,
+                retry_budget=self.retry_budget
+            )
+        summary['sketch_updates'] += committed
+        summary['sketch_failures'] += len(failed)
+        if failed:
+            summary['errors'].append(f"Failed to merge {len(failed)} sketch windows")
+        return failed
+
+    def commit_latest_values(self, latest, summary):
+        """
+        Update the latest-value item of every series seen in an object.
+
+        Writes are conditional on the stored timestamp being older, so replayed
+        or late objects are counted as stale instead of overwriting newer values.
+
+        Args:
+            latest: LatestValueTracker, or None when the stage is disabled
+            summary: Processing summary dictionary to update
+
+        Returns:
+            int: Number of items that were not updated
+        """
+        if latest is None or not len(latest):
+            return 0
+
+        with self.instrumentation.span('latest_values'):
+            updated, stale, failed = latest.commit(
+                self.dynamodb_client,
+                self.stages.latest_table,
+                concurrency=self.write_concurrency,
+                retry_budget=self.retry_budget
+            )
+        summary['latest_updates'] += updated
+        summary['latest_stale'] += stale
+        if failed:
+            summary['errors'].append(f"Failed to update {failed} latest-value items")
+        return failed
@@ -0,0 +1,171 @@
+"""
+Hive-partitioned Parquet output for Athena.
+
+Validated metrics are buffered per ``dt=YYYY-MM-DD/hour=HH/metric_type=X``
+partition (UTC, from each metric's own timestamp) and written as Parquet
+files so Athena can prune partitions and read only the columns a query
+needs. A partition is flushed when it reaches ``max_rows`` and everything
+left is flushed at the end of the invocation.
+
+pyarrow is an optional dependency; it is only imported when a sink is
+created, so functions that leave the sink disabled do not need it.
+"""
+
+import io
+import threading
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+DEFAULT_PREFIX = 'parquet/metrics'
+DEFAULT_MAX_ROWS = 100000  # rows buffered per partition before a flush
+DEFAULT_ROW_GROUP_SIZE = 50000
+DEFAULT_COMPRESSION = 'snappy'
+
+# Columns stored in each file; partition columns live in the key only
+COLUMNS = ('metric_id', 'timestamp', 'hostname', 'value', 'unit', 'region', 'environment')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("The Parquet sink requires the 'pyarrow' package") from e
+    return pyarrow, pyarrow.parquet
+
+
+def partition_path(timestamp, metric_type):
+    """
+    Build the Hive partition path for one metric.
+
+    Args:
+        timestamp: Epoch seconds
+        metric_type: Metric type name
+
+    Returns:
+        str: e.g. ``dt=2026-02-01/hour=20/metric_type=cpu``
+    """
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return (f"dt={moment:%Y-%m-%d}/hour={moment:%H}/"
+            f"metric_type={quote(str(metric_type), safe='')}")
+
+
+class ParquetSink:
+    """
+    Buffer validated metrics and write them to S3 as partitioned Parquet.
+
+    Safe to share between the worker threads of one invocation.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Destination bucket
+        prefix: Key prefix the partitions are created under
+        max_rows: Rows buffered per partition before it is flushed
+        row_group_size: Maximum rows per Parquet row group
+        compression: Parquet column compression codec
+    """
+
+    def __init__(self, s3_client, bucket, prefix=DEFAULT_PREFIX, max_rows=DEFAULT_MAX_ROWS,
+                 row_group_size=DEFAULT_ROW_GROUP_SIZE, compression=DEFAULT_COMPRESSION):
+        self.pa, self.pq = _require_pyarrow()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.max_rows = max_rows
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = self.pa.schema([
+            ('metric_id', self.pa.string()),
+            ('timestamp', self.pa.int64()),
+            ('hostname', self.pa.string()),
+            ('value', self.pa.float64()),
+            ('unit', self.pa.string()),
+            ('region', self.pa.string()),
+            ('environment', self.pa.string()),
+        ])
+        self.files_written = 0
+        self.rows_written = 0
+        self._buffers = {}
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def add(self, metrics, default_region='unknown'):
+        """
+        Buffer validated metrics, flushing any partition that fills up.
+
+        Args:
+            metrics: Validated metric dictionaries (int timestamp, float value)
+            default_region: Region recorded for metrics that carry none
+
+        Returns:
+            list: S3 keys written by threshold flushes
+        """
+        full = []
+        with self._lock:
+            for metric in metrics:
+                # Partition paths only change per hour and metric type
+                hour = metric['timestamp'] // 3600
+                path_key = (hour, metric['metric_type'])
+                path = self._paths.get(path_key)
+                if path is None:
+                    path = self._paths[path_key] = partition_path(hour * 3600, metric['metric_type'])
+
+                columns = self._buffers.get(path)
+                if columns is None:
+                    columns = self._buffers[path] = {name: [] for name in COLUMNS}
+
+                columns['metric_id'].append(str(metric['metric_id']))
+                columns['timestamp'].append(metric['timestamp'])
+                columns['hostname'].append(str(metric['hostname']))
+                columns['value'].append(metric['value'])
+                columns['unit'].append(str(metric.get('unit', 'unknown')))
+                columns['region'].append(str(metric.get('region', default_region)))
+                columns['environment'].append(str(metric.get('environment', 'unknown')))
+
+                if len(columns['metric_id']) >= self.max_rows:
+                    full.append((path, self._buffers.pop(path)))
+
+        return [self._write(path, columns) for path, columns in full]
+
+    def flush(self):
+        """
+        Write every buffered partition.
+
+        Returns:
+            list: S3 keys written
+        """
+        with self._lock:
+            pending, self._buffers = self._buffers, {}
+        return [self._write(path, columns) for path, columns in pending.items()]
+
+    @property
+    def buffered_rows(self):
+        with self._lock:
+            return sum(len(columns['metric_id']) for columns in self._buffers.values())
+
+    def _write(self, path, columns):
+        """Encode one partition buffer as Parquet and upload it."""
+        table = self.pa.Table.from_pydict(columns, schema=self.schema)
+
+        buffer = io.BytesIO()
+        self.pq.write_table(
+            table, buffer,
+            row_group_size=self.row_group_size,
+            compression=self.compression
+        )
+
+        key = f"{self.prefix}/{path}/part-{uuid.uuid4().hex}.parquet"
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=buffer.getvalue(),
+            ContentType='application/vnd.apache.parquet'
+        )
+
+        with self._lock:
+            self.files_written += 1
+            self.rows_written += table.num_rows
+
+        print(f"Wrote {table.num_rows} rows to s3://{self.bucket}/{key}")
+        return key
@@ -0,0 +1,257 @@
+"""
+Incremental min/max/sum/count rollups maintained at ingest time.
+
+Each validated batch is folded in memory into per
+``(hostname, metric_type, resolution, window_start)`` aggregates, and each
+aggregate is committed with one atomic ``UpdateItem``:
+
+    ADD  #count :count, #sum :sum
+    SET  #min = if_not_exists(#min, :min), #max = if_not_exists(#max, :max)
+
+``ADD`` makes count and sum commutative, so late or out-of-order data merges
+into the right window whenever it arrives. DynamoDB has no ``min()`` in
+update expressions, so the stored extremes come back with the update and, in
+the rare case this batch beats them, a follow-up conditional ``SET`` lowers
+(or raises) them. The condition keeps that monotonic under concurrency.
+
+Rollup table layout:
+    series (S, HASH):      ``{hostname}#{metric_type}#{resolution}``
+    window_start (N, RANGE): Epoch second the window starts at
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.dynamodb_writer import call_with_retry
+from pipeline_common.item_encoder import number_value, ttl_timestamp
+
+RESOLUTIONS = {'1m': 60, '1h': 3600}
+DEFAULT_RESOLUTIONS = ('1m', '1h')
+DEFAULT_TTL_DAYS = 90
+
+
+def parse_resolutions(value):
+    """
+    Parse a comma-separated resolution list from configuration.
+
+    Args:
+        value: e.g. ``"1m,1h"``
+
+    Returns:
+        tuple: Resolution names
+
+    Raises:
+        ValueError: If a resolution is not in RESOLUTIONS
+    """
+    names = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in names if name not in RESOLUTIONS]
+    if unknown:
+        raise ValueError(f"Unsupported rollup resolution(s): {', '.join(unknown)}")
+    return names
+
+
+def series_key(hostname, metric_type, resolution):
+    """Partition key of a rollup series."""
+    return f"{hostname}#{metric_type}#{resolution}"
+
+
+class RollupAccumulator:
+    """
+    In-memory aggregates for one file or invocation.
+
+    Args:
+        resolutions: Resolution names to maintain (keys of RESOLUTIONS)
+    """
+
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS):
+        self.resolutions = tuple((name, RESOLUTIONS[name]) for name in resolutions)
+        self.aggregates = {}
+
+    def __len__(self):
+        return len(self.aggregates)
+
+    def retain(self, keys):
+        """
+        Drop every aggregate whose key is not in ``keys``.
+
+        Args:
+            keys: Keys still to commit, e.g. the ones a failed attempt left pending
+        """
+        self.aggregates = {key: value for key, value in self.aggregates.items() if key in keys}
+
+    def fold(self, metrics):
+        """
+        Fold validated metrics into the aggregates.
+
+        Args:
+            metrics: Validated metrics (int ``timestamp``, float ``value``)
+        """
+        aggregates = self.aggregates
+        resolutions = self.resolutions
+
+        for metric in metrics:
+            timestamp = metric['timestamp']
+            value = metric['value']
+            hostname = metric['hostname']
+            metric_type = metric['metric_type']
+
+            for name, seconds in resolutions:
+                key = (hostname, metric_type, name, timestamp - timestamp % seconds)
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregates[key] = [1, value, value, value]
+                else:
+                    aggregate[0] += 1
+                    aggregate[1] += value
+                    if value < aggregate[2]:
+                        aggregate[2] = value
+                    if value > aggregate[3]:
+                        aggregate[3] = value
+
+    def commit(self, client, table_name, concurrency=4, ttl_days=DEFAULT_TTL_DAYS, retry_budget=None):
+        """
+        Commit every aggregate with one UpdateItem each, then reset.
+
+        Args:
+            client: Low-level boto3 DynamoDB client
+            table_name: Rollup table name
+            concurrency: UpdateItem calls in flight at once
+            ttl_days: Retention for rollup items
+            retry_budget: Optional RetryBudget shared with the invocation
+
+        Returns:
+            tuple: (committed_count, failed_keys)
+        """
+        aggregates, self.aggregates = self.aggregates, {}
+        if not aggregates:
+            return 0, []
+
+        ttl = {'N': str(ttl_timestamp(ttl_days))}
+
+        def commit_one(entry):
+            key, aggregate = entry
+            return _commit_aggregate(client, table_name, key, aggregate, ttl, retry_budget)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            results = list(executor.map(commit_one, aggregates.items()))
+
+        failed = [key for key, committed in zip(aggregates, results) if not committed]
+        return len(results) - len(failed), failed
+
+
+def _commit_aggregate(client, table_name, key, aggregate, ttl, retry_budget):
+    """
+    Merge one aggregate into its stored window.
+
+    Returns:
+        bool: True when the aggregate was committed
+    """
+    hostname, metric_type, resolution, window_start = key
+    count, total, minimum, maximum = aggregate
+    item_key = {
+        'series': {'S': series_key(hostname, metric_type, resolution)},
+        'window_start': {'N': str(window_start)}
+    }
+
+    try:
+        response = call_with_retry(
+            client.update_item,
+            retry_budget=retry_budget,
+            TableName=table_name,
+            Key=item_key,
+            UpdateExpression=(
+                'ADD #count :count, #sum :sum '
+                'SET #min = if_not_exists(#min, :min), #max = if_not_exists(#max, :max), '
+                'hostname = :hostname, metric_type = :metric_type, #ttl = :ttl'
+            ),
+            ExpressionAttributeNames={
+                '#count': 'count', '#sum': 'sum', '#min': 'min', '#max': 'max', '#ttl': 'ttl'
+            },
+            ExpressionAttributeValues={
+                ':count': {'N': str(count)},
+                ':sum': number_value(total),
+                ':min': number_value(minimum),
+                ':max': number_value(maximum),
+                ':hostname': {'S': str(hostname)},
+                ':metric_type': {'S': str(metric_type)},
+                ':ttl': ttl
+            },
+            ReturnValues='UPDATED_NEW'
+        )
+    except ClientError as e:
+        print(f"ERROR: Rollup update failed for {item_key['series']['S']}: {e.response['Error']['Code']}")
+        return False
+
+    stored = response.get('Attributes', {})
+    if 'min' in stored and float(stored['min']['N']) > minimum:
+        _tighten_extreme(client, table_name, item_key, '#min', 'min', '>', minimum, retry_budget)
+    if 'max' in stored and float(stored['max']['N']) < maximum:
+        _tighten_extreme(client, table_name, item_key, '#max', 'max', '<', maximum, retry_budget)
+
+    return True
+
+
+def _tighten_extreme(client, table_name, item_key, placeholder, attribute, comparison, value, retry_budget):
+    """Conditionally replace a stored min/max that this batch beats."""
+    try:
+        call_with_retry(
+            client.update_item,
+            retry_budget=retry_budget,
+            TableName=table_name,
+            Key=item_key,
+            UpdateExpression=f'SET {placeholder} = :value',
+            ConditionExpression=f'{placeholder} {comparison} :value',
+            ExpressionAttributeNames={placeholder: attribute},
+            ExpressionAttributeValues={':value': number_value(value)}
+        )
+    except ClientError as e:
+        # Another writer already stored a more extreme value
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"WARNING: Failed to update rollup {attribute}: {e.response['Error']['Code']}")
+
+
+def query_rollups(client, table_name, hostname, metric_type, resolution, start, end):
+    """
+    Read the aggregates of one series between two times.
+
+    Cost is one paginated Query over the windows in range, independent of
+    how many raw points they summarise.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Rollup table name
+        hostname: Host to read
+        metric_type: Metric type to read
+        resolution: Resolution name (e.g. ``'1h'``)
+        start: Inclusive epoch second
+        end: Exclusive epoch second
+
+    Returns:
+        list: Dicts with window_start, count, sum, min, max and avg
+    """
+    paginator = client.get_paginator('query')
+    pages = paginator.paginate(
+        TableName=table_name,
+        KeyConditionExpression='series = :series AND window_start BETWEEN :start AND :end',
+        ExpressionAttributeValues={
+            ':series': {'S': series_key(hostname, metric_type, resolution)},
+            ':start': {'N': str(start)},
+            ':end': {'N': str(end - 1)}
+        }
+    )
+
+    windows = []
+    for page in pages:
+        for item in page.get('Items', []):
+            count = int(item['count']['N'])
+            total = float(item['sum']['N'])
+            windows.append({
+                'window_start': int(item['window_start']['N']),
+                'count': count,
+                'sum': total,
+                'min': float(item['min']['N']),
+                'max': float(item['max']['N']),
+                'avg': total / count if count else None
+            })
+    return windows
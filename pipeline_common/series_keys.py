@@ -0,0 +1,262 @@
+"""
+Time-bucketed series key layout.
+
+``InfraMetrics`` is keyed by ``metric_id`` (``{type}-{ts}-{host}`` or
+``{name}#{instance}#{ts}``), so every point is its own partition and one
+host's series can only be read through ``metric_type-timestamp-index``
+with a filter. The series layout keys items by
+
+    series (S, HASH):   {hostname}#{metric_type}#{YYYY-MM-DD}[#{shard}]
+    timestamp (N, RANGE)
+
+so a day of one series is a single partition and a per-host range read is
+one ``Query`` per day. ``metric_id`` and every other attribute are kept, so
+the GSI and existing consumers keep working.
+
+Hot hosts can spread a day over several partitions: with N shards, a point
+goes to shard ``crc32(timestamp) % N``. The shard depends only on the
+point, so rewrites and migrations land on the same item, and readers query
+all N shards. Shard counts come from a ``ShardMap`` that writers and
+readers must share (``SERIES_SHARDS`` / ``SERIES_HOT_HOSTS``).
+"""
+
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from pipeline_common.dynamodb_writer import call_with_retry
+from pipeline_common.item_encoder import DEFAULT_TTL_DAYS, SECONDS_PER_DAY, ItemEncoder
+from pipeline_common.metric_query import QueryResult
+
+LAYOUTS = ('metric_id', 'series')
+SERIES_KEY_ATTRIBUTES = ('series', 'timestamp')
+
+
+class ShardMap:
+    """
+    Write shards per host.
+
+    Args:
+        default: Shards for hosts without an override
+        overrides: Optional dict of hostname -> shard count for hot hosts
+    """
+
+    def __init__(self, default=1, overrides=None):
+        if default < 1 or any(count < 1 for count in (overrides or {}).values()):
+            raise ValueError("Shard counts must be at least 1")
+        self.default = default
+        self.overrides = dict(overrides or {})
+
+    def shards(self, hostname):
+        return self.overrides.get(hostname, self.default)
+
+    def __repr__(self):
+        return f"ShardMap(default={self.default}, overrides={self.overrides})"
+
+
+def parse_shard_map(default='1', hot_hosts=''):
+    """
+    Build a ShardMap from environment-style strings.
+
+    Args:
+        default: Default shard count, e.g. ``"1"``
+        hot_hosts: Comma-separated ``hostname=shards`` pairs, e.g. ``"db-01=8,db-02=4"``
+
+    Returns:
+        ShardMap
+
+    Raises:
+        ValueError: If an entry is malformed
+    """
+    overrides = {}
+    for entry in (hot_hosts or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        hostname, separator, count = entry.rpartition('=')
+        if not separator or not hostname:
+            raise ValueError(f"Invalid hot host entry: {entry} (expected hostname=shards)")
+        overrides[hostname] = int(count)
+    return ShardMap(int(default or 1), overrides)
+
+
+def validate_layout(layout):
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unsupported key layout: {layout} (expected one of {', '.join(LAYOUTS)})")
+    return layout
+
+
+@lru_cache(maxsize=4096)
+def day_bucket(day_number):
+    """Format a UTC day number (epoch seconds // 86400) as ``YYYY-MM-DD``."""
+    return time.strftime('%Y-%m-%d', time.gmtime(day_number * SECONDS_PER_DAY))
+
+
+def shard_of(timestamp, shards):
+    """Stable shard of a point; always 0 for an unsharded series."""
+    if shards <= 1:
+        return 0
+    return zlib.crc32(str(int(timestamp)).encode('ascii')) % shards
+
+
+def series_key(hostname, metric_type, timestamp, shards=1):
+    """
+    Build the partition key of one point.
+
+    Args:
+        hostname: Host name
+        metric_type: Metric type
+        timestamp: Epoch seconds
+        shards: Write shards of the host (1 = unsharded)
+
+    Returns:
+        str: e.g. ``host-001#cpu#2026-01-15`` or ``host-001#cpu#2026-01-15#3``
+    """
+    key = f"{hostname}#{metric_type}#{day_bucket(int(timestamp) // SECONDS_PER_DAY)}"
+    if shards > 1:
+        key += f"#{shard_of(timestamp, shards)}"
+    return key
+
+
+def partition_keys(hostname, metric_type, start, end, shards=1):
+    """
+    List the partition keys covering ``[start, end)`` for one series.
+
+    Returns:
+        list: (series key, first, last) tuples with inclusive timestamp bounds
+    """
+    start, end = int(start), int(end)
+    keys = []
+    for day_number in range(start // SECONDS_PER_DAY, (end - 1) // SECONDS_PER_DAY + 1 if end > start else 0):
+        first = max(start, day_number * SECONDS_PER_DAY)
+        last = min(end, (day_number + 1) * SECONDS_PER_DAY) - 1
+        base = f"{hostname}#{metric_type}#{day_bucket(day_number)}"
+        if shards > 1:
+            keys.extend((f"{base}#{shard}", first, last) for shard in range(shards))
+        else:
+            keys.append((base, first, last))
+    return keys
+
+
+class SeriesItemEncoder(ItemEncoder):
+    """
+    ItemEncoder for tables using the series layout.
+
+    Items are identical to ``ItemEncoder`` items plus the ``series``
+    partition key.
+
+    Args:
+        region: Default region for metrics that do not carry one
+        environment: Default environment for metrics that do not carry one
+        ttl_days: Retention period used for the ``ttl`` attribute
+        now: Optional epoch time the TTL is computed from
+        shard_map: ShardMap for hot hosts (unsharded when omitted)
+    """
+
+    key_attributes = SERIES_KEY_ATTRIBUTES
+
+    def __init__(self, region, environment='unknown', ttl_days=DEFAULT_TTL_DAYS, now=None, shard_map=None):
+        super().__init__(region, environment, ttl_days, now)
+        self.shard_map = shard_map or ShardMap()
+
+    def encode(self, metric):
+        item = super().encode(metric)
+        hostname = str(metric['hostname'])
+        item['series'] = {'S': series_key(hostname, metric['metric_type'], metric['timestamp'],
+                                          self.shard_map.shards(hostname))}
+        return item
+
+
+def create_encoder(layout, region, environment='unknown', ttl_days=DEFAULT_TTL_DAYS, shard_map=None):
+    """
+    Create the item encoder for a key layout.
+
+    Args:
+        layout: 'metric_id' or 'series'
+        region: Default region
+        environment: Default environment
+        ttl_days: Retention period used for the ``ttl`` attribute
+        shard_map: ShardMap for the series layout
+
+    Returns:
+        ItemEncoder or SeriesItemEncoder
+    """
+    validate_layout(layout)
+    if layout == 'series':
+        return SeriesItemEncoder(region, environment, ttl_days, shard_map=shard_map)
+    return ItemEncoder(region, environment, ttl_days)
+
+
+def query_series(client, table_name, hostname, metric_type, start, end, shard_map=None,
+                 concurrency=8, retry_budget=None):
+    """
+    Read one host's series in ``[start, end)`` from a series-layout table.
+
+    Each day (and shard) is a single-partition Query; they run in parallel.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Series-layout table
+        hostname: Host name
+        metric_type: Metric type
+        start: First epoch second (inclusive)
+        end: Last epoch second (exclusive)
+        shard_map: ShardMap the writers use (unsharded when omitted)
+        concurrency: Partitions queried at once
+        retry_budget: Optional RetryBudget for throttled pages
+
+    Returns:
+        QueryResult: Points ordered by timestamp
+    """
+    started = time.perf_counter()
+    shards = (shard_map or ShardMap()).shards(hostname)
+    keys = partition_keys(hostname, metric_type, start, end, shards)
+
+    def read(key):
+        series, first, last = key
+        request = {
+            'TableName': table_name,
+            'KeyConditionExpression': 'series = :series AND #ts BETWEEN :first AND :last',
+            'ProjectionExpression': '#ts, #value',
+            'ExpressionAttributeNames': {'#ts': 'timestamp', '#value': 'value'},
+            'ExpressionAttributeValues': {
+                ':series': {'S': series},
+                ':first': {'N': str(first)},
+                ':last': {'N': str(last)}
+            }
+        }
+        timestamps = []
+        values = []
+        pages = 0
+        while True:
+            response = call_with_retry(client.query, retry_budget=retry_budget, **request)
+            pages += 1
+            for item in response.get('Items', []):
+                timestamps.append(item['timestamp']['N'])
+                values.append(item['value']['N'])
+            if 'LastEvaluatedKey' not in response:
+                return timestamps, values, pages
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(keys) or 1))) as executor:
+        parts = list(executor.map(read, keys))
+
+    timestamps = np.array([ts for part in parts for ts in part[0]], dtype=np.str_).astype(np.int64)
+    values = np.array([value for part in parts for value in part[1]], dtype=np.str_).astype(np.float64)
+    if shards > 1:
+        # Shards of one day interleave in time
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+
+    return QueryResult(
+        metric_type,
+        timestamps,
+        values,
+        np.full(len(timestamps), hostname, dtype=object),
+        pages=sum(part[2] for part in parts),
+        scanned=len(timestamps),
+        seconds=round(time.perf_counter() - started, 3)
+    )
@@ -0,0 +1,221 @@
+"""
+Resumable copy of ``InfraMetrics`` into the series key layout.
+
+``migrate_to_series`` runs a parallel ``Scan`` of the source table
+(``TotalSegments`` workers), adds the ``series`` partition key to every
+item and writes it to the target table with the parallel BatchWriteItem
+engine. Items are otherwise copied unchanged, wire format in and out.
+
+Progress is checkpointed per segment after every page (the page's
+``LastEvaluatedKey`` and counters) to a local JSON file. A segment only
+advances once its page is fully written, so an interrupted run is resumed
+by starting it again with the same checkpoint and segment count; at most
+one page per segment is copied twice, and rewriting an item is harmless
+because its key depends only on its own attributes.
+
+Online cut-over:
+
+1. Create the target table (``create_series_table``).
+2. Point the processors at it with ``KEY_LAYOUT=series`` so new points
+   land in the new layout.
+3. Run the migration for the history. Points written by both paths are
+   identical, apart from ``ttl``.
+4. Move readers to ``series_keys.query_series``.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline_common.dynamodb_writer import MAX_RETRIES, ParallelBatchWriter, call_with_retry
+from pipeline_common.metric_query import INDEX_NAME
+from pipeline_common.series_keys import SERIES_KEY_ATTRIBUTES, ShardMap, series_key
+
+DEFAULT_SEGMENTS = 8
+DEFAULT_PAGE_SIZE = 1000
+
+# Attributes older collectors used for the host
+_HOST_ATTRIBUTES = ('hostname', 'host_id', 'instance_id')
+
+
+class MigrationCheckpoint:
+    """
+    Per-segment progress of a migration, persisted as JSON.
+
+    Args:
+        path: Checkpoint file (None keeps progress in memory only)
+        source: Source table name
+        target: Target table name
+        total_segments: Scan segments of the run
+
+    Raises:
+        ValueError: If an existing checkpoint belongs to a different run
+    """
+
+    def __init__(self, path, source, target, total_segments):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {'source': source, 'target': target, 'total_segments': total_segments, 'segments': {}}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if (saved['source'], saved['target'], saved['total_segments']) != (source, target, total_segments):
+                raise ValueError(f"Checkpoint {path} belongs to {saved['source']} -> {saved['target']} "
+                                 f"with {saved['total_segments']} segments")
+            self.state = saved
+
+    def segment(self, index):
+        with self._lock:
+            return dict(self.state['segments'].get(str(index), {'last_key': None, 'done': False,
+                                                                  'copied': 0, 'skipped': 0}))
+
+    def advance(self, index, last_key, copied, skipped):
+        """Record a fully written page and persist the checkpoint."""
+        with self._lock:
+            progress = self.state['segments'].setdefault(
+                str(index), {'last_key': None, 'done': False, 'copied': 0, 'skipped': 0})
+            progress['last_key'] = last_key
+            progress['done'] = last_key is None
+            progress['copied'] += copied
+            progress['skipped'] += skipped
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        # Write then rename, so an interrupted save never corrupts the checkpoint
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.path)
+
+
+def to_series_item(item, shard_map):
+    """
+    Add the ``series`` key to an InfraMetrics item.
+
+    Args:
+        item: Item in AttributeValue form
+        shard_map: ShardMap the processors use
+
+    Returns:
+        dict or None: Item with ``series``, or None when it lacks a host,
+            metric type or timestamp
+    """
+    host = next((item[name]['S'] for name in _HOST_ATTRIBUTES if 'S' in item.get(name, {})), None)
+    if host is None or 'metric_type' not in item or 'timestamp' not in item:
+        return None
+
+    migrated = dict(item)
+    if 'hostname' not in migrated:
+        migrated['hostname'] = {'S': host}
+    migrated['series'] = {'S': series_key(host, item['metric_type']['S'], int(item['timestamp']['N']),
+                                          shard_map.shards(host))}
+    return migrated
+
+
+def create_series_table(client, table_name, wait=True):
+    """
+    Create an on-demand table with the series layout and the metric type index.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: New table name
+        wait: Block until the table is active
+    """
+    client.create_table(
+        TableName=table_name,
+        KeySchema=[
+            {'AttributeName': 'series', 'KeyType': 'HASH'},
+            {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'series', 'AttributeType': 'S'},
+            {'AttributeName': 'timestamp', 'AttributeType': 'N'},
+            {'AttributeName': 'metric_type', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': INDEX_NAME,
+            'KeySchema': [
+                {'AttributeName': 'metric_type', 'KeyType': 'HASH'},
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    if wait:
+        client.get_waiter('table_exists').wait(TableName=table_name)
+
+
+def migrate_to_series(client, source_table, target_table, shard_map=None, total_segments=DEFAULT_SEGMENTS,
+                      checkpoint_path=None, page_size=DEFAULT_PAGE_SIZE, write_concurrency=4,
+                      max_retries=MAX_RETRIES, retry_budget=None):
+    """
+    Copy every item of ``source_table`` into ``target_table`` in the series layout.
+
+    Args:
+        client: Low-level boto3 DynamoDB client (size its connection pool to
+            ``total_segments * write_concurrency``)
+        source_table: Table keyed by metric_id
+        target_table: Table keyed by series and timestamp
+        shard_map: ShardMap the processors use (unsharded when omitted)
+        total_segments: Parallel Scan segments
+        checkpoint_path: Optional JSON file to resume from and save to
+        page_size: Scan page size
+        write_concurrency: BatchWriteItem requests in flight per segment
+        max_retries: Retries per write request after the first attempt
+        retry_budget: Optional RetryBudget for throttled reads and writes
+
+    Returns:
+        dict: copied, skipped, segments and seconds
+
+    Raises:
+        RuntimeError: If items could not be written; progress up to the
+            failed page is kept in the checkpoint
+    """
+    shard_map = shard_map or ShardMap()
+    checkpoint = MigrationCheckpoint(checkpoint_path, source_table, target_table, total_segments)
+    started = time.perf_counter()
+
+    def migrate_segment(index):
+        progress = checkpoint.segment(index)
+        if progress['done']:
+            return
+        writer = ParallelBatchWriter(client, target_table, concurrency=write_concurrency, max_retries=max_retries,
+                                     retry_budget=retry_budget, key_attributes=SERIES_KEY_ATTRIBUTES)
+        request = {'TableName': source_table, 'Segment': index, 'TotalSegments': total_segments,
+                   'Limit': page_size}
+        if progress['last_key']:
+            request['ExclusiveStartKey'] = progress['last_key']
+
+        while True:
+            response = call_with_retry(client.scan, retry_budget=retry_budget, **request)
+            items = [to_series_item(item, shard_map) for item in response.get('Items', [])]
+            migrated = [item for item in items if item is not None]
+
+            result = writer.write(migrated)
+            if result.failed:
+                raise RuntimeError(f"Segment {index}: {result.failed} items could not be written; "
+                                   f"rerun to resume from the last checkpoint")
+
+            last_key = response.get('LastEvaluatedKey')
+            checkpoint.advance(index, last_key, result.succeeded, len(items) - len(migrated))
+            if last_key is None:
+                return
+            request['ExclusiveStartKey'] = last_key
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        # list() re-raises a segment failure once the other segments have finished
+        list(executor.map(migrate_segment, range(total_segments)))
+
+    segments = checkpoint.state['segments'].values()
+    return {
+        'copied': sum(progress['copied'] for progress in segments),
+        'skipped': sum(progress['skipped'] for progress in segments),
+        'segments': total_segments,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
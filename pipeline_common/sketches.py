@@ -0,0 +1,470 @@
+"""
+Mergeable quantile sketches per host, metric type and window.
+
+Percentiles cannot be rolled up from min/max/sum/count, and computing them
+exactly in Athena means scanning every raw point. The sketch stage keeps a
+DDSketch (Masson et al., "DDSketch: A Fast and Fully-Mergeable Quantile
+Sketch with Relative-Error Guarantees", VLDB 2019) per
+``(hostname, metric_type, resolution, window_start)`` instead:
+
+* A value ``v`` is counted in bucket ``ceil(log_gamma(|v|))`` with
+  ``gamma = (1 + a) / (1 - a)``, so every quantile comes back within a
+  relative error ``a`` of a true value (1% by default). Negative values
+  have their own buckets; values closer to zero than ``MIN_INDEXABLE``
+  are counted as zero.
+* Merging two sketches adds their bucket counts. That is exact and
+  order-independent, so windows merge across invocations and hosts merge
+  into fleet-wide percentiles at read time.
+* A sketch of 0-100 % CPU needs at most a few hundred buckets, usually a
+  few dozen per hour, and is stored as a varint-encoded binary attribute.
+
+Sketch table layout:
+    series (S, HASH):        ``{hostname}#{metric_type}#{resolution}``
+    window_start (N, RANGE): Epoch second the window starts at
+    fleet_series (S):        ``{metric_type}#{resolution}#{shard}``, hash
+                             key of FLEET_INDEX_NAME (with ``window_start``)
+    sketch (B), count, hostname, metric_type, version, ttl
+
+Every host rewrites its sketch once per file, so an unsharded fleet key
+would put all hosts of a metric type on one index partition (about 1,000
+writes/s) and throttle the base table behind it. Hosts are spread over
+``FLEET_SHARDS`` keys by ``crc32(hostname)``; fleet reads query every shard.
+
+``commit`` merges each window into its stored sketch (read, merge, write),
+conditional on the ``version`` read, like ``chunk_store``. Merging is not
+idempotent, so the processors only commit the sketches of written points,
+and the ingestion ledger keeps a retried object from merging a window twice.
+"""
+
+import math
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.dynamodb_writer import call_with_retry
+from pipeline_common.item_encoder import ttl_timestamp
+from pipeline_common.rollups import RESOLUTIONS
+
+VERSION = 1
+DEFAULT_ACCURACY = 0.01
+DEFAULT_RESOLUTIONS = ('1h',)
+DEFAULT_TTL_DAYS = 90
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+FLEET_INDEX_NAME = 'fleet_series-window_start-index'
+FLEET_SHARDS = 16  # index partition keys per metric type; writers and readers must agree
+MIN_INDEXABLE = 1e-9
+MAX_CONFLICTS = 5  # merge attempts per window under concurrent writers
+
+# version, relative accuracy, count, zero count, min, max
+_HEADER = struct.Struct('>BdQQdd')
+
+
+def series_key(hostname, metric_type, resolution):
+    """Partition key of a host's sketch series."""
+    return f"{hostname}#{metric_type}#{resolution}"
+
+
+def fleet_shard(hostname, shards=FLEET_SHARDS):
+    """Fleet index shard of a host."""
+    return zlib.crc32(str(hostname).encode('utf-8')) % shards
+
+
+def fleet_key(metric_type, resolution, shard):
+    """Partition key of one shard of a metric type's sketches in FLEET_INDEX_NAME."""
+    return f"{metric_type}#{resolution}#{shard}"
+
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("Unexpected end of sketch")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class DDSketch:
+    """
+    Quantile sketch with a relative-error guarantee.
+
+    Args:
+        relative_accuracy: Maximum relative error of a returned quantile
+
+    Raises:
+        ValueError: If the accuracy is not in (0, 1)
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        """Count one value."""
+        if value > MIN_INDEXABLE:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.positive[index] = self.positive.get(index, 0) + 1
+        elif value < -MIN_INDEXABLE:
+            index = math.ceil(math.log(-value) / self._log_gamma)
+            self.negative[index] = self.negative.get(index, 0) + 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add another sketch's counts to this one.
+
+        Raises:
+            ValueError: If the sketches use different accuracies
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f"Cannot merge sketches with accuracy {other.relative_accuracy} "
+                             f"into {self.relative_accuracy}")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """
+        Estimate a quantile.
+
+        Args:
+            q: Quantile in [0, 1]
+
+        Returns:
+            float or None: Estimate, or None for an empty sketch
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1]")
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = 0
+        # Negative buckets from the most negative value up, then zero, then positive
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return self._clamp(-self._bucket_value(index))
+        seen += self.zero_count
+        if seen > rank:
+            return self._clamp(0.0)
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._clamp(self._bucket_value(index))
+        return self.max
+
+    def _bucket_value(self, index):
+        """Value whose relative error to every value in the bucket is at most the accuracy."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def _clamp(self, value):
+        return min(max(value, self.min), self.max)
+
+    def to_bytes(self):
+        """
+        Serialize as a header followed by delta- and varint-encoded buckets.
+
+        Returns:
+            bytes: Encoded sketch
+        """
+        buffer = bytearray(_HEADER.pack(VERSION, self.relative_accuracy, self.count, self.zero_count,
+                                        self.min, self.max))
+        for store in (self.positive, self.negative):
+            _write_varint(buffer, len(store))
+            previous = 0
+            for index in sorted(store):
+                delta = index - previous
+                _write_varint(buffer, (delta << 1) ^ (delta >> 63))  # zigzag
+                _write_varint(buffer, store[index])
+                previous = index
+        return bytes(buffer)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Decode a sketch written by ``to_bytes``.
+
+        Raises:
+            ValueError: If the data is truncated or has an unknown version
+        """
+        data = bytes(data)
+        if len(data) < _HEADER.size:
+            raise ValueError("Unexpected end of sketch")
+        version, accuracy, count, zero_count, minimum, maximum = _HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"Unsupported sketch version: {version}")
+
+        sketch = cls(accuracy)
+        sketch.count = count
+        sketch.zero_count = zero_count
+        sketch.min = minimum
+        sketch.max = maximum
+        position = _HEADER.size
+        for store in (sketch.positive, sketch.negative):
+            buckets, position = _read_varint(data, position)
+            index = 0
+            for _ in range(buckets):
+                delta, position = _read_varint(data, position)
+                index += (delta >> 1) ^ -(delta & 1)
+                store[index], position = _read_varint(data, position)
+        return sketch
+
+
+class SketchAccumulator:
+    """
+    Sketches of one file or invocation, per (hostname, metric_type, resolution, window).
+
+    Args:
+        resolutions: Resolution names to maintain (keys of rollups.RESOLUTIONS)
+        relative_accuracy: Accuracy of new sketches
+        fleet_shards: Fleet index shards; read_quantiles must use the same count
+    """
+
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS, relative_accuracy=DEFAULT_ACCURACY,
+                 fleet_shards=FLEET_SHARDS):
+        self.resolutions = tuple((name, RESOLUTIONS[name]) for name in resolutions)
+        self.relative_accuracy = relative_accuracy
+        self.fleet_shards = fleet_shards
+        self.sketches = {}
+
+    def __len__(self):
+        return len(self.sketches)
+
+    def retain(self, keys):
+        """
+        Drop every sketch whose key is not in ``keys``.
+
+        Args:
+            keys: Keys still to commit, e.g. the ones a failed attempt left pending
+        """
+        self.sketches = {key: value for key, value in self.sketches.items() if key in keys}
+
+    def fold(self, metrics):
+        """
+        Add validated metrics (int ``timestamp``, float ``value``).
+
+        Args:
+            metrics: Validated metrics
+        """
+        sketches = self.sketches
+        for metric in metrics:
+            timestamp = metric['timestamp']
+            for name, seconds in self.resolutions:
+                key = (metric['hostname'], metric['metric_type'], name, timestamp - timestamp % seconds)
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = DDSketch(self.relative_accuracy)
+                sketch.add(metric['value'])
+
+    def commit(self, client, table_name, concurrency=4, ttl_days=DEFAULT_TTL_DAYS, retry_budget=None):
+        """
+        Merge every sketch into its stored window, then reset.
+
+        Args:
+            client: Low-level boto3 DynamoDB client
+            table_name: Sketch table name
+            concurrency: Windows merged at once
+            ttl_days: Retention for sketch items
+            retry_budget: Optional RetryBudget shared with the invocation
+
+        Returns:
+            tuple: (committed_count, failed_keys)
+        """
+        sketches, self.sketches = self.sketches, {}
+        if not sketches:
+            return 0, []
+
+        ttl = {'N': str(ttl_timestamp(ttl_days))}
+
+        def commit_one(entry):
+            key, sketch = entry
+            return _merge_sketch(client, table_name, key, sketch, ttl, self.fleet_shards, retry_budget)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            results = list(executor.map(commit_one, sketches.items()))
+
+        failed = [key for key, committed in zip(sketches, results) if not committed]
+        return len(results) - len(failed), failed
+
+
+def _merge_sketch(client, table_name, key, sketch, ttl, fleet_shards, retry_budget):
+    """
+    Read, merge and conditionally write one window.
+
+    Returns:
+        bool: True when the sketch was merged
+    """
+    hostname, metric_type, resolution, window_start = key
+    item_key = {
+        'series': {'S': series_key(hostname, metric_type, resolution)},
+        'window_start': {'N': str(window_start)}
+    }
+
+    try:
+        for _ in range(MAX_CONFLICTS):
+            response = call_with_retry(client.get_item, retry_budget=retry_budget, TableName=table_name,
+                                       Key=item_key, ConsistentRead=True)
+            stored = response.get('Item')
+
+            merged = DDSketch(sketch.relative_accuracy)
+            merged.merge(sketch)
+            version = 0
+            condition = {'ConditionExpression': 'attribute_not_exists(series)'}
+            if stored is not None:
+                version = int(stored['version']['N'])
+                merged.merge(DDSketch.from_bytes(stored['sketch']['B']))
+                condition = {
+                    'ConditionExpression': '#version = :version',
+                    'ExpressionAttributeNames': {'#version': 'version'},
+                    'ExpressionAttributeValues': {':version': {'N': str(version)}}
+                }
+            try:
+                call_with_retry(
+                    client.put_item,
+                    retry_budget=retry_budget,
+                    TableName=table_name,
+                    Item=dict(item_key, **{
+                        'fleet_series': {'S': fleet_key(metric_type, resolution,
+                                                        fleet_shard(hostname, fleet_shards))},
+                        'sketch': {'B': merged.to_bytes()},
+                        'count': {'N': str(merged.count)},
+                        'hostname': {'S': str(hostname)},
+                        'metric_type': {'S': str(metric_type)},
+                        'version': {'N': str(version + 1)},
+                        'ttl': ttl
+                    }),
+                    **condition
+                )
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # Another writer merged into this window first: merge again on top of it
+
+        print(f"ERROR: Sketch {item_key['series']['S']}/{window_start} kept changing; "
+              f"gave up after {MAX_CONFLICTS} merges")
+        return False
+    except (ClientError, ValueError) as e:
+        reason = e.response['Error']['Code'] if isinstance(e, ClientError) else str(e)
+        print(f"ERROR: Sketch merge failed for {item_key['series']['S']}/{window_start}: {reason}")
+        return False
+
+
+def read_quantiles(client, table_name, metric_type, start, end, hostname=None, resolution='1h',
+                   quantiles=DEFAULT_QUANTILES, fleet_shards=FLEET_SHARDS, concurrency=8, retry_budget=None):
+    """
+    Merge the sketches of a time range and return its quantiles.
+
+    Windows whose start lies in ``[start, end)`` are merged, so the range is
+    effectively aligned to the resolution. Without a hostname, every host's
+    sketches are read through FLEET_INDEX_NAME, one query per shard run in
+    parallel, and merged into fleet-wide quantiles.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        table_name: Sketch table name
+        metric_type: Metric type
+        start: First epoch second (inclusive)
+        end: Last epoch second (exclusive)
+        hostname: Host to read, or None for the whole fleet
+        resolution: Resolution name (e.g. ``'1h'``)
+        quantiles: Quantiles to return
+        fleet_shards: Fleet index shards the sketches were written with
+        concurrency: Shard queries in flight
+        retry_budget: Optional RetryBudget for throttled pages
+
+    Returns:
+        dict: count, min, max, windows, seconds and one ``pNN`` entry per
+            quantile (None when no points were found)
+    """
+    started = time.perf_counter()
+    values = {':first': {'N': str(int(start))}, ':last': {'N': str(int(end) - 1)}}
+    if hostname is None:
+        requests = [
+            {
+                'IndexName': FLEET_INDEX_NAME,
+                'KeyConditionExpression': 'fleet_series = :series AND window_start BETWEEN :first AND :last',
+                'ExpressionAttributeValues': dict(values, **{
+                    ':series': {'S': fleet_key(metric_type, resolution, shard)}
+                })
+            }
+            for shard in range(fleet_shards)
+        ]
+    else:
+        requests = [{
+            'KeyConditionExpression': 'series = :series AND window_start BETWEEN :first AND :last',
+            'ExpressionAttributeValues': dict(values, **{
+                ':series': {'S': series_key(hostname, metric_type, resolution)}
+            })
+        }]
+
+    def read_one(request):
+        request = dict(request, TableName=table_name, ProjectionExpression='sketch')
+        sketches = []
+        while True:
+            response = call_with_retry(client.query, retry_budget=retry_budget, **request)
+            sketches.extend(DDSketch.from_bytes(item['sketch']['B']) for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return sketches
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(requests)))) as executor:
+        results = list(executor.map(read_one, requests))
+
+    merged = None
+    windows = 0
+    for sketches in results:
+        for sketch in sketches:
+            if merged is None:
+                merged = sketch
+            else:
+                merged.merge(sketch)
+            windows += 1
+
+    empty = merged is None or merged.count == 0
+    result = {
+        'count': 0 if empty else merged.count,
+        'min': None if empty else merged.min,
+        'max': None if empty else merged.max,
+        'windows': windows,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    for q in quantiles:
+        result[f"p{q * 100:g}"] = None if empty else merged.quantile(q)
+    return result
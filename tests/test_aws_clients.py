@@ -0,0 +1,109 @@
+import sys
+import os
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.aws_clients import ClientRegistry, parse_services
+
+
+class TestClientRegistry(unittest.TestCase):
+    """Unit tests for lazily created, pooled AWS clients"""
+
+    def setUp(self):
+        self.session = MagicMock()
+        self.session.client.side_effect = lambda service, **kwargs: MagicMock(name=service)
+        self.registry = ClientRegistry(max_pool_connections=32, session=self.session)
+
+    def test_client_is_cached(self):
+        """Test each service is created once with the tuned config"""
+        first = self.registry.client('s3')
+        second = self.registry.client('s3')
+
+        self.assertIs(first, second)
+        self.session.client.assert_called_once()
+        config = self.session.client.call_args[1]['config']
+        self.assertEqual(config.max_pool_connections, 32)
+        self.assertTrue(config.tcp_keepalive)
+
+    def test_per_client_pool_size(self):
+        """Test a pool size override creates a separately configured client"""
+        self.registry.client('dynamodb', max_pool_connections=64)
+
+        config = self.session.client.call_args[1]['config']
+        self.assertEqual(config.max_pool_connections, 64)
+
+    def test_lazy_client_resolves_on_first_use(self):
+        """Test a lazy proxy creates nothing until an attribute is accessed"""
+        sqs = self.registry.lazy('sqs', region_name='eu-west-1')
+        self.session.client.assert_not_called()
+
+        sqs.send_message(QueueUrl='q', MessageBody='{}')
+        sqs.send_message(QueueUrl='q', MessageBody='{}')
+
+        self.session.client.assert_called_once()
+        self.assertEqual(self.session.client.call_args[1]['region_name'], 'eu-west-1')
+        self.assertEqual(sqs.resolve().send_message.call_count, 2)
+
+    def test_lazy_client_ignores_dunder_lookups(self):
+        """Test protocol probes such as mock.patch's __code__ check do not create the client"""
+        s3 = self.registry.lazy('s3')
+        self.assertFalse(hasattr(s3, '__code__'))
+        with self.assertRaises(AttributeError):
+            s3.__deepcopy__
+        with self.assertRaises(AttributeError):
+            s3._is_coroutine
+        self.assertFalse(s3.resolved)
+        self.session.client.assert_not_called()
+
+    def test_lazy_resource(self):
+        """Test lazy proxies can wrap boto3 resources"""
+        dynamodb = self.registry.lazy('dynamodb', resource=True)
+
+        dynamodb.Table('InfraMetrics')
+
+        self.session.resource.assert_called_once()
+        self.session.client.assert_not_called()
+
+    def test_prewarm(self):
+        """Test prewarm resolves only the listed services"""
+        s3 = self.registry.lazy('s3')
+        cloudwatch = self.registry.lazy('cloudwatch')
+
+        warmed = self.registry.prewarm(['s3'])
+
+        self.assertEqual(warmed, ['s3'])
+        self.assertTrue(s3.resolved)
+        self.assertFalse(cloudwatch.resolved)
+
+    def test_prewarm_failure_is_not_fatal(self):
+        """Test a client that cannot be created does not break the init phase"""
+        self.session.client.side_effect = RuntimeError('no region')
+        self.registry.lazy('s3')
+
+        self.assertEqual(self.registry.prewarm(['s3']), [])
+
+    def test_concurrent_first_use(self):
+        """Test threads racing on first use share one client"""
+        proxies = [self.registry.lazy('s3') for _ in range(8)]
+        results = []
+        threads = [threading.Thread(target=lambda p=p: results.append(p.resolve())) for p in proxies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(client) for client in results}), 1)
+        self.session.client.assert_called_once()
+
+    def test_parse_services(self):
+        """Test service lists are parsed from environment strings"""
+        self.assertEqual(parse_services(' s3, dynamodb ,,'), ['s3', 'dynamodb'])
+        self.assertEqual(parse_services(''), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
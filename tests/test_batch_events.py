@@ -0,0 +1,97 @@
+import sys
+import os
+import base64
+import gzip
+import json
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.batch_events import item_identifier, unpack_message
+
+S3_RECORD = {'s3': {'bucket': {'name': 'metrics-bucket'}, 'object': {'key': 'metrics/a.json', 'eTag': 'abc'}}}
+METRIC = {'metric_id': 'cpu-1', 'timestamp': 1738674000, 'metric_type': 'cpu', 'value': 1.0, 'hostname': 'h'}
+
+
+def sqs_message(body, message_id='msg-1'):
+    return {'eventSource': 'aws:sqs', 'messageId': message_id, 'body': body}
+
+
+def kinesis_message(data, sequence='4959'):
+    return {
+        'eventSource': 'aws:kinesis',
+        'kinesis': {'sequenceNumber': sequence, 'data': base64.b64encode(data).decode('ascii')}
+    }
+
+
+class TestBatchEvents(unittest.TestCase):
+    """Unit tests for unpacking SQS and Kinesis batch messages"""
+
+    def test_item_identifier(self):
+        """Test SQS message IDs and Kinesis sequence numbers are reported"""
+        self.assertEqual(item_identifier(sqs_message('{}')), 'msg-1')
+        self.assertEqual(item_identifier(kinesis_message(b'{}')), '4959')
+
+    def test_unsupported_source(self):
+        """Test records from other event sources are rejected"""
+        with self.assertRaises(ValueError):
+            item_identifier({'eventSource': 'aws:s3'})
+
+    def test_s3_notification(self):
+        """Test S3 notifications delivered to SQS yield S3 records"""
+        s3_records, inline = unpack_message(sqs_message(json.dumps({'Records': [S3_RECORD]})))
+
+        self.assertEqual(s3_records, [S3_RECORD])
+        self.assertEqual(inline, [])
+
+    def test_sns_wrapped_notification(self):
+        """Test S3 notifications fanned out through SNS are unwrapped"""
+        body = json.dumps({'Type': 'Notification', 'Message': json.dumps({'Records': [S3_RECORD]})})
+
+        s3_records, _ = unpack_message(sqs_message(body))
+
+        self.assertEqual(s3_records, [S3_RECORD])
+
+    def test_eventbridge_object_created(self):
+        """Test EventBridge Object Created events become S3 records"""
+        body = json.dumps({
+            'source': 'aws.s3',
+            'detail-type': 'Object Created',
+            'detail': {'bucket': {'name': 'metrics-bucket'},
+                       'object': {'key': 'metrics/a.json', 'etag': 'abc', 'version-id': 'v1'}}
+        })
+
+        s3_records, _ = unpack_message(sqs_message(body))
+
+        self.assertEqual(s3_records[0]['s3']['object'], {'key': 'metrics/a.json', 'eTag': 'abc', 'versionId': 'v1'})
+
+    def test_s3_test_event_ignored(self):
+        """Test the s3:TestEvent sent on configuration is ignored"""
+        self.assertEqual(unpack_message(sqs_message(json.dumps({'Event': 's3:TestEvent'}))), ([], []))
+
+    def test_inline_ndjson(self):
+        """Test inline NDJSON payloads yield their records"""
+        body = '\n'.join(json.dumps(METRIC) for _ in range(3))
+
+        s3_records, inline = unpack_message(sqs_message(body))
+
+        self.assertEqual(s3_records, [])
+        self.assertEqual(inline, [METRIC] * 3)
+
+    def test_kinesis_gzip_payload(self):
+        """Test compressed Kinesis data is decoded and decompressed"""
+        data = gzip.compress(json.dumps([METRIC, METRIC]).encode('utf-8'))
+
+        _, inline = unpack_message(kinesis_message(data))
+
+        self.assertEqual(inline, [METRIC, METRIC])
+
+    def test_invalid_json(self):
+        """Test unparseable payloads raise"""
+        with self.assertRaises(ValueError):
+            unpack_message(sqs_message('not json{'))
+
+
+if __name__ == '__main__':
+    unittest.main()
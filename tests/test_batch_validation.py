@@ -0,0 +1,83 @@
+import sys
+import os
+import unittest
+
+import numpy as np
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.batch_validation import validate_batch
+
+
+class TestBatchValidation(unittest.TestCase):
+    """Unit tests for vectorized metric validation"""
+
+    def setUp(self):
+        self.metric = {
+            'metric_id': 'cpu-1738440000-host-001',
+            'timestamp': 1738440000,
+            'metric_type': 'cpu',
+            'value': 42.5,
+            'hostname': 'host-001'
+        }
+
+    def test_clean_batch(self):
+        """Test numeric strings are coerced and every row passes"""
+        records = [self.metric, dict(self.metric, timestamp='1738440060', value='43.25')]
+
+        result = validate_batch(records)
+
+        self.assertTrue(result.mask.all())
+        self.assertEqual(result.failures, {})
+        self.assertEqual(result.timestamps.tolist(), [1738440000, 1738440060])
+        self.assertEqual(result.values.tolist(), [42.5, 43.25])
+
+    def test_failure_reasons(self):
+        """Test each invalid row is counted under its first failing check"""
+        no_host = dict(self.metric)
+        del no_host['hostname']
+        records = [
+            self.metric,
+            'not a dict',
+            no_host,
+            dict(self.metric, timestamp='12.5'),
+            dict(self.metric, timestamp=None),
+            dict(self.metric, value='abc'),
+            dict(self.metric, value=None),
+            dict(self.metric, value=float('inf')),
+            dict(self.metric, timestamp=10 ** 20),
+        ]
+
+        result = validate_batch(records)
+
+        self.assertEqual(result.mask.tolist(), [True] + [False] * 8)
+        self.assertEqual(result.failures, {
+            'not_an_object': 1,
+            'missing_fields': 1,
+            'invalid_timestamp': 3,
+            'invalid_value': 3,
+        })
+        self.assertEqual(result.valid_count, 1)
+        self.assertEqual(result.invalid_count, 8)
+        self.assertTrue(np.isnan(result.values[1:]).all())
+
+    def test_matches_scalar_coercion(self):
+        """Test results agree with int()/float() on mixed input types"""
+        raw = [(1738440000, 1), ('1738440001', '2.5'), (1738440002.9, ' 3 '), (True, False)]
+        records = [dict(self.metric, timestamp=t, value=v) for t, v in raw]
+
+        result = validate_batch(records)
+
+        self.assertEqual(result.timestamps.tolist(), [int(t) for t, _ in raw])
+        self.assertEqual(result.values.tolist(), [float(v) for _, v in raw])
+
+    def test_empty_batch(self):
+        """Test an empty batch produces empty columns"""
+        result = validate_batch([])
+        self.assertEqual(len(result.mask), 0)
+        self.assertEqual(result.failures, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common import chunk_store
+
+TABLE = 'InfraMetricsChunks'
+START = 1768435200
+
+
+def metric(ts, value, host='host-1'):
+    return {'metric_id': f'cpu-{ts}-{host}', 'timestamp': ts, 'metric_type': 'cpu', 'value': value,
+            'hostname': host, 'unit': 'percent'}
+
+
+class TestChunkAccumulator(unittest.TestCase):
+    """Grouping of points into hourly chunks"""
+
+    def test_fold_groups_by_series_and_hour(self):
+        chunks = chunk_store.ChunkAccumulator()
+        chunks.fold([metric(START, 1.0), metric(START + 3599, 2.0), metric(START + 3600, 3.0),
+                     metric(START, 4.0, host='host-2'), metric(START, 5.0)])
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks.chunks[('host-1', 'cpu', START)], {START: 5.0, START + 3599: 2.0})
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestChunkStore(unittest.TestCase):
+    """Segment appends, reads and compaction against a mocked table"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client('dynamodb', region_name='us-east-1')
+        self.client.create_table(
+            TableName=TABLE,
+            KeySchema=[{'AttributeName': 'series', 'KeyType': 'HASH'},
+                       {'AttributeName': 'chunk', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'series', 'AttributeType': 'S'},
+                                  {'AttributeName': 'chunk', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def commit(self, metrics):
+        chunks = chunk_store.ChunkAccumulator()
+        chunks.fold(metrics)
+        return chunks.commit(self.client, TABLE)
+
+    def items(self):
+        return self.client.scan(TableName=TABLE)['Items']
+
+    def read(self, start=START, end=START + 2 * 3600):
+        return chunk_store.read_chunks(self.client, TABLE, 'host-1', 'cpu', start, end)
+
+    def test_append_does_not_read(self):
+        self.commit([metric(START, 1.0)])
+        with patch.object(self.client, 'get_item') as get_item, patch.object(self.client, 'query') as query:
+            result = self.commit([metric(START + 60, 2.0), metric(START + 3600, 3.0)])
+        get_item.assert_not_called()
+        query.assert_not_called()
+        self.assertEqual((result.committed, result.points), (2, 2))
+        self.assertEqual(sorted(key[2] for key in result.written), [START, START + 3600])
+        self.assertEqual(len(self.items()), 3)
+
+    def test_replay_is_idempotent(self):
+        points = [metric(START + i * 60, float(i)) for i in range(30)]
+        self.commit(points)
+        self.commit(points)
+        self.assertEqual(len(self.items()), 1)
+        self.assertEqual(len(self.read()), 30)
+
+    def test_read_merges_segments(self):
+        self.commit([metric(START + i * 60, float(i)) for i in range(90)])
+        # A later write of a timestamp wins
+        self.commit([metric(START, -1.0), metric(START + 30, 0.5)])
+
+        series = self.read()
+        self.assertEqual(len(series), 91)
+        self.assertEqual(series.values[:2].tolist(), [-1.0, 0.5])
+        self.assertEqual(series.values[-1], 89.0)
+        self.assertTrue((series.timestamps[1:] > series.timestamps[:-1]).all())
+
+        window = self.read(START + 1800, START + 3660)
+        self.assertEqual(window.timestamps.tolist(), list(range(START + 1800, START + 3660, 60)))
+
+    def test_compaction_folds_closed_hours(self):
+        for i in range(3):
+            self.commit([metric(START + i * 600 + j * 60, float(i)) for j in range(10)])
+        self.commit([metric(START + 3600, 9.0)])
+        before = self.read()
+
+        stats = chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 2 * 3600,
+                                           now=START + 3600 + 60)
+        self.assertEqual(stats, {'hours': 1, 'segments': 3, 'conflicts': 0})
+        chunks = sorted(item['chunk']['S'] for item in self.items())
+        self.assertEqual(chunks[0], chunk_store.chunk_key(START))
+        self.assertEqual(len(chunks), 2)  # merged hour plus the open hour's segment
+        after = self.read()
+        self.assertEqual(after.timestamps.tolist(), before.timestamps.tolist())
+        self.assertEqual(after.values.tolist(), before.values.tolist())
+
+        # Later segments are read on top of the merged chunk and folded next time
+        self.commit([metric(START, 7.0)])
+        self.assertEqual(self.read().values[0], 7.0)
+        stats = chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 3600,
+                                           now=START + 7200)
+        self.assertEqual((stats['hours'], stats['segments']), (1, 1))
+        self.assertEqual(self.read().values[0], 7.0)
+
+    def test_folded_segments_are_not_reapplied(self):
+        self.commit([metric(START, 1.0)])
+        self.commit([metric(START, 2.0)])
+        with patch.object(self.client, 'batch_write_item', return_value={}):
+            chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 3600, now=START + 7200)
+        # The segments could not be deleted but the merged chunk lists them
+        self.assertEqual(len(self.items()), 3)
+        self.assertEqual(self.read().values.tolist(), [2.0])
+        stats = chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 3600,
+                                           now=START + 7200)
+        self.assertEqual(stats['segments'], 2)
+        self.assertEqual(len(self.items()), 1)
+        self.assertEqual(self.read().values.tolist(), [2.0])
+
+    def test_concurrent_compaction_is_skipped(self):
+        self.commit([metric(START, 1.0)])
+        original = chunk_store.call_with_retry
+        raced = []
+
+        def racing(operation, **kwargs):
+            # Another compaction lands between our query and our write, once
+            if operation.__name__ == 'put_item' and 'ConditionExpression' in kwargs and not raced:
+                raced.append(True)
+                chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 3600,
+                                           now=START + 7200)
+            return original(operation, **kwargs)
+
+        self.commit([metric(START + 60, 2.0)])
+        with patch.object(chunk_store, 'call_with_retry', racing):
+            self.commit([metric(START + 120, 3.0)])
+            stats = chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 3600,
+                                               now=START + 7200)
+        self.assertEqual(stats['conflicts'], 1)
+        self.assertEqual(self.read().values.tolist(), [1.0, 2.0, 3.0])
+
+    def test_open_hours_are_not_compacted(self):
+        self.commit([metric(START, 1.0)])
+        stats = chunk_store.compact_chunks(self.client, TABLE, 'host-1', 'cpu', START, START + 3600, now=START + 60)
+        self.assertEqual(stats['hours'], 0)
+        self.assertEqual(len(self.items()), 1)
+
+    def test_failed_segments_are_reported(self):
+        from botocore.exceptions import ClientError
+        error = ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'PutItem')
+        with patch.object(self.client, 'put_item', side_effect=error):
+            result = self.commit([metric(START, 1.0), metric(START + 3600, 2.0)])
+        self.assertEqual(len(result.failed), 2)
+        self.assertEqual(result.failed_points, 2)
+        self.assertEqual(result.written, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import unittest
+from unittest.mock import MagicMock
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.cloudwatch_emitter import MetricsEmitter, validate_mode
+
+
+class TestMetricsEmitter(unittest.TestCase):
+    """Unit tests for buffered CloudWatch publishing"""
+
+    def test_folds_hosts_into_statistic_values(self):
+        """Test points sharing name, unit, dimensions and minute become one datum"""
+        client = MagicMock()
+        emitter = MetricsEmitter('InfraMonitoring', client=client)
+        for value in (10.0, 30.0, 20.0):
+            emitter.add('cpu', value, unit='Percent', dimensions={'Region': 'eu-west-1'}, timestamp=1738440010)
+        emitter.add('disk', 50.0, unit='Percent', dimensions={'Region': 'eu-west-1'}, timestamp=1738440010)
+
+        self.assertEqual(emitter.flush(), 1)
+
+        datums = {d['MetricName']: d for d in client.put_metric_data.call_args[1]['MetricData']}
+        self.assertEqual(datums['cpu']['StatisticValues'],
+                         {'SampleCount': 3.0, 'Sum': 60.0, 'Minimum': 10.0, 'Maximum': 30.0})
+        self.assertEqual(datums['disk']['Value'], 50.0)
+        self.assertEqual(datums['cpu']['Dimensions'], [{'Name': 'Region', 'Value': 'eu-west-1'}])
+        self.assertEqual(len(emitter), 0)
+
+    def test_sends_maximum_size_requests(self):
+        """Test datums are split into requests of at most 1000"""
+        client = MagicMock()
+        emitter = MetricsEmitter('InfraMonitoring', client=client)
+        for host in range(2500):
+            emitter.add('cpu', 1.0, dimensions={'InstanceID': f'i-{host}'}, timestamp=1738440000)
+
+        self.assertEqual(emitter.flush(), 3)
+        sizes = [len(c[1]['MetricData']) for c in client.put_metric_data.call_args_list]
+        self.assertEqual(sizes, [1000, 1000, 500])
+
+    def test_emf_mode_writes_log_documents(self):
+        """Test EMF mode emits structured documents instead of calling the API"""
+        lines = []
+        emitter = MetricsEmitter('InfraMonitoring', mode='emf', emit=lines.append)
+        emitter.add('cpu', 10.0, unit='Percent', dimensions={'Region': 'eu-west-1'}, timestamp=1738440010)
+        emitter.add('cpu', 20.0, unit='Percent', dimensions={'Region': 'eu-west-1'}, timestamp=1738440020)
+        emitter.add('memory', 55.0, unit='Percent', dimensions={'Region': 'eu-west-1'}, timestamp=1738440030)
+
+        self.assertEqual(emitter.flush(), 1)
+
+        document = json.loads(lines[0])
+        metadata = document['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(document['_aws']['Timestamp'], 1738440000000)
+        self.assertEqual(metadata['Dimensions'], [['Region']])
+        self.assertEqual(document['Region'], 'eu-west-1')
+        self.assertEqual(document['cpu'], [10.0, 20.0])
+        self.assertEqual(document['memory'], 55.0)
+
+    def test_emf_mode_splits_large_value_arrays(self):
+        """Test more than 100 values of one metric span several documents"""
+        lines = []
+        emitter = MetricsEmitter('InfraMonitoring', mode='emf', emit=lines.append)
+        for i in range(150):
+            emitter.add('cpu', float(i), timestamp=1738440000)
+
+        self.assertEqual(emitter.flush(), 2)
+        self.assertEqual([len(json.loads(line)['cpu']) for line in lines], [100, 50])
+
+    def test_emf_mode_separates_units_and_stringifies_dimensions(self):
+        """Test one name in two units lands in two documents with string dimension values"""
+        lines = []
+        emitter = MetricsEmitter('InfraMonitoring', mode='emf', emit=lines.append)
+        emitter.add('latency', 250.0, unit='Milliseconds', dimensions={'Port': 443}, timestamp=1738440000)
+        emitter.add('latency', 0.5, unit='Seconds', dimensions={'Port': 443}, timestamp=1738440000)
+
+        self.assertEqual(emitter.flush(), 2)
+
+        documents = [json.loads(line) for line in lines]
+        units = {d['_aws']['CloudWatchMetrics'][0]['Metrics'][0]['Unit']: d['latency'] for d in documents}
+        self.assertEqual(units, {'Milliseconds': 250.0, 'Seconds': 0.5})
+        self.assertEqual({d['Port'] for d in documents}, {'443'})
+
+    def test_api_mode_keeps_only_statistics(self):
+        """Test api mode does not buffer raw values"""
+        emitter = MetricsEmitter('InfraMonitoring', client=MagicMock())
+        for i in range(3):
+            emitter.add('cpu', float(i), timestamp=1738440000)
+
+        self.assertEqual(list(emitter._points.values()), [[3, 3.0, 0.0, 2.0, None]])
+
+    def test_modes(self):
+        """Test mode validation and the api-mode client requirement"""
+        self.assertEqual(validate_mode(' EMF '), 'emf')
+        with self.assertRaises(ValueError):
+            validate_mode('statsd')
+        with self.assertRaises(ValueError):
+            MetricsEmitter('InfraMonitoring', mode='api')
+
+        emitter = MetricsEmitter('InfraMonitoring', mode='none')
+        emitter.add('cpu', 1.0)
+        self.assertEqual(emitter.flush(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
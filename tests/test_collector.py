@@ -1,9 +1,11 @@
 import sys
 import os
+import json
 import unittest
 from unittest.mock import patch, MagicMock
 
 # Add parent directory to path to import lambda function
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../lambda/data-collector')))
 
 import lambda_function
@@ -61,6 +63,32 @@ class TestDataCollector(unittest.TestCase):
         self.assertIn('metrics/', s3_key)
         self.assertIn('.json', s3_key)
 
+    @patch('lambda_function.s3_client')
+    def test_upload_to_s3_gzip(self, mock_s3):
+        """Test compressed upload sets ContentEncoding and key suffix"""
+        import gzip
+        import json
+        metrics = [{'metric_id': 'test-001', 'value': 50.0}]
+
+        s3_key = lambda_function.upload_to_s3(metrics, 1738440000, codec='gzip')
+
+        kwargs = mock_s3.put_object.call_args[1]
+        self.assertTrue(s3_key.endswith('.json.gz'))
+        self.assertEqual(kwargs['ContentEncoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(kwargs['Body'])), metrics)
+
+    @patch('lambda_function.cloudwatch')
+    def test_publish_fleet_metrics(self, mock_cloudwatch):
+        """Test every host folds into one datum per metric type in a single request"""
+        metrics = lambda_function.generate_metrics_batch()
+
+        requests = lambda_function.publish_fleet_metrics(metrics, mode='api')
+
+        self.assertEqual(requests, 1)
+        datums = mock_cloudwatch.put_metric_data.call_args[1]['MetricData']
+        self.assertEqual(len(datums), 4)
+        self.assertTrue(all(d['StatisticValues']['SampleCount'] == 5.0 for d in datums))
+
     @patch('lambda_function.upload_to_s3')
     @patch('lambda_function.generate_metrics_batch')
     def test_lambda_handler_success(self, mock_generate, mock_upload):
@@ -76,5 +104,29 @@ class TestDataCollector(unittest.TestCase):
         self.assertEqual(result['statusCode'], 200)
         self.assertIn('message', result['body'])
 
+    def test_generate_metrics_batch_load_generator(self):
+        """Test generate_metrics_batch delegates to a seeded load generator"""
+        from pipeline_common.load_generator import LoadGenerator
+        generator = LoadGenerator(hosts=1000, start=1738440000, seed=3)
+
+        metrics = lambda_function.generate_metrics_batch(generator, step=1)
+
+        self.assertEqual(len(metrics), 4000)
+        replay = LoadGenerator(hosts=1000, start=1738440000, seed=3)
+        self.assertEqual(metrics, lambda_function.generate_metrics_batch(replay, step=1))
+
+    @patch('lambda_function.aws_clients.get_client')
+    def test_lambda_handler_load_mode(self, mock_get_client):
+        """Test the load event writes generated objects concurrently"""
+        mock_s3 = mock_get_client.return_value
+        event = {'load': {'hosts': 500, 'steps': 2, 'records_per_object': 1000, 'start': 1738440000}}
+
+        result = lambda_function.lambda_handler(event, None)
+
+        self.assertEqual(result['statusCode'], 200)
+        body = json.loads(result['body'])
+        self.assertEqual((body['objects'], body['records']), (4, 4000))
+        self.assertEqual(mock_s3.put_object.call_count, 4)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,214 @@
+import sys
+import os
+import gzip
+import json
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common import compaction
+
+BUCKET = 'bucket1'
+DAY = '2026/01/15'
+BASE_TS = int(datetime(2026, 1, 15, tzinfo=timezone.utc).timestamp())
+
+
+def metric(ts, index):
+    return {'metric_id': f'cpu-{ts}-{index}', 'timestamp': ts, 'metric_type': 'cpu', 'value': index}
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestCompaction(unittest.TestCase):
+    """Compaction against a mocked bucket"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket=BUCKET)
+        self.now = datetime(2026, 1, 17, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def put_array(self, ts, count=3):
+        key = f"metrics/{DAY}/metrics-{ts}.json"
+        self.s3.put_object(Bucket=BUCKET, Key=key, Body=json.dumps([metric(ts, i) for i in range(count)]))
+        return key
+
+    def put_ndjson_gzip(self, ts, count=3):
+        key = f"raw-metrics/{DAY}/metrics-{ts}.json.gz"
+        payload = '\n'.join(json.dumps(metric(ts, i)) for i in range(count))
+        self.s3.put_object(Bucket=BUCKET, Key=key, Body=gzip.compress(payload.encode('utf-8')),
+                           ContentEncoding='gzip')
+        return key
+
+    def read_all(self, layout, partition=DAY):
+        records = []
+        for key in compaction.resolve_partition(self.s3, BUCKET, layout, partition):
+            records.extend(compaction._read_records(self.s3, BUCKET, key))
+        return records
+
+    def test_compacts_both_layouts(self):
+        for offset in range(4):
+            self.put_array(BASE_TS + offset * 3600)
+            self.put_ndjson_gzip(BASE_TS + offset * 3600)
+
+        for layout in compaction.LAYOUTS:
+            before = sorted(r['metric_id'] for r in self.read_all(layout))
+            stats = compaction.compact_partition(self.s3, BUCKET, layout, DAY, target_records=5, now=self.now)
+            self.assertEqual(stats['status'], 'compacted')
+            self.assertEqual(stats['sources'], 4)
+            self.assertEqual(stats['records'], 12)
+            self.assertEqual(stats['outputs'], 3)
+            keys = compaction.resolve_partition(self.s3, BUCKET, layout, DAY)
+            self.assertEqual(len(keys), 3)
+            self.assertTrue(all(key.startswith(f"compacted/{layout}/{DAY}/part-") for key in keys))
+            self.assertEqual(sorted(r['metric_id'] for r in self.read_all(layout)), before)
+
+    def test_manifest_is_athena_readable(self):
+        self.put_ndjson_gzip(BASE_TS)
+        compaction.compact_partition(self.s3, BUCKET, 'raw-metrics', DAY, now=self.now)
+        # The compacted data prefix holds only outputs; the manifest is one JSON line elsewhere
+        listed = self.s3.list_objects_v2(Bucket=BUCKET, Prefix='compacted/raw-metrics/')
+        outputs = [entry['Key'] for entry in listed['Contents']]
+        self.assertEqual(outputs, compaction.resolve_partition(self.s3, BUCKET, 'raw-metrics', DAY))
+        key = compaction.manifest_key('raw-metrics', DAY)
+        self.assertEqual(key, f"compacted/manifests/raw-metrics/{DAY}/manifest.json")
+        body = self.s3.get_object(Bucket=BUCKET, Key=key)['Body'].read().decode('utf-8')
+        self.assertNotIn('\n', body)
+        self.assertEqual([output['key'] for output in json.loads(body)['outputs']], outputs)
+
+    def test_second_run_is_a_no_op(self):
+        self.put_array(BASE_TS)
+        compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, now=self.now)
+        stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, now=self.now)
+        self.assertEqual(stats['status'], 'unchanged')
+
+    def test_late_arrivals_are_appended(self):
+        self.put_array(BASE_TS)
+        compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, now=self.now)
+        late = self.put_array(BASE_TS + 60)
+
+        keys = compaction.resolve_partition(self.s3, BUCKET, 'metrics', DAY)
+        self.assertIn(late, keys)
+        self.assertEqual(len(self.read_all('metrics')), 6)
+
+        stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, now=self.now)
+        self.assertEqual(stats['sources'], 1)
+        manifest, _ = compaction.read_manifest(self.s3, BUCKET, 'metrics', DAY)
+        self.assertEqual(len(manifest['sources']), 2)
+        self.assertEqual(len(manifest['outputs']), 2)
+        self.assertNotIn(late, compaction.resolve_partition(self.s3, BUCKET, 'metrics', DAY))
+        self.assertEqual(len(self.read_all('metrics')), 6)
+
+    def test_stale_manifest_conflicts(self):
+        self.put_array(BASE_TS)
+        manifest_key = compaction.manifest_key('metrics', DAY)
+        with self.assertRaises(compaction.ManifestConflict):
+            compaction._put_manifest(self.s3, BUCKET, manifest_key, {'sources': []}, '"stale"')
+
+        # A manifest created behind the run's back wins; the run's outputs are removed
+        original = compaction.read_manifest
+        def racing_read(*args, **kwargs):
+            result = original(*args, **kwargs)
+            compaction._put_manifest(self.s3, BUCKET, manifest_key, {'sources': [], 'outputs': []}, None)
+            return result
+        compaction.read_manifest = racing_read
+        try:
+            stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, now=self.now)
+        finally:
+            compaction.read_manifest = original
+        self.assertEqual(stats['status'], 'conflict')
+        listed = self.s3.list_objects_v2(Bucket=BUCKET, Prefix=compaction.output_prefix('metrics', DAY))
+        self.assertEqual(listed.get('Contents', []), [])
+
+    def test_delete_mode_waits_for_grace_period(self):
+        key = self.put_array(BASE_TS)
+        stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, mode='delete',
+                                             delete_grace_seconds=3600, now=self.now)
+        self.assertEqual(stats['deleted'], 0)
+        self.assertEqual(self.s3.head_object(Bucket=BUCKET, Key=key)['ContentLength'] > 0, True)
+
+        stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, mode='delete',
+                                             delete_grace_seconds=3600, now=self.now + timedelta(hours=2))
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(self.s3.list_objects_v2(Bucket=BUCKET, Prefix='metrics/')['KeyCount'], 0)
+        self.assertEqual(len(self.read_all('metrics')), 3)
+
+    def test_revisit_requires_a_manifest(self):
+        self.put_array(BASE_TS)
+        stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', DAY, now=self.now, require_manifest=True)
+        self.assertEqual(stats['status'], 'skipped')
+        self.assertEqual(compaction.read_manifest(self.s3, BUCKET, 'metrics', DAY), (None, None))
+        self.assertEqual(compaction.revisit_days(3600), 2)
+        self.assertEqual(compaction.revisit_days(2 * 86400), 3)
+
+    def test_daily_runs_delete_and_pick_up_late_arrivals(self):
+        import importlib.util
+        from unittest.mock import patch
+
+        path = os.path.join(os.path.dirname(__file__), '..', 'compaction', 'lambda_function.py')
+        spec = importlib.util.spec_from_file_location('compaction_lambda', path)
+        handler = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(handler)
+
+        original = self.put_array(BASE_TS)
+        event = {'bucket': BUCKET, 'layouts': ['metrics'], 'mode': 'delete'}
+        with patch.object(handler, 's3_client', self.s3), patch.object(handler, 'datetime') as clock:
+            clock.now.return_value = datetime(2026, 1, 16, 2, tzinfo=timezone.utc)
+            first = json.loads(handler.lambda_handler(event, None)['body'])
+            late = self.put_array(BASE_TS + 600)
+
+            clock.now.return_value = datetime(2026, 1, 17, 2, tzinfo=timezone.utc)
+            second = json.loads(handler.lambda_handler(event, None)['body'])
+
+        self.assertEqual((first['compacted'], first['deleted']), (1, 0))
+        # The next daily run revisits the 15th: the late object is compacted
+        # and the original, committed a day ago, is deleted
+        self.assertEqual((second['compacted'], second['sources'], second['deleted']), (1, 1, 1))
+        remaining = [entry['Key'] for entry in self.s3.list_objects_v2(Bucket=BUCKET, Prefix='metrics/')['Contents']]
+        self.assertEqual(remaining, [late])
+        self.assertNotIn(original, remaining)
+        self.assertEqual(len(self.read_all('metrics')), 6)
+
+    def test_hour_partitions(self):
+        self.put_array(BASE_TS)
+        self.put_array(BASE_TS + 3600)
+        partitions = compaction.partitions(date(2026, 1, 15), 'hour')
+        self.assertEqual(len(partitions), 24)
+        self.assertEqual(partitions[1], f"{DAY}/01")
+
+        stats = compaction.compact_partition(self.s3, BUCKET, 'metrics', partitions[1], now=self.now)
+        self.assertEqual(stats['sources'], 1)
+        self.assertEqual(len(self.read_all('metrics', partitions[0])), 3)
+        self.assertEqual(compaction.partition_end(partitions[1]),
+                         datetime(2026, 1, 15, 2, tzinfo=timezone.utc))
+
+
+    def test_hour_partitions_share_one_day_listing(self):
+        from unittest.mock import patch
+
+        self.put_array(BASE_TS)
+        self.put_array(BASE_TS + 3600)
+        listing = {}
+        with patch.object(self.s3, 'get_paginator', wraps=self.s3.get_paginator) as paginator:
+            stats = [compaction.compact_partition(self.s3, BUCKET, 'metrics', partition, now=self.now,
+                                                  listing=listing)
+                     for partition in compaction.partitions(date(2026, 1, 15), 'hour')]
+            keys = compaction.resolve_partition(self.s3, BUCKET, 'metrics', f"{DAY}/02", listing=listing)
+
+        self.assertEqual(paginator.call_count, 1)
+        self.assertEqual([s['sources'] for s in stats[:3]], [1, 1, 0])
+        self.assertEqual(keys, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import sys
+import os
+import io
+import json
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common import compression
+from pipeline_common.json_stream import iter_json_records
+
+try:
+    compression.compress(b'', compression.ZSTD)
+    HAS_ZSTD = True
+except RuntimeError:
+    HAS_ZSTD = False
+
+
+class TestCompression(unittest.TestCase):
+    """Unit tests for collector/processor compression codecs"""
+
+    def setUp(self):
+        self.records = [
+            {'metric_id': f'cpu-1738440000-host-{i:03d}', 'metric_type': 'cpu', 'value': 50.0 + i}
+            for i in range(200)
+        ]
+        self.payload = '\n'.join(json.dumps(r) for r in self.records)
+
+    def roundtrip(self, codec, content_encoding=None, key=''):
+        body = io.BytesIO(compression.compress(self.payload, codec))
+        stream = compression.open_stream(body, content_encoding, key)
+        return list(iter_json_records(stream, chunk_size=64))
+
+    def test_gzip_roundtrip(self):
+        """Test gzip payloads shrink and stream back record by record"""
+        compressed = compression.compress(self.payload, 'gzip')
+        self.assertLess(len(compressed), len(self.payload) // 5)
+        self.assertEqual(self.roundtrip('gzip', content_encoding='gzip'), self.records)
+
+    @unittest.skipUnless(HAS_ZSTD, 'zstd codec not available')
+    def test_zstd_roundtrip(self):
+        """Test zstd payloads stream back record by record"""
+        self.assertEqual(self.roundtrip('zstd', key='metrics.json.zst'), self.records)
+
+    def test_uncompressed_passthrough(self):
+        """Test plain payloads are returned unchanged"""
+        self.assertEqual(self.roundtrip('none'), self.records)
+
+    def test_detect_codec(self):
+        """Test header, then key suffix, then magic bytes decide the codec"""
+        self.assertEqual(compression.detect_codec('gzip', 'a.json'), 'gzip')
+        self.assertEqual(compression.detect_codec(None, 'a.json.zst'), 'zstd')
+        self.assertEqual(compression.detect_codec(None, 'a.json', b'\x1f\x8b\x08\x00'), 'gzip')
+        self.assertEqual(compression.detect_codec(None, 'a.json', b'[{"a'), 'none')
+
+    def test_gzip_detected_from_magic_bytes(self):
+        """Test gzip objects without metadata are still decompressed"""
+        self.assertEqual(self.roundtrip('gzip', key='metrics.json'), self.records)
+
+    def test_codec_metadata(self):
+        """Test key suffixes and ContentEncoding values per codec"""
+        self.assertEqual(compression.key_suffix('gzip'), '.gz')
+        self.assertEqual(compression.key_suffix('none'), '')
+        self.assertEqual(compression.content_encoding('zstd'), 'zstd')
+        self.assertIsNone(compression.content_encoding('none'))
+
+    def test_invalid_codec(self):
+        """Test unknown codecs are rejected"""
+        with self.assertRaises(ValueError):
+            compression.validate_codec('lz4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import os
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common import decoders
+from pipeline_common.decoders import decode_records, decoder_names, register_decoder
+from pipeline_common.ingestion import filter_valid
+
+
+def envelope(**overrides):
+    record = {
+        'timestamp': '2025-02-04T13:00:00Z',
+        'region': 'eu-west-1',
+        'instance_id': 'i-0123456789',
+        'metrics': {'cpu': 45.2, 'memory': 62}
+    }
+    record.update(overrides)
+    return record
+
+
+class TestDecoders(unittest.TestCase):
+    """Unit tests for payload shape sniffing and decoding"""
+
+    def test_flat_records_pass_through(self):
+        """Test flat records are dispatched to the flat decoder unchanged"""
+        records = [{'metric_id': 'm-1', 'timestamp': 1, 'metric_type': 'cpu', 'value': 1.0, 'hostname': 'h'}]
+
+        name, metrics = decode_records(iter(records))
+
+        self.assertEqual(name, decoders.FLAT)
+        self.assertEqual(list(metrics), records)
+
+    def test_envelopes_expand_to_flat_records(self):
+        """Test each numeric metric of an envelope becomes one flat record"""
+        name, metrics = decode_records([envelope(environment='staging')])
+        metrics = list(metrics)
+
+        self.assertEqual(name, decoders.ENVELOPE)
+        self.assertEqual(len(metrics), 2)
+        self.assertEqual(metrics[0], {
+            'metric_id': 'cpu#i-0123456789#1738674000',
+            'timestamp': 1738674000,
+            'metric_type': 'cpu',
+            'value': 45.2,
+            'hostname': 'i-0123456789',
+            'region': 'eu-west-1',
+            'environment': 'staging'
+        })
+        self.assertEqual(metrics[1]['metric_type'], 'memory')
+
+        _, defaulted = decode_records([envelope()])
+        self.assertEqual(next(defaulted)['environment'], decoders.DEFAULT_ENVIRONMENT)
+
+    def test_envelope_skips_non_numeric_metrics(self):
+        """Test non-numeric metric values are not expanded"""
+        _, metrics = decode_records([envelope(metrics={'cpu': 'high', 'disk': 10})])
+
+        self.assertEqual([m['metric_type'] for m in metrics], ['disk'])
+
+    def test_invalid_envelopes_reach_validation(self):
+        """Test malformed envelopes are passed through and rejected by validation"""
+        records = [envelope(), {'metrics': {'cpu': 1.0}}, envelope(timestamp='not-a-time')]
+
+        _, metrics = decode_records(records)
+        metrics = list(metrics)
+        validated, result = filter_valid(metrics)
+
+        self.assertEqual(len(metrics), 4)
+        self.assertEqual(len(validated), 2)
+        self.assertEqual(result.invalid_count, 2)
+
+    def test_empty_payload(self):
+        """Test an empty payload reports no decoder"""
+        name, metrics = decode_records(iter([]))
+
+        self.assertIsNone(name)
+        self.assertEqual(list(metrics), [])
+
+    def test_register_decoder(self):
+        """Test custom decoders take part in dispatch and can be replaced"""
+        original = decoder_names()
+        saved = list(decoders._decoders)
+        self.addCleanup(decoders._decoders.__setitem__, slice(None), saved)
+
+        register_decoder('pairs', lambda record: isinstance(record, list),
+                         lambda records: ({'metric_type': r[0], 'value': r[1]} for r in records))
+
+        name, metrics = decode_records([['cpu', 1.5]])
+
+        self.assertEqual(name, 'pairs')
+        self.assertEqual(list(metrics), [{'metric_type': 'cpu', 'value': 1.5}])
+        self.assertEqual(decoder_names(), original + ['pairs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
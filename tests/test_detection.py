@@ -0,0 +1,164 @@
+import sys
+import os
+import json
+import unittest
+from unittest.mock import MagicMock
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common.detection import (
+    AlertPublisher, DetectionEngine, EwmaDetector, S3StateStore, parse_rules
+)
+
+BASE_TS = 1768435200
+
+
+def metric(value, ts=BASE_TS, metric_type='cpu_utilization', hostname='web-01'):
+    return {'hostname': hostname, 'metric_type': metric_type, 'timestamp': ts, 'value': float(value)}
+
+
+class TestRules(unittest.TestCase):
+    """Rule parsing and evaluation"""
+
+    def test_parse_rules(self):
+        rules = parse_rules('cpu_utilization>80, memory_usage>=90:critical,*<0:info')
+        self.assertEqual([rule.name for rule in rules], ['cpu_utilization>80', 'memory_usage>=90', '*<0'])
+        self.assertEqual([rule.severity for rule in rules], ['warning', 'critical', 'info'])
+        self.assertEqual(parse_rules(''), [])
+
+    def test_parse_rules_rejects_malformed(self):
+        for value in ('cpu_utilization', 'cpu_utilization=80', 'cpu_utilization>80:urgent'):
+            with self.assertRaises(ValueError):
+                parse_rules(value)
+
+    def test_rules_and_cooldown(self):
+        engine = DetectionEngine(parse_rules('cpu_utilization>80,*<0:critical'), cooldown_seconds=300)
+        raised = engine.evaluate([
+            metric(85), metric(95, BASE_TS + 60), metric(70, BASE_TS + 120),
+            metric(-1, metric_type='disk_usage'), metric(90, BASE_TS + 400)
+        ])
+        alerts = engine.drain()
+        self.assertEqual(raised, 3)
+        self.assertEqual([(alert['check'], alert['timestamp']) for alert in alerts],
+                         [('cpu_utilization>80', BASE_TS), ('*<0', BASE_TS), ('cpu_utilization>80', BASE_TS + 400)])
+        self.assertEqual(alerts[0]['threshold'], 80.0)
+        self.assertEqual(engine.drain(), [])
+
+
+class TestEwmaDetector(unittest.TestCase):
+    """Per-series z-score detection"""
+
+    def test_flags_spike_after_warmup(self):
+        engine = DetectionEngine(detector=EwmaDetector(['cpu_utilization'], alpha=0.2, z_threshold=4, warmup=10))
+        steady = [metric(50 + (i % 3), BASE_TS + i * 60) for i in range(20)]
+        self.assertEqual(engine.evaluate(steady), 0)
+        self.assertEqual(engine.evaluate([metric(95, BASE_TS + 20 * 60)]), 1)
+        alert = engine.drain()[0]
+        self.assertEqual(alert['check'], 'ewma')
+        self.assertGreater(alert['zscore'], 4)
+        # Other metric types and late points leave the state alone
+        state = engine.state()
+        engine.evaluate([metric(1000, metric_type='memory_usage'), metric(0, BASE_TS)])
+        self.assertEqual(engine.state(), state)
+
+    def test_no_alert_during_warmup(self):
+        engine = DetectionEngine(detector=EwmaDetector(warmup=30))
+        self.assertEqual(engine.evaluate([metric(50, BASE_TS), metric(5000, BASE_TS + 60)]), 0)
+
+    def test_merge_state_keeps_newer_series(self):
+        engine = DetectionEngine(detector=EwmaDetector())
+        engine.evaluate([metric(50, BASE_TS + 60)])
+        engine.merge_state({'series': {'web-01#cpu_utilization': [10.0, 1.0, 5, BASE_TS],
+                                       'web-02#cpu_utilization': [20.0, 2.0, 8, BASE_TS]},
+                            'cooldowns': {'web-02#cpu_utilization#ewma': BASE_TS}})
+        state = engine.state()
+        self.assertEqual(state['series']['web-01#cpu_utilization'], [50.0, 0.0, 1, BASE_TS + 60])
+        self.assertEqual(state['series']['web-02#cpu_utilization'], [20.0, 2.0, 8, BASE_TS])
+        self.assertEqual(state['cooldowns'], {'web-02#cpu_utilization#ewma': BASE_TS})
+        engine.expire(BASE_TS + 1)
+        self.assertEqual(list(engine.state()['series']), ['web-01#cpu_utilization'])
+
+
+class TestAlertPublisher(unittest.TestCase):
+    """Batched SNS delivery"""
+
+    def test_packs_alerts_into_batches(self):
+        sns = MagicMock()
+        sns.publish_batch.side_effect = lambda **kwargs: {
+            'Successful': [{'Id': entry['Id']} for entry in kwargs['PublishBatchRequestEntries']]}
+        alerts = [dict(metric(90, BASE_TS + i), check='cpu_utilization>80', severity='warning', padding='x' * 200)
+                  for i in range(30)]
+        alerts.append(dict(metric(99), check='cpu_utilization>95', severity='critical'))
+        publisher = AlertPublisher(sns, 'arn:aws:sns:us-east-1:123456789012:alerts', max_message_bytes=2048)
+        messages, failed = publisher.publish(alerts)
+        entries = [entry for call in sns.publish_batch.call_args_list
+                   for entry in call.kwargs['PublishBatchRequestEntries']]
+        self.assertEqual(failed, 0)
+        self.assertEqual(messages, len(entries))
+        self.assertLess(len(entries), len(alerts))
+        self.assertTrue(all(len(entry['Message']) <= 2048 for entry in entries))
+        first = json.loads(entries[0]['Message'])['alerts'][0]
+        self.assertEqual(first['severity'], 'critical')
+        self.assertEqual(entries[0]['MessageAttributes']['severity']['StringValue'], 'critical')
+        delivered = sum(json.loads(entry['Message'])['count'] for entry in entries)
+        self.assertEqual(delivered, len(alerts))
+
+    def test_counts_rejected_alerts(self):
+        sns = MagicMock()
+        sns.publish_batch.return_value = {'Successful': [], 'Failed': [{'Id': '0', 'Code': 'Throttled'}]}
+        messages, failed = AlertPublisher(sns, 'arn').publish([dict(metric(90), check='c', severity='warning')])
+        self.assertEqual((messages, failed), (0, 1))
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestS3StateStore(unittest.TestCase):
+    """Checkpoints shared by several containers"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket='bucket1')
+        self.store = S3StateStore(self.s3, 'bucket1', min_interval=0)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def test_checkpoint_sync_and_conflict(self):
+        first = DetectionEngine(detector=EwmaDetector())
+        second = DetectionEngine(detector=EwmaDetector())
+        self.store.sync(first)
+        self.store.sync(second)
+        self.assertFalse(self.store.checkpoint(first))
+        first.evaluate([metric(50, hostname='web-01')])
+        self.assertTrue(self.store.checkpoint(first))
+        # second has not seen first's checkpoint, so its put conflicts and merges
+        second.evaluate([metric(60, hostname='web-02')])
+        self.assertTrue(self.store.checkpoint(second))
+        self.assertEqual(set(second.state()['series']), {'web-01#cpu_utilization', 'web-02#cpu_utilization'})
+        restored = DetectionEngine(detector=EwmaDetector())
+        self.store.sync(restored)
+        self.assertEqual(restored.state(), second.state())
+        self.assertFalse(restored.dirty)
+
+    def test_checkpoints_are_rate_limited(self):
+        store = S3StateStore(self.s3, 'bucket1', min_interval=60)
+        engine = DetectionEngine(detector=EwmaDetector())
+        engine.evaluate([metric(50)])
+        self.assertTrue(store.checkpoint(engine))
+        engine.evaluate([metric(55, ts=BASE_TS + 60)])
+        self.assertFalse(store.checkpoint(engine))
+        self.assertTrue(engine.dirty)
+        self.assertTrue(store.checkpoint(engine, force=True))
+        self.assertFalse(engine.dirty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import sys
+import os
+import gzip
+import json
+import unittest
+from unittest.mock import MagicMock
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.dlq_writer import MAX_BATCH_ENTRIES, DeadLetterWriter
+
+QUEUE_URL = 'https://sqs.example/dlq'
+
+
+def item(index, padding=0):
+    return {'metric_id': f'test-{index}', 'value': float(index), 'padding': 'x' * padding}
+
+
+def accept_all(QueueUrl, Entries):
+    return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+
+class TestDeadLetterWriter(unittest.TestCase):
+    """Unit tests for the batched DLQ writer"""
+
+    def setUp(self):
+        self.sqs = MagicMock()
+        self.sqs.send_message_batch.side_effect = accept_all
+        self.s3 = MagicMock()
+
+    def sent_bodies(self):
+        return [json.loads(entry['MessageBody'])
+                for call in self.sqs.send_message_batch.call_args_list
+                for entry in call[1]['Entries']]
+
+    def test_flush_packs_items_into_one_message(self):
+        """Test failures from many batches share one message and one request"""
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL)
+        for batch in range(40):
+            writer.add_items([item(batch * 25 + i) for i in range(25)])
+
+        result = writer.flush()
+
+        self.assertEqual((result.requests, result.messages, result.items), (1, 1, 1000))
+        self.assertEqual(len(self.sent_bodies()[0]['failed_metrics']), 1000)
+        self.assertEqual(len(writer), 0)
+
+    def test_messages_respect_size_and_entry_limits(self):
+        """Test items are split across messages and batch requests by size"""
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL, max_message_bytes=4096)
+        writer.add_items([item(i, padding=900) for i in range(60)])
+
+        result = writer.flush()
+
+        self.assertEqual(result.items, 60)
+        self.assertEqual(result.dropped, 0)
+        for call in self.sqs.send_message_batch.call_args_list:
+            entries = call[1]['Entries']
+            self.assertLessEqual(len(entries), MAX_BATCH_ENTRIES)
+            self.assertLessEqual(sum(len(e['MessageBody']) for e in entries), 4096)
+
+    def test_oversize_payload_spills_to_s3(self):
+        """Test a payload over the message limit is stored in S3 behind a pointer"""
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL, s3_client=self.s3,
+                                  spill_bucket='dlq-bucket', max_message_bytes=4096)
+        writer.add_items([item(i, padding=900) for i in range(60)])
+        writer.add_event({'Records': []}, 'boom')
+
+        result = writer.flush()
+
+        self.assertEqual((result.spilled, result.messages, result.items, result.events), (1, 1, 60, 1))
+        put = self.s3.put_object.call_args[1]
+        self.assertEqual(put['Bucket'], 'dlq-bucket')
+        self.assertTrue(put['Key'].startswith('dlq/') and put['Key'].endswith('.json.gz'))
+        payload = json.loads(gzip.decompress(put['Body']))
+        self.assertEqual(len(payload['failed_metrics']), 60)
+        self.assertEqual(payload['events'][0]['error'], 'boom')
+
+        pointer = self.sent_bodies()[0]
+        self.assertEqual(pointer['payload_s3'], {'bucket': 'dlq-bucket', 'key': put['Key']})
+        self.assertEqual((pointer['failed_metric_count'], pointer['event_count']), (60, 1))
+        self.assertNotIn('failed_metrics', pointer)
+
+    def test_small_payload_stays_inline(self):
+        """Test payloads that fit in one message are not spilled"""
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL, s3_client=self.s3, spill_bucket='dlq-bucket')
+        writer.add_items([item(1)])
+
+        writer.flush()
+
+        self.s3.put_object.assert_not_called()
+        self.assertEqual(self.sent_bodies()[0]['failed_metrics'], [item(1)])
+
+    def test_oversize_message_without_spill_is_dropped(self):
+        """Test a message that cannot fit is counted instead of failing silently"""
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL, max_message_bytes=1024)
+        writer.add_event({'payload': 'x' * 2048}, 'boom')
+
+        result = writer.flush()
+
+        self.assertEqual(result.dropped, 1)
+        self.sqs.send_message_batch.assert_not_called()
+
+    def test_failed_entries_retried_once(self):
+        """Test entries failing on the SQS side are retried once"""
+        responses = [
+            {'Successful': [{'Id': '0'}], 'Failed': [{'Id': '1', 'SenderFault': False, 'Code': 'InternalError'}]},
+            {'Successful': [{'Id': '1'}]}
+        ]
+        self.sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: responses.pop(0)
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL)
+        writer.add_event({'id': 1}, 'first')
+        writer.add_event({'id': 2}, 'second')
+
+        result = writer.flush()
+
+        self.assertEqual((result.requests, result.messages, result.dropped), (2, 2, 0))
+        retried = self.sqs.send_message_batch.call_args[1]['Entries']
+        self.assertEqual([e['Id'] for e in retried], ['1'])
+
+    def test_spill_failure_falls_back_to_inline(self):
+        """Test failures are still sent inline when the S3 spill fails"""
+        self.s3.put_object.side_effect = RuntimeError('AccessDenied')
+        writer = DeadLetterWriter(self.sqs, QUEUE_URL, s3_client=self.s3,
+                                  spill_bucket='dlq-bucket', max_message_bytes=4096)
+        writer.add_items([item(i, padding=900) for i in range(10)])
+
+        result = writer.flush()
+
+        self.assertEqual((result.spilled, result.items), (0, 10))
+
+    def test_empty_flush(self):
+        """Test flushing an empty buffer makes no calls"""
+        result = DeadLetterWriter(self.sqs, QUEUE_URL).flush()
+
+        self.assertEqual(result.requests, 0)
+        self.sqs.send_message_batch.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
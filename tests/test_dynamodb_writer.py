@@ -0,0 +1,190 @@
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.dynamodb_writer import (
+    ParallelBatchWriter, RetryBudget, call_with_retry, full_jitter_backoff, serialize_item
+)
+
+
+def make_items(count):
+    return [serialize_item({'metric_id': f'cpu-{i}', 'timestamp': i}) for i in range(count)]
+
+
+class TestParallelBatchWriter(unittest.TestCase):
+    """Unit tests for the pipelined BatchWriteItem engine"""
+
+    def test_keeps_requests_in_flight(self):
+        """Test several requests run concurrently but never above the limit"""
+        in_flight = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_write(RequestItems):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+            return {'UnprocessedItems': {}}
+
+        client = MagicMock()
+        client.batch_write_item.side_effect = slow_write
+
+        result = ParallelBatchWriter(client, 'InfraMetrics', concurrency=3).write(make_items(250))
+
+        self.assertEqual(result.succeeded, 250)
+        self.assertEqual(result.failed, 0)
+        self.assertEqual(client.batch_write_item.call_count, 10)
+        self.assertEqual(max(peak), 3)
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_resubmits_unprocessed_items(self, mock_sleep):
+        """Test only unprocessed items are sent again"""
+        items = make_items(5)
+        client = MagicMock()
+        client.batch_write_item.side_effect = [
+            {'UnprocessedItems': {'InfraMetrics': [{'PutRequest': {'Item': items[4]}}]}},
+            {'UnprocessedItems': {}},
+        ]
+
+        result = ParallelBatchWriter(client, 'InfraMetrics').write(items)
+
+        self.assertEqual(result.succeeded, 5)
+        self.assertEqual(result.retried, 1)
+        retry = client.batch_write_item.call_args_list[1][1]['RequestItems']['InfraMetrics']
+        self.assertEqual(retry, [{'PutRequest': {'Item': items[4]}}])
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_reports_failed_items(self, mock_sleep):
+        """Test non-retryable errors fail the request's items"""
+        client = MagicMock()
+        client.batch_write_item.side_effect = ClientError(
+            {'Error': {'Code': 'ValidationException'}}, 'BatchWriteItem'
+        )
+
+        result = ParallelBatchWriter(client, 'InfraMetrics').write(make_items(30))
+
+        self.assertEqual(result.succeeded, 0)
+        self.assertEqual(result.failed, 30)
+        self.assertEqual(len(result.failed_items), 30)
+        mock_sleep.assert_not_called()
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_throttled_request_retries_all_pending(self, mock_sleep):
+        """Test a rejected request is resent in full since nothing was written"""
+        client = MagicMock()
+        client.batch_write_item.side_effect = [
+            ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'BatchWriteItem'),
+            {'UnprocessedItems': {}},
+        ]
+
+        result = ParallelBatchWriter(client, 'InfraMetrics').write(make_items(3))
+
+        self.assertEqual((result.succeeded, result.retried, result.failed), (3, 3, 0))
+
+    def test_repeated_key_waits_for_earlier_request(self):
+        """Test a key repeated in a later request is written after the earlier one finishes"""
+        events = []
+        lock = threading.Lock()
+
+        def slow_first_write(RequestItems):
+            items = [r['PutRequest']['Item'] for r in RequestItems['InfraMetrics']]
+            first = items[0]['metric_id']['S'] == 'cpu-0'
+            with lock:
+                events.append(('start', first))
+            if first:
+                time.sleep(0.05)
+            with lock:
+                events.append(('end', first))
+            return {'UnprocessedItems': {}}
+
+        client = MagicMock()
+        client.batch_write_item.side_effect = slow_first_write
+        items = make_items(30) + [serialize_item({'metric_id': 'cpu-3', 'timestamp': 3, 'value': 2})]
+
+        writer = ParallelBatchWriter(client, 'InfraMetrics', concurrency=4,
+                                     key_attributes=('metric_id', 'timestamp'))
+        result = writer.write(items)
+
+        self.assertEqual(result.succeeded, 31)
+        self.assertLess(events.index(('end', True)), events.index(('start', False)))
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_collapsed_duplicates_follow_their_surviving_item(self, mock_sleep):
+        """Test duplicates collapsed before the write count as failed when the kept item fails"""
+        items = make_items(3) + [serialize_item({'metric_id': 'cpu-2', 'timestamp': 2})] * 2
+        # Unprocessed items come back as new dicts, not the objects that were sent
+        unprocessed = {'UnprocessedItems': {'InfraMetrics': [
+            {'PutRequest': {'Item': serialize_item({'metric_id': 'cpu-2', 'timestamp': 2})}}
+        ]}}
+        client = MagicMock()
+        client.batch_write_item.return_value = unprocessed
+
+        writer = ParallelBatchWriter(client, 'InfraMetrics', max_retries=1,
+                                     key_attributes=('metric_id', 'timestamp'))
+        result = writer.write(items)
+
+        self.assertEqual(len(client.batch_write_item.call_args_list[0][1]['RequestItems']['InfraMetrics']), 3)
+        self.assertEqual((result.succeeded, result.failed), (2, 3))
+        self.assertEqual(len(result.failed_items), 1)
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_retry_budget_is_shared(self, mock_sleep):
+        """Test retries stop once the invocation budget is spent"""
+        def unprocessed_all(RequestItems):
+            return {'UnprocessedItems': RequestItems}
+
+        client = MagicMock()
+        client.batch_write_item.side_effect = unprocessed_all
+        budget = RetryBudget(2)
+
+        result = ParallelBatchWriter(
+            client, 'InfraMetrics', concurrency=1, max_retries=5, retry_budget=budget
+        ).write(make_items(50))
+
+        self.assertEqual(result.succeeded, 0)
+        self.assertEqual(result.failed, 50)
+        self.assertEqual(budget.remaining, 0)
+        self.assertEqual(client.batch_write_item.call_count, 4)  # 2 requests + 2 retries
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_max_retries_matches_call_with_retry(self, mock_sleep):
+        """Test max_retries counts retries after the first attempt for batch and single calls"""
+        throttled = ClientError({'Error': {'Code': 'ThrottlingException'}}, 'BatchWriteItem')
+        client = MagicMock()
+        client.batch_write_item.side_effect = throttled
+        client.put_item.side_effect = throttled
+        result = ParallelBatchWriter(client, 'InfraMetrics', max_retries=2).write(make_items(1))
+        with self.assertRaises(ClientError):
+            call_with_retry(client.put_item, max_retries=2, TableName='InfraMetrics', Item={})
+        self.assertEqual(result.failed, 1)
+        self.assertEqual(client.batch_write_item.call_count, 3)
+        self.assertEqual(client.put_item.call_count, 3)
+        # The last allowed retry still succeeds
+        client.batch_write_item.side_effect = [throttled, throttled, {'UnprocessedItems': {}}]
+        result = ParallelBatchWriter(client, 'InfraMetrics', max_retries=2).write(make_items(1))
+        self.assertEqual((result.succeeded, result.failed), (1, 0))
+        client.batch_write_item.side_effect = [throttled, {'UnprocessedItems': {}}]
+        result = ParallelBatchWriter(client, 'InfraMetrics', max_retries=0).write(make_items(1))
+        self.assertEqual(result.failed, 1)
+
+    def test_full_jitter_backoff_bounds(self):
+        """Test delays stay within the exponential ceiling and cap"""
+        for attempt in range(10):
+            delay = full_jitter_backoff(attempt, base=0.1, cap=1.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(1.0, 0.1 * 2 ** attempt))
+
+
+if __name__ == '__main__':
+    unittest.main()
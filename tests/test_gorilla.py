@@ -0,0 +1,73 @@
+import sys
+import os
+import math
+import random
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.gorilla import BitReader, BitWriter, decode_block, encode_block
+
+START = 1768435200
+
+
+class TestGorilla(unittest.TestCase):
+    """Delta-of-delta / XOR block encoding"""
+
+    def assert_round_trip(self, timestamps, values):
+        decoded_timestamps, decoded_values = decode_block(encode_block(timestamps, values))
+        self.assertEqual(decoded_timestamps, timestamps)
+        self.assertEqual(len(decoded_values), len(values))
+        for expected, actual in zip(values, decoded_values):
+            if math.isnan(expected):
+                self.assertTrue(math.isnan(actual))
+            else:
+                self.assertEqual(actual, expected)
+                self.assertEqual(math.copysign(1, actual), math.copysign(1, expected))
+
+    def test_bit_round_trip(self):
+        writer = BitWriter()
+        fields = [(1, 1), (5, 3), (0x1FFF, 13), (2 ** 64 - 1, 64), (0, 7)]
+        for value, bits in fields:
+            writer.write(value, bits)
+        reader = BitReader(writer.to_bytes())
+        self.assertEqual([reader.read(bits) for _, bits in fields], [value for value, _ in fields])
+
+    def test_steady_series_is_compact(self):
+        timestamps = list(range(START, START + 3600, 60))
+        values = [42.0] * 60
+        block = encode_block(timestamps, values)
+        self.assertLess(len(block), 40)
+        self.assert_round_trip(timestamps, values)
+
+    def test_every_delta_of_delta_range(self):
+        deltas = [60, 60, 61, 59, 123, 60, 400, 60, 3000, 60, 10 ** 9, 1, 60]
+        timestamps = [START]
+        for delta in deltas:
+            timestamps.append(timestamps[-1] + delta)
+        self.assert_round_trip(timestamps, [float(i) for i in range(len(timestamps))])
+
+    def test_special_and_random_values(self):
+        self.assert_round_trip(list(range(START, START + 8)),
+                               [0.0, -0.0, float('inf'), float('-inf'), float('nan'), 1e-300, 1e300, -2.5])
+        rng = random.Random(7)
+        timestamps = sorted(rng.sample(range(START, START + 86400), 1000))
+        self.assert_round_trip(timestamps, [round(rng.uniform(0, 100), 2) for _ in timestamps])
+
+    def test_single_point_and_negative_timestamp(self):
+        self.assert_round_trip([-5], [3.25])
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            encode_block([], [])
+        with self.assertRaises(ValueError):
+            encode_block([START, START], [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            encode_block([START], [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            decode_block(encode_block([START, START + 60], [1.0, 2.5])[:10])
+
+
+if __name__ == '__main__':
+    unittest.main()
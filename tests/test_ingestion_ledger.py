@@ -0,0 +1,116 @@
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.ingestion_ledger import BloomFilter, IngestionLedger, object_id
+
+
+def record(**s3_object):
+    return {'s3': {'bucket': {'name': 'test-bucket'}, 'object': dict({'key': 'metrics/a.json'}, **s3_object)}}
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Unit tests for the warm-container Bloom filter"""
+
+    def test_no_false_negatives(self):
+        """Test every added value is reported as present"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        values = [f's3://bucket/key-{i}#etag' for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+        self.assertEqual(len(bloom), 1000)
+
+    def test_false_positive_rate(self):
+        """Test the false-positive rate stays near its target at capacity"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'added-{i}')
+
+        false_positives = sum(f'absent-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_starts_over_at_capacity(self):
+        """Test a full filter is cleared instead of saturating"""
+        bloom = BloomFilter(capacity=100, error_rate=0.01)
+        for i in range(100):
+            bloom.add(f'added-{i}')
+        bloom.add('next')
+
+        self.assertEqual(len(bloom), 1)
+        self.assertIn('next', bloom)
+        self.assertLess(sum(f'added-{i}' in bloom for i in range(100)), 10)
+
+
+class TestIngestionLedger(unittest.TestCase):
+    """Unit tests for the durable ingestion ledger"""
+
+    def test_object_id(self):
+        """Test version IDs win over ETags and unidentifiable records are skipped"""
+        self.assertEqual(object_id(record(eTag='e1')), 's3://test-bucket/metrics/a.json#e1')
+        self.assertEqual(object_id(record(eTag='e1', versionId='v1')), 's3://test-bucket/metrics/a.json#v1')
+        self.assertIsNone(object_id(record()))
+
+    def test_durable_hit_populates_bloom(self):
+        """Test a ledger hit is remembered so the next check is confirmed with a cheaper read"""
+        client = MagicMock()
+        client.get_item.return_value = {'Item': {'object_id': {'S': 'x'}, 'committed_at': {'N': '1'}}}
+        ledger = IngestionLedger(client, 'InfraMetricsLedger', bloom=BloomFilter(capacity=10))
+
+        self.assertTrue(ledger.is_processed('s3://b/k#e'))
+        self.assertTrue(ledger.is_processed('s3://b/k#e'))
+        reads = [c[1]['ConsistentRead'] for c in client.get_item.call_args_list]
+        self.assertEqual(reads, [True, False])
+
+    def test_bloom_false_positive_is_not_a_duplicate(self):
+        """Test a Bloom hit without a ledger record does not skip the object"""
+        client = MagicMock()
+        client.get_item.return_value = {}
+        bloom = BloomFilter(capacity=10)
+        bloom.add('s3://b/k#e')
+        ledger = IngestionLedger(client, 'InfraMetricsLedger', bloom=bloom)
+
+        self.assertFalse(ledger.is_processed('s3://b/k#e'))
+        reads = [c[1]['ConsistentRead'] for c in client.get_item.call_args_list]
+        self.assertEqual(reads, [False, True])
+
+    def test_commit_race(self):
+        """Test a losing conditional put reports the object as already committed"""
+        client = MagicMock()
+        client.put_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'PutItem')
+        ledger = IngestionLedger(client, 'InfraMetricsLedger')
+
+        self.assertFalse(ledger.commit('s3://b/k#e', metrics=10))
+        self.assertEqual(client.put_item.call_args[1]['Item']['metrics'], {'N': '10'})
+
+
+    def test_progress_of_incomplete_attempt(self):
+        """Test an incomplete attempt's stage progress is recorded and read back on the retry"""
+        client = MagicMock()
+        ledger = IngestionLedger(client, 'InfraMetricsLedger')
+        key = ('web-01', 'cpu', '1m', 1738440000)
+
+        self.assertTrue(ledger.record_progress('s3://b/k#e', {'rollups': [], 'sketches': [key]}))
+        item = client.put_item.call_args[1]['Item']
+        self.assertEqual(item['stages']['M']['rollups'], {'NULL': True})
+        self.assertEqual(item['stages']['M']['sketches'], {'SS': ['["web-01", "cpu", "1m", 1738440000]']})
+        self.assertEqual(client.put_item.call_args[1]['ConditionExpression'], 'attribute_not_exists(committed_at)')
+
+        client.get_item.return_value = {'Item': {'object_id': {'S': 's3://b/k#e'}, 'stages': item['stages']}}
+        retry = IngestionLedger(client, 'InfraMetricsLedger', bloom=BloomFilter(capacity=10))
+        self.assertFalse(retry.is_processed('s3://b/k#e'))
+        self.assertEqual(retry.progress('s3://b/k#e'), {'rollups': frozenset(), 'sketches': frozenset([key])})
+        self.assertEqual(retry.progress('s3://b/other#e'), {})
+        self.assertNotIn('s3://b/k#e', retry.bloom)
+
+
+if __name__ == '__main__':
+    unittest.main()
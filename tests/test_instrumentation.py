@@ -0,0 +1,65 @@
+import sys
+import os
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.instrumentation import Instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Unit tests for per-stage spans"""
+
+    def test_spans_accumulate_per_stage(self):
+        """Test repeated spans add up their counts and time"""
+        instrumentation = Instrumentation()
+        for _ in range(3):
+            with instrumentation.span('validate'):
+                sum(range(1000))
+
+        stages = instrumentation.snapshot()
+        self.assertEqual(stages['validate']['count'], 3)
+        self.assertGreater(stages['validate']['seconds'], 0)
+        self.assertNotIn('peak_kb', stages['validate'])
+
+    def test_iterate_times_each_item(self):
+        """Test the time spent producing items is attributed to the stage"""
+        instrumentation = Instrumentation()
+
+        items = list(instrumentation.iterate('download_parse', iter([1, 2, 3])))
+
+        self.assertEqual(items, [1, 2, 3])
+        # Three items plus the final StopIteration
+        self.assertEqual(instrumentation.snapshot()['download_parse']['count'], 4)
+
+    def test_memory_peaks(self):
+        """Test tracemalloc peaks are recorded and tracing is stopped afterwards"""
+        import tracemalloc
+
+        instrumentation = Instrumentation(trace_memory=True)
+        instrumentation.start()
+        try:
+            with instrumentation.span('parse'):
+                payload = bytearray(4 * 1024 * 1024)
+            del payload
+        finally:
+            instrumentation.stop()
+
+        self.assertGreaterEqual(instrumentation.snapshot()['parse']['peak_kb'], 4096)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_disabled_is_a_no_op(self):
+        """Test a disabled instance records nothing and returns iterables unchanged"""
+        instrumentation = Instrumentation(enabled=False, trace_memory=True)
+        source = iter([1])
+
+        with instrumentation.span('validate'):
+            pass
+
+        self.assertIs(instrumentation.iterate('parse', source), source)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import sys
+import os
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.item_encoder import ItemEncoder, parse_timestamp, ttl_timestamp
+
+
+class TestItemEncoder(unittest.TestCase):
+    """Unit tests for wire-format item encoding"""
+
+    def setUp(self):
+        self.metric = {
+            'metric_id': 'cpu-1738440000-host-001',
+            'timestamp': 1738440000,
+            'metric_type': 'cpu',
+            'value': 42.5,
+            'hostname': 'host-001'
+        }
+
+    def test_encode_with_defaults(self):
+        """Test per-file defaults and TTL are applied"""
+        encoder = ItemEncoder('eu-west-1', ttl_days=30, now=1738440000)
+
+        item = encoder.encode(self.metric)
+
+        self.assertEqual(item, {
+            'metric_id': {'S': 'cpu-1738440000-host-001'},
+            'timestamp': {'N': '1738440000'},
+            'metric_type': {'S': 'cpu'},
+            'value': {'N': '42.5'},
+            'unit': {'S': 'unknown'},
+            'hostname': {'S': 'host-001'},
+            'region': {'S': 'eu-west-1'},
+            'environment': {'S': 'unknown'},
+            'ttl': {'N': str(1738440000 + 30 * 86400)}
+        })
+
+    def test_encode_with_overrides_and_tags(self):
+        """Test metric fields override defaults and tags are serialized"""
+        metric = dict(self.metric, region='us-east-1', environment='prod', unit='percent',
+                      tags={'team': 'infra'})
+
+        item = ItemEncoder('eu-west-1').encode(metric)
+
+        self.assertEqual(item['region'], {'S': 'us-east-1'})
+        self.assertEqual(item['environment'], {'S': 'prod'})
+        self.assertEqual(item['unit'], {'S': 'percent'})
+        self.assertEqual(item['tags'], {'M': {'team': {'S': 'infra'}}})
+
+    def test_encode_all_is_lazy(self):
+        """Test batches are encoded on demand"""
+        items = ItemEncoder('eu-west-1').encode_all([self.metric] * 3)
+        self.assertEqual(len(list(items)), 3)
+
+    def test_parse_timestamp(self):
+        """Test ISO strings and epoch numbers both convert to epoch seconds"""
+        self.assertEqual(parse_timestamp('2026-01-31T12:00:00Z'), 1769860800)
+        self.assertEqual(parse_timestamp('2026-01-31T12:00:00+00:00'), 1769860800)
+        self.assertEqual(parse_timestamp(1769860800.7), 1769860800)
+
+    def test_ttl_timestamp(self):
+        """Test TTL is the retention period past the given time"""
+        self.assertEqual(ttl_timestamp(1, now=100.9), 100 + 86400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import os
+import io
+import json
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.json_stream import iter_json_records, iter_batches
+
+
+def parse(payload, chunk_size=7):
+    """Parse a str payload with a deliberately tiny chunk size."""
+    return list(iter_json_records(io.BytesIO(payload.encode('utf-8')), chunk_size=chunk_size))
+
+
+class TestJsonStream(unittest.TestCase):
+    """Unit tests for the incremental JSON record parser"""
+
+    def setUp(self):
+        self.records = [
+            {'metric_id': f'cpu-1738440000-host-00{i}', 'value': 12.5 * i, 'host': 'hôst'}
+            for i in range(5)
+        ]
+
+    def test_json_array(self):
+        """Test arrays are split into records across chunk boundaries"""
+        self.assertEqual(parse(json.dumps(self.records, indent=2)), self.records)
+
+    def test_single_object(self):
+        """Test a single object is returned as one record"""
+        self.assertEqual(parse(json.dumps(self.records[0])), [self.records[0]])
+
+    def test_ndjson(self):
+        """Test newline-delimited records as written by data_collector.py"""
+        payload = '\n'.join(json.dumps(r) for r in self.records) + '\n'
+        self.assertEqual(parse(payload), self.records)
+
+    def test_empty_inputs(self):
+        """Test empty bodies and empty arrays yield nothing"""
+        self.assertEqual(parse(''), [])
+        self.assertEqual(parse('  [ ]  '), [])
+
+    def test_multibyte_split_across_chunks(self):
+        """Test UTF-8 sequences split between reads decode correctly"""
+        for chunk_size in range(1, 5):
+            self.assertEqual(parse(json.dumps(self.records), chunk_size), self.records)
+
+    def test_utf8_bom(self):
+        """Test a leading byte order mark is ignored"""
+        payload = b'\xef\xbb\xbf' + json.dumps(self.records).encode('utf-8')
+        self.assertEqual(list(iter_json_records(io.BytesIO(payload))), self.records)
+
+    def test_invalid_json(self):
+        """Test malformed input raises JSONDecodeError"""
+        for payload in ('invalid json{', '[{"a": 1},', '[{"a": 1} {"b": 2}]', '[{"a": 1}] x'):
+            with self.assertRaises(json.JSONDecodeError):
+                parse(payload)
+
+    def test_non_object_records(self):
+        """Test scalar top-level values are rejected"""
+        with self.assertRaises(ValueError):
+            parse('[1, 2]')
+
+    def test_record_size_limit(self):
+        """Test an unterminated record stops buffering at the limit"""
+        stream = io.BytesIO(b'[{"a": "' + b'x' * 1000)
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_records(stream, chunk_size=16, max_record_chars=100))
+        self.assertLess(stream.tell(), 1000)
+
+    def test_iter_batches(self):
+        """Test records are grouped into bounded slices"""
+        batches = list(iter_batches(iter(range(7)), 3))
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+
+if __name__ == '__main__':
+    unittest.main()
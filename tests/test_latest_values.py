@@ -0,0 +1,139 @@
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from botocore.exceptions import ClientError
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common.latest_values import LatestValueTracker, batch_get_latest
+
+
+def metric(timestamp, value, hostname='host-001', metric_type='cpu'):
+    return {
+        'metric_id': f'{metric_type}-{timestamp}-{hostname}',
+        'timestamp': timestamp,
+        'value': value,
+        'hostname': hostname,
+        'metric_type': metric_type,
+        'unit': 'percent'
+    }
+
+
+def stored(hostname, metric_type, timestamp, value):
+    return {
+        'hostname': {'S': hostname},
+        'metric_type': {'S': metric_type},
+        'timestamp': {'N': str(timestamp)},
+        'value': {'N': str(value)},
+        'unit': {'S': 'percent'}
+    }
+
+
+class TestLatestValueTracker(unittest.TestCase):
+    """Unit tests for conditional latest-value items"""
+
+    def test_fold_keeps_newest_per_series(self):
+        """Test out-of-order points reduce to the newest one per series"""
+        tracker = LatestValueTracker()
+        tracker.fold([metric(30, 3.0), metric(10, 1.0), metric(20, 2.0, hostname='host-002')])
+        tracker.fold([metric(25, 2.5)])
+
+        self.assertEqual(tracker.latest[('host-001', 'cpu')]['timestamp'], 30)
+        self.assertEqual(tracker.latest[('host-002', 'cpu')]['timestamp'], 20)
+
+    def test_commit_counts_stale_writes(self):
+        """Test a failed timestamp condition counts as stale, not as a failure"""
+        client = MagicMock()
+        client.update_item.side_effect = [
+            {},
+            ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'UpdateItem'),
+        ]
+
+        tracker = LatestValueTracker()
+        tracker.fold([metric(30, 3.0), metric(20, 2.0, hostname='host-002')])
+
+        self.assertEqual(tracker.commit(client, 'InfraMetricsLatest', concurrency=1), (1, 1, 0))
+        kwargs = client.update_item.call_args_list[0][1]
+        self.assertEqual(kwargs['ConditionExpression'], 'attribute_not_exists(#ts) OR #ts < :ts')
+        self.assertEqual(kwargs['Key'], {'hostname': {'S': 'host-001'}, 'metric_type': {'S': 'cpu'}})
+        self.assertEqual(len(tracker), 0)
+
+
+class TestBatchGetLatest(unittest.TestCase):
+    """Unit tests for BatchGetItem reads of latest values"""
+
+    @patch('pipeline_common.latest_values.time.sleep')
+    def test_chunks_and_retries_unprocessed_keys(self, mock_sleep):
+        """Test keys are requested 100 at a time and unprocessed keys are resubmitted"""
+        series = [(f'host-{i:03d}', 'cpu') for i in range(150)]
+        unprocessed = {'hostname': {'S': 'host-099'}, 'metric_type': {'S': 'cpu'}}
+
+        def fake_get(RequestItems):
+            keys = RequestItems['InfraMetricsLatest']['Keys']
+            items = [stored(k['hostname']['S'], 'cpu', 100, 1.5) for k in keys if k != unprocessed]
+            response = {'Responses': {'InfraMetricsLatest': items}}
+            if unprocessed in keys and len(keys) > 1:
+                response['UnprocessedKeys'] = {'InfraMetricsLatest': {'Keys': [unprocessed]}}
+            return response
+
+        client = MagicMock()
+        client.batch_get_item.side_effect = fake_get
+
+        results = batch_get_latest(client, 'InfraMetricsLatest', series)
+
+        self.assertEqual(client.batch_get_item.call_count, 3)
+        self.assertEqual(len(results), 149)
+        self.assertEqual(results[('host-000', 'cpu')],
+                         {'timestamp': 100, 'value': 1.5, 'unit': 'percent', 'metric_id': None})
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestLatestValuesTable(unittest.TestCase):
+    """Conditional updates and reads against a mocked latest-value table"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client('dynamodb', region_name='us-east-1')
+        self.client.create_table(
+            TableName='InfraMetricsLatest',
+            KeySchema=[{'AttributeName': 'hostname', 'KeyType': 'HASH'},
+                       {'AttributeName': 'metric_type', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'hostname', 'AttributeType': 'S'},
+                                  {'AttributeName': 'metric_type', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def test_newest_value_wins(self):
+        """Test updates are accepted by DynamoDB and an older file cannot overwrite a newer value"""
+        tracker = LatestValueTracker()
+        tracker.fold([metric(30, 3.0), metric(20, 2.0, hostname='host-002')])
+        self.assertEqual(tracker.commit(self.client, 'InfraMetricsLatest'), (2, 0, 0))
+
+        tracker.fold([metric(10, 1.0), metric(40, 4.0, hostname='host-002')])
+        self.assertEqual(tracker.commit(self.client, 'InfraMetricsLatest'), (1, 1, 0))
+
+        results = batch_get_latest(self.client, 'InfraMetricsLatest',
+                                   [('host-001', 'cpu'), ('host-002', 'cpu'), ('host-003', 'cpu')])
+        self.assertEqual(results, {
+            ('host-001', 'cpu'): {'timestamp': 30, 'value': 3.0, 'unit': 'percent',
+                                  'metric_id': 'cpu-30-host-001'},
+            ('host-002', 'cpu'): {'timestamp': 40, 'value': 4.0, 'unit': 'percent',
+                                  'metric_id': 'cpu-40-host-002'}
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
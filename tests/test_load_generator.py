@@ -0,0 +1,120 @@
+import sys
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.batch_validation import validate_batch
+from pipeline_common.load_generator import (
+    LoadGenerator, LocalObjectSink, S3ObjectSink, parse_metric_specs, run_load
+)
+
+START = 1738440000
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """Unit tests for the seeded synthetic load generator"""
+
+    def test_parse_metric_specs(self):
+        """Test metric specs with and without distributions"""
+        specs = parse_metric_specs('cpu:normal:55:15:percent, network:lognormal:7:1:bytes, disk')
+
+        self.assertEqual([s.name for s in specs], ['cpu', 'network', 'disk'])
+        self.assertEqual((specs[0].distribution, specs[0].a, specs[0].b), ('normal', 55.0, 15.0))
+        self.assertEqual(specs[1].unit, 'bytes')
+        self.assertEqual(specs[2].distribution, 'uniform')
+
+    def test_invalid_specs(self):
+        """Test malformed specs and unknown distributions are rejected"""
+        for value in ('', 'cpu:normal', 'cpu:zipf:1:2'):
+            with self.assertRaises(ValueError):
+                parse_metric_specs(value)
+
+    def test_same_seed_same_values(self):
+        """Test values depend only on the seed and the step"""
+        first = LoadGenerator(hosts=500, start=START, seed=7)
+        second = LoadGenerator(hosts=500, start=START, seed=7)
+
+        self.assertTrue((first.values(3) == second.values(3)).all())
+        self.assertFalse((first.values(3) == LoadGenerator(hosts=500, start=START, seed=8).values(3)).all())
+        self.assertFalse((first.values(3) == first.values(4)).all())
+
+    def test_distributions_respect_ranges(self):
+        """Test uniform bounds and percent clipping"""
+        generator = LoadGenerator(hosts=10000, metric_specs='cpu:normal:95:20:percent,net:uniform:100:200:bytes',
+                                  start=START)
+        cpu, net = generator.values(0)
+
+        self.assertLessEqual(cpu.max(), 100.0)
+        self.assertGreaterEqual(cpu.min(), 0.0)
+        self.assertTrue(((net >= 100.0) & (net <= 200.0)).all())
+
+    def test_batch_records_are_valid(self):
+        """Test records carry the collector format and pass processor validation"""
+        generator = LoadGenerator(hosts=50, interval=30, start=START)
+        records = generator.batch(2)
+
+        self.assertEqual(len(records), 200)
+        self.assertEqual(records[0]['metric_id'], f'cpu-{START + 60}-host-001')
+        self.assertEqual(records[0]['host_id'], records[0]['hostname'])
+        self.assertEqual(len({r['metric_id'] for r in records}), 200)
+        self.assertTrue(validate_batch(records).mask.all())
+
+    def test_batch_slices_match_full_step(self):
+        """Test building a step in slices yields the same records"""
+        generator = LoadGenerator(hosts=30, start=START)
+        full = generator.batch(0)
+        sliced = generator.batch(0, 0, 50) + generator.batch(0, 50, 50) + generator.batch(0, 100, 50)
+
+        self.assertEqual(sliced, full)
+
+    def test_step_drawn_once_for_all_slices(self):
+        """Test the objects of one step share a single draw"""
+        generator = LoadGenerator(hosts=30, start=START)
+        with patch.object(generator, 'values', wraps=generator.values) as values:
+            for offset in range(0, generator.records_per_step, 20):
+                generator.batch(0, offset, 20)
+            generator.batch(1, 0, 20)
+        self.assertEqual([c.args for c in values.call_args_list], [(0,), (1,)])
+
+    def test_run_load_local(self):
+        """Test a run writes every record to local files"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        generator = LoadGenerator(hosts=250, start=START)
+
+        stats = run_load(generator, LocalObjectSink(directory), steps=2, records_per_object=400,
+                         shape='ndjson', codec='gzip', concurrency=4)
+
+        self.assertEqual(stats['objects'], 6)
+        self.assertEqual(stats['records'], 2000)
+        written = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                self.assertTrue(name.endswith('.json.gz'))
+                with gzip.open(os.path.join(root, name), 'rt') as f:
+                    written.extend(json.loads(line) for line in f)
+        self.assertEqual(len(written), 2000)
+
+    def test_s3_sink(self):
+        """Test S3 objects are tagged with their content encoding"""
+        s3 = MagicMock()
+        generator = LoadGenerator(hosts=10, start=START)
+
+        run_load(generator, S3ObjectSink(s3, 'load-bucket'), codec='gzip')
+
+        put = s3.put_object.call_args[1]
+        self.assertEqual(put['Bucket'], 'load-bucket')
+        self.assertEqual(put['ContentEncoding'], 'gzip')
+        self.assertEqual(put['Key'], f'load-test/2025/02/01/metrics-{START}-00000.json.gz')
+        self.assertEqual(len(json.loads(gzip.decompress(put['Body']))), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import sys
+import os
+import unittest
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common import metric_query
+
+TABLE = 'InfraMetrics'
+START = 1768435200
+
+
+class TestSplitRange(unittest.TestCase):
+    """Sub-range splitting"""
+
+    def test_ranges_are_contiguous_and_cover_the_interval(self):
+        ranges = metric_query.split_range(START, START + 86400, 7)
+        self.assertEqual(len(ranges), 7)
+        self.assertEqual(ranges[0][0], START)
+        self.assertEqual(ranges[-1][1], START + 86399)
+        for (_, last), (first, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(first, last + 1)
+
+    def test_short_and_empty_ranges(self):
+        self.assertEqual(metric_query.split_range(10, 13, 16), [(10, 10), (11, 11), (12, 12)])
+        self.assertEqual(metric_query.split_range(10, 10, 4), [])
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestQueryMetrics(unittest.TestCase):
+    """Parallel queries against a mocked table"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client('dynamodb', region_name='us-east-1')
+        self.client.create_table(
+            TableName=TABLE,
+            KeySchema=[{'AttributeName': 'metric_id', 'KeyType': 'HASH'},
+                       {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'metric_id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'timestamp', 'AttributeType': 'N'},
+                                  {'AttributeName': 'metric_type', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{
+                'IndexName': metric_query.INDEX_NAME,
+                'KeySchema': [{'AttributeName': 'metric_type', 'KeyType': 'HASH'},
+                              {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        for step in range(60):
+            ts = START + step * 60
+            for host in range(3):
+                for metric_type in ('cpu', 'memory'):
+                    self.client.put_item(TableName=TABLE, Item={
+                        'metric_id': {'S': f'{metric_type}-{ts}-host-{host}'},
+                        'timestamp': {'N': str(ts)},
+                        'metric_type': {'S': metric_type},
+                        'value': {'N': str(step + host / 10)},
+                        'hostname': {'S': f'host-{host}'}
+                    })
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def test_reads_the_whole_range_in_order(self):
+        result = metric_query.query_metrics(self.client, TABLE, 'cpu', START, START + 3600, segments=8)
+        self.assertEqual(len(result), 180)
+        self.assertEqual(result.timestamps.dtype, 'int64')
+        self.assertEqual(result.values.dtype, 'float64')
+        self.assertTrue((result.timestamps[1:] >= result.timestamps[:-1]).all())
+        self.assertEqual(result.pages, 8)
+
+    def test_range_end_is_exclusive(self):
+        result = metric_query.query_metrics(self.client, TABLE, 'cpu', START + 60, START + 180)
+        self.assertEqual(sorted(set(result.timestamps.tolist())), [START + 60, START + 120])
+
+    def test_host_filter(self):
+        result = metric_query.query_metrics(self.client, TABLE, 'memory', START, START + 3600,
+                                            hosts=['host-1'], segments=4)
+        self.assertEqual(len(result), 60)
+        self.assertEqual(set(result.hostnames), {'host-1'})
+        self.assertEqual(result.scanned, 180)
+        timestamps, values = result.for_host('host-1')
+        self.assertEqual(values[0], 0.1)
+
+    def test_large_host_filter_applies_after_reading(self):
+        hosts = ['host-2'] + [f'other-{i}' for i in range(metric_query.MAX_FILTER_HOSTS)]
+        result = metric_query.query_metrics(self.client, TABLE, 'cpu', START, START + 3600, hosts=hosts)
+        self.assertEqual(len(result), 60)
+        self.assertEqual(set(result.hostnames), {'host-2'})
+
+    def test_empty_host_filter(self):
+        result = metric_query.query_metrics(self.client, TABLE, 'cpu', START, START + 3600, hosts=[])
+        self.assertEqual(len(result), 0)
+        self.assertEqual(result.pages, 0)
+
+    def test_empty_result(self):
+        result = metric_query.query_metrics(self.client, TABLE, 'disk', START, START + 3600)
+        self.assertEqual(len(result), 0)
+        self.assertEqual(result.timestamps.dtype, 'int64')
+
+
+if __name__ == '__main__':
+    unittest.main()
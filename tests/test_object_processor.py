@@ -0,0 +1,214 @@
+import sys
+import os
+import io
+import gzip
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.object_processor import ObjectProcessor, StageConfig, download_records, new_processing_summary
+from pipeline_common.series_keys import create_encoder
+
+TABLE = 'InfraMetrics'
+BASE_TS = 1738675200
+
+RECORD = {
+    'eventName': 'ObjectCreated:Put',
+    's3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': 'metrics/test.json'}}
+}
+
+
+def metric(i=0, **overrides):
+    return dict({
+        'metric_id': f'test-{i}',
+        'timestamp': BASE_TS + i * 60,
+        'metric_type': 'cpu_utilization',
+        'value': 75.5,
+        'unit': 'percent',
+        'hostname': 'server-001',
+        'region': 'us-east-1',
+        'environment': 'production'
+    }, **overrides)
+
+
+def make_processor(client, s3=None, **kwargs):
+    return ObjectProcessor(client, s3 or MagicMock(), TABLE, lambda: create_encoder('metric_id', 'us-east-1'),
+                           'us-east-1', **kwargs)
+
+
+def s3_body(payload):
+    return {'Body': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+
+class TestDownloadRecords(unittest.TestCase):
+    """Streaming download and parse errors"""
+
+    def test_json_array(self):
+        s3 = MagicMock()
+        s3.get_object.return_value = s3_body([metric()])
+        records = list(download_records(s3, 'test-bucket', 'test.json'))
+        self.assertEqual([record['metric_id'] for record in records], ['test-0'])
+        s3.get_object.assert_called_once_with(Bucket='test-bucket', Key='test.json')
+
+    def test_ndjson_and_gzip(self):
+        s3 = MagicMock()
+        s3.get_object.return_value = {'Body': io.BytesIO('\n'.join(json.dumps(metric(i)) for i in range(3)).encode())}
+        self.assertEqual(len(list(download_records(s3, 'test-bucket', 'test.json'))), 3)
+        body = gzip.compress(json.dumps([metric(), metric(1)]).encode('utf-8'))
+        s3.get_object.return_value = {'Body': io.BytesIO(body), 'ContentEncoding': 'gzip'}
+        self.assertEqual(len(list(download_records(s3, 'test-bucket', 'test.json.gz'))), 2)
+
+    def test_errors_are_raised(self):
+        s3 = MagicMock()
+        s3.get_object.return_value = {'Body': io.BytesIO(b'invalid json{')}
+        with self.assertRaises(json.JSONDecodeError):
+            list(download_records(s3, 'test-bucket', 'test.json'))
+        s3.get_object.side_effect = ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        with self.assertRaises(ClientError):
+            list(download_records(s3, 'test-bucket', 'test.json'))
+
+
+class TestWrite(unittest.TestCase):
+    """Raw table writes"""
+
+    def test_parallel_batches(self):
+        client = MagicMock()
+        client.batch_write_item.return_value = {'UnprocessedItems': {}}
+        result = make_processor(client).write([metric(i) for i in range(60)])
+        self.assertEqual((result.succeeded, result.failed, result.retried), (60, 0, 0))
+        self.assertEqual(client.batch_write_item.call_count, 3)  # 25 + 25 + 10
+        request = client.batch_write_item.call_args_list[0][1]['RequestItems'][TABLE]
+        self.assertEqual(request[0]['PutRequest']['Item']['value'], {'N': '75.5'})
+
+    def test_duplicate_keys_collapse(self):
+        client = MagicMock()
+        client.batch_write_item.return_value = {'UnprocessedItems': {}}
+        result = make_processor(client).write([metric()] * 3)
+        self.assertEqual((result.succeeded, result.failed), (3, 0))
+        self.assertEqual(len(client.batch_write_item.call_args[1]['RequestItems'][TABLE]), 1)
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_throttling_is_retried(self, mock_sleep):
+        client = MagicMock()
+        client.batch_write_item.side_effect = [
+            ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'BatchWriteItem'),
+            {'UnprocessedItems': {}}
+        ]
+        result = make_processor(client).write([metric()])
+        mock_sleep.assert_called()
+        self.assertEqual((result.succeeded, result.failed, result.retried), (1, 0, 1))
+
+    def test_chunk_only_skips_raw_items(self):
+        client = MagicMock()
+        stages = StageConfig(chunk_table='InfraMetricsChunks', chunk_only=True)
+        result = make_processor(client, stages=stages).write([metric()])
+        self.assertEqual(result.succeeded, 0)
+        client.batch_write_item.assert_not_called()
+        self.assertFalse(StageConfig(chunk_only=True).chunk_only)
+
+
+class TestProcessS3Record(unittest.TestCase):
+    """Stage orchestration for one object"""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.s3 = MagicMock()
+        self.s3.get_object.return_value = s3_body([metric(i) for i in range(10)] + [{'metric_id': 'broken'}])
+
+        def throttle_last_two(RequestItems):
+            return {'UnprocessedItems': {TABLE: RequestItems[TABLE][-2:]}}
+
+        self.client.batch_write_item.side_effect = throttle_last_two
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_failed_items_go_to_dead_letters(self, mock_sleep):
+        dead_letters = MagicMock()
+        summary = new_processing_summary()
+        make_processor(self.client, self.s3, dead_letters=dead_letters).process_s3_record(RECORD, summary)
+        # Queued as the metrics that were received, not as DynamoDB items
+        self.assertEqual(dead_letters.add_items.call_args[0][0], [metric(8), metric(9)])
+        self.assertEqual((summary['total_metrics'], summary['invalid_metrics']), (11, 1))
+        self.assertEqual((summary['successful_writes'], summary['failed_writes']), (8, 2))
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_redelivered_failures_skip_dead_letters(self, mock_sleep):
+        dead_letters = MagicMock()
+        processor = make_processor(self.client, self.s3, dead_letters=dead_letters, redelivered=True)
+        processor.process_s3_record(RECORD, new_processing_summary())
+        dead_letters.add_items.assert_not_called()
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_partial_redelivered_object_skips_sketches(self, mock_sleep):
+        stages = StageConfig(sketch_table='InfraMetricsSketches')
+        summary = new_processing_summary()
+        make_processor(self.client, self.s3, stages=stages, redelivered=True).process_s3_record(RECORD, summary)
+        # The redelivery of the whole object merges its points once
+        self.client.get_item.assert_not_called()
+        self.client.put_item.assert_not_called()
+        self.assertEqual(summary['sketch_updates'], 0)
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_partial_object_merges_written_points(self, mock_sleep):
+        from pipeline_common.sketches import DDSketch
+
+        self.client.get_item.return_value = {}
+        stages = StageConfig(sketch_table='InfraMetricsSketches')
+        summary = new_processing_summary()
+        make_processor(self.client, self.s3, stages=stages).process_s3_record(RECORD, summary)
+        # Nothing retries the object, so the eight points that were written are merged now
+        sketch = DDSketch.from_bytes(self.client.put_item.call_args.kwargs['Item']['sketch']['B'])
+        self.assertEqual(sketch.count, 8)
+        self.assertEqual(summary['sketch_updates'], 1)
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_parquet_rows_are_the_written_points(self, mock_sleep):
+        sink = MagicMock()
+        sink.add.return_value = []
+        make_processor(self.client, self.s3, parquet_sink=sink).process_s3_record(RECORD, new_processing_summary())
+        self.assertEqual(sink.add.call_args[0][0], [metric(i) for i in range(8)])
+
+        # A redelivered object adds its rows on the attempt that writes them all
+        sink.reset_mock()
+        self.s3.get_object.return_value = s3_body([metric(i) for i in range(10)])
+        processor = make_processor(self.client, self.s3, parquet_sink=sink, redelivered=True)
+        processor.process_s3_record(RECORD, new_processing_summary())
+        sink.add.assert_not_called()
+
+    def test_empty_object_raises(self):
+        self.s3.get_object.return_value = s3_body([])
+        with self.assertRaises(ValueError):
+            make_processor(self.client, self.s3).process_s3_record(RECORD, new_processing_summary())
+
+
+class TestProcessInlineMetrics(unittest.TestCase):
+    """Stage orchestration for the inline metrics of a batch"""
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_failed_messages_are_left_out_of_sketches(self, mock_sleep):
+        from pipeline_common.sketches import DDSketch
+
+        client = MagicMock()
+        client.batch_write_item.side_effect = lambda RequestItems: {'UnprocessedItems': {
+            TABLE: [request for request in RequestItems[TABLE]
+                    if request['PutRequest']['Item']['metric_id']['S'] == 'test-3']}}
+        client.get_item.return_value = {}
+        metrics = [metric(i, value=float(i)) for i in range(6)]
+        owners = ['m1', 'm1', 'm1', 'm2', 'm2', 'm2']
+        summary = new_processing_summary()
+
+        processor = make_processor(client, stages=StageConfig(sketch_table='InfraMetricsSketches'), redelivered=True)
+        failed_ids = processor.process_inline_metrics(metrics, owners, summary)
+
+        self.assertEqual(failed_ids, {'m2'})
+        sketch = DDSketch.from_bytes(client.put_item.call_args.kwargs['Item']['sketch']['B'])
+        self.assertEqual((sketch.count, sketch.max), (3, 2.0))
+        self.assertEqual(summary['sketch_updates'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys
+import os
+import io
+import unittest
+from unittest.mock import MagicMock
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pipeline_common.parquet_sink import ParquetSink, partition_path
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+@unittest.skipIf(pq is None, 'pyarrow not installed')
+class TestParquetSink(unittest.TestCase):
+    """Unit tests for the Hive-partitioned Parquet sink"""
+
+    def setUp(self):
+        self.s3 = MagicMock()
+        self.metrics = [
+            {'metric_id': f'{t}-{ts}-host-001', 'timestamp': ts, 'metric_type': t,
+             'value': 10.0 + i, 'hostname': 'host-001'}
+            for i, (t, ts) in enumerate([('cpu', 1738440000), ('cpu', 1738440060),
+                                         ('memory', 1738440000), ('cpu', 1738447200)])
+        ]
+
+    def written(self):
+        """Map partition path -> table for every put_object call."""
+        tables = {}
+        for call in self.s3.put_object.call_args_list:
+            key = call[1]['Key']
+            tables[key.rsplit('/', 1)[0]] = pq.read_table(io.BytesIO(call[1]['Body']))
+        return tables
+
+    def test_flush_writes_one_file_per_partition(self):
+        """Test rows are grouped by dt/hour/metric_type"""
+        sink = ParquetSink(self.s3, 'analytics-bucket')
+
+        self.assertEqual(sink.add(self.metrics, 'eu-west-1'), [])
+        keys = sink.flush()
+
+        self.assertEqual(len(keys), 3)
+        tables = self.written()
+        cpu = tables['parquet/metrics/dt=2025-02-01/hour=20/metric_type=cpu']
+        self.assertEqual(cpu.column('timestamp').to_pylist(), [1738440000, 1738440060])
+        self.assertEqual(cpu.column('region').to_pylist(), ['eu-west-1', 'eu-west-1'])
+        self.assertNotIn('metric_type', cpu.column_names)
+        self.assertIn('parquet/metrics/dt=2025-02-01/hour=22/metric_type=cpu', tables)
+        self.assertEqual(sink.rows_written, 4)
+        self.assertEqual(sink.buffered_rows, 0)
+
+    def test_threshold_flush(self):
+        """Test a partition is written as soon as it reaches max_rows"""
+        sink = ParquetSink(self.s3, 'analytics-bucket', max_rows=2)
+
+        keys = sink.add(self.metrics[:2])
+
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(sink.buffered_rows, 0)
+
+    def test_partition_path_escapes_metric_type(self):
+        """Test metric types cannot break out of their partition"""
+        self.assertEqual(partition_path(1738440000, 'disk/io=read'),
+                         'dt=2025-02-01/hour=20/metric_type=disk%2Fio%3Dread')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from botocore.exceptions import ClientError
+
+from pipeline_common.rollups import RollupAccumulator, parse_resolutions, query_rollups
+
+
+def metric(timestamp, value, hostname='host-001', metric_type='cpu'):
+    return {'timestamp': timestamp, 'value': value, 'hostname': hostname, 'metric_type': metric_type}
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'UpdateItem')
+
+
+class TestRollupAccumulator(unittest.TestCase):
+    """Unit tests for incremental rollup aggregation"""
+
+    def test_fold_groups_by_window(self):
+        """Test metrics fold into per-host, per-type, per-window aggregates"""
+        rollups = RollupAccumulator(('1m', '1h'))
+        rollups.fold([
+            metric(1738440000, 10.0),
+            metric(1738440030, 30.0),
+            metric(1738440060, 20.0),
+            metric(1738440000, 5.0, hostname='host-002'),
+        ])
+
+        aggregates = rollups.aggregates
+        self.assertEqual(aggregates[('host-001', 'cpu', '1m', 1738440000)], [2, 40.0, 10.0, 30.0])
+        self.assertEqual(aggregates[('host-001', 'cpu', '1m', 1738440060)], [1, 20.0, 20.0, 20.0])
+        self.assertEqual(aggregates[('host-001', 'cpu', '1h', 1738440000)], [3, 60.0, 10.0, 30.0])
+        self.assertEqual(len(rollups), 5)
+
+        rollups.retain({('host-002', 'cpu', '1m', 1738440000)})
+        self.assertEqual(list(rollups.aggregates), [('host-002', 'cpu', '1m', 1738440000)])
+
+    def test_commit_issues_one_update_per_window(self):
+        """Test each aggregate becomes one ADD/SET UpdateItem and the accumulator resets"""
+        client = MagicMock()
+        client.update_item.return_value = {'Attributes': {'min': {'N': '10.0'}, 'max': {'N': '30.0'}}}
+
+        rollups = RollupAccumulator(('1m',))
+        rollups.fold([metric(1738440000, 10.0), metric(1738440030, 30.0)])
+        committed, failed = rollups.commit(client, 'InfraMetricsRollups')
+
+        self.assertEqual((committed, failed), (1, []))
+        self.assertEqual(len(rollups), 0)
+        kwargs = client.update_item.call_args[1]
+        self.assertEqual(kwargs['Key'], {
+            'series': {'S': 'host-001#cpu#1m'},
+            'window_start': {'N': '1738440000'}
+        })
+        self.assertTrue(kwargs['UpdateExpression'].startswith('ADD #count :count, #sum :sum'))
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':count'], {'N': '2'})
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':sum'], {'N': '40.0'})
+
+    def test_late_data_tightens_stored_extremes(self):
+        """Test a batch that beats the stored min/max issues conditional follow-ups"""
+        client = MagicMock()
+        client.update_item.side_effect = [
+            {'Attributes': {'min': {'N': '15.0'}, 'max': {'N': '25.0'}}},
+            {},
+            client_error('ConditionalCheckFailedException'),
+        ]
+
+        rollups = RollupAccumulator(('1m',))
+        rollups.fold([metric(1738440000, 10.0), metric(1738440030, 30.0)])
+        committed, failed = rollups.commit(client, 'InfraMetricsRollups')
+
+        self.assertEqual((committed, failed), (1, []))
+        min_call, max_call = client.update_item.call_args_list[1:]
+        self.assertEqual(min_call[1]['ConditionExpression'], '#min > :value')
+        self.assertEqual(min_call[1]['ExpressionAttributeValues'], {':value': {'N': '10.0'}})
+        self.assertEqual(max_call[1]['ConditionExpression'], '#max < :value')
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_commit_retries_throttling(self, mock_sleep):
+        """Test throttled updates are retried and permanent errors are counted"""
+        client = MagicMock()
+        client.update_item.side_effect = [
+            client_error('ProvisionedThroughputExceededException'),
+            {'Attributes': {}},
+        ]
+
+        rollups = RollupAccumulator(('1m',))
+        rollups.fold([metric(1738440000, 1.0)])
+        self.assertEqual(rollups.commit(client, 'InfraMetricsRollups', concurrency=1), (1, []))
+
+        client.update_item.side_effect = client_error('ValidationException')
+        rollups.fold([metric(1738440000, 1.0)])
+        self.assertEqual(rollups.commit(client, 'InfraMetricsRollups', concurrency=1),
+                         (0, [('host-001', 'cpu', '1m', 1738440000)]))
+
+    @patch('pipeline_common.dynamodb_writer.time.sleep')
+    def test_tighten_retries_throttling(self, mock_sleep):
+        """Test the conditional min/max follow-up is retried like the update itself"""
+        client = MagicMock()
+        client.update_item.side_effect = [
+            {'Attributes': {'min': {'N': '15.0'}}},
+            client_error('ThrottlingException'),
+            {},
+        ]
+
+        rollups = RollupAccumulator(('1m',))
+        rollups.fold([metric(1738440000, 10.0)])
+        self.assertEqual(rollups.commit(client, 'InfraMetricsRollups'), (1, []))
+        self.assertEqual(client.update_item.call_count, 3)
+        self.assertEqual(client.update_item.call_args[1]['ConditionExpression'], '#min > :value')
+
+    def test_query_rollups_computes_average(self):
+        """Test stored windows are decoded with their average"""
+        paginator = MagicMock()
+        paginator.paginate.return_value = [{'Items': [{
+            'window_start': {'N': '1738440000'},
+            'count': {'N': '4'},
+            'sum': {'N': '100'},
+            'min': {'N': '10'},
+            'max': {'N': '40'},
+        }]}]
+        client = MagicMock()
+        client.get_paginator.return_value = paginator
+
+        windows = query_rollups(client, 'InfraMetricsRollups', 'host-001', 'cpu', '1h',
+                                1738440000, 1738443600)
+
+        self.assertEqual(windows, [{
+            'window_start': 1738440000, 'count': 4, 'sum': 100.0,
+            'min': 10.0, 'max': 40.0, 'avg': 25.0
+        }])
+        values = paginator.paginate.call_args[1]['ExpressionAttributeValues']
+        self.assertEqual(values[':end'], {'N': '1738443599'})
+
+    def test_parse_resolutions(self):
+        """Test configured resolutions are validated"""
+        self.assertEqual(parse_resolutions(' 1m, 1h '), ('1m', '1h'))
+        with self.assertRaises(ValueError):
+            parse_resolutions('1m,5m')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import sys
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common import series_keys, series_migration
+from pipeline_common.ingestion import write_metrics
+
+DAY = 1768435200  # 2026-01-15T00:00:00Z
+
+
+def metric(host, ts, value=1.0, metric_type='cpu'):
+    return {'metric_id': f'{metric_type}-{ts}-{host}', 'timestamp': ts, 'metric_type': metric_type,
+            'value': value, 'hostname': host}
+
+
+class TestSeriesKeys(unittest.TestCase):
+    """Key construction and shard maps"""
+
+    def test_series_key(self):
+        self.assertEqual(series_keys.series_key('host-1', 'cpu', DAY + 86399), 'host-1#cpu#2026-01-15')
+        self.assertEqual(series_keys.series_key('host-1', 'cpu', DAY + 86400), 'host-1#cpu#2026-01-16')
+        sharded = series_keys.series_key('host-1', 'cpu', DAY + 60, shards=4)
+        self.assertRegex(sharded, r'^host-1#cpu#2026-01-15#[0-3]$')
+        self.assertEqual(sharded, series_keys.series_key('host-1', 'cpu', DAY + 60, shards=4))
+
+    def test_shards_spread_points(self):
+        shards = {series_keys.shard_of(DAY + step * 60, 4) for step in range(100)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+
+    def test_partition_keys_cover_each_day_and_shard(self):
+        keys = series_keys.partition_keys('host-1', 'cpu', DAY + 3600, DAY + 86400 + 60)
+        self.assertEqual(keys, [('host-1#cpu#2026-01-15', DAY + 3600, DAY + 86399),
+                                ('host-1#cpu#2026-01-16', DAY + 86400, DAY + 86459)])
+        self.assertEqual(len(series_keys.partition_keys('host-1', 'cpu', DAY, DAY + 86400, shards=3)), 3)
+        self.assertEqual(series_keys.partition_keys('host-1', 'cpu', DAY, DAY), [])
+
+    def test_parse_shard_map(self):
+        shard_map = series_keys.parse_shard_map('2', 'db-01=8, db-02=4')
+        self.assertEqual(shard_map.shards('db-01'), 8)
+        self.assertEqual(shard_map.shards('web-01'), 2)
+        with self.assertRaises(ValueError):
+            series_keys.parse_shard_map('1', 'db-01')
+        with self.assertRaises(ValueError):
+            series_keys.parse_shard_map('1', 'db-01=0')
+
+    def test_encoder_layouts(self):
+        plain = series_keys.create_encoder('metric_id', 'eu-west-1')
+        series = series_keys.create_encoder('series', 'eu-west-1',
+                                            shard_map=series_keys.ShardMap(1, {'hot': 2}))
+        item = series.encode(metric('host-1', DAY))
+        self.assertEqual(item['series'], {'S': 'host-1#cpu#2026-01-15'})
+        self.assertNotIn('series', plain.encode(metric('host-1', DAY)))
+        self.assertRegex(series.encode(metric('hot', DAY))['series']['S'], r'#[01]$')
+        with self.assertRaises(ValueError):
+            series_keys.create_encoder('other', 'eu-west-1')
+
+    def test_to_series_item_falls_back_to_host_id(self):
+        item = {'metric_id': {'S': 'cpu-1-host-9'}, 'timestamp': {'N': str(DAY)},
+                'metric_type': {'S': 'cpu'}, 'host_id': {'S': 'host-9'}}
+        migrated = series_migration.to_series_item(item, series_keys.ShardMap())
+        self.assertEqual(migrated['series'], {'S': 'host-9#cpu#2026-01-15'})
+        self.assertEqual(migrated['hostname'], {'S': 'host-9'})
+        self.assertIsNone(series_migration.to_series_item({'metric_id': {'S': 'x'}}, series_keys.ShardMap()))
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestSeriesTables(unittest.TestCase):
+    """Writes, reads and migration against mocked tables"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client('dynamodb', region_name='us-east-1')
+        series_migration.create_series_table(self.client, 'Series', wait=False)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def create_source(self, count):
+        self.client.create_table(
+            TableName='InfraMetrics',
+            KeySchema=[{'AttributeName': 'metric_id', 'KeyType': 'HASH'},
+                       {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'metric_id', 'AttributeType': 'S'},
+                                  {'AttributeName': 'timestamp', 'AttributeType': 'N'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        encoder = series_keys.create_encoder('metric_id', 'eu-west-1')
+        metrics = [metric(f'host-{i % 3}', DAY + (i // 3) * 600, float(i)) for i in range(count)]
+        write_metrics(self.client, 'InfraMetrics', metrics, encoder)
+
+    def test_write_and_query_sharded_series(self):
+        shard_map = series_keys.ShardMap(1, {'hot': 4})
+        encoder = series_keys.create_encoder('series', 'eu-west-1', shard_map=shard_map)
+        metrics = [metric('hot', DAY + step * 60, float(step)) for step in range(2 * 1440)]
+        metrics.append(metric('cold', DAY, 5.0))
+        result = write_metrics(self.client, 'Series', metrics, encoder)
+        self.assertEqual(result.succeeded, len(metrics))
+
+        hot = series_keys.query_series(self.client, 'Series', 'hot', 'cpu', DAY + 3600, DAY + 86400 + 3600,
+                                       shard_map=shard_map)
+        self.assertEqual(len(hot), 1440)
+        self.assertEqual(hot.timestamps[0], DAY + 3600)
+        self.assertTrue((hot.timestamps[1:] > hot.timestamps[:-1]).all())
+        self.assertEqual(hot.values[0], 60.0)
+        self.assertEqual(hot.pages, 8)
+
+        cold = series_keys.query_series(self.client, 'Series', 'cold', 'cpu', DAY, DAY + 60)
+        self.assertEqual(cold.values.tolist(), [5.0])
+
+    def test_migration_copies_and_resumes(self):
+        self.create_source(60)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'checkpoint.json')
+            original_advance = series_migration.MigrationCheckpoint.advance
+            calls = []
+
+            def interrupted(self_, *args):
+                calls.append(args)
+                if len(calls) == 2:
+                    raise KeyboardInterrupt
+                return original_advance(self_, *args)
+
+            with patch.object(series_migration.MigrationCheckpoint, 'advance', interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    series_migration.migrate_to_series(self.client, 'InfraMetrics', 'Series', total_segments=1,
+                                                       checkpoint_path=checkpoint, page_size=10)
+            with open(checkpoint) as f:
+                self.assertEqual(json.load(f)['segments']['0']['copied'], 10)
+
+            stats = series_migration.migrate_to_series(self.client, 'InfraMetrics', 'Series', total_segments=1,
+                                                       checkpoint_path=checkpoint, page_size=10)
+            self.assertEqual(stats['copied'], 60)
+
+            with self.assertRaises(ValueError):
+                series_migration.migrate_to_series(self.client, 'InfraMetrics', 'Series', total_segments=2,
+                                                   checkpoint_path=checkpoint)
+
+        self.assertEqual(self.client.scan(TableName='Series', Select='COUNT')['Count'], 60)
+        result = series_keys.query_series(self.client, 'Series', 'host-1', 'cpu', DAY, DAY + 86400)
+        self.assertEqual(len(result), 20)
+
+    def test_parallel_segments(self):
+        self.create_source(90)
+        stats = series_migration.migrate_to_series(self.client, 'InfraMetrics', 'Series', total_segments=4)
+        self.assertEqual(stats['copied'], 90)
+        self.assertEqual(self.client.scan(TableName='Series', Select='COUNT')['Count'], 90)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Add repository root to path to import the shared package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:  # pragma: no cover
+    mock_aws = None
+
+from pipeline_common.sketches import (
+    FLEET_INDEX_NAME, FLEET_SHARDS, DDSketch, SketchAccumulator, fleet_shard, read_quantiles
+)
+
+TABLE = 'InfraMetricsSketches'
+BASE_TS = 1768435200  # 2026-01-15T00:00:00Z
+
+
+def sketch_of(values, accuracy=0.01):
+    sketch = DDSketch(accuracy)
+    for value in values:
+        sketch.add(float(value))
+    return sketch
+
+
+class TestDDSketch(unittest.TestCase):
+    """Sketch accuracy, merging and encoding"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.values = np.concatenate([rng.lognormal(3, 1, 5000), -rng.uniform(0, 5, 200), np.zeros(50)])
+
+    def assert_within(self, sketch, values, accuracy):
+        ordered = np.sort(values)
+        for q in (0.01, 0.25, 0.5, 0.95, 0.99, 1.0):
+            expected = ordered[int(q * (len(ordered) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), accuracy * abs(expected) + 1e-12, q)
+
+    def test_relative_accuracy(self):
+        sketch = sketch_of(self.values)
+        self.assertEqual(len(sketch), len(self.values))
+        self.assert_within(sketch, self.values, 0.01)
+        self.assertEqual(sketch.quantile(0), self.values.min())
+        self.assertEqual(sketch.quantile(1), self.values.max())
+
+    def test_merge_matches_single_sketch(self):
+        merged = DDSketch()
+        for part in np.array_split(self.values, 7):
+            merged.merge(sketch_of(part))
+        single = sketch_of(self.values)
+        self.assertEqual(merged.positive, single.positive)
+        self.assertEqual(merged.negative, single.negative)
+        self.assertEqual((merged.count, merged.zero_count, merged.min, merged.max),
+                         (single.count, single.zero_count, single.min, single.max))
+        with self.assertRaises(ValueError):
+            merged.merge(DDSketch(0.05))
+
+    def test_round_trip_is_compact(self):
+        sketch = sketch_of(np.linspace(0, 100, 3600))
+        data = sketch.to_bytes()
+        decoded = DDSketch.from_bytes(data)
+        self.assertEqual(decoded.positive, sketch.positive)
+        self.assertEqual(decoded.quantile(0.99), sketch.quantile(0.99))
+        self.assertLess(len(data), 2048)
+        with self.assertRaises(ValueError):
+            DDSketch.from_bytes(data[:-1])
+
+    def test_empty_sketch(self):
+        self.assertIsNone(DDSketch().quantile(0.5))
+        self.assertEqual(DDSketch.from_bytes(DDSketch().to_bytes()).count, 0)
+
+
+class TestSketchAccumulator(unittest.TestCase):
+    """Folding and committing windows"""
+
+    def test_fold_groups_by_window(self):
+        accumulator = SketchAccumulator(('1m', '1h'))
+        accumulator.fold([
+            {'hostname': 'web-01', 'metric_type': 'cpu', 'timestamp': BASE_TS + 30, 'value': 10.0},
+            {'hostname': 'web-01', 'metric_type': 'cpu', 'timestamp': BASE_TS + 90, 'value': 20.0}
+        ])
+        self.assertEqual(len(accumulator), 3)
+        self.assertEqual(accumulator.sketches[('web-01', 'cpu', '1h', BASE_TS)].count, 2)
+
+    def test_commit_records_failures(self):
+        from botocore.exceptions import ClientError
+        client = MagicMock()
+        client.get_item.side_effect = ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'GetItem')
+        accumulator = SketchAccumulator()
+        accumulator.fold([{'hostname': 'web-01', 'metric_type': 'cpu', 'timestamp': BASE_TS, 'value': 1.0}])
+        self.assertEqual(accumulator.commit(client, TABLE), (0, [('web-01', 'cpu', '1h', BASE_TS)]))
+        self.assertEqual(len(accumulator), 0)
+
+
+@unittest.skipIf(mock_aws is None, "moto is not installed")
+class TestSketchTable(unittest.TestCase):
+    """Merges across invocations and fleet-wide reads"""
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.client = boto3.client('dynamodb', region_name='us-east-1')
+        self.client.create_table(
+            TableName=TABLE,
+            KeySchema=[
+                {'AttributeName': 'series', 'KeyType': 'HASH'},
+                {'AttributeName': 'window_start', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'series', 'AttributeType': 'S'},
+                {'AttributeName': 'window_start', 'AttributeType': 'N'},
+                {'AttributeName': 'fleet_series', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': FLEET_INDEX_NAME,
+                'KeySchema': [
+                    {'AttributeName': 'fleet_series', 'KeyType': 'HASH'},
+                    {'AttributeName': 'window_start', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['sketch']}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def ingest(self, hostname, values, start):
+        accumulator = SketchAccumulator()
+        accumulator.fold([{'hostname': hostname, 'metric_type': 'latency_ms', 'timestamp': start + i,
+                           'value': float(value)} for i, value in enumerate(values)])
+        return accumulator.commit(self.client, TABLE)
+
+    def test_invocations_merge_and_fleet_read(self):
+        rng = np.random.default_rng(3)
+        fleet = []
+        for host in ('web-01', 'web-02', 'web-03'):
+            for hour in range(3):
+                # Two invocations per window
+                for _ in range(2):
+                    values = rng.gamma(2, 20 if host != 'web-03' else 60, 500)
+                    fleet.extend(values)
+                    self.assertEqual(self.ingest(host, values, BASE_TS + hour * 3600), (1, []))
+
+        result = read_quantiles(self.client, TABLE, 'latency_ms', BASE_TS, BASE_TS + 3 * 3600)
+        self.assertEqual(result['count'], len(fleet))
+        self.assertEqual(result['windows'], 9)
+        expected = np.sort(fleet)[int(0.99 * (len(fleet) - 1))]
+        self.assertLessEqual(abs(result['p99'] - expected), 0.01 * expected)
+        self.assertEqual(set(result), {'count', 'min', 'max', 'windows', 'seconds', 'p50', 'p95', 'p99'})
+
+        host = read_quantiles(self.client, TABLE, 'latency_ms', BASE_TS, BASE_TS + 3600, hostname='web-01')
+        self.assertEqual((host['count'], host['windows']), (1000, 1))
+
+        empty = read_quantiles(self.client, TABLE, 'latency_ms', BASE_TS - 3600, BASE_TS)
+        self.assertEqual((empty['count'], empty['p50']), (0, None))
+
+    def test_fleet_key_is_sharded_by_host(self):
+        hosts = [f'web-{i:03d}' for i in range(40)]
+        for host in hosts:
+            self.ingest(host, [1.0, 2.0], BASE_TS)
+        items = self.client.scan(TableName=TABLE)['Items']
+        keys = {item['fleet_series']['S'] for item in items}
+        self.assertEqual(keys, {f'latency_ms#1h#{fleet_shard(host)}' for host in hosts})
+        self.assertGreater(len(keys), FLEET_SHARDS // 2)
+        result = read_quantiles(self.client, TABLE, 'latency_ms', BASE_TS, BASE_TS + 3600)
+        self.assertEqual((result['count'], result['windows']), (80, 40))
+
+
+if __name__ == '__main__':
+    unittest.main()